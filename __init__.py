@@ -8,7 +8,8 @@ from config.config import Config  # 从config.config导入Config
 import importlib.util
 import sys
 from flask_migrate import Migrate
-from database import db, Department, Course
+from werkzeug.middleware.proxy_fix import ProxyFix  # 反向代理头处理
+from database import db, Department, Course, search_index
 # 全局变量存储数据库实例和模型
 db = None
 User = None
@@ -19,6 +20,11 @@ def create_app(config_object=Config):
     app = Flask(__name__)
     app.config.from_object(config_object)
 
+    # 部署在反向代理之后时，按配置的可信代理层数还原客户端IP(限流按该地址计数)
+    proxy_hops = app.config.get("PROXY_FIX_X_FOR", 0)
+    if proxy_hops > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+
     # 初始化 CSRF 保护
     csrf = CSRFProtect(app)
 
@@ -60,6 +66,7 @@ def create_app(config_object=Config):
     from blueprints.notification import notification_bp  # 添加这一行
     from blueprints.ranking import ranking_bp  # 确保导入排行榜蓝图
     from blueprints.utils_bp import utils_bp  # 导入其他蓝图
+    from blueprints.events import events_bp  # 导入SSE推送蓝图
 
     # 将蓝图注册到应用
     app.register_blueprint(auth_bp)
@@ -73,10 +80,33 @@ def create_app(config_object=Config):
     app.register_blueprint(notification_bp)  # 添加这一行
     app.register_blueprint(ranking_bp)  # 注册排行榜蓝图
     app.register_blueprint(utils_bp, url_prefix='/utils')  # 注册其他蓝图
+    app.register_blueprint(events_bp)  # 注册SSE推送蓝图
 
     # 导入并应用用户关注功能 - 在所有数据库表都创建好之后再初始化
     with app.app_context():
         db.create_all()  # 确保创建了所有表，包括新添加的UserFollow表
+        # 创建资料全文检索索引(FTS5虚拟表)，首次部署时根据现有资料建立索引
+        search_index.ensure()
+
+    # 初始化通知数据(导入旧版通知文件)
+    initialize_notification_data(app)
+
+    # 启动通知归档/压缩后台任务
+    if not app.config.get("TESTING"):
+        from notification import (
+            retention_job,
+            follower_digest,
+            broadcast_sender,
+            follower_fanout,
+        )
+
+        retention_job.start(app)
+        # 启动关注者通知扇出线程(补做上次退出时遗留的任务)
+        follower_fanout.start(app)
+        # 启动关注上传每日摘要邮件任务
+        follower_digest.start(app)
+        # 启动管理员群发邮件任务
+        broadcast_sender.start(app)
 
     # 用户加载函数
     @login_manager.user_loader
@@ -102,17 +132,13 @@ def create_app(config_object=Config):
     # 注入未读通知数到所有模板
     @app.context_processor
     def inject_unread_notifications():
-        from blueprints.notification import load_notifications
+        from notification import notification_manager
 
         unread_count = 0
         if current_user.is_authenticated:
-            all_notifications = load_notifications()
-            for notification in all_notifications:
-                if notification["target_role"] == "all" or (
-                    current_user.is_admin and notification["target_role"] == "admin"
-                ):
-                    if current_user.id not in notification.get("read_by", []):
-                        unread_count += 1
+            unread_count = notification_manager.get_unread_count(
+                current_user.id, current_user.is_admin
+            )
         return {"unread_count": unread_count}
 
     # 注册自定义过滤器
@@ -225,6 +251,11 @@ def initialize_database(app):
                         db.create_all()
                         print("数据库表创建成功")
 
+                        # create_all 不会为已存在的表补建新增的索引，这里逐个补齐
+                        for table in db.metadata.sorted_tables:
+                            for index in table.indexes:
+                                index.create(db.engine, checkfirst=True)
+
                         # 检查是否需要添加学院数据
                         try:
                             dept_count = Department.query.count()
@@ -484,3 +515,24 @@ def initialize_course_data(app):
         print(f"初始化课程数据失败: {str(e)}")
         import traceback
         traceback.print_exc()
+
+
+def initialize_notification_data(app):
+    """将旧版 notifications.json 导入通知表，压缩广播已读记录，并在没有任何通知时创建欢迎通知"""
+    from notification import notification_manager, unread_counter
+
+    try:
+        with app.app_context():
+            unread_counter.ensure_token()
+            imported = notification_manager.import_legacy_notifications(app.root_path)
+            if imported:
+                print(f"✓ 已从 notifications.json 导入 {imported} 条通知")
+            compacted = notification_manager.compact_read_receipts()
+            if compacted:
+                print(f"✓ 已为 {compacted} 位用户压缩广播已读记录")
+            if notification_manager.create_welcome_notification():
+                print("已创建欢迎通知")
+    except Exception as e:
+        print(f"初始化通知数据失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,3 @@
+"""
+性能测试 - 使用本地模拟SMTP服务器测量邮件子系统的吞吐量和延迟，不会连接真实的邮件服务商
+"""
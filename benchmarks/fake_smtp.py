@@ -0,0 +1,241 @@
+import os
+import ssl
+import time
+import base64
+import asyncio
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def generate_self_signed_cert(directory: Optional[str] = None) -> Tuple[str, str]:
+    """
+    使用 openssl 命令生成 localhost/127.0.0.1 的自签名证书
+
+    参数:
+        directory: 证书存放目录(可选，默认新建临时目录)
+    返回:
+        (证书文件路径, 私钥文件路径)
+    """
+    directory = directory or tempfile.mkdtemp()
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", keyfile, "-out", certfile, "-days", "1",
+            "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
+
+
+class FakeSMTPServer:
+    """
+    模拟SMTP服务器 - 在后台线程的事件循环中运行，记录并丢弃收到的邮件
+
+    支持 EHLO/HELO、AUTH PLAIN/LOGIN、MAIL、RCPT、DATA、RSET、NOOP、QUIT，
+    可以模拟的服务商行为:
+        latency      - 每封邮件在 DATA 结束后等待的秒数
+        use_ssl      - 使用SSL连接(SMTP_SSL)，默认生成自签名证书
+        auth_failures - 登录总是失败(535)的账户集合，运行中可以修改
+        rate_limit   - 每个账户在 rate_window 秒内最多接收的邮件数，超过后 MAIL 返回 421 并断开连接
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.05,
+        use_ssl: bool = False,
+        certfile: Optional[str] = None,
+        keyfile: Optional[str] = None,
+        auth_failures: Optional[Set[str]] = None,
+        rate_limit: Optional[int] = None,
+        rate_window: float = 60,
+    ):
+        """
+        初始化模拟服务器
+
+        参数:
+            host: 监听地址
+            port: 监听端口，0 表示由系统分配
+            latency: 每封邮件的响应延迟(秒)
+            use_ssl: 是否使用SSL连接
+            certfile: SSL证书文件(可选，未提供时生成自签名证书)
+            keyfile: SSL私钥文件
+            auth_failures: 登录失败的账户集合
+            rate_limit: 每个账户在窗口内最多接收的邮件数(可选)
+            rate_window: 限流窗口(秒)
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.use_ssl = use_ssl
+        if use_ssl and certfile is None:
+            certfile, keyfile = generate_self_signed_cert()
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.auth_failures = set(auth_failures or ())
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.received: List[Tuple[str, float, str]] = []  # [(收件人, 接收时间, 发件账户)]
+        self.connections = 0  # 累计建立的连接数
+        self.logins = 0  # 累计登录成功次数
+        self.auth_rejections = 0  # 累计登录失败次数
+        self.rate_limited = 0  # 累计被限流的邮件数
+        self._accepted: Dict[str, deque] = {}  # {账户: 窗口内接收邮件的时间}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    # 生命周期 ------------------------------------------------------
+    def start(self) -> "FakeSMTPServer":
+        """启动服务器线程，返回后即可连接"""
+        self._thread = threading.Thread(target=self._run, name="FakeSMTPServer", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self
+
+    def _run(self) -> None:
+        """服务器线程的主函数"""
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        context = None
+        if self.use_ssl:
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(self.certfile, self.keyfile)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(
+                self._handle, self.host, self.port, ssl=context, backlog=1024
+            )
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def stop(self) -> None:
+        """关闭服务器"""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    # 统计 ----------------------------------------------------------
+    def delivered_by_account(self) -> Dict[str, int]:
+        """各发件账户投递成功的邮件数"""
+        counts = {}
+        for _, _, user in self.received:
+            counts[user] = counts.get(user, 0) + 1
+        return counts
+
+    def _over_limit(self, user: str) -> bool:
+        """账户是否超过了限流窗口内的邮件数"""
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        accepted = self._accepted.setdefault(user, deque())
+        while accepted and now - accepted[0] > self.rate_window:
+            accepted.popleft()
+        if len(accepted) >= self.rate_limit:
+            return True
+        accepted.append(now)
+        return False
+
+    def _check_login(self, user: str) -> bool:
+        """记录一次登录，返回是否成功"""
+        if user in self.auth_failures:
+            self.auth_rejections += 1
+            return False
+        self.logins += 1
+        return True
+
+    # 会话处理 ------------------------------------------------------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个SMTP会话"""
+        self.connections += 1
+        recipients = []
+        user = ""
+
+        def reply(line: str) -> None:
+            writer.write(line.encode() + b"\r\n")
+
+        reply("220 fake.smtp ESMTP ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+
+                if verb == "EHLO":
+                    reply("250-fake.smtp")
+                    reply("250-AUTH PLAIN LOGIN")
+                    reply("250 8BITMIME")
+                elif verb == "HELO":
+                    reply("250 fake.smtp")
+                elif verb == "AUTH":
+                    if command.upper().startswith("AUTH LOGIN"):
+                        # 用户名可能直接跟在命令后面(initial response)
+                        parts = command.split(" ", 2)
+                        if len(parts) == 3:
+                            token = parts[2].encode()
+                        else:
+                            reply("334 VXNlcm5hbWU6")
+                            await writer.drain()
+                            token = (await reader.readline()).strip()
+                        user = base64.b64decode(token).decode()
+                        reply("334 UGFzc3dvcmQ6")
+                        await writer.drain()
+                        await reader.readline()
+                    else:
+                        # AUTH PLAIN base64("\0用户名\0密码")
+                        token = command.split(" ", 2)[2]
+                        user = base64.b64decode(token).split(b"\0")[1].decode()
+                    if self._check_login(user):
+                        reply("235 Authentication successful")
+                    else:
+                        user = ""
+                        reply("535 Authentication failed")
+                elif verb == "MAIL":
+                    recipients = []
+                    if self._over_limit(user):
+                        self.rate_limited += 1
+                        reply("421 Too many messages, try again later")
+                        await writer.drain()
+                        break
+                    reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[1].strip().strip("<>"))
+                    reply("250 OK")
+                elif verb == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        pass
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    now = time.time()
+                    self.received.extend((r, now, user) for r in recipients)
+                    reply("250 OK queued")
+                elif verb in ("RSET", "NOOP"):
+                    reply("250 OK")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("502 Command not implemented")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,295 @@
+"""
+邮件子系统性能测试 - 在进程内启动模拟SMTP服务器，测量 MailNotifier 的吞吐量、延迟和故障转移
+
+用法(在项目根目录下执行):
+    # 队列发送 1000 封邮件，20 个线程并发调用 send
+    python -m benchmarks.mail_bench --mode send --messages 1000 --concurrency 20
+
+    # 同步发送，SSL连接，每封邮件 100ms 延迟
+    python -m benchmarks.mail_bench --mode send_sync --ssl --latency 0.1
+
+    # 验证码发送，第一个账户登录失败，10 秒后恢复
+    python -m benchmarks.mail_bench --mode verification --fail-accounts 1 --recover-after 10
+
+    # 保存基线，修改代码后对比
+    python -m benchmarks.mail_bench --save baseline.json
+    python -m benchmarks.mail_bench --compare baseline.json
+
+不会使用 .env 中的真实账户，也不会连接真实的邮件服务商
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from benchmarks.fake_smtp import FakeSMTPServer
+
+MODES = ("send", "send_sync", "verification")
+
+
+def configure_environment(
+    backend: str,
+    port: int,
+    accounts: int,
+    connections: int,
+    daily_limit: int,
+    use_ssl: bool = False,
+    cafile: Optional[str] = None,
+) -> None:
+    """
+    通过环境变量配置邮件子系统，指向模拟服务器(必须在创建 MailNotifier 之前调用)
+
+    参数:
+        backend: 发送引擎(threads 或 asyncio)
+        port: 模拟服务器端口
+        accounts: 邮箱账户数量
+        connections: 每个账户的最大连接数
+        daily_limit: 每个账户的发送配额
+        use_ssl: 是否使用SSL连接
+        cafile: 校验模拟服务器证书的CA文件
+    """
+    os.environ.update(
+        {
+            "SMTP_HOST": "127.0.0.1",
+            "SMTP_PORT": str(port),
+            "SMTP_USE_SSL": "1" if use_ssl else "0",
+            "SMTP_SSL_CAFILE": cafile or "",
+            "MAIL_BACKEND": backend,
+            "MAIL_OUTBOX_PATH": os.path.join(tempfile.mkdtemp(), "outbox.db"),
+            "SMTP_CONNECTIONS_PER_ACCOUNT": str(connections),
+        }
+    )
+    for idx in range(1, accounts + 1):
+        os.environ[f"EMAIL_USER_{idx}"] = account_address(idx)
+        os.environ[f"EMAIL_PWD_{idx}"] = "password"
+        os.environ[f"EMAIL_DAILY_LIMIT_{idx}"] = str(daily_limit)
+    # 空值让账户扫描在此停止，不会读取 .env 中的其他账户
+    os.environ[f"EMAIL_USER_{accounts + 1}"] = ""
+
+
+def account_address(idx: int) -> str:
+    """第 idx 个测试账户的邮箱地址"""
+    return f"bench{idx}@example.com"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    计算百分位数(最近秩法)
+
+    参数:
+        values: 数值列表
+        pct: 百分位(0~100)
+    返回:
+        百分位数，列表为空时返回0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class MailBenchmark:
+    """
+    单次性能测试 - 按命令行参数启动模拟服务器、配置 MailNotifier 并发发送邮件
+    """
+
+    def __init__(self, args):
+        """
+        初始化性能测试
+
+        参数:
+            args: 命令行参数
+        """
+        self.args = args
+        self.server = FakeSMTPServer(
+            latency=args.latency,
+            use_ssl=args.ssl,
+            auth_failures={account_address(i) for i in args.fail_accounts},
+            rate_limit=args.rate_limit,
+            rate_window=args.rate_window,
+        ).start()
+        configure_environment(
+            args.backend,
+            self.server.port,
+            args.accounts,
+            args.connections,
+            daily_limit=args.messages * 2,
+            use_ssl=args.ssl,
+            cafile=self.server.certfile,
+        )
+        self.enqueued_at: Dict[str, float] = {}  # {收件人: 调用发送接口的时间}
+        self.results: List[Dict] = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def _record(self, result: Dict) -> None:
+        """记录一次发送结果，全部完成时设置完成事件"""
+        with self._lock:
+            self.results.append(result)
+            if len(self.results) >= self.args.messages:
+                self._done.set()
+
+    def _send_one(self, i: int) -> None:
+        """按测试模式发送第 i 封邮件"""
+        import notification
+
+        recipient = f"user{i}@example.com"
+        self.enqueued_at[recipient] = time.time()
+        if self.args.mode == "send":
+            notification.MailNotifier().send(
+                to=recipient,
+                subject="性能测试",
+                content="<p>benchmark</p>",
+                content_type="html",
+                callback=self._record,
+                lane=self.args.lane,
+            )
+        elif self.args.mode == "send_sync":
+            self._record(
+                notification.MailNotifier().send_sync(
+                    recipient, "性能测试", "<p>benchmark</p>", "html"
+                )
+            )
+        else:
+            success, email, _ = notification.send_verification_codes(
+                [recipient], timeout=self.args.timeout
+            )[0]
+            self._record(
+                {"success": [email], "failed": {}}
+                if success
+                else {"success": [], "failed": {email: "验证码发送失败"}}
+            )
+
+    def _recover_later(self) -> None:
+        """到达指定时间后让所有账户恢复正常登录"""
+        time.sleep(self.args.recover_after)
+        self.server.auth_failures.clear()
+
+    def run(self) -> Dict:
+        """
+        执行测试
+
+        返回:
+            测试报告字典
+        """
+        logging.disable(logging.CRITICAL)
+        from notification import MailNotifier
+
+        notifier = MailNotifier()
+        if self.args.recover_after is not None:
+            threading.Thread(target=self._recover_later, daemon=True).start()
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
+            list(executor.map(self._send_one, range(self.args.messages)))
+        calls_finished = time.time()
+        completed = self._done.wait(self.args.timeout)
+        elapsed = time.time() - started
+
+        # 入队到服务器收到邮件的延迟
+        latencies = [
+            received_at - self.enqueued_at[rcpt]
+            for rcpt, received_at, _ in self.server.received
+            if rcpt in self.enqueued_at
+        ]
+        delivered = len(latencies)
+        report = {
+            "mode": self.args.mode,
+            "backend": self.args.backend,
+            "messages": self.args.messages,
+            "concurrency": self.args.concurrency,
+            "completed": completed,
+            "delivered": delivered,
+            "failed": sum(len(r["failed"]) for r in self.results),
+            "elapsed_seconds": round(elapsed, 3),
+            "call_seconds": round(calls_finished - started, 3),
+            "messages_per_second": round(delivered / elapsed, 1) if elapsed else 0.0,
+            "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "latency_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "latency_max_ms": round(max(latencies, default=0) * 1000, 1),
+            "smtp_connections": self.server.connections,
+            "smtp_logins": self.server.logins,
+            "auth_rejections": self.server.auth_rejections,
+            "rate_limited": self.server.rate_limited,
+            "connection_reuse_ratio": notifier.stats()["connections"]["reuse_ratio"],
+            "delivered_by_account": self.server.delivered_by_account(),
+            "breakers": {
+                address: breaker.snapshot()["state"]
+                for address, breaker in notifier.breakers.items()
+            },
+        }
+        MailNotifier.close()
+        self.server.stop()
+        return report
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None) -> None:
+    """
+    打印测试报告，提供基线时同时打印变化比例
+
+    参数:
+        report: 测试报告
+        baseline: 基线报告(可选)
+    """
+    for key, value in report.items():
+        line = f"{key:<24}{value}"
+        if (
+            baseline is not None
+            and isinstance(value, (int, float))
+            and not isinstance(value, bool)
+            and isinstance(baseline.get(key), (int, float))
+            and baseline[key]
+        ):
+            change = (value - baseline[key]) / baseline[key] * 100
+            line += f"  (基线 {baseline[key]}, {change:+.1f}%)"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="邮件子系统性能测试")
+    parser.add_argument("--mode", choices=MODES, default="send", help="测试的发送接口")
+    parser.add_argument("--backend", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--messages", type=int, default=500, help="发送的邮件数量")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发调用发送接口的线程数")
+    parser.add_argument("--lane", default="transactional", help="send 模式使用的发送通道")
+    parser.add_argument("--accounts", type=int, default=2, help="邮箱账户数量")
+    parser.add_argument("--connections", type=int, default=3, help="每个账户的最大连接数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务器每封邮件的延迟(秒)")
+    parser.add_argument("--ssl", action="store_true", help="使用SSL连接(自签名证书)")
+    parser.add_argument(
+        "--fail-accounts", type=int, nargs="*", default=[], help="登录失败的账户序号(从1开始)"
+    )
+    parser.add_argument("--recover-after", type=float, help="多少秒后让失败的账户恢复")
+    parser.add_argument("--rate-limit", type=int, help="每个账户在限流窗口内最多接收的邮件数")
+    parser.add_argument("--rate-window", type=float, default=60, help="限流窗口(秒)")
+    parser.add_argument("--timeout", type=float, default=120, help="等待全部发送完成的最长秒数")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出报告")
+    parser.add_argument("--save", help="把报告保存为基线文件")
+    parser.add_argument("--compare", help="与基线文件对比")
+    args = parser.parse_args()
+
+    report = MailBenchmark(args).run()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+比较 threads 和 asyncio 两种邮件发送引擎的吞吐量
+
+用法(在项目根目录下执行):
+    python -m benchmarks.mail_engines --messages 500 --latency 0.05
+
+每种引擎在独立的子进程中运行(MailNotifier 是进程内单例)，
+连接本地模拟SMTP服务器，不会使用 .env 中的真实账户发送邮件
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import subprocess
+
+BACKENDS = ("threads", "asyncio")
+
+
+def run_child(args) -> None:
+    """在当前进程中测试一种引擎，以JSON输出结果"""
+    from benchmarks.fake_smtp import FakeSMTPServer
+    from benchmarks.mail_bench import configure_environment
+
+    server = FakeSMTPServer(latency=args.latency).start()
+    configure_environment(
+        args.backend, server.port, args.accounts, args.connections, daily_limit=args.messages
+    )
+    logging.disable(logging.CRITICAL)
+
+    from notification import MailNotifier
+
+    notifier = MailNotifier()
+    done = threading.Event()
+    finished = []
+    lock = threading.Lock()
+
+    def callback(result):
+        with lock:
+            finished.append(result)
+            if len(finished) >= args.messages:
+                done.set()
+
+    started = time.perf_counter()
+    for i in range(args.messages):
+        notifier.send(
+            to=f"user{i}@example.com",
+            subject="benchmark",
+            content="hello",
+            callback=callback,
+            lane=args.lane,
+        )
+    enqueued = time.perf_counter() - started
+    completed = done.wait(args.timeout)
+    elapsed = time.perf_counter() - started
+
+    sent = sum(len(r["success"]) for r in finished)
+    print(
+        json.dumps(
+            {
+                "backend": args.backend,
+                "messages": args.messages,
+                "sent": sent,
+                "completed": completed,
+                "enqueue_seconds": round(enqueued, 3),
+                "elapsed_seconds": round(elapsed, 3),
+                "messages_per_second": round(sent / elapsed, 1),
+                "smtp_connections": server.connections,
+                "smtp_logins": server.logins,
+            }
+        )
+    )
+    MailNotifier.close()
+    server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="邮件发送引擎吞吐量对比")
+    parser.add_argument("--messages", type=int, default=300, help="发送的邮件数量")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务器每封邮件的延迟(秒)")
+    parser.add_argument("--accounts", type=int, default=2, help="邮箱账户数量")
+    parser.add_argument("--connections", type=int, default=10, help="每个账户的最大连接数")
+    parser.add_argument("--lane", default="transactional", help="发送通道")
+    parser.add_argument("--timeout", type=float, default=300, help="等待全部发送完成的最长秒数")
+    parser.add_argument("--backend", choices=BACKENDS, help="只测试一种引擎")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    results = []
+    for backend in [args.backend] if args.backend else BACKENDS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.mail_engines", "--child", "--backend", backend]
+            + [
+                f"--{name}={getattr(args, name)}"
+                for name in ("messages", "latency", "accounts", "connections", "lane", "timeout")
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'引擎':<10}{'发送数':>8}{'耗时(s)':>10}{'邮件/秒':>10}{'连接数':>8}{'登录数':>8}")
+    for r in results:
+        print(
+            f"{r['backend']:<10}{r['sent']:>8}{r['elapsed_seconds']:>10}"
+            f"{r['messages_per_second']:>10}{r['smtp_connections']:>8}{r['smtp_logins']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 import database
-from database.models import User, Material, Course, Department
+from database.models import User, Material, Course, Department, EmailBroadcast
 from utils.forms import AdminEditUserForm
 from permission import admin_required
+from notification import retention_job, follower_digest, broadcast_sender, MailNotifier
 from datetime import datetime, timedelta
 import os
 from flask import current_app
@@ -149,3 +150,94 @@ def delete_user(user_id):
         return jsonify({"success": True, "message": "用户已成功注销"})
     else:
         return jsonify({"success": False, "message": "删除用户失败"})
+
+
+# 通知保留任务指标
+@admin_bp.route("/admin/notifications/retention")
+@login_required
+@admin_required
+def notification_retention_stats():
+    """查看通知归档/压缩任务的运行指标"""
+    return jsonify(retention_job.stats())
+
+
+# 关注上传摘要邮件任务指标
+@admin_bp.route("/admin/notifications/digest")
+@login_required
+@admin_required
+def notification_digest_stats():
+    """查看关注上传摘要邮件任务的运行指标"""
+    return jsonify(follower_digest.stats())
+
+
+# 邮件队列指标
+@admin_bp.route("/admin/mail/stats")
+@login_required
+@admin_required
+def mail_stats():
+    """查看邮件队列深度、发送耗时分布和各账户的发送计数(只统计处理该请求的进程)"""
+    return jsonify(MailNotifier().stats())
+
+
+# 群发邮件
+@admin_bp.route("/admin/broadcasts", methods=["GET", "POST"])
+@login_required
+@admin_required
+def broadcasts():
+    """群发邮件页面: 创建群发并查看发送进度(发送由后台线程完成，不阻塞请求)"""
+    if request.method == "POST":
+        subject = request.form.get("subject", "").strip()
+        content = request.form.get("content", "").strip()
+        segment = request.form.get("segment", "all")
+        department_id = request.form.get("department_id", type=int)
+        content_type = request.form.get("content_type", "plain")
+
+        if not subject or not content:
+            flash("主题和内容不能为空")
+            return redirect(url_for("admin.broadcasts"))
+
+        try:
+            broadcast = broadcast_sender.create(
+                subject=subject,
+                content=content,
+                creator_id=current_user.id,
+                segment=segment,
+                department_id=department_id,
+                content_type=content_type,
+            )
+            flash(f"群发已创建，共 {broadcast.total} 位收件人，正在后台发送")
+        except ValueError as e:
+            flash(str(e))
+        except Exception:
+            flash("创建群发失败，请重试")
+        return redirect(url_for("admin.broadcasts"))
+
+    recent = (
+        EmailBroadcast.query.order_by(EmailBroadcast.id.desc()).limit(20).all()
+    )
+    departments = Department.query.order_by(Department.name).all()
+    return render_template(
+        "admin_broadcast.html", broadcasts=recent, departments=departments
+    )
+
+
+# 群发进度
+@admin_bp.route("/admin/broadcasts/progress")
+@login_required
+@admin_required
+def broadcast_progress():
+    """查询指定群发的进度(ids 参数为逗号分隔的群发ID)"""
+    ids = [int(i) for i in request.args.get("ids", "").split(",") if i.isdigit()]
+    rows = EmailBroadcast.query.filter(EmailBroadcast.id.in_(ids)).all() if ids else []
+    return jsonify({"broadcasts": [b.to_dict() for b in rows]})
+
+
+# 取消群发
+@admin_bp.route("/admin/broadcasts/<int:broadcast_id>/cancel", methods=["POST"])
+@login_required
+@admin_required
+def cancel_broadcast(broadcast_id):
+    """取消群发，已写入发件箱的分块仍会投递"""
+    if broadcast_sender.cancel(broadcast_id):
+        return jsonify({"success": True})
+    return jsonify({"success": False, "message": "群发已结束或不存在"})
@@ -22,6 +22,7 @@ from utils.forms import (
     ResetPasswordForm,
 )
 import notification
+from utils.rate_limit import RateLimit, rate_limit
 
 # 邮件工具：生成验证码、发送邮件、保存验证码、验证码校验功能
 from datetime import datetime
@@ -34,6 +35,7 @@ auth_bp = Blueprint("auth", __name__)
 
 # 登录路由
 @auth_bp.route("/login", methods=["GET", "POST"])
+@rate_limit("login", RateLimit("ip", 30, 300), RateLimit("email", 10, 300))
 def login():
     form = LoginForm()
     if form.validate_on_submit():
@@ -62,6 +64,7 @@ def login():
 
 # 注册路由
 @auth_bp.route("/register", methods=["GET", "POST"])
+@rate_limit("register", RateLimit("ip", 20, 3600))
 def register():
     form = RegisterForm()
     if form.validate_on_submit():
@@ -102,23 +105,30 @@ def register():
     return render_template("register.html", form=form)
 
 
-# 删除这个异步包装函数，直接使用同步版本
-def send_verification_codes_sync(email_list, subject="验证码 - PKUHUB", timeout=60):
-    """同步调用验证码发送函数
+# 每个会话保留的发送凭证数量
+MAX_SESSION_TICKETS = 5
 
-    参数:
-        email_list: 接收验证码的邮箱列表
-        subject: 邮件标题
-        timeout: 发送超时时间（秒）
 
-    返回:
-        包含(success, email, code)三元组的列表
+def remember_verification_ticket(ticket, email):
+    """在会话中记录发送凭证，状态查询只允许查询本会话申请的凭证
+
+    参数:
+        ticket: 发送凭证(发件箱记录ID)
+        email: 接收验证码的邮箱
     """
-    # 直接调用同步函数，不需要asyncio
-    return notification.send_verification_codes(email_list, subject, timeout)
+    tickets = dict(session.get("verification_tickets", {}))
+    tickets[str(ticket)] = email
+    # 只保留最近的几个凭证，避免会话Cookie过大
+    session["verification_tickets"] = dict(list(tickets.items())[-MAX_SESSION_TICKETS:])
 
 
 @auth_bp.route("/send_verification_code", methods=["POST"])
+@rate_limit(
+    "send_code",
+    RateLimit("ip", 10, 600),
+    RateLimit("email", 1, 60),  # 同一邮箱1分钟内不能重复请求
+    RateLimit("email", 5, 3600),
+)
 def send_verification_code():
     data = request.get_json()
     email = data.get("email")
@@ -141,34 +151,29 @@ def send_verification_code():
         if existing_username:
             return jsonify({"success": False, "message": "该用户名已被使用"})
 
-    # 检查是否短时间内多次请求验证码（防止频繁请求攻击）
-    last_request_time_key = f"last_verification_request_{email}"
-    if last_request_time_key in session:
-        last_time = session[last_request_time_key]
-        elapsed_seconds = datetime.now().timestamp() - last_time
-        if elapsed_seconds < 60:  # 1分钟内不能重复请求
-            remaining = int(60 - elapsed_seconds)
-            return jsonify(
-                {"success": False, "message": f"请求过于频繁，请在{remaining}秒后重试"}
-            )
+    # 写入发件箱后立即返回，由前端轮询发送状态
+    ticket = notification.request_verification_code(email)
+    remember_verification_ticket(ticket, email)
 
-    # 记录本次请求时间
-    session[last_request_time_key] = datetime.now().timestamp()
+    return jsonify({"success": True, "ticket": ticket}), 202
 
-    # 使用同步函数发送验证码
-    results = send_verification_codes_sync([email])
 
-    # 检查结果
-    if results and len(results) > 0:
-        success, _, _ = results[0]  # 获取第一个结果，因为只发送了一封邮件
-        if success:
-            return jsonify({"success": True})
+@auth_bp.route("/verification_status/<int:ticket>")
+def verification_status(ticket):
+    """查询验证码邮件的发送状态: pending、sent 或 failed"""
+    email = session.get("verification_tickets", {}).get(str(ticket))
+    if email is None:
+        return jsonify({"status": "unknown"}), 404
 
-    return jsonify({"success": False, "message": "发送邮件失败，请稍后重试"})
+    status = notification.get_verification_status(ticket, email)
+    if status == "unknown":
+        return jsonify({"status": status}), 404
+    return jsonify({"status": status})
 
 
 # 添加邮箱检查路由
 @auth_bp.route("/check_email", methods=["POST"])
+@rate_limit("availability", RateLimit("ip", 60, 60))
 def check_email():
     """检查邮箱是否已被注册"""
     data = request.get_json()
@@ -180,9 +185,8 @@ def check_email():
     ):
         return jsonify({"available": False, "message": "请使用北京大学邮箱"})
     
-    # 检查是否已被注册
-    existing_user = database.get_user(method="email", key=email)
-    is_available = not existing_user
+    # 检查是否已被注册(布隆过滤器判断一定不存在时不查询数据库)
+    is_available = not database.email_exists(email)
     
     return jsonify({
         "available": is_available,
@@ -192,6 +196,7 @@ def check_email():
 
 # 添加用户名检查路由
 @auth_bp.route("/check_username", methods=["POST"])
+@rate_limit("availability", RateLimit("ip", 60, 60))
 def check_username():
     """检查用户名是否已被使用"""
     data = request.get_json()
@@ -200,9 +205,8 @@ def check_username():
     if not username:
         return jsonify({"available": False, "message": "请输入用户名"})
     
-    # 检查用户名是否已被使用
-    existing_user = database.get_user(method="username", key=username)
-    is_available = not existing_user
+    # 检查用户名是否已被使用(布隆过滤器判断一定不存在时不查询数据库)
+    is_available = not database.username_exists(username)
     
     return jsonify({
         "available": is_available,
@@ -212,6 +216,12 @@ def check_username():
 
 # 忘记密码路由
 @auth_bp.route("/forgot_password", methods=["GET", "POST"])
+@rate_limit(
+    "reset_code",
+    RateLimit("ip", 10, 600),
+    RateLimit("email", 1, 60),  # 同一邮箱1分钟内不能重复请求
+    RateLimit("email", 5, 3600),
+)
 def forgot_password():
     """忘记密码页面 - 请求验证码"""
     # 如果用户已经登录，重定向到主页
@@ -234,37 +244,20 @@ def forgot_password():
             flash("该邮箱尚未注册")
             return render_template("forgot_password.html", form=form)
 
-        # 检查是否短时间内多次请求验证码
-        last_request_time_key = f"last_reset_request_{email}"
-        if last_request_time_key in session:
-            last_time = session[last_request_time_key]
-            elapsed_seconds = datetime.now().timestamp() - last_time
-            if elapsed_seconds < 60:  # 1分钟内不能重复请求
-                remaining = int(60 - elapsed_seconds)
-                flash(f"请求过于频繁，请在{remaining}秒后重试")
-                return render_template("forgot_password.html", form=form)
-
-        # 记录本次请求时间
-        session[last_request_time_key] = datetime.now().timestamp()
-
-        # 使用同步函数发送验证码
-        results = send_verification_codes_sync(
-            [email], subject="重置密码验证码 - PKUHUB"
+        # 写入发件箱后立即跳转，重置密码页面轮询发送状态
+        ticket = notification.request_verification_code(
+            email, subject="重置密码验证码 - PKUHUB"
         )
-
-        if results and len(results) > 0:
-            success, _, _ = results[0]
-            if success:
-                flash("验证码已发送到您的邮箱，请查收并完成密码重置")
-                return redirect(url_for("auth.reset_password", email=email))
-
-        flash("发送验证码失败，请稍后重试")
+        remember_verification_ticket(ticket, email)
+        flash("验证码正在发送到您的邮箱，请查收并完成密码重置")
+        return redirect(url_for("auth.reset_password", email=email, ticket=ticket))
 
     return render_template("forgot_password.html", form=form)
 
 
 # 重置密码路由
 @auth_bp.route("/reset_password", methods=["GET", "POST"])
+@rate_limit("reset_password", RateLimit("ip", 20, 600), RateLimit("email", 10, 600))
 def reset_password():
     """重置密码页面 - 使用验证码设置新密码"""
     # 如果用户已经登录，重定向到主页
@@ -300,7 +293,9 @@ def reset_password():
         flash("密码已重置，请使用新密码登录")
         return redirect(url_for("auth.login"))
 
-    return render_template("reset_password.html", form=form)
+    # 从找回密码页面跳转过来时带有发送凭证，页面据此轮询发送状态
+    ticket = request.args.get("ticket", type=int) if request.method == "GET" else None
+    return render_template("reset_password.html", form=form, ticket=ticket)
 
 
 # 登出路由
@@ -0,0 +1,57 @@
+import time
+
+from flask import Blueprint, Response, current_app, request
+from flask_login import login_required, current_user
+from notification import notification_manager, event_hub, format_sse
+
+# 创建蓝图
+events_bp = Blueprint("events", __name__)
+
+# 空闲时发送心跳的间隔(秒)，防止代理断开连接
+KEEPALIVE_INTERVAL = 15
+# 单个连接的最长存活时间(秒)，到期后由浏览器自动重连
+STREAM_LIFETIME = 600
+# 每个工作进程同时保持的推送连接上限(每个连接占用一个 gunicorn 线程，见 deploy.py)，
+# 超出时返回503，浏览器关闭 EventSource 并退回定时轮询
+MAX_STREAMS = 16
+
+
+@events_bp.route("/events")
+@login_required
+def stream():
+    """SSE推送: 未读通知数变化，以及当前资料的新评论"""
+    material_id = request.args.get("material_id", type=int)
+    user_id = current_user.id
+    is_admin = bool(current_user.is_admin)
+
+    subscription = event_hub.subscribe(
+        current_app._get_current_object(), user_id, is_admin, material_id, limit=MAX_STREAMS
+    )
+    if subscription is None:
+        return Response(status=503, headers={"Retry-After": str(STREAM_LIFETIME)})
+
+    # 连接建立时先推送一次当前未读数
+    count = notification_manager.get_unread_count(user_id, is_admin)
+    event_hub.remember_count(user_id, is_admin, count)
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            yield format_sse("unread", {"count": count})
+
+            deadline = time.monotonic() + STREAM_LIFETIME
+            while time.monotonic() < deadline:
+                item = subscription.get(timeout=KEEPALIVE_INTERVAL)
+                if item is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(*item)
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    # 生成器不使用请求上下文，响应返回后数据库会话即被释放
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -9,7 +9,7 @@ from flask import (
     current_app,
 )
 from flask_login import login_required, current_user
-from database import db,get_followers,is_following
+from database import db,is_following
 from database.models import (
     Course,
     Material,
@@ -24,8 +24,8 @@ from utils.secure_filename_cn import secure_filename_cn
 from datetime import datetime, date
 import os
 from werkzeug.utils import secure_filename
-import json
 import pytz
+from notification import follower_fanout, event_hub
 
 # 创建蓝图
 material_bp = Blueprint("material", __name__)
@@ -174,6 +174,9 @@ def material_view(material_id):
             material_id=material_id,
             created_at=now
         )
+
+        # 立即向正在查看该资料的连接推送新评论
+        event_hub.wake()
         
         # 如果是AJAX请求，返回JSON响应
         if is_ajax:
@@ -583,41 +586,11 @@ def toggle_like(material_id):
 
 # 通知关注者有新资料上传
 def notify_followers(user_id, material):
-    """通知所有关注该用户的人有新资料上传"""
-    # 查找所有关注该用户的用户ID
-    followers = get_followers(user_id)
-    
-    # 修改这里：直接从User对象获取id属性，而不是尝试像元组那样索引
-    follower_ids = [follower.id for follower in followers]
-    
-    if not follower_ids:
-        return
-
-    # 读取现有通知
+    """通知所有关注该用户的人有新资料上传(在后台线程中扇出，不阻塞上传请求)"""
     try:
-        with open("notifications.json", "r", encoding="utf-8") as f:
-            notifications = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        notifications = []
-
-    # 创建通知
-    notification = {
-        "id": str(datetime.now().timestamp()),
-        "title": "关注的用户上传了新资料",
-        "content": f"您关注的用户 {material.uploader.username} 上传了新资料《{material.title}》，点击查看详情。\n\n资料类型：{material.file_type}\n课程：{material.course.name}\n上传时间：{material.created_at.strftime('%Y-%m-%d %H:%M')}",
-        "target_role": "followers",  # 特殊标记，表示这是针对特定用户的关注通知
-        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "created_by": user_id,
-        "material_id": material.id,  # 添加资料ID便于跳转
-        "for_users": follower_ids,  # 记录需要接收通知的用户ID
-        "read_by": [],
-    }
-
-    notifications.append(notification)
-
-    # 保存通知
-    with open("notifications.json", "w", encoding="utf-8") as f:
-        json.dump(notifications, f, ensure_ascii=False, indent=2)
+        follower_fanout.submit(current_app._get_current_object(), user_id, material.id)
+    except Exception as e:
+        print(f"创建关注者通知失败: {str(e)}")
 
 
 @material_bp.route("/material/<int:material_id>/comments")
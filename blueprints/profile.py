@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user, logout_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from database import db,get_followers,get_following,follow_user,unfollow_user
@@ -8,9 +8,10 @@ from database.models import (
     UserLike,
     UserDownloadLimit,
     Course,  # 添加 Course 导入
+    EmailPreference,
 )
 import database
-from utils.forms import UpdateProfileForm, ChangePasswordForm
+from utils.forms import UpdateProfileForm, ChangePasswordForm, EmailPreferenceForm
 from sqlalchemy import func, or_  # 添加 or_ 导入，用于构建OR条件查询
 
 # 创建蓝图
@@ -125,10 +126,12 @@ def profile():
 def edit_profile():
     profile_form = UpdateProfileForm()
     password_form = ChangePasswordForm()
+    preference_form = EmailPreferenceForm()
 
     if request.method == "GET":
         profile_form.username.data = current_user.username
         profile_form.bio.data = current_user.bio
+        preference_form.follower_uploads.data = _follower_upload_mode(current_user.id)
 
     if profile_form.validate_on_submit():
         # 检查用户名是否已被其他用户使用 (添加这个检查)
@@ -140,7 +143,8 @@ def edit_profile():
                 return render_template(
                     "edit_profile.html", 
                     profile_form=profile_form, 
-                    password_form=password_form
+                    password_form=password_form,
+                    preference_form=preference_form,
                 )
         
         update_data = {
@@ -167,13 +171,43 @@ def edit_profile():
                 "edit_profile.html",
                 profile_form=profile_form,
                 password_form=password_form,
+                preference_form=preference_form,
             )
 
     return render_template(
-        "edit_profile.html", profile_form=profile_form, password_form=password_form
+        "edit_profile.html",
+        profile_form=profile_form,
+        password_form=password_form,
+        preference_form=preference_form,
     )
 
 
+def _follower_upload_mode(user_id):
+    """获取用户关注上传的邮件发送方式，没有设置时使用配置中的默认方式"""
+    preference = db.session.get(EmailPreference, user_id)
+    if preference is not None and preference.follower_uploads:
+        return preference.follower_uploads
+    return current_app.config.get("NOTIFICATION_DIGEST_DEFAULT", "off")
+
+
+# 邮件通知偏好
+@profile_bp.route("/email_preferences", methods=["POST"])
+@login_required
+def email_preferences():
+    form = EmailPreferenceForm()
+    if form.validate_on_submit():
+        preference = db.session.get(EmailPreference, current_user.id)
+        if preference is None:
+            preference = EmailPreference(user_id=current_user.id)
+            db.session.add(preference)
+        preference.follower_uploads = form.follower_uploads.data
+        db.session.commit()
+        flash("邮件通知设置已保存")
+    else:
+        flash("邮件通知设置无效")
+    return redirect(url_for("profile.edit_profile", tab="email"))
+
+
 # 修改密码
 @profile_bp.route("/change_password", methods=["GET", "POST"])
 @login_required
@@ -1,16 +1,52 @@
-from flask import Blueprint, render_template, request, current_app
+from flask import Blueprint, render_template, request, current_app, url_for
 import database
 from flask_login import login_required, current_user
 from database.models import Department, Material,Course
 from datetime import datetime, timedelta
-from sqlalchemy import or_, desc, func
-from sqlalchemy.sql.expression import case
+from sqlalchemy import desc, false, func, select
+from sqlalchemy.orm import contains_eager, joinedload
 from database.models import Department, Material, MaterialStats, Comment
 
 # 创建蓝图
 search_bp = Blueprint("search", __name__)
 
 
+# 搜索结果分页的默认和最大每页条数
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# 结果数不超过该值时精确计数，超过时按匹配结果的资料ID范围估算
+EXACT_COUNT_LIMIT = 1000
+
+
+def count_results(stmt):
+    """
+    统计搜索结果数，结果很多时给出估算值
+
+    最多读取 EXACT_COUNT_LIMIT + 1 个按ID排序的资料ID(只读主键，不加载资料对象):
+    不超过上限时就是精确结果数；超过上限时，按这些ID覆盖了匹配结果自身ID范围(最小到最大匹配ID)的比例外推总数，
+    匹配集中在部分ID区间(如某门课程、某段时间)时不会按整张资料表的ID范围放大
+
+    参数:
+        stmt: 已添加关键词和筛选条件、尚未排序的查询
+    返回:
+        (结果数, 是否为精确值)
+    """
+    ids = [
+        row[0]
+        for row in stmt.with_entities(Material.id)
+        .order_by(Material.id)
+        .limit(EXACT_COUNT_LIMIT + 1)
+    ]
+    if len(ids) <= EXACT_COUNT_LIMIT:
+        return len(ids), True
+
+    first_id = ids[0]
+    last_id = stmt.with_entities(func.max(Material.id)).scalar()
+    covered = (ids[-1] - first_id + 1) / (last_id - first_id + 1)
+    estimate = max(round(len(ids) / covered, -2), len(ids))
+    return int(estimate), False
+
+
 # 搜索路由
 @search_bp.route("/search")
 @login_required
@@ -21,6 +57,9 @@ def search():
     time_filter = request.args.get("time", "")
     sort_by = request.args.get("sort", "relevance")
     course_type = request.args.get("course_type", "")  # 新增课程类型筛选参数
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = request.args.get("per_page", DEFAULT_PAGE_SIZE, type=int)
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
 
     if not query and not file_type and not time_filter:
         # 如果没有任何查询参数，显示空结果页面
@@ -33,21 +72,13 @@ def search():
         # 构建基础查询
         stmt = database.db.session.query(Material)
 
-        # 添加关键字过滤
-        if query:
-            # 在多个字段中搜索关键字
-            stmt = stmt.filter(
-                or_(
-                    Material.title.ilike(f"%{query}%"),
-                    Material.description.ilike(f"%{query}%"),
-                    Material.course.has(database.Course.name.ilike(f"%{query}%")),
-                    Material.course.has(
-                        database.Course.department.has(
-                            database.Department.name.ilike(f"%{query}%")
-                        )
-                    ),
-                )
-            )
+        # 添加关键字过滤 - 使用全文索引匹配标题、描述、课程和学院名称
+        fts = database.search_index.match(query) if query else None
+        if fts is not None:
+            stmt = stmt.join(fts, fts.c.material_id == Material.id)
+        elif query:
+            # 关键词中没有可检索的文字(如只有标点)
+            stmt = stmt.filter(false())
 
         # 添加资料类型过滤
         if file_type:
@@ -67,34 +98,58 @@ def search():
         if course_type:
             stmt = stmt.filter(Material.course.has(Course.type == course_type))
 
-        # 添加排序
+        # 统计结果数(精确值已知时，超出范围的页码调整为最后一页)
+        total, total_exact = count_results(stmt)
+        if total_exact:
+            page = min(page, max(1, -(-total // per_page)))
+
+        # 添加排序；模板用到的统计随资料一起加载，按下载次数排序时直接使用排序已经连接的统计表
+        stats_option = joinedload(Material.stats)
         if sort_by == "newest":
             stmt = stmt.order_by(desc(Material.created_at))
         elif sort_by == "downloads":
             stmt = stmt.join(Material.stats).order_by(
                 desc(MaterialStats.download_count)  # 修改这里，删除 database. 前缀
             )
+            stats_option = contains_eager(Material.stats)
         elif sort_by == "comments":
-            # 按评论数量排序
-            stmt = (
-                stmt.outerjoin(Material.comments)
-                .group_by(Material.id)
-                .order_by(desc(func.count(Comment.id)))
+            # 按评论数量排序(相关子查询计数，不对结果分组)
+            comment_count = (
+                select(func.count(Comment.id))
+                .where(Comment.material_id == Material.id)
+                .correlate(Material)
+                .scalar_subquery()
             )
-        elif sort_by == "relevance" and query:
-            # 相关性排序 - 根据标题匹配程度优先
-            relevance = case(
-                (Material.title.ilike(f"{query}%"), 100),
-                (Material.title.ilike(f"%{query}%"), 50),
-                else_=10,
-            )
-            stmt = stmt.order_by(desc(relevance), desc(Material.created_at))
+            stmt = stmt.order_by(desc(comment_count))
+        elif sort_by == "relevance" and fts is not None:
+            # 相关性排序 - 按BM25得分(标题匹配权重最高)，得分越小越相关
+            stmt = stmt.order_by(fts.c.rank, desc(Material.created_at))
         else:
             # 默认按创建时间降序
             stmt = stmt.order_by(desc(Material.created_at))
 
-        # 执行查询
-        materials = stmt.all()
+        # 执行查询 - 只读取当前页，多取一条判断是否有下一页；
+        # 模板用到的统计、课程、学院和上传者随资料一起加载，避免逐条懒加载
+        rows = (
+            stmt.options(
+                stats_option,
+                joinedload(Material.course).joinedload(Course.department),
+                joinedload(Material.uploader),
+            )
+            .offset((page - 1) * per_page)
+            .limit(per_page + 1)
+            .all()
+        )
+        materials = rows[:per_page]
+        has_next = len(rows) > per_page
+
+        # 生成描述摘要，匹配的关键词高亮显示
+        snippets = {}
+        if fts is not None:
+            for material in materials:
+                snippets[material.id] = database.search_index.highlight(
+                    material.description, query
+                )
 
         # 准备类型选项用于筛选框
         file_types = [
@@ -139,6 +194,20 @@ def search():
         # 获取所有课程类型列表
         course_types = database.get_course_types()
 
+        # 分页信息，页码链接保留当前的搜索和筛选参数
+        args = request.args.to_dict()
+        pagination = {
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "total_exact": total_exact,
+            "pages": max(page, -(-total // per_page)) if total_exact else None,
+            "has_prev": page > 1,
+            "has_next": has_next,
+            "prev_url": url_for("search.search", **{**args, "page": page - 1}),
+            "next_url": url_for("search.search", **{**args, "page": page + 1}),
+        }
+
         return render_template(
             "search.html",
             materials=materials,
@@ -149,6 +218,8 @@ def search():
             current_sort=sort_by,
             current_course_type=course_type,
             course_types=course_types,
+            snippets=snippets,
+            pagination=pagination,
         )
 
     except Exception as e:
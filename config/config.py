@@ -86,6 +86,43 @@ class Config:
     WTF_CSRF_TIME_LIMIT = _yaml_config["csrf"]["time_limit"]
     WTF_CSRF_SSL_STRICT = _yaml_config["csrf"]["ssl_strict"]
 
+    # 通知保留策略: 按 target_role 设置保留天数，过期通知归档后从数据库删除
+    _notification_config = _yaml_config.get("notification", {})
+    NOTIFICATION_RETENTION_DAYS = _notification_config.get(
+        "retention_days", {"all": 365, "admin": 180, "followers": 90}
+    )
+    NOTIFICATION_ARCHIVE_FOLDER = os.path.join(
+        BASE_DIR, _notification_config.get("archive_folder", "archive/notifications")
+    )
+    NOTIFICATION_MAINTENANCE_INTERVAL = (
+        _notification_config.get("maintenance_interval_hours", 24) * 3600
+    )
+
+    # 关注上传摘要邮件: 用户未设置偏好时的默认方式、发送周期、每批邮件数、
+    # 每封摘要最多列出的资料数，以及为验证码等邮件保留的账户配额
+    _digest_config = _notification_config.get("digest", {})
+    # 默认不发送，用户需要在个人资料中主动开启；YAML 会把不加引号的 off 解析为 False
+    NOTIFICATION_DIGEST_DEFAULT = _digest_config.get("default") or "off"
+    NOTIFICATION_DIGEST_INTERVAL = _digest_config.get("interval_hours", 24) * 3600
+    NOTIFICATION_DIGEST_BATCH_SIZE = _digest_config.get("batch_size", 100)
+    NOTIFICATION_DIGEST_MAX_ITEMS = _digest_config.get("max_items", 20)
+    NOTIFICATION_DIGEST_QUOTA_RESERVE = _digest_config.get("quota_reserve", 20)
+
+    # 管理员群发邮件: 每个分块的收件人数，以及为验证码等邮件保留的账户配额
+    _broadcast_config = _notification_config.get("broadcast", {})
+    NOTIFICATION_BROADCAST_CHUNK_SIZE = _broadcast_config.get("chunk_size", 50)
+    NOTIFICATION_BROADCAST_QUOTA_RESERVE = _broadcast_config.get("quota_reserve", 20)
+
+    # 请求限流: 计数保存在所有工作进程共享的SQLite文件中，各路由的规则见 blueprints/auth.py
+    _rate_limit_config = _yaml_config.get("rate_limit", {})
+    RATE_LIMIT_ENABLED = _rate_limit_config.get("enabled", True)
+    RATE_LIMIT_STORAGE = os.path.join(
+        BASE_DIR, _rate_limit_config.get("storage", "rate_limit.db")
+    )
+    # 应用前面的可信反向代理层数: 大于0时按 X-Forwarded-For/X-Forwarded-Proto 还原客户端地址，
+    # 直接对外监听时必须为0，否则客户端可以伪造 X-Forwarded-For 绕过按IP限流
+    PROXY_FIX_X_FOR = _rate_limit_config.get("proxy_hops", 0)
+
     # 设置"记住我"的 Cookie 有效期为 30 天
     REMEMBER_COOKIE_DURATION = timedelta(days=30)
 
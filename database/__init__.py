@@ -1,5 +1,19 @@
 from .base import db
-from .models import User, Course, Material, Department, Comment
+from .models import (
+    User,
+    Course,
+    Material,
+    Department,
+    Comment,
+    Notification,
+    NotificationReceipt,
+    NotificationState,
+    NotificationWatermark,
+    FollowerFanoutTask,
+    EmailPreference,
+    EmailBroadcast,
+    EmailBroadcastChunk,
+)
 
 # 导入数据库操作函数
 from .action import (
@@ -39,6 +53,16 @@ from .action import (
     get_followers,  # 获取粉丝列表
 )
 
+# 导入用户名/邮箱可用性检查(布隆过滤器快速路径)
+from .availability import (
+    username_exists,  # 用户名是否已被使用
+    email_exists,  # 邮箱是否已被注册
+    availability_filter,  # 用户名/邮箱过滤器
+)
+
+# 导入资料全文检索索引
+from .search_index import search_index  # 资料全文检索索引
+
 
 __all__ = [
     "db",  # 数据库对象
@@ -47,6 +71,14 @@ __all__ = [
     "Department",  # 学院模型
     "Material",  # 课程资料模型
     "Comment",  # 评论模型
+    "Notification",  # 通知模型
+    "NotificationReceipt",  # 通知回执模型
+    "NotificationState",  # 通知共享状态模型
+    "NotificationWatermark",  # 通知已读水位线模型
+    "FollowerFanoutTask",  # 关注者通知扇出任务模型
+    "EmailPreference",  # 邮件通知偏好模型
+    "EmailBroadcast",  # 群发邮件模型
+    "EmailBroadcastChunk",  # 群发邮件分块模型
     # 用户通用操作
     "create_user",  # 创建用户
     "get_user",  # 获取用户
@@ -78,4 +110,10 @@ __all__ = [
     "unfollow_user",  # 取消关注
     "get_following",  # 获取关注列表
     "get_followers",  # 获取粉丝列表
+    # 可用性检查
+    "username_exists",  # 用户名是否已被使用
+    "email_exists",  # 邮箱是否已被注册
+    "availability_filter",  # 用户名/邮箱过滤器
+    # 全文检索
+    "search_index",  # 资料全文检索索引
 ]
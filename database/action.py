@@ -1,5 +1,7 @@
-from .models import Course, Material, Department, MaterialStats,User,Comment,Relationship, UserDownloadLimit
+from .models import Course, Material, Department, MaterialStats,User,Comment,Relationship, UserDownloadLimit, Notification, NotificationReceipt, NotificationWatermark, FollowerFanoutTask, EmailPreference, EmailBroadcast
 from .base import db
+from .availability import availability_filter
+from .search_index import search_index
 import logging
 from sqlalchemy import select
 from sqlalchemy import update
@@ -21,9 +23,11 @@ def safe_commit():
         return False
 
 
-def update_with_version_check(model, instance_id, new_data, current_version):
+def update_with_version_check(model, instance_id, new_data, current_version, commit=True):
     """
     使用版本检查更新数据,用于乐观锁实现 (使用SQLAlchemy 2.0 Update构造)
+    :param commit: 是否立即提交;为False时由调用方在同一事务中完成其他写入后提交
+    :return: 成功返回True,版本冲突或提交失败返回False
     """
     # 使用Update构造
     stmt = (
@@ -40,7 +44,7 @@ def update_with_version_check(model, instance_id, new_data, current_version):
     if result.rowcount == 0:
         return False  # 冲突,没有行被更新
 
-    return safe_commit()  # 提交事务
+    return safe_commit() if commit else True  # 提交事务
 
 
 def get_records(model, method=None, key=None, islikely=False):
@@ -140,6 +144,24 @@ def delete_user(id=None):
         # 删除用户关注关系（作为关注者和被关注者两种情况）
         Relationship.query.filter_by(follower_id=id).delete()
         Relationship.query.filter_by(followed_id=id).delete()
+
+        # 删除用户的通知回执，保留用户创建的通知但清空创建者
+        NotificationReceipt.query.filter_by(user_id=id).delete()
+        NotificationWatermark.query.filter_by(user_id=id).delete()
+        Notification.query.filter_by(created_by=id).update(
+            {Notification.created_by: None}, synchronize_session=False
+        )
+
+        # 删除用户上传资料后尚未扇出的关注者通知任务
+        FollowerFanoutTask.query.filter_by(uploader_id=id).delete()
+
+        # 删除用户的邮件通知偏好
+        EmailPreference.query.filter_by(user_id=id).delete()
+
+        # 保留用户创建的群发记录但清空创建者
+        EmailBroadcast.query.filter_by(created_by=id).update(
+            {EmailBroadcast.created_by: None}, synchronize_session=False
+        )
         
         # 删除用户
         db.session.delete(user)
@@ -167,8 +189,13 @@ def update_user(id=None, **kwargs):
     # 检查是否使用乐观锁
     current_version = kwargs.pop("version", None)
     if current_version is not None:
-        # 使用乐观锁更新
-        return update_with_version_check(User, id, kwargs, current_version)
+        # 使用乐观锁更新(批量UPDATE不触发ORM事件，需要手动更新用户名/邮箱过滤器)
+        if not update_with_version_check(User, id, kwargs, current_version):
+            return None
+        if "username" in kwargs or "email" in kwargs:
+            availability_filter.notify(kwargs.get("username"), kwargs.get("email"))
+        db.session.refresh(user)
+        return user
 
     # 普通更新
     for key, value in kwargs.items():
@@ -238,8 +265,15 @@ def update_course(id=None, **kwargs):
     # 检查是否使用乐观锁
     current_version = kwargs.pop("version", None)
     if current_version is not None:
-        # 使用乐观锁更新
-        return update_with_version_check(Course, id, kwargs, current_version)
+        # 使用乐观锁更新(批量UPDATE不触发ORM事件，资料全文索引在同一事务中手动更新，一起提交或回滚)
+        if not update_with_version_check(Course, id, kwargs, current_version, commit=False):
+            return None
+        if {"name", "code", "department_id"} & kwargs.keys():
+            search_index.index_course(db.session.connection(), id)
+        if not safe_commit():
+            return None
+        db.session.refresh(course)
+        return course
 
     # 普通更新
     for key, value in kwargs.items():
@@ -303,19 +337,24 @@ def delete_material(id=None):
 
 
 def update_material(material_id, **kwargs):
-    """更新资料记录"""
+    """
+    更新资料记录
+    :param material_id: 资料ID
+    :param kwargs: 要更新的字段和值
+    :return: 成功返回更新后的资料对象,失败返回None
+    """
     try:
         material = Material.query.get(material_id)
         if not material:
             logger.error(f"更新资料失败: ID为{material_id}的资料不存在")
-            return False
+            return None
 
         # 检查是否有课程ID更新，需要确保新课程存在
         if "course_id" in kwargs:
             course = Course.query.get(kwargs["course_id"])
             if not course:
                 logger.error(f"更新资料失败: ID为{kwargs['course_id']}的课程不存在")
-                return False
+                return None
 
         # 更新资料字段
         for key, value in kwargs.items():
@@ -338,7 +377,7 @@ def update_material(material_id, **kwargs):
     except Exception as e:
         db.session.rollback()
         logger.error(f"更新资料出错: {str(e)}")
-        return False
+        return None
 
 
 def create_material(**kwargs):
@@ -0,0 +1,227 @@
+# 用户名/邮箱可用性查询的快速路径
+# 注册页面在输入时反复调用 /check_email 和 /check_username，绝大多数被查询的值并不存在，
+# 用布隆过滤器可以在不访问数据库的情况下确定"一定不存在"，只有"可能存在"时才执行精确查询
+
+import math
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable
+
+from sqlalchemy import event, inspect, select
+
+from .base import db
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    布隆过滤器 - 判断元素"一定不在集合中"或"可能在集合中"，不支持删除
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        """
+        按预计元素数和误判率分配位数组
+
+        参数:
+            capacity: 预计元素数
+            error_rate: 元素数不超过 capacity 时的误判率
+        """
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        """双重哈希生成 hashes 个位置"""
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        """添加元素"""
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        """元素是否可能在集合中(False 表示一定不在)"""
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class UserAvailabilityFilter:
+    """
+    用户名和邮箱的布隆过滤器 - 每个工作进程一份，存放小写的用户名和邮箱
+
+    工作方式:
+    1. 首次查询时从 user 表只读取 id、username、email 建立过滤器，容量为当时元素数的两倍
+    2. 本进程通过ORM新增或修改用户时，mapper 事件立即把新的用户名和邮箱加入过滤器
+    3. 其他进程注册的用户: 每 SYNC_INTERVAL 秒按主键读取 id 大于已同步最大值的新用户
+    4. 其他进程修改的用户名/邮箱以及删除的用户: 每 REBUILD_INTERVAL 秒重建一次；
+       元素数超过容量导致误判率上升时也会重建
+    过滤器只用于判断"一定不存在"，可能存在时由调用方执行精确查询，因此结果与数据库一致，
+    只有其他进程在最近 SYNC_INTERVAL 秒内注册的用户可能被短暂地报告为可用(提交注册时仍会再次检查)
+    """
+
+    # 增量同步其他进程新注册用户的间隔(秒)
+    SYNC_INTERVAL = 5
+    # 完整重建的间隔(秒)
+    REBUILD_INTERVAL = 600
+
+    def __init__(self, error_rate: float = 0.01):
+        """
+        初始化过滤器(首次查询时才读取数据库)
+
+        参数:
+            error_rate: 目标误判率
+        """
+        self.error_rate = error_rate
+        self._filter = None
+        self._max_id = 0
+        self._synced_at = 0.0
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"probes": 0, "filtered": 0, "queries": 0, "false_positives": 0}
+
+    @staticmethod
+    def _key(field: str, value: str) -> str:
+        """过滤器中的元素: 字段前缀 + 小写值"""
+        return f"{field}:{value.strip().lower()}"
+
+    def _add_user(self, username: str, email: str) -> None:
+        """把一个用户的用户名和邮箱加入过滤器(调用方持有锁)"""
+        if username:
+            self._filter.add(self._key("username", username))
+        if email:
+            self._filter.add(self._key("email", email))
+
+    def rebuild(self) -> None:
+        """从 user 表重新建立过滤器"""
+        rows = db.session.execute(select(User.id, User.username, User.email)).all()
+        bloom = BloomFilter(4 * len(rows) + 1000, self.error_rate)
+        for _, username, email in rows:
+            bloom.add(self._key("username", username))
+            bloom.add(self._key("email", email))
+        with self._lock:
+            self._filter = bloom
+            self._max_id = max((row[0] for row in rows), default=0)
+            self._built_at = self._synced_at = time.time()
+        logger.info(f"用户名/邮箱布隆过滤器已建立: {len(rows)} 个用户，{bloom.size} 位")
+
+    def _sync(self) -> None:
+        """按需重建，或读取其他进程新注册的用户"""
+        now = time.time()
+        if (
+            self._filter is None
+            or now - self._built_at > self.REBUILD_INTERVAL
+            or self._filter.count > self._filter.capacity
+        ):
+            self.rebuild()
+            return
+        if now - self._synced_at < self.SYNC_INTERVAL:
+            return
+
+        rows = db.session.execute(
+            select(User.id, User.username, User.email)
+            .where(User.id > self._max_id)
+            .order_by(User.id)
+        ).all()
+        with self._lock:
+            for user_id, username, email in rows:
+                self._add_user(username, email)
+                self._max_id = max(self._max_id, user_id)
+            self._synced_at = now
+
+    def exists(self, field: str, value: str) -> bool:
+        """
+        检查用户名或邮箱是否已被使用(与 User.<field> == value 的精确查询结果一致)
+
+        参数:
+            field: "username" 或 "email"
+            value: 要检查的值
+        返回:
+            是否已存在
+        """
+        self._sync()
+        self._stats["probes"] += 1
+        if self._key(field, value) not in self._filter:
+            self._stats["filtered"] += 1
+            return False
+
+        # 可能存在: 只查询主键，走 username/email 的唯一索引
+        self._stats["queries"] += 1
+        column = getattr(User, field)
+        found = db.session.execute(select(User.id).where(column == value).limit(1)).first()
+        if found is None:
+            self._stats["false_positives"] += 1
+        return found is not None
+
+    def notify(self, username: str, email: str) -> None:
+        """
+        记录本进程新增或修改的用户名和邮箱
+
+        参数:
+            username: 用户名
+            email: 邮箱
+        """
+        with self._lock:
+            if self._filter is not None:
+                self._add_user(username, email)
+
+    def stats(self) -> Dict:
+        """获取过滤器统计"""
+        bloom = self._filter
+        return {
+            **self._stats,
+            "elements": bloom.count if bloom else 0,
+            "bits": bloom.size if bloom else 0,
+            "hashes": bloom.hashes if bloom else 0,
+        }
+
+
+# 创建全局用户名/邮箱过滤器实例
+availability_filter = UserAvailabilityFilter()
+
+
+@event.listens_for(User, "after_insert")
+def _track_new_user(mapper, connection, target):
+    """新增用户时更新过滤器(事务回滚只会留下误判，不会漏判)"""
+    availability_filter.notify(target.username, target.email)
+
+
+@event.listens_for(User, "after_update")
+def _track_renamed_user(mapper, connection, target):
+    """修改用户名或邮箱时更新过滤器，其他字段的修改(如登录时间)不处理"""
+    attrs = inspect(target).attrs
+    if attrs.username.history.has_changes() or attrs.email.history.has_changes():
+        availability_filter.notify(target.username, target.email)
+
+
+def username_exists(username: str) -> bool:
+    """
+    检查用户名是否已被使用
+
+    参数:
+        username: 用户名
+    返回:
+        是否已存在
+    """
+    return availability_filter.exists("username", username)
+
+
+def email_exists(email: str) -> bool:
+    """
+    检查邮箱是否已被注册
+
+    参数:
+        email: 邮箱
+    返回:
+        是否已存在
+    """
+    return availability_filter.exists("email", email)
@@ -611,6 +611,8 @@ class Relationship(db.Model):
     # 确保同一用户不会重复关注同一个人
     __table_args__ = (
         db.UniqueConstraint('follower_id', 'followed_id', name='uq_user_relationship'),
+        # 按被关注者查找粉丝(上传通知扇出)
+        db.Index('ix_relationship_followed', 'followed_id'),
     )
     
     # 关系定义
@@ -628,4 +630,305 @@ class Relationship(db.Model):
     )
     
     def __repr__(self):
-        return f"<Relationship {self.follower_id} follows {self.followed_id}>"
\ No newline at end of file
+        return f"<Relationship {self.follower_id} follows {self.followed_id}>"
+
+class Notification(db.Model):
+    """
+    应用内通知模型 - 存储管理员发布的公告和关注上传提醒
+    target_role 决定通知受众:
+        all       - 全体用户
+        admin     - 仅管理员
+        followers - 关注者通知，具体接收人记录在 NotificationReceipt 中
+    """
+
+    __tablename__ = "notification"
+    # 主键，自增ID同时反映通知的创建先后顺序
+    id = db.Column(db.Integer, primary_key=True)
+    # 通知标题
+    title = db.Column(db.String(200), nullable=False)
+    # 通知内容
+    content = db.Column(db.Text, nullable=False)
+    # 目标角色，建立索引便于按受众过滤
+    target_role = db.Column(db.String(20), nullable=False, default="all", index=True)
+    # 创建时间（使用本地时间，与资料上传时间保持一致）
+    created_at = db.Column(
+        db.DateTime, default=datetime.datetime.now, nullable=False, index=True
+    )
+    # 创建者ID
+    created_by = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="SET NULL"), index=True
+    )
+    # 关联资料ID(关注上传提醒使用)，便于跳转
+    material_id = db.Column(
+        db.Integer, db.ForeignKey("material.id", ondelete="SET NULL")
+    )
+
+    # 关系
+    receipts = db.relationship(
+        "NotificationReceipt",
+        backref="notification",
+        lazy="dynamic",
+        cascade="all, delete-orphan",  # 删除通知时级联删除所有回执
+    )
+
+    __table_args__ = (
+        # 复合索引：按照目标角色和创建时间查询(用于按受众筛选并排序)
+        db.Index("ix_notification_role_created", "target_role", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<Notification {self.id}: {self.title}>"
+
+    def to_dict(self, is_read=False):
+        """
+        转换为字典 - 用于模板渲染和API响应
+        参数:
+            is_read: 当前用户是否已读该通知
+        返回:
+            通知信息字典
+        """
+        return {
+            "id": self.id,
+            "title": self.title,
+            "content": self.content,
+            "target_role": self.target_role,
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "created_by": self.created_by,
+            "material_id": self.material_id,
+            "is_read": bool(is_read),
+        }
+
+
+class NotificationReceipt(db.Model):
+    """
+    通知回执模型 - 记录用户与通知之间的已读状态
+    关注者通知在创建时为每个接收人写入一条未读回执；
+    全体/管理员通知在用户标记已读时写入一条已读回执
+    """
+
+    __tablename__ = "notification_receipt"
+    id = db.Column(db.Integer, primary_key=True)
+    notification_id = db.Column(
+        db.Integer,
+        db.ForeignKey("notification.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    # 是否已读
+    read = db.Column(db.Boolean, default=False, nullable=False)
+    # 标记已读的时间
+    read_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # 每个用户对每条通知只有一条回执
+        db.UniqueConstraint(
+            "notification_id", "user_id", name="uq_notification_receipt"
+        ),
+        # 复合索引：按用户和已读状态查询(用于统计未读数量)
+        db.Index("ix_receipt_user_read", "user_id", "read"),
+    )
+
+    def __repr__(self):
+        return f"<NotificationReceipt {self.notification_id} user={self.user_id} read={self.read}>"
+
+
+class NotificationState(db.Model):
+    """
+    通知系统共享状态表 - 以键值对形式存储多个工作进程共享的计数器
+    如未读计数缓存的失效令牌(unread_token)，每次通知变化时递增
+    """
+
+    __tablename__ = "notification_state"
+    key = db.Column(db.String(50), primary_key=True)  # 状态键名
+    value = db.Column(db.Integer, default=0, nullable=False)  # 状态值
+
+    def __repr__(self):
+        return f"<NotificationState {self.key}={self.value}>"
+
+
+class NotificationWatermark(db.Model):
+    """
+    广播通知已读水位线 - 每个用户一条记录
+    ID不大于 last_read_id 的全体/管理员通知视为已读；
+    水位线之上单独读过的通知以已读回执(NotificationReceipt)的形式记录为例外
+    """
+
+    __tablename__ = "notification_watermark"
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        primary_key=True,  # 使用外键作为主键
+    )
+    # 已连续读到的最新广播通知ID(通知ID自增，与创建时间顺序一致)
+    last_read_id = db.Column(db.Integer, default=0, nullable=False)
+    # 水位线更新时间
+    updated_at = db.Column(
+        db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now
+    )
+
+    def __repr__(self):
+        return f"<NotificationWatermark user={self.user_id} last_read_id={self.last_read_id}>"
+
+
+class FollowerFanoutTask(db.Model):
+    """
+    待扇出的关注者通知任务 - 上传资料后写入，扇出线程创建通知时在同一事务中删除
+    工作进程退出时尚未处理的任务留在表中，由任一进程的扇出线程补做；
+    执行出错时累加 attempts，达到上限后删除
+    """
+
+    __tablename__ = "follower_fanout_task"
+    id = db.Column(db.Integer, primary_key=True)
+    uploader_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    material_id = db.Column(
+        db.Integer, db.ForeignKey("material.id", ondelete="CASCADE"), nullable=False
+    )
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now, index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)  # 已失败的执行次数
+
+    def __repr__(self):
+        return f"<FollowerFanoutTask {self.id} material={self.material_id}>"
+
+
+class EmailPreference(db.Model):
+    """
+    邮件通知偏好 - 每个用户一条记录，没有记录的用户使用配置中的默认方式
+    follower_uploads 决定关注的用户上传资料时如何发送邮件:
+        immediate - 每次上传立即发送一封邮件
+        daily     - 合并到每日摘要邮件
+        off       - 不发送邮件(应用内通知不受影响)
+    """
+
+    MODES = ("immediate", "daily", "off")
+
+    __tablename__ = "email_preference"
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        primary_key=True,  # 使用外键作为主键
+    )
+    # 关注上传的邮件发送方式，为空时使用配置中的默认方式
+    follower_uploads = db.Column(db.String(10))
+    # 已发送过邮件的最新关注者通知ID，摘要只包含ID更大的通知
+    last_digest_id = db.Column(db.Integer, default=0, nullable=False)
+    # 偏好更新时间
+    updated_at = db.Column(
+        db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now
+    )
+
+    def __repr__(self):
+        return f"<EmailPreference user={self.user_id} follower_uploads={self.follower_uploads}>"
+
+
+class EmailBroadcast(db.Model):
+    """
+    管理员群发邮件 - 记录群发内容、目标人群和发送进度
+    收件人按用户ID顺序分块写入发件箱，cursor 记录已分块到的用户ID，进程重启后从 cursor 继续
+    segment 决定目标人群:
+        all        - 全部已验证邮箱的用户
+        admin      - 管理员
+        department - 在指定学院的课程下上传过资料的用户
+    status: pending(等待开始) -> sending(分块写入发件箱并等待投递) -> done / cancelled
+    """
+
+    SEGMENTS = ("all", "admin", "department")
+
+    __tablename__ = "email_broadcast"
+    id = db.Column(db.Integer, primary_key=True)
+    # 邮件主题
+    subject = db.Column(db.String(200), nullable=False)
+    # 邮件正文
+    content = db.Column(db.Text, nullable=False)
+    # 正文类型("plain"或"html")
+    content_type = db.Column(db.String(10), nullable=False, default="plain")
+    # 目标人群
+    segment = db.Column(db.String(20), nullable=False, default="all")
+    # 目标学院(segment 为 department 时使用)
+    department_id = db.Column(
+        db.Integer, db.ForeignKey("department.id", ondelete="SET NULL")
+    )
+    # 创建者ID
+    created_by = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="SET NULL"))
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    # 发送状态，建立索引便于后台线程查找未完成的群发
+    status = db.Column(db.String(10), nullable=False, default="pending", index=True)
+    # 已分块到的用户ID(不含之后的用户)
+    cursor = db.Column(db.Integer, default=0, nullable=False)
+    # 创建时统计的收件人总数
+    total = db.Column(db.Integer, default=0, nullable=False)
+    # 已写入发件箱、投递成功、投递失败的收件人数
+    enqueued = db.Column(db.Integer, default=0, nullable=False)
+    sent = db.Column(db.Integer, default=0, nullable=False)
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    # 处理该群发的进程租约到期时间(Unix时间戳)，到期前其他进程不会处理
+    lease_until = db.Column(db.Integer, default=0, nullable=False)
+
+    # 关系
+    chunks = db.relationship(
+        "EmailBroadcastChunk",
+        backref="broadcast",
+        lazy="dynamic",
+        cascade="all, delete-orphan",
+    )
+
+    def __repr__(self):
+        return f"<EmailBroadcast {self.id}: {self.subject} ({self.status})>"
+
+    def to_dict(self):
+        """
+        转换为字典 - 用于进度查询的API响应
+        返回:
+            群发信息和进度字典
+        """
+        done = self.sent + self.failed
+        return {
+            "id": self.id,
+            "subject": self.subject,
+            "segment": self.segment,
+            "department_id": self.department_id,
+            "status": self.status,
+            "total": self.total,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "progress": round(done / self.total * 100, 1) if self.total else 100.0,
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "finished_at": self.finished_at.strftime("%Y-%m-%d %H:%M:%S")
+            if self.finished_at
+            else None,
+        }
+
+
+class EmailBroadcastChunk(db.Model):
+    """
+    群发邮件的一个分块 - 用户ID在 (first_user_id, last_user_id] 范围内的目标用户，
+    作为一封多收件人邮件写入发件箱，通过 outbox_id 查询投递结果
+    """
+
+    __tablename__ = "email_broadcast_chunk"
+    id = db.Column(db.Integer, primary_key=True)
+    broadcast_id = db.Column(
+        db.Integer,
+        db.ForeignKey("email_broadcast.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    # 用户ID范围(左开右闭)
+    first_user_id = db.Column(db.Integer, nullable=False)
+    last_user_id = db.Column(db.Integer, nullable=False)
+    # 收件人数
+    recipients = db.Column(db.Integer, nullable=False)
+    # 发件箱记录ID，为空表示分块已记录但尚未写入发件箱
+    outbox_id = db.Column(db.Integer)
+    # 投递状态: pending(等待投递结果)、sent(已投递)、dead(放弃重试)、lost(发件箱记录已被清理，未确认的收件人计为失败)
+    status = db.Column(db.String(10), nullable=False, default="pending")
+    sent = db.Column(db.Integer, default=0, nullable=False)
+    failed = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<EmailBroadcastChunk {self.id} broadcast={self.broadcast_id} ({self.status})>"
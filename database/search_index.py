@@ -0,0 +1,227 @@
+# 资料全文检索索引
+# material_fts 是SQLite FTS5虚拟表，每份资料一行(rowid = material.id)，冗余保存资料标题、描述以及所属课程和学院的名称，
+# 搜索时用 MATCH 走倒排索引并按 BM25 排序，不再对 material/course/department 逐行执行 LIKE
+# 索引中保存的是 tokenizer.py 切分后的词(中文二元组)，不是原文
+
+import logging
+from typing import Iterable, List, Optional
+
+from markupsafe import Markup
+from sqlalchemy import column, event, func, inspect, literal_column, select, table, text
+from sqlalchemy.exc import OperationalError
+
+from .base import db
+from .models import Course, Department, Material
+from .tokenizer import highlight, query_expression, tokenize
+
+logger = logging.getLogger(__name__)
+
+# 索引的列及其 BM25 权重(标题最重要)
+FTS_COLUMNS = (
+    ("title", 10.0),
+    ("description", 2.0),
+    ("course_name", 5.0),
+    ("course_code", 5.0),
+    ("department_name", 1.0),
+)
+
+# 虚拟表定义: 索引内容已经按空格切分好，unicode61 只需按空格拆分
+_CREATE_SQL = "CREATE VIRTUAL TABLE material_fts USING fts5({}, tokenize='unicode61')".format(
+    ", ".join(name for name, _ in FTS_COLUMNS)
+)
+
+# 构造查询用的表对象(虚拟表不在 db.metadata 中，create_all 不会创建它)
+material_fts = table("material_fts", column("rowid"), *(column(name) for name, _ in FTS_COLUMNS))
+
+# 读取资料及其课程、学院名称的语句，用于写入索引
+_DOCUMENT_SQL = """
+    SELECT m.id, m.title, COALESCE(m.description, ''), COALESCE(c.name, ''),
+           COALESCE(c.code, ''), COALESCE(d.name, '')
+    FROM material m
+    LEFT JOIN course c ON c.id = m.course_id
+    LEFT JOIN department d ON d.id = c.department_id
+"""
+
+
+class MaterialSearchIndex:
+    """
+    资料全文检索 - 维护 material_fts 并生成检索子查询
+
+    工作方式:
+    1. 应用启动时创建虚拟表，索引行数与资料数不一致时(首次部署或索引损坏)重建
+    2. Material、Course、Department 的 mapper 事件在同一个数据库事务中更新索引，
+       事务回滚时索引一起回滚；只有标题、描述、课程、名称等被索引字段变化时才更新
+    3. 写入和查询都经过 tokenizer.py 的归一化和中文二元组切分，查询词按空白拆分，所有词都必须出现(可以在不同列中)，
+       单字和中英文长度不限，全部通过倒排索引查找
+    """
+
+    # 建表 ----------------------------------------------------------
+    def ensure(self) -> None:
+        """
+        创建索引表，必要时重建索引(需要在应用上下文中调用)
+        多个工作进程同时启动时只有一个进程能拿到写锁，其余进程等待超时后跳过，由拿到锁的进程完成重建
+        """
+        try:
+            with db.engine.begin() as connection:
+                existing = connection.execute(
+                    text("SELECT sql FROM sqlite_master WHERE name = 'material_fts'")
+                ).scalar()
+                if existing != _CREATE_SQL:
+                    # 表不存在或分词方式已变化(旧版本的 trigram 索引)，重新建表
+                    if existing is not None:
+                        connection.execute(text("DROP TABLE material_fts"))
+                    connection.execute(text(_CREATE_SQL))
+                indexed = connection.execute(text("SELECT COUNT(*) FROM material_fts")).scalar()
+                total = connection.execute(text("SELECT COUNT(*) FROM material")).scalar()
+                if indexed != total:
+                    self.rebuild(connection)
+        except OperationalError as e:
+            logger.warning(f"资料全文索引初始化跳过: {str(e)}")
+
+    def rebuild(self, connection) -> int:
+        """
+        重建整个索引
+
+        参数:
+            connection: 数据库连接(在调用方的事务中)
+        返回:
+            索引的资料数
+        """
+        connection.execute(text("DELETE FROM material_fts"))
+        count = self._index(connection, "")
+        logger.info(f"资料全文索引已重建: {count} 份资料")
+        return count
+
+    # 写入 ----------------------------------------------------------
+    @staticmethod
+    def _documents(rows: Iterable) -> List[dict]:
+        """把查询结果切分为索引行"""
+        names = [name for name, _ in FTS_COLUMNS]
+        return [
+            {"rowid": row[0], **{name: tokenize(value) for name, value in zip(names, row[1:])}}
+            for row in rows
+        ]
+
+    def _index(self, connection, where: str, **params) -> int:
+        """
+        读取满足条件的资料并写入索引(调用方已删除旧的索引行)
+
+        参数:
+            connection: 数据库连接
+            where: 过滤资料的 WHERE 子句(可为空)
+            params: 子句参数
+        返回:
+            写入的行数
+        """
+        rows = connection.execute(text(_DOCUMENT_SQL + where), params).all()
+        documents = self._documents(rows)
+        if documents:
+            connection.execute(material_fts.insert(), documents)
+        return len(documents)
+
+    def index_material(self, connection, material_id: int) -> None:
+        """重新索引一份资料"""
+        connection.execute(text("DELETE FROM material_fts WHERE rowid = :id"), {"id": material_id})
+        self._index(connection, "WHERE m.id = :id", id=material_id)
+
+    def index_course(self, connection, course_id: int) -> None:
+        """重新索引一门课程下的所有资料"""
+        connection.execute(
+            text(
+                "DELETE FROM material_fts WHERE rowid IN "
+                "(SELECT id FROM material WHERE course_id = :id)"
+            ),
+            {"id": course_id},
+        )
+        self._index(connection, "WHERE m.course_id = :id", id=course_id)
+
+    def index_department(self, connection, department_id: int) -> None:
+        """重新索引一个学院所有课程下的资料"""
+        connection.execute(
+            text(
+                "DELETE FROM material_fts WHERE rowid IN (SELECT m.id FROM material m "
+                "JOIN course c ON c.id = m.course_id WHERE c.department_id = :id)"
+            ),
+            {"id": department_id},
+        )
+        self._index(connection, "WHERE c.department_id = :id", id=department_id)
+
+    def remove_material(self, connection, material_id: int) -> None:
+        """从索引中删除一份资料"""
+        connection.execute(text("DELETE FROM material_fts WHERE rowid = :id"), {"id": material_id})
+
+    # 查询 ----------------------------------------------------------
+    def match(self, query: str):
+        """
+        生成检索子查询
+
+        参数:
+            query: 用户输入的搜索词
+        返回:
+            子查询(列: material_id、rank)，rank 越小越相关；没有可检索的词时返回None
+        """
+        expression = query_expression(query)
+        if expression is None:
+            return None
+        fts = literal_column("material_fts")
+        stmt = select(
+            material_fts.c.rowid.label("material_id"),
+            func.bm25(fts, *(weight for _, weight in FTS_COLUMNS)).label("rank"),
+        ).where(fts.op("MATCH")(expression))
+        return stmt.subquery("fts")
+
+    @staticmethod
+    def highlight(text: Optional[str], query: str) -> Optional[Markup]:
+        """
+        截取文本中匹配查询词的片段并用 <mark> 标出(索引中保存的是切分后的词，摘要从原文生成)
+
+        参数:
+            text: 原始文本(如资料描述)
+            query: 用户输入的搜索词
+        返回:
+            转义后的HTML片段，没有匹配时返回None
+        """
+        return highlight(text, query)
+
+
+# 创建全局检索索引实例
+search_index = MaterialSearchIndex()
+
+
+def _changed(target, *names) -> bool:
+    """实例的任一字段是否在本次 flush 中被修改"""
+    attrs = inspect(target).attrs
+    return any(attrs[name].history.has_changes() for name in names)
+
+
+@event.listens_for(Material, "after_insert")
+def _index_new_material(mapper, connection, target):
+    """新增资料时写入索引"""
+    search_index.index_material(connection, target.id)
+
+
+@event.listens_for(Material, "after_update")
+def _index_updated_material(mapper, connection, target):
+    """标题、描述或所属课程变化时重新索引"""
+    if _changed(target, "title", "description", "course_id"):
+        search_index.index_material(connection, target.id)
+
+
+@event.listens_for(Material, "after_delete")
+def _remove_deleted_material(mapper, connection, target):
+    """删除资料时删除索引行(删除课程、学院或用户时资料由ORM级联删除，同样会触发)"""
+    search_index.remove_material(connection, target.id)
+
+
+@event.listens_for(Course, "after_update")
+def _index_updated_course(mapper, connection, target):
+    """课程名称、代码或学院变化时重新索引该课程的资料"""
+    if _changed(target, "name", "code", "department_id"):
+        search_index.index_course(connection, target.id)
+
+
+@event.listens_for(Department, "after_update")
+def _index_updated_department(mapper, connection, target):
+    """学院名称变化时重新索引该学院的资料"""
+    if _changed(target, "name"):
+        search_index.index_department(connection, target.id)
@@ -0,0 +1,180 @@
+# 资料全文检索的中文分词
+# FTS5 自带的分词器不切分中文(unicode61 把连续的汉字当成一个词，trigram 只能匹配3个字以上的子串)，
+# 这里在写入索引和查询之前先把文本切分为以空格分隔的词，索引表使用 unicode61 分词器按空格读取:
+#   - 连续的汉字(以及假名、韩文)切分为相互重叠的二元组，并补上最后一个字，例如 "数据结构" -> 数据 据结 结构 构
+#   - 连续的字母、连续的数字各为一个词，例如 "CS202" -> cs 202
+# 切分前统一做全角/半角(NFKC)、大小写和繁体/简体归一化，索引和查询使用同一套规则
+
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+from markupsafe import Markup, escape
+
+# 繁体 -> 简体 对照表(资料标题、课程名称中的常用字)，按位置一一对应
+_TRADITIONAL = (
+    "與數據結構學課題習試筆記講義編彙匯資計機電網絡腦軟體統係繫運營經濟會議論證說設譯"
+    "語詞讀書寫頁類號碼線綫級紅綠藍黃圖劃畫幾積變換對應實驗報測質點間問樹鏈連棧隊雜傳"
+    "輸協處務門開關閉從來進過這個們為爲時長東車軍國際華歷現當藝術醫藥衛態環區場發髮觀"
+    "聯動靜熱氣錯誤優勢專業職產權財稅銀貨幣價總導師範練綜復複雙單選擇簡難讓給約續織組"
+    "細紙純維羅馬魚鳥龍齊麥黨閱陽陰陳陸隨隱雲靈頭顏願風飛館養蟲見規視覺親認討訓訪許診"
+    "詳誌請諸調談謝識譜護讚豐貝負責貢貧購費賽跡躍軌軸較載輕輔輯農邊遞遠適遲遺還郵鄉釋"
+    "針鋼錄鍵鎖鏡閘閣雖離雞霧響頂項順須預領頻額顯飲飯驅驚鬥麼齡億傑側備偉僅儲兒內兩冊"
+    "剛創劇勞勝卻參員喚嚴園圍圓團塊壓壞聲夢奮獎婦孫寧審寶將尋屆屬層歲島廣廠廢廳張強彈"
+    "徑徵憶懷戰戲戶掃掛揚損擁擊擔擬擴攝斷於晉暫條極標樂樣橋檔檢歡歸殘殺漢沒況溫滿潔濃"
+    "濕災無煙燈爭獨獲畢異療盡盤眾確礎禮種稱穩窮競築簽糧紀紋納絕絲緊緒緣縣縮績繼罰聖聞"
+    "聰聽脈腳臉臨興舉艱節萬葉蘇衝補裝製覽觸訂評詢詩該誠誰諾貫賴贏趨轉輪辦辭週達遷邏鄰"
+    "鐘鐵閑陣險韋頓頸顆顧飄餘鬆魯鳳麗後裡裏臺灣並併傷儀狀濾籤麵緩鑑鑒階懸擺攜敵斂暢歐"
+    "殼減渦潛瀏燒爾犧獸璽瘋癒皺盜矯硯祕穀窩箏糾紛紡絃綱緯縱繩繪纖罷羨聳膠膚艙莖蒐薦藉"
+    "蘭虛蝕褲襯託訊訴誇誕誘諮謀謂謙譽貿賀賓賞賦贊趙辯迴遜邁醜釐鈔銳銷鋪鍛鎮鑄閃闡陝隸"
+    "韌韻頌頗顛颱飽馳駐騰驟鬧鯨鴻鹽"
+)
+_SIMPLIFIED = (
+    "与数据结构学课题习试笔记讲义编汇汇资计机电网络脑软体统系系运营经济会议论证说设译"
+    "语词读书写页类号码线线级红绿蓝黄图划画几积变换对应实验报测质点间问树链连栈队杂传"
+    "输协处务门开关闭从来进过这个们为为时长东车军国际华历现当艺术医药卫态环区场发发观"
+    "联动静热气错误优势专业职产权财税银货币价总导师范练综复复双单选择简难让给约续织组"
+    "细纸纯维罗马鱼鸟龙齐麦党阅阳阴陈陆随隐云灵头颜愿风飞馆养虫见规视觉亲认讨训访许诊"
+    "详志请诸调谈谢识谱护赞丰贝负责贡贫购费赛迹跃轨轴较载轻辅辑农边递远适迟遗还邮乡释"
+    "针钢录键锁镜闸阁虽离鸡雾响顶项顺须预领频额显饮饭驱惊斗么龄亿杰侧备伟仅储儿内两册"
+    "刚创剧劳胜却参员唤严园围圆团块压坏声梦奋奖妇孙宁审宝将寻届属层岁岛广厂废厅张强弹"
+    "径征忆怀战戏户扫挂扬损拥击担拟扩摄断于晋暂条极标乐样桥档检欢归残杀汉没况温满洁浓"
+    "湿灾无烟灯争独获毕异疗尽盘众确础礼种称稳穷竞筑签粮纪纹纳绝丝紧绪缘县缩绩继罚圣闻"
+    "聪听脉脚脸临兴举艰节万叶苏冲补装制览触订评询诗该诚谁诺贯赖赢趋转轮办辞周达迁逻邻"
+    "钟铁闲阵险韦顿颈颗顾飘余松鲁凤丽后里里台湾并并伤仪状滤签面缓鉴鉴阶悬摆携敌敛畅欧"
+    "壳减涡潜浏烧尔牺兽玺疯愈皱盗矫砚秘谷窝筝纠纷纺弦纲纬纵绳绘纤罢羡耸胶肤舱茎搜荐借"
+    "兰虚蚀裤衬托讯诉夸诞诱咨谋谓谦誉贸贺宾赏赋赞赵辩回逊迈丑厘钞锐销铺锻镇铸闪阐陕隶"
+    "韧韵颂颇颠台饱驰驻腾骤闹鲸鸿盐"
+)
+
+_T2S = str.maketrans(_TRADITIONAL, _SIMPLIFIED)
+
+# 按二元组切分的文字: 中日韩统一表意文字(含扩展A和兼容区)、假名、韩文音节
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_RUN = re.compile(rf"([{_CJK}]+)|([0-9]+)|((?:(?![{_CJK}])[^\W\d_])+)")
+
+
+def normalize(text: str) -> str:
+    """
+    归一化文本: 全角转半角、兼容字符展开(NFKC)、转小写、繁体转简体
+
+    参数:
+        text: 原始文本
+    返回:
+        归一化后的文本
+    """
+    return unicodedata.normalize("NFKC", text).lower().translate(_T2S)
+
+
+def _runs(text: str) -> List[Tuple[bool, str]]:
+    """把归一化后的文本切分为 (是否为汉字, 连续片段) 列表，标点和空白被丢弃"""
+    return [(bool(m.group(1)), m.group(0)) for m in _RUN.finditer(text)]
+
+
+def _bigrams(run: str) -> List[str]:
+    """连续汉字的相互重叠的二元组"""
+    return [run[i : i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text: Optional[str]) -> str:
+    """
+    把一列文本切分为写入索引的词(以空格分隔)
+
+    每段连续汉字在二元组之后补上最后一个字，这样每个字都是某个词的开头，单字查询可以用前缀匹配走索引
+
+    参数:
+        text: 原始文本
+    返回:
+        以空格分隔的词
+    """
+    tokens = []
+    for cjk, run in _runs(normalize(text or "")):
+        if cjk:
+            tokens.extend(_bigrams(run))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return " ".join(tokens)
+
+
+def query_expression(query: str) -> Optional[str]:
+    """
+    把用户输入转换为 FTS5 查询表达式
+
+    每个以空白分隔的查询词转换为一个短语，所有短语都必须出现:
+    - 连续汉字转换为二元组，"数据结构" 匹配 "数据结构与算法" 中连续的 数据 据结 结构；
+      汉字后面还有字母/数字时与索引一样补上最后一个字，保证短语中的词在索引中相邻
+    - 查询词末尾的单个汉字或字母/数字使用前缀匹配(边输入边搜索时最后一个词往往不完整)
+
+    参数:
+        query: 用户输入
+    返回:
+        查询表达式，没有可检索的词时返回None
+    """
+    phrases = []
+    for term in query.split():
+        runs = _runs(normalize(term))
+        if not runs:
+            continue
+        tokens = []
+        for cjk, run in runs[:-1]:
+            tokens.extend(_bigrams(run) + [run[-1]] if cjk else [run])
+        cjk, run = runs[-1]
+        if cjk and len(run) > 1:
+            tokens.extend(_bigrams(run))
+            phrases.append('"{}"'.format(" ".join(tokens)))
+        else:
+            tokens.append(run)
+            phrases.append('"{}" *'.format(" ".join(tokens)))
+    return " AND ".join(phrases) or None
+
+
+def highlight(text: Optional[str], query: str, width: int = 48) -> Optional[Markup]:
+    """
+    截取文本中第一个匹配查询词的片段，并用 <mark> 标出所有匹配(按归一化后的文本匹配，繁体、全角也能标出)
+
+    参数:
+        text: 原始文本(如资料描述)
+        query: 用户输入
+        width: 片段的最大字符数
+    返回:
+        转义后的HTML片段，文本中没有匹配时返回None
+    """
+    if not text:
+        return None
+
+    # 逐字归一化并记录每个归一化字符对应的原文位置(NFKC 可能把一个字展开为多个字)
+    normalized, origin = [], []
+    for i, char in enumerate(text):
+        for n in normalize(char):
+            normalized.append(n)
+            origin.append(i)
+    normalized = "".join(normalized)
+
+    spans = []
+    for term in query.split():
+        needle = normalize(term)
+        start = normalized.find(needle)
+        while needle and start != -1:
+            end = start + len(needle) - 1
+            spans.append((origin[start], origin[end] + 1))
+            start = normalized.find(needle, start + len(needle))
+    if not spans:
+        return None
+
+    # 片段从第一个匹配之前几个字开始
+    spans.sort()
+    begin = max(0, spans[0][0] - width // 4)
+    finish = min(len(text), begin + width)
+    html, cursor = [], begin
+    for start, end in spans:
+        start, end = max(start, cursor), min(end, finish)
+        if start >= end:
+            continue
+        html.append(escape(text[cursor:start]))
+        html.append(Markup("<mark>") + escape(text[start:end]) + Markup("</mark>"))
+        cursor = end
+    html.append(escape(text[cursor:finish]))
+    prefix = "…" if begin > 0 else ""
+    suffix = "…" if finish < len(text) else ""
+    return Markup(prefix + "".join(str(part) for part in html) + suffix)
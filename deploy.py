@@ -11,7 +11,11 @@ def run_gunicorn():
     启动 Gunicorn WSGI 服务器来运行 Flask 应用
 
     参数说明:
-    -w 4: 使用4个工作进程(workers)处理请求，提高并发能力
+    -w 12: 使用12个工作进程(workers)处理请求，提高并发能力
+    -k gthread --threads 32: 每个工作进程用32个线程处理请求，SSE长连接各占用一个线程，
+        每个进程最多保持 blueprints/events.py 中 MAX_STREAMS 个推送连接，其余线程留给普通请求；
+        不使用 gevent: 邮件队列、定时任务和推送轮询都是后台线程，限流、发件箱、配额和验证码存储会阻塞等待SQLite写锁，
+        在 gevent 的 monkey patch 下任何一次阻塞都会卡住整个工作进程
     -b 0.0.0.0:5000: 绑定到所有网络接口的5000端口
     --access-logfile -: 将访问日志输出到标准输出(控制台)
     main:app: 指定 Flask 应用实例，格式为 "模块名:应用实例变量名"
@@ -21,6 +25,10 @@ def run_gunicorn():
             "gunicorn",  # 使用 gunicorn 命令
             "-w",
             "12",  # 设置12个工作进程，根据CPU核心数可调整
+            "-k",
+            "gthread",  # 多线程工作模式，阻塞的SQLite调用只占用当前线程
+            "--threads",
+            "32",  # 每个工作进程的线程数，SSE推送连接最多占用其中 MAX_STREAMS 个
             "-b",
             "0.0.0.0:5000",  # 监听所有网络接口的5000端口
             "--access-logfile",
@@ -13,23 +13,83 @@ from .base import (
     NotificationError,
     AuthenticationError,
     DeliveryError,
+    PoolExhaustedError,
     ConfigurationError,
 )
 
+# 从mail_templates.py导入邮件模板和骨架缓存
+from .mail_templates import (
+    MailTemplate,
+    MailTemplateCache,
+    mail_templates,
+)
+
+# 从mail_metrics.py导入邮件发送指标
+from .mail_metrics import (
+    LatencyHistogram,
+    MailMetrics,
+    mail_metrics,
+)
+
 # 从verification_code.py导入验证码相关功能
 from .verification_code import (
     code_generator,
     send_verification_codes,
+    request_verification_code,
+    get_verification_status,
     verify_code,
     code_manager,
 )
 
+# 从code_store.py导入共享验证码存储
+from .code_store import VerificationCodeStore
+
+# 从quota_store.py导入共享发送配额
+from .quota_store import MailQuotaStore
+
 # 从app_notification.py导入应用内通知功能
 from .app_notification import (
     AppNotificationManager,
     notification_manager,
 )
 
+# 从unread_counter.py导入未读计数缓存
+from .unread_counter import (
+    UnreadCounterCache,
+    unread_counter,
+)
+
+# 从fanout.py导入关注者通知扇出队列
+from .fanout import (
+    FollowerFanoutQueue,
+    follower_fanout,
+)
+
+# 从event_hub.py导入SSE事件中心
+from .event_hub import (
+    EventHub,
+    event_hub,
+    format_sse,
+)
+
+# 从retention.py导入通知保留任务
+from .retention import (
+    NotificationRetentionJob,
+    retention_job,
+)
+
+# 从digest.py导入关注上传邮件摘要任务
+from .digest import (
+    FollowerDigestJob,
+    follower_digest,
+)
+
+# 从broadcast.py导入管理员群发邮件任务
+from .broadcast import (
+    EmailBroadcastSender,
+    broadcast_sender,
+)
+
 # 指定导出的符号，控制from notification import *的行为
 __all__ = [
     # 邮件通知相关
@@ -37,13 +97,37 @@ __all__ = [
     "NotificationError",
     "AuthenticationError",
     "DeliveryError",
+    "PoolExhaustedError",
     "ConfigurationError",
+    "MailTemplate",
+    "MailTemplateCache",
+    "mail_templates",
+    "LatencyHistogram",
+    "MailMetrics",
+    "mail_metrics",
+    "MailQuotaStore",
     # 验证码相关
     "code_generator",
     "send_verification_codes",
+    "request_verification_code",
+    "get_verification_status",
     "verify_code",
     "code_manager",
+    "VerificationCodeStore",
     # 应用内通知相关
     "AppNotificationManager",
     "notification_manager",
+    "UnreadCounterCache",
+    "unread_counter",
+    "FollowerFanoutQueue",
+    "follower_fanout",
+    "EventHub",
+    "event_hub",
+    "format_sse",
+    "NotificationRetentionJob",
+    "retention_job",
+    "FollowerDigestJob",
+    "follower_digest",
+    "EmailBroadcastSender",
+    "broadcast_sender",
 ]
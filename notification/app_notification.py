@@ -1,12 +1,28 @@
 import os
 import json
+import logging
 from datetime import datetime
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional, Iterable
+
+from sqlalchemy import and_, or_, exists, select, func, update, insert, literal
+from sqlalchemy.exc import IntegrityError
+
+from database import db, User, Notification, NotificationReceipt, NotificationWatermark
+from database.models import Relationship
+from .unread_counter import unread_counter
+from .event_hub import event_hub
+
+logger = logging.getLogger(__name__)
 
 
 class AppNotificationManager:
     """
     应用内通知管理类 - 负责存储、加载和管理通知
+    通知存储在 notification 表中，已读状态存储在 notification_receipt 表中
+
+    广播通知(全体/管理员)的已读状态由每个用户一条的水位线记录：
+    ID不大于水位线的广播视为已读，水位线之上单独读过的广播保留已读回执作为例外，
+    水位线前移时回收这些例外回执，因此每个用户占用的空间与用户总数无关
     """
 
     _instance = None
@@ -23,280 +39,683 @@ class AppNotificationManager:
         if self._initialized:
             return
 
-        # 通知存储文件名
-        self._notification_file = "notifications.json"
+        # 旧版通知存储文件名(仅用于一次性导入)
+        self._legacy_notification_file = "notifications.json"
         self._initialized = True
 
-    def get_notification_path(self, app_root_path: str) -> str:
+    @staticmethod
+    def visible_roles(is_admin: bool) -> List[str]:
         """
-        获取通知存储文件的完整路径
+        获取用户可见的广播通知角色
 
         参数:
-            app_root_path: 应用根目录
+            is_admin: 用户是否为管理员
         返回:
-            通知文件的完整路径
+            可见的 target_role 列表
         """
-        return os.path.join(app_root_path, self._notification_file)
+        return ["all", "admin"] if is_admin else ["all"]
 
-    def load_notifications(self, app_root_path: str) -> List[Dict]:
+    def create_notification(
+        self,
+        title: str,
+        content: str,
+        creator_id: int,
+        target_role: str = "all",
+        material_id: Optional[int] = None,
+        recipient_ids: Optional[Iterable[int]] = None,
+    ) -> Notification:
         """
-        加载所有通知
+        创建新通知
 
         参数:
-            app_root_path: 应用根目录
+            title: 通知标题
+            content: 通知内容
+            creator_id: 创建者ID
+            target_role: 目标角色 ('all'、'admin' 或 'followers')
+            material_id: 关联资料ID(可选)
+            recipient_ids: 接收人ID列表，仅 followers 通知使用
+
         返回:
-            通知列表
+            创建的通知对象
         """
+        if not title.strip() or not content.strip():
+            raise ValueError("标题和内容不能为空")
+
+        notification = Notification(
+            title=title.strip(),
+            content=content.strip(),
+            target_role=target_role,
+            created_by=creator_id,
+            material_id=material_id,
+        )
+
         try:
-            notification_path = self.get_notification_path(app_root_path)
-            if os.path.exists(notification_path):
-                with open(notification_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            return []
+            db.session.add(notification)
+            db.session.flush()  # 获取通知ID
+
+            # 关注者通知：为每个接收人批量写入一条未读回执
+            if recipient_ids:
+                db.session.execute(
+                    insert(NotificationReceipt),
+                    [
+                        {"notification_id": notification.id, "user_id": uid, "read": False}
+                        for uid in set(recipient_ids)
+                    ],
+                )
+
+            if target_role == "followers":
+                new_token = unread_counter.bump_token(recipient_ids or [])
+            else:
+                new_token = unread_counter.bump_token(target_role=target_role)
+            db.session.commit()
         except Exception as e:
-            print(f"加载通知失败: {e}")
-            return []
+            db.session.rollback()
+            logger.error(f"创建通知失败: {str(e)}")
+            raise
+
+        # 增加受众的未读计数
+        unread_counter.on_created(new_token, target_role, recipient_ids)
+        event_hub.wake()
+        return notification
 
-    def save_notifications(self, notifications: List[Dict], app_root_path: str) -> bool:
+    def create_follower_notification(
+        self,
+        uploader_id: int,
+        title: str,
+        content: str,
+        material_id: Optional[int] = None,
+    ) -> Optional[Notification]:
         """
-        保存通知到文件
+        创建关注者通知，并用一条 INSERT ... SELECT 为上传者的所有粉丝写入未读回执
 
         参数:
-            notifications: 通知列表
-            app_root_path: 应用根目录
+            uploader_id: 上传者ID
+            title: 通知标题
+            content: 通知内容
+            material_id: 关联资料ID(可选)
+
         返回:
-            是否保存成功
+            创建的通知对象，没有粉丝时返回None
         """
+        notification = Notification(
+            title=title.strip(),
+            content=content.strip(),
+            target_role="followers",
+            created_by=uploader_id,
+            material_id=material_id,
+        )
+
         try:
-            notification_path = self.get_notification_path(app_root_path)
-            with open(notification_path, "w", encoding="utf-8") as f:
-                json.dump(notifications, f, ensure_ascii=False, indent=2)
+            db.session.add(notification)
+            db.session.flush()  # 获取通知ID
+
+            # 每位粉丝一条未读回执，数据不经过Python
+            result = db.session.execute(
+                insert(NotificationReceipt).from_select(
+                    ["notification_id", "user_id", "read"],
+                    select(
+                        literal(notification.id),
+                        Relationship.follower_id,
+                        literal(False),
+                    ).where(Relationship.followed_id == uploader_id),
+                )
+            )
+            if result.rowcount == 0:
+                db.session.rollback()
+                return None
+
+            unread_counter.bump_token(
+                select(Relationship.follower_id).where(
+                    Relationship.followed_id == uploader_id
+                )
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"创建关注者通知失败: {str(e)}")
+            raise
+
+        # 接收人未在进程内展开，直接让本进程缓存失效
+        unread_counter.invalidate()
+        event_hub.wake()
+        return notification
+
+    def mark_as_read(self, notification_id: int, user_id: int, is_admin: bool) -> bool:
+        """
+        标记通知为已读
+
+        参数:
+            notification_id: 通知ID
+            user_id: 用户ID
+            is_admin: 用户是否为管理员
+
+        返回:
+            是否标记成功(通知不存在、不可见或已读时返回False)
+        """
+        try:
+            # 已有未读回执(关注者通知)：一条按唯一索引定位的UPDATE即可
+            result = db.session.execute(
+                update(NotificationReceipt)
+                .where(
+                    NotificationReceipt.notification_id == notification_id,
+                    NotificationReceipt.user_id == user_id,
+                    NotificationReceipt.read.is_(False),
+                )
+                .values(read=True, read_at=datetime.now())
+            )
+            if result.rowcount > 0:
+                new_token = unread_counter.bump_token([user_id])
+                db.session.commit()
+                unread_counter.on_read(new_token, user_id)
+                event_hub.wake()
+                return True
+
+            # 广播通知：水位线以下的已经读过
+            notification = db.session.get(Notification, notification_id)
+            if not notification or notification.target_role not in self.visible_roles(
+                is_admin
+            ):
+                return False
+            if notification_id <= self.get_watermark(user_id):
+                return False
+
+            # 水位线之上的广播先写入例外回执，再尝试前移水位线
+            db.session.add(
+                NotificationReceipt(
+                    notification_id=notification_id,
+                    user_id=user_id,
+                    read=True,
+                    read_at=datetime.now(),
+                )
+            )
+            db.session.flush()
+            self._advance_watermark(user_id, is_admin)
+            new_token = unread_counter.bump_token([user_id])
+            db.session.commit()
+            unread_counter.on_read(new_token, user_id)
+            event_hub.wake()
             return True
+        except IntegrityError:
+            # 回执已存在，说明已经读过
+            db.session.rollback()
+            return False
         except Exception as e:
-            print(f"保存通知失败: {e}")
+            db.session.rollback()
+            logger.error(f"标记通知已读失败: {str(e)}")
             return False
 
-    def create_notification(
-        self,
-        title: str,
-        content: str,
-        creator_id: int,
-        target_role: str = "all",
-        app_root_path: str = None,
-    ) -> Dict:
+    def mark_all_as_read(self, user_id: int, is_admin: bool) -> int:
         """
-        创建新通知
+        将用户的全部通知标记为已读
+
+        广播通知直接把水位线移到最新的可见广播，并在同一事务中回收水位线以下的例外回执；
+        关注者通知用一条UPDATE把该用户的未读回执全部置为已读。
+        从新到旧逐条阅读时水位线无法前移，由这里一次性收拢
 
         参数:
-            title: 通知标题
-            content: 通知内容
-            creator_id: 创建者ID
-            target_role: 目标角色 ('all' 或 'admin')
-            app_root_path: 应用根目录
+            user_id: 用户ID
+            is_admin: 用户是否为管理员
 
         返回:
-            创建的通知字典
+            本次标记为已读的通知数量
         """
-        if not title.strip() or not content.strip():
-            raise ValueError("标题和内容不能为空")
+        try:
+            unread = self.count_unread(user_id, is_admin)
 
-        # 创建新通知
-        new_notification = {
-            "id": str(datetime.now().timestamp()),
-            "title": title.strip(),
-            "content": content.strip(),
-            "target_role": target_role,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "created_by": creator_id,
-            "read_by": [],
-        }
+            db.session.execute(
+                update(NotificationReceipt)
+                .where(
+                    NotificationReceipt.user_id == user_id,
+                    NotificationReceipt.read.is_(False),
+                )
+                .values(read=True, read_at=datetime.now())
+            )
 
-        if app_root_path:
-            # 加载现有通知并添加新通知
-            notifications = self.load_notifications(app_root_path)
-            notifications.append(new_notification)
+            latest = db.session.execute(
+                select(func.max(Notification.id)).where(
+                    Notification.target_role.in_(self.visible_roles(is_admin))
+                )
+            ).scalar()
+            if latest is not None and latest > self.get_watermark(user_id):
+                self._set_watermark(user_id, latest)
 
-            # 保存更新后的通知
-            self.save_notifications(notifications, app_root_path)
+            if unread == 0:
+                # 没有未读通知，只提交水位线上的回执回收
+                db.session.commit()
+                return 0
+
+            new_token = unread_counter.bump_token([user_id])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"全部标记已读失败: {str(e)}")
+            return 0
 
-        return new_notification
+        unread_counter.on_read(new_token, user_id, unread)
+        event_hub.wake()
+        return unread
 
-    def mark_as_read(
-        self, notification_id: str, user_id: int, app_root_path: str
-    ) -> bool:
+    def get_watermark(self, user_id: int) -> int:
         """
-        标记通知为已读
+        获取用户的广播已读水位线
 
         参数:
-            notification_id: 通知ID
             user_id: 用户ID
-            app_root_path: 应用根目录
+        返回:
+            已连续读到的最新广播通知ID，没有记录时为0
+        """
+        value = db.session.execute(
+            select(NotificationWatermark.last_read_id).where(
+                NotificationWatermark.user_id == user_id
+            )
+        ).scalar()
+        return value or 0
+
+    def _set_watermark(self, user_id: int, last_read_id: int) -> None:
+        """
+        在当前事务中设置用户水位线，并删除水位线以下已不再需要的广播回执
 
+        参数:
+            user_id: 用户ID
+            last_read_id: 新的水位线
+        """
+        watermark = db.session.get(NotificationWatermark, user_id)
+        if watermark is None:
+            db.session.add(
+                NotificationWatermark(user_id=user_id, last_read_id=last_read_id)
+            )
+        else:
+            watermark.last_read_id = last_read_id
+
+        broadcast_ids = select(Notification.id).where(
+            Notification.target_role != "followers",
+            Notification.id <= last_read_id,
+        )
+        NotificationReceipt.query.filter(
+            NotificationReceipt.user_id == user_id,
+            NotificationReceipt.notification_id.in_(broadcast_ids),
+        ).delete(synchronize_session=False)
+        db.session.flush()
+
+    def _advance_watermark(self, user_id: int, is_admin: bool) -> int:
+        """
+        将水位线前移到第一条未读广播之前，并回收被水位线覆盖的例外回执
+
+        参数:
+            user_id: 用户ID
+            is_admin: 用户是否为管理员
         返回:
-            是否标记成功
+            前移后的水位线
         """
-        notifications = self.load_notifications(app_root_path)
+        current = self.get_watermark(user_id)
+        visible = self.visible_roles(is_admin)
+
+        # 水位线之上第一条没有已读回执的可见广播
+        first_unread = db.session.execute(
+            select(func.min(Notification.id)).where(
+                Notification.target_role.in_(visible),
+                Notification.id > current,
+                ~exists().where(
+                    NotificationReceipt.notification_id == Notification.id,
+                    NotificationReceipt.user_id == user_id,
+                    NotificationReceipt.read.is_(True),
+                ),
+            )
+        ).scalar()
+
+        if first_unread is None:
+            # 全部读完，水位线移到最新的可见广播
+            target = db.session.execute(
+                select(func.max(Notification.id)).where(
+                    Notification.target_role.in_(visible)
+                )
+            ).scalar() or current
+        else:
+            target = first_unread - 1
 
-        for notification in notifications:
-            if notification["id"] == notification_id:
-                if "read_by" not in notification:
-                    notification["read_by"] = []
+        if target > current:
+            self._set_watermark(user_id, target)
+        return max(target, current)
 
-                if user_id not in notification["read_by"]:
-                    notification["read_by"].append(user_id)
-                    self.save_notifications(notifications, app_root_path)
-                    return True
+    def _visible_query(self, user_id: int, is_admin: bool):
+        """
+        构建用户可见通知的查询，附带当前用户的回执已读状态
 
-        return False
+        参数:
+            user_id: 用户ID
+            is_admin: 用户是否为管理员
+        返回:
+            查询 (Notification, read) 的 Select 对象
+        """
+        return (
+            select(Notification, NotificationReceipt.read)
+            .outerjoin(
+                NotificationReceipt,
+                and_(
+                    NotificationReceipt.notification_id == Notification.id,
+                    NotificationReceipt.user_id == user_id,
+                ),
+            )
+            .where(
+                or_(
+                    Notification.target_role.in_(self.visible_roles(is_admin)),
+                    and_(
+                        Notification.target_role == "followers",
+                        NotificationReceipt.id.isnot(None),
+                    ),
+                )
+            )
+        )
 
     def get_user_notifications(
-        self, user_id: int, is_admin: bool, app_root_path: str
+        self,
+        user_id: int,
+        is_admin: bool,
+        before: Optional[int] = None,
+        limit: Optional[int] = None,
     ) -> List[Dict]:
         """
-        获取用户可见的通知
+        获取用户可见的通知，按时间从新到旧排列(键集分页)
 
         参数:
             user_id: 用户ID
             is_admin: 用户是否为管理员
-            app_root_path: 应用根目录
+            before: 只返回ID小于该值的通知(上一页最后一条的ID，可选)
+            limit: 最多返回的条数(可选，不传则返回全部)
 
         返回:
             用户可见的通知列表，带有is_read标记
         """
-        all_notifications = self.load_notifications(app_root_path)
-        user_notifications = []
-
-        for notification in all_notifications:
-            # 检查是否是全体通知或针对特定角色
-            if notification["target_role"] == "all" or (
-                is_admin and notification["target_role"] == "admin"
-            ):
-                # 添加一个标记，指示当前用户是否已读该通知
-                notification_copy = notification.copy()  # 创建副本以不影响原始数据
-                notification_copy["is_read"] = user_id in notification.get(
-                    "read_by", []
+        watermark = self.get_watermark(user_id)
+        stmt = self._visible_query(user_id, is_admin).order_by(Notification.id.desc())
+        if before is not None:
+            stmt = stmt.where(Notification.id < before)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        rows = db.session.execute(stmt).all()
+        return [
+            notification.to_dict(
+                is_read=bool(read)
+                or (
+                    notification.target_role != "followers"
+                    and notification.id <= watermark
                 )
-                user_notifications.append(notification_copy)
-
-        return user_notifications
+            )
+            for notification, read in rows
+        ]
 
-    def get_unread_count(self, user_id: int, is_admin: bool, app_root_path: str) -> int:
+    def get_notification_page(
+        self, user_id: int, is_admin: bool, before: Optional[int] = None, limit: int = 20
+    ) -> Dict:
         """
-        获取用户未读通知数量
+        获取一页通知及下一页的游标
 
         参数:
             user_id: 用户ID
             is_admin: 用户是否为管理员
-            app_root_path: 应用根目录
+            before: 游标，上一页返回的 next_cursor(可选)
+            limit: 每页条数
 
         返回:
-            未读通知数量
+            {"notifications": [...], "next_cursor": 下一页游标，没有更多时为None}
         """
-        all_notifications = self.load_notifications(app_root_path)
-        unread_count = 0
+        # 多取一条用于判断是否还有下一页
+        notifications = self.get_user_notifications(
+            user_id, is_admin, before=before, limit=limit + 1
+        )
+        has_more = len(notifications) > limit
+        notifications = notifications[:limit]
+        return {
+            "notifications": notifications,
+            "next_cursor": notifications[-1]["id"] if has_more else None,
+        }
 
-        for notification in all_notifications:
-            if notification["target_role"] == "all" or (
-                is_admin and notification["target_role"] == "admin"
-            ):
-                if user_id not in notification.get("read_by", []):
-                    unread_count += 1
+    def get_unread_count(self, user_id: int, is_admin: bool) -> int:
+        """
+        获取用户未读通知数量(优先从进程内计数缓存读取)
 
-        return unread_count
+        参数:
+            user_id: 用户ID
+            is_admin: 用户是否为管理员
+
+        返回:
+            未读通知数量
+        """
+        return unread_counter.get(
+            user_id, is_admin, lambda: self.count_unread(user_id, is_admin)
+        )
 
-    def create_welcome_notification(self, app_root_path: str) -> bool:
+    def count_unread(self, user_id: int, is_admin: bool) -> int:
         """
-        创建欢迎通知(如果通知文件不存在)
+        从数据库统计用户未读通知数量
 
         参数:
-            app_root_path: 应用根目录
+            user_id: 用户ID
+            is_admin: 用户是否为管理员
 
         返回:
-            是否需要创建欢迎通知
-        """
-        notification_path = self.get_notification_path(app_root_path)
-        if not os.path.exists(notification_path):
-            welcome_notification = self.create_notification(
-                title="欢迎使用PKUHUB",
-                content="欢迎使用PKUHUB！\n\n这是一个由北大学生自主开发的学习资源共享网站，旨在促进校内知识流通，提高学习效率。\n\n如有任何问题或建议，请联系管理员。",
-                creator_id=1,  # 假设ID为1的是管理员
-                target_role="all",
+            未读通知数量
+        """
+        # 未读的广播通知：水位线之上、可见且没有该用户的例外回执(走主键范围扫描)
+        watermark = self.get_watermark(user_id)
+        broadcast_unread = (
+            select(func.count(Notification.id))
+            .where(
+                Notification.id > watermark,
+                Notification.target_role.in_(self.visible_roles(is_admin)),
+                ~exists().where(
+                    NotificationReceipt.notification_id == Notification.id,
+                    NotificationReceipt.user_id == user_id,
+                ),
+            )
+            .scalar_subquery()
+        )
+        # 未读的关注者通知：走 (user_id, read) 索引
+        inbox_unread = (
+            select(func.count(NotificationReceipt.id))
+            .where(
+                NotificationReceipt.user_id == user_id,
+                NotificationReceipt.read.is_(False),
             )
+            .scalar_subquery()
+        )
+        return db.session.execute(select(broadcast_unread + inbox_unread)).scalar() or 0
 
-            with open(notification_path, "w", encoding="utf-8") as f:
-                json.dump([welcome_notification], f, ensure_ascii=False, indent=2)
+    def create_welcome_notification(self) -> bool:
+        """
+        创建欢迎通知(如果还没有任何通知)
 
-            return True
-        return False
+        返回:
+            是否创建了欢迎通知
+        """
+        if db.session.query(Notification.id).first() is not None:
+            return False
+
+        self.create_notification(
+            title="欢迎使用PKUHUB",
+            content="欢迎使用PKUHUB！\n\n这是一个由北大学生自主开发的学习资源共享网站，旨在促进校内知识流通，提高学习效率。\n\n如有任何问题或建议，请联系管理员。",
+            creator_id=1,  # 假设ID为1的是管理员
+            target_role="all",
+        )
+        return True
 
-    def delete_notification(
-        self, notification_id: str, user_id: int, app_root_path: str
-    ) -> bool:
+    def delete_notification(self, notification_id: int, user_id: int) -> bool:
         """
-        删除单个通知（只有管理员可以完全删除，普通用户只能删除已读的自己可见的通知）
+        删除单个通知（创建者可以完全删除，普通用户只能删除自己已读的关注者通知）
 
         参数:
             notification_id: 通知ID
             user_id: 用户ID
-            app_root_path: 应用根目录
 
         返回:
             是否删除成功
         """
-        notifications = self.load_notifications(app_root_path)
+        notification = db.session.get(Notification, notification_id)
+        if not notification:
+            return False
 
-        for i, notification in enumerate(notifications):
-            if notification["id"] == notification_id:
-                # 检查是否是管理员发布的通知，普通用户不能删除
-                if notification.get(
-                    "created_by"
-                ) == user_id or user_id in notification.get("read_by", []):
-                    # 从列表中删除通知
-                    del notifications[i]
-                    self.save_notifications(notifications, app_root_path)
-                    return True
+        try:
+            if notification.created_by == user_id:
+                # 创建者删除整条通知，回执级联删除
+                db.session.delete(notification)
+                unread_counter.bump_token()
+                db.session.commit()
+                unread_counter.invalidate()
+                return True
+
+            if notification.target_role == "followers":
+                # 接收人只删除自己的已读回执
+                deleted = NotificationReceipt.query.filter_by(
+                    notification_id=notification_id, user_id=user_id, read=True
+                ).delete()
+                db.session.commit()
+                return deleted > 0
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"删除通知失败: {str(e)}")
 
         return False
 
-    def delete_all_read_notifications(
-        self, user_id: int, is_admin: bool, app_root_path: str
-    ) -> int:
+    def delete_all_read_notifications(self, user_id: int, is_admin: bool) -> int:
         """
-        删除用户的所有已读通知
+        删除用户的所有已读关注者通知
+        (广播通知对所有人共享，删除回执会使其重新变为未读，因此不做处理)
 
         参数:
             user_id: 用户ID
             is_admin: 用户是否为管理员
-            app_root_path: 应用根目录
 
         返回:
             删除的通知数量
         """
-        notifications = self.load_notifications(app_root_path)
-        original_count = len(notifications)
-
-        # 过滤出未读通知和不可见的通知
-        filtered_notifications = []
-        for notification in notifications:
-            # 检查通知是否为该用户可见
-            is_visible = notification["target_role"] == "all" or (
-                is_admin and notification["target_role"] == "admin"
+        try:
+            follower_ids = select(Notification.id).where(
+                Notification.target_role == "followers"
             )
+            deleted = NotificationReceipt.query.filter(
+                NotificationReceipt.user_id == user_id,
+                NotificationReceipt.read.is_(True),
+                NotificationReceipt.notification_id.in_(follower_ids),
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            return deleted
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"删除已读通知失败: {str(e)}")
+            return 0
 
-            # 检查是否已读
-            is_read = user_id in notification.get("read_by", [])
+    def import_legacy_notifications(self, app_root_path: str) -> int:
+        """
+        从旧版 notifications.json 导入通知(仅在通知表为空时执行)
 
-            # 保留未读的通知或不可见的通知
-            if not is_visible or not is_read:
-                filtered_notifications.append(notification)
+        参数:
+            app_root_path: 应用根目录
+        返回:
+            导入的通知数量
+        """
+        legacy_path = os.path.join(app_root_path, self._legacy_notification_file)
+        if not os.path.exists(legacy_path):
+            return 0
+        if db.session.query(Notification.id).first() is not None:
+            return 0
 
-        # 保存过滤后的通知列表
-        if len(filtered_notifications) < original_count:
-            self.save_notifications(filtered_notifications, app_root_path)
-            return original_count - len(filtered_notifications)
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                legacy_notifications = json.load(f)
+        except Exception as e:
+            logger.error(f"读取旧版通知文件失败: {str(e)}")
+            return 0
+
+        # 按创建时间排序导入，使自增ID与时间顺序一致
+        legacy_notifications.sort(key=lambda n: n.get("created_at", ""))
+
+        imported = 0
+        try:
+            for item in legacy_notifications:
+                try:
+                    created_at = datetime.strptime(
+                        item["created_at"], "%Y-%m-%d %H:%M:%S"
+                    )
+                except (KeyError, ValueError):
+                    created_at = datetime.now()
+
+                notification = Notification(
+                    title=item.get("title", ""),
+                    content=item.get("content", ""),
+                    target_role=item.get("target_role", "all"),
+                    created_at=created_at,
+                    created_by=item.get("created_by"),
+                    material_id=item.get("material_id"),
+                )
+                db.session.add(notification)
+                db.session.flush()
+
+                read_by = set(item.get("read_by", []))
+                if notification.target_role == "followers":
+                    recipients = set(item.get("for_users", []))
+                else:
+                    recipients = read_by
+
+                receipts = [
+                    {
+                        "notification_id": notification.id,
+                        "user_id": uid,
+                        "read": uid in read_by,
+                        "read_at": created_at if uid in read_by else None,
+                    }
+                    for uid in recipients
+                ]
+                if receipts:
+                    db.session.execute(insert(NotificationReceipt), receipts)
+                imported += 1
+
+            # 将旧版 read_by 列表压缩为水位线，只保留乱序阅读的例外回执
+            self._compact_broadcast_receipts()
+            unread_counter.bump_token()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"导入旧版通知失败: {str(e)}")
+            return 0
 
-        return 0
+        return imported
 
+    def _compact_broadcast_receipts(self) -> int:
+        """
+        为所有持有广播已读回执的用户前移水位线(在当前事务中执行)
+
+        返回:
+            处理的用户数量
+        """
+        reader_rows = db.session.execute(
+            select(NotificationReceipt.user_id, User.is_admin)
+            .join(User, User.id == NotificationReceipt.user_id)
+            .join(Notification, Notification.id == NotificationReceipt.notification_id)
+            .where(Notification.target_role != "followers")
+            .distinct()
+        ).all()
+        for user_id, is_admin in reader_rows:
+            self._advance_watermark(user_id, bool(is_admin))
+        return len(reader_rows)
+
+    def compact_read_receipts(self) -> int:
+        """
+        将历史遗留的广播已读回执压缩为水位线(应用启动时调用，可重复执行)
+
+        返回:
+            处理的用户数量
+        """
+        try:
+            users = self._compact_broadcast_receipts()
+            if users:
+                unread_counter.bump_token()
+            db.session.commit()
+            return users
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"压缩广播已读回执失败: {str(e)}")
+            return 0
 
 # 创建全局通知管理器实例
 notification_manager = AppNotificationManager()
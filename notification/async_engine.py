@@ -0,0 +1,619 @@
+import ssl
+import time
+import base64
+import asyncio
+import logging
+import smtplib
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .base import MailQueue, EmailAccount, DeliveryError, PoolExhaustedError
+from .outbox import MailOutbox
+from .mail_metrics import mail_metrics
+
+
+class AsyncSMTPConnection:
+    """
+    基于 asyncio 流的最小SMTP客户端，只实现发送通知所需的命令
+    出错时抛出与 smtplib 相同的异常，发送逻辑可以沿用同样的错误分类
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        use_ssl: bool = True,
+        timeout: float = 30,
+        ssl_cafile: Optional[str] = None,
+    ):
+        """
+        初始化连接参数(不会立即连接)
+
+        参数:
+            host: SMTP服务器地址
+            port: SMTP服务器端口
+            use_ssl: 是否使用SSL连接
+            timeout: 连接和单条命令的超时秒数
+            ssl_cafile: 校验服务器证书使用的CA文件(可选)
+        """
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.ssl_cafile = ssl_cafile
+        self.timeout = timeout
+        self.extensions = {}  # EHLO 返回的扩展 {名称: 参数}
+        self._reader = None
+        self._writer = None
+
+    async def connect(self) -> None:
+        """建立连接，读取欢迎信息并发送 EHLO"""
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.host,
+                    self.port,
+                    ssl=ssl.create_default_context(cafile=self.ssl_cafile)
+                    if self.use_ssl
+                    else None,
+                ),
+                self.timeout,
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise smtplib.SMTPConnectError(-1, f"无法连接 {self.host}:{self.port}: {e}")
+
+        code, message = await self._read_reply()
+        if code != 220:
+            self.close()
+            raise smtplib.SMTPConnectError(code, message)
+        await self.ehlo()
+
+    async def _read_reply(self) -> Tuple[int, str]:
+        """
+        读取一条(可能多行的)服务器响应
+
+        返回:
+            (响应码, 响应文本)
+        """
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            except asyncio.TimeoutError:
+                self.close()
+                raise smtplib.SMTPServerDisconnected("等待服务器响应超时")
+            if not line:
+                self.close()
+                raise smtplib.SMTPServerDisconnected("服务器意外关闭了连接")
+            lines.append(line[4:].strip().decode("utf-8", "replace"))
+            # "250-" 表示后面还有响应行，"250 " 表示最后一行
+            if line[3:4] != b"-":
+                try:
+                    return int(line[:3]), "\n".join(lines)
+                except ValueError:
+                    self.close()
+                    raise smtplib.SMTPServerDisconnected(f"无法解析的响应: {line!r}")
+
+    async def command(self, line: str) -> Tuple[int, str]:
+        """
+        发送一条命令并读取响应
+
+        参数:
+            line: 命令(不含换行)
+        返回:
+            (响应码, 响应文本)
+        """
+        if self._writer is None:
+            raise smtplib.SMTPServerDisconnected("连接尚未建立")
+        self._writer.write(line.encode("utf-8") + b"\r\n")
+        return await self._read_reply()
+
+    async def ehlo(self) -> None:
+        """发送 EHLO 并记录服务器支持的扩展"""
+        code, message = await self.command("EHLO localhost")
+        if code != 250:
+            raise smtplib.SMTPHeloError(code, message)
+        self.extensions = {}
+        for item in message.split("\n")[1:]:
+            name, _, params = item.partition(" ")
+            self.extensions[name.upper()] = params.upper()
+
+    async def login(self, user: str, password: str) -> None:
+        """
+        登录(支持 AUTH PLAIN 和 AUTH LOGIN)
+
+        参数:
+            user: 用户名
+            password: 密码
+        抛出:
+            smtplib.SMTPAuthenticationError - 当认证失败时
+        """
+        mechanisms = self.extensions.get("AUTH", "PLAIN LOGIN").split()
+        if "PLAIN" in mechanisms:
+            token = base64.b64encode(f"\0{user}\0{password}".encode("utf-8")).decode()
+            code, message = await self.command(f"AUTH PLAIN {token}")
+        else:
+            code, message = await self.command("AUTH LOGIN")
+            if code == 334:
+                code, message = await self.command(
+                    base64.b64encode(user.encode("utf-8")).decode()
+                )
+            if code == 334:
+                code, message = await self.command(
+                    base64.b64encode(password.encode("utf-8")).decode()
+                )
+        if code not in (235, 503):  # 503 表示已经登录过
+            raise smtplib.SMTPAuthenticationError(code, message)
+
+    async def sendmail(
+        self, from_addr: str, to_addr: str, data: bytes, eight_bit: bool = False
+    ) -> None:
+        """
+        发送一封邮件给单个收件人
+
+        参数:
+            from_addr: 发件地址
+            to_addr: 收件地址
+            data: 完整的邮件字节(CRLF换行)
+            eight_bit: 正文是否为8bit传输编码
+        抛出:
+            smtplib.SMTPRecipientsRefused - 当收件人被拒收时
+            smtplib.SMTPSenderRefused / SMTPDataError - 当服务器拒绝发件人或邮件内容时
+        """
+        body_option = " BODY=8BITMIME" if eight_bit else ""
+        code, message = await self.command(f"MAIL FROM:<{from_addr}>{body_option}")
+        if code != 250:
+            await self._reset()
+            raise smtplib.SMTPSenderRefused(code, message, from_addr)
+
+        code, message = await self.command(f"RCPT TO:<{to_addr}>")
+        if code not in (250, 251):
+            await self._reset()
+            raise smtplib.SMTPRecipientsRefused({to_addr: (code, message)})
+
+        code, message = await self.command("DATA")
+        if code != 354:
+            await self._reset()
+            raise smtplib.SMTPDataError(code, message)
+
+        # 转义以 "." 开头的行，并以单独一行 "." 结束
+        if data.startswith(b"."):
+            data = b"." + data
+        data = data.replace(b"\r\n.", b"\r\n..")
+        if not data.endswith(b"\r\n"):
+            data += b"\r\n"
+        self._writer.write(data + b".\r\n")
+        code, message = await self._read_reply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, message)
+
+    async def _reset(self) -> None:
+        """发送 RSET 放弃当前邮件事务，忽略错误"""
+        try:
+            await self.command("RSET")
+        except smtplib.SMTPException:
+            pass
+
+    async def noop(self) -> None:
+        """发送 NOOP 检查连接是否有效"""
+        code, message = await self.command("NOOP")
+        if code != 250:
+            raise smtplib.SMTPResponseException(code, message)
+
+    async def quit(self) -> None:
+        """发送 QUIT 并关闭连接，忽略错误"""
+        try:
+            await self.command("QUIT")
+        except Exception:
+            pass
+        self.close()
+
+    def close(self) -> None:
+        """直接关闭底层连接"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+@dataclass
+class AsyncPooledConnection:
+    """
+    异步连接池中的单个SMTP连接及其状态
+    """
+
+    smtp: AsyncSMTPConnection  # SMTP连接
+    authenticated: bool = False  # 是否已完成登录
+    message_count: int = 0  # 该连接已发送的邮件数
+    last_used: float = 0.0  # 最近一次使用的时间(time.monotonic)
+    broken: bool = False  # 使用过程中出错，归还时关闭而不放回连接池
+
+
+class AsyncConnectionPool:
+    """
+    异步连接池 - 与 ConnectionPool 相同的复用和回收策略，
+    用 asyncio.Semaphore 限制每个账户同时使用的连接数。
+    只能在事件循环线程中使用
+    """
+
+    # 空闲超过该秒数的连接在复用前先用NOOP检查是否仍然有效
+    NOOP_AFTER_SECONDS = 10
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        use_ssl: bool = True,
+        ssl_cafile: Optional[str] = None,
+        max_messages: int = 100,
+        max_idle: float = 60,
+        connections_per_account: int = 3,
+        checkout_timeout: float = 30,
+    ):
+        """
+        初始化连接池
+
+        参数:
+            host: SMTP服务器地址
+            port: SMTP服务器端口
+            use_ssl: 是否使用SSL连接
+            ssl_cafile: 校验服务器证书使用的CA文件(可选)
+            max_messages: 单个连接最多发送的邮件数，达到后关闭重建
+            max_idle: 连接最长空闲秒数，超过后关闭重建
+            connections_per_account: 每个账户最多同时使用的连接数
+            checkout_timeout: 等待可用连接的最长秒数
+        """
+        self._host = host
+        self._port = port
+        self._use_ssl = use_ssl
+        self._ssl_cafile = ssl_cafile
+        self._max_messages = max_messages
+        self._max_idle = max_idle
+        self._connections_per_account = connections_per_account
+        self._checkout_timeout = checkout_timeout
+        self._idle: Dict[str, List[AsyncPooledConnection]] = {}  # {邮箱地址: 空闲连接栈}
+        self._slots: Dict[str, asyncio.Semaphore] = {}  # {邮箱地址: 连接数信号量}
+
+    async def _is_reusable(self, address: str, entry: AsyncPooledConnection) -> bool:
+        """
+        判断空闲连接是否可以继续使用
+        参数:
+            address - 邮箱地址
+            entry - 空闲连接
+        返回:连接是否有效且未达到回收条件
+        """
+        idle = time.monotonic() - entry.last_used
+        if entry.message_count >= self._max_messages or idle > self._max_idle:
+            return False
+        if idle > self.NOOP_AFTER_SECONDS:
+            try:
+                await entry.smtp.noop()
+            except Exception as e:
+                logging.info(f"检测到无效连接 ({address}): {str(e)}，正在重新创建...")
+                return False
+        return True
+
+    @asynccontextmanager
+    async def checkout(self, account: EmailAccount):
+        """
+        借出指定账户一个已登录的连接，async with 块结束后自动归还
+
+        参数:
+            account - 要使用的邮箱账户
+        返回:
+            AsyncPooledConnection(通过 .smtp 使用SMTP连接)
+        抛出:
+            PoolExhaustedError - 当等待可用连接超时时
+            DeliveryError - 当无法创建连接时
+            smtplib.SMTPAuthenticationError - 当登录失败时
+        """
+        slots = self._slots.setdefault(
+            account.address, asyncio.Semaphore(self._connections_per_account)
+        )
+        idle = self._idle.setdefault(account.address, [])
+        try:
+            await asyncio.wait_for(slots.acquire(), self._checkout_timeout)
+        except asyncio.TimeoutError:
+            raise PoolExhaustedError(f"账户 {account.address} 的连接全部被占用")
+
+        entry = None
+        reused = False
+        try:
+            # 优先复用最近用过的空闲连接
+            while idle and entry is None:
+                candidate = idle.pop()
+                if await self._is_reusable(account.address, candidate):
+                    entry = candidate
+                    reused = True
+                else:
+                    await candidate.smtp.quit()
+
+            if entry is None:
+                smtp = AsyncSMTPConnection(
+                    self._host, self._port, self._use_ssl, ssl_cafile=self._ssl_cafile
+                )
+                try:
+                    await smtp.connect()
+                except Exception as conn_error:
+                    logging.error(f"创建连接失败: {str(conn_error)}")
+                    raise DeliveryError(f"无法创建SMTP连接: {str(conn_error)}")
+                entry = AsyncPooledConnection(smtp=smtp, last_used=time.monotonic())
+
+            # 只有新建或重置的连接需要登录
+            if not entry.authenticated:
+                await entry.smtp.login(account.address, account.password)
+                entry.authenticated = True
+
+            mail_metrics.record_checkout(account.address, reused)
+            yield entry
+        except BaseException:
+            if entry is not None:
+                entry.broken = True
+            raise
+        finally:
+            if entry is not None:
+                if entry.broken:
+                    entry.smtp.close()
+                else:
+                    entry.last_used = time.monotonic()
+                    idle.append(entry)
+            slots.release()
+
+    def drain(self, account: EmailAccount) -> None:
+        """
+        关闭账户的所有空闲连接(账户熔断时调用)
+        参数:account - 邮箱账户
+        """
+        for entry in self._idle.pop(account.address, []):
+            entry.smtp.close()
+
+    async def close_all(self) -> None:
+        """关闭所有空闲连接"""
+        for address in list(self._idle):
+            for entry in self._idle.pop(address):
+                await entry.smtp.quit()
+
+
+class AsyncMailEngine:
+    """
+    异步发送引擎 - 在专用线程中运行 asyncio 事件循环，
+    一个线程即可同时进行大量SMTP会话(每个账户的并发数由连接池限制)
+    """
+
+    def __init__(self, pool: AsyncConnectionPool):
+        """
+        初始化发送引擎(调用 start 后才会创建事件循环线程)
+
+        参数:
+            pool: 异步连接池
+        """
+        self.pool = pool
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """启动事件循环线程"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._run_loop, name="MailEventLoop", daemon=True
+            )
+            self._thread.start()
+            logging.info("异步邮件发送引擎已启动")
+
+    def _run_loop(self) -> None:
+        """事件循环线程的主函数"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """
+        在事件循环中调度协程(线程安全)
+
+        参数:
+            coro: 协程对象
+        返回:
+            concurrent.futures.Future
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """
+        在事件循环中执行协程并阻塞等待结果(供同步调用方使用)
+
+        参数:
+            coro: 协程对象
+            timeout: 最长等待秒数
+        返回:
+            协程的返回值
+        """
+        return self.submit(coro).result(timeout)
+
+    def call_soon(self, callback: Callable, *args) -> None:
+        """在事件循环线程中执行普通函数(线程安全)"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    async def _shutdown(self) -> None:
+        """关闭所有连接并取消仍在运行的协程(发送中的邮件由租约机制重新领取)"""
+        await self.pool.close_all()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self) -> None:
+        """关闭所有连接并停止事件循环"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(5)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+            if not self.loop.is_running():
+                self.loop.close()
+            logging.info("异步邮件发送引擎已停止")
+
+
+class AsyncMailQueue(MailQueue):
+    """
+    基于 asyncio 的邮件队列 - 与 MailQueue 共用发件箱、通道和回调机制，
+    但每个通道不再是若干阻塞线程，而是事件循环中的一个调度协程，
+    最多同时进行 lane_workers[lane] 个发送会话。
+    发件箱的SQLite操作放到线程池执行，不阻塞事件循环
+    """
+
+    # 每次领取的最大邮件数
+    CLAIM_BATCH = 10
+
+    def __init__(
+        self,
+        outbox: MailOutbox,
+        sender: Callable,
+        engine: AsyncMailEngine,
+        lane_workers: Dict[str, int] = None,
+    ):
+        """
+        初始化异步邮件队列
+
+        参数:
+            outbox: 持久化发件箱
+            sender: 异步发送函数 async (to, subject, content, content_type) -> 结果字典
+            engine: 异步发送引擎
+            lane_workers: 各通道的最大并发发送数 {lane: count}
+        """
+        super().__init__(outbox, sender, lane_workers)
+        self._engine = engine
+        self._lane_events: List[asyncio.Event] = []  # 各调度协程的唤醒事件
+
+    def start(self):
+        """启动事件循环和各通道的调度协程"""
+        with self._lock:
+            if self._running:
+                return
+
+            self._running = True
+            self._engine.start()
+            for lane in MailOutbox.LANES:
+                concurrency = self._lane_workers.get(lane, 0)
+                if concurrency <= 0:
+                    continue
+                # 可领取的通道: 本通道及所有更高优先级的通道，按优先级排列
+                lanes = list(MailOutbox.LANES[: MailOutbox.LANES.index(lane) + 1])
+                self._engine.submit(self._dispatch(lane, lanes, concurrency))
+            self._engine.submit(self._housekeeping())
+
+            logging.info(f"异步邮件队列已启动，各通道并发数 {self._lane_workers}")
+
+    def stop(self):
+        """停止调度协程(正在发送的邮件由租约机制保证不会丢失)"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._notify()
+            logging.info("异步邮件队列已停止")
+
+    def _notify(self):
+        """唤醒所有调度协程"""
+        self._engine.call_soon(self._set_events)
+
+    def _set_events(self):
+        """在事件循环线程中设置所有唤醒事件"""
+        for event in self._lane_events:
+            event.set()
+
+    async def _dispatch(self, lane: str, lanes: List[str], concurrency: int):
+        """
+        通道调度协程: 在并发上限内持续领取邮件，每封邮件一个发送任务
+
+        参数:
+            lane: 通道名称
+            lanes: 可领取的通道，按优先级排列
+            concurrency: 最大并发发送数
+        """
+        loop = asyncio.get_running_loop()
+        owner = f"{self._owner_prefix}:async-{lane}"
+        wakeup = asyncio.Event()
+        freed = asyncio.Event()
+        self._lane_events.append(wakeup)
+        in_flight = set()
+
+        def on_done(task):
+            in_flight.discard(task)
+            freed.set()
+
+        while self._running:
+            try:
+                free = concurrency - len(in_flight)
+                if free <= 0:
+                    freed.clear()
+                    await freed.wait()
+                    continue
+
+                tasks = await loop.run_in_executor(
+                    None, self._outbox.claim, owner, min(free, self.CLAIM_BATCH), lanes
+                )
+                if not tasks:
+                    wakeup.clear()
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), self.POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                for task in tasks:
+                    delivery = asyncio.ensure_future(self._deliver(task))
+                    in_flight.add(delivery)
+                    delivery.add_done_callback(on_done)
+            except Exception as e:
+                logging.error(f"邮件调度协程出现错误: {str(e)}", exc_info=True)
+                await asyncio.sleep(0.1)
+
+    async def _deliver(self, task: Dict):
+        """
+        发送一封已领取的邮件并记录结果
+
+        参数:
+            task: 从发件箱领取的邮件
+        """
+        loop = asyncio.get_running_loop()
+        self._record_wait(task["lane"], time.time() - task["created_at"])
+        self._hold_lease(task)
+        try:
+            result = await self._sender(
+                task["recipients"], task["subject"], task["content"], task["content_type"]
+            )
+            await loop.run_in_executor(None, self._finish_task, task, result)
+        except Exception as e:
+            logging.error(f"处理邮件任务时出错: {str(e)}", exc_info=True)
+            await loop.run_in_executor(
+                None,
+                self._outbox.retry_later,
+                task["id"],
+                task["owner"],
+                task["attempts"],
+                str(e),
+            )
+        finally:
+            self._release_lease(task)
+
+    async def _housekeeping(self):
+        """定期为发送中的邮件续约、处理其他进程完成的回调并清理发件箱"""
+        loop = asyncio.get_running_loop()
+        while self._running:
+            try:
+                await loop.run_in_executor(None, self._renew_leases)
+                await loop.run_in_executor(None, self._poll_callbacks)
+                await loop.run_in_executor(None, self._purge_if_due)
+            except Exception as e:
+                logging.error(f"邮件队列维护出错: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.POLL_INTERVAL)
@@ -1,15 +1,24 @@
 # 导入必要的标准库
 import os
+import asyncio
+import ssl
 import smtplib
-from email.message import EmailMessage
-from typing import Union, List, Dict, Callable, Any
-from dataclasses import dataclass
+from typing import Union, List, Dict, Callable, Any, Optional
+from dataclasses import dataclass, field
+from contextlib import contextmanager
 import logging
 import threading
 import queue
 import time
 from dotenv import load_dotenv
 import sys
+import socket
+
+from .outbox import MailOutbox
+from .quota_store import MailQuotaStore
+from .circuit_breaker import CircuitBreaker, HealthProber, order_accounts
+from .mail_templates import mail_templates
+from .mail_metrics import ACCOUNT_COUNTERS, LatencyHistogram, mail_metrics
 
 
 # 自定义异常 --------------------------------------------------
@@ -25,6 +34,10 @@ class DeliveryError(NotificationError):
     """邮件投递失败异常 - 当邮件无法发送到目标收件人时抛出"""
 
 
+class PoolExhaustedError(DeliveryError):
+    """连接池繁忙异常 - 当账户的连接全部被占用且等待超时时抛出(不代表账户故障)"""
+
+
 class ConfigurationError(NotificationError):
     """配置错误异常 - 当环境变量配置缺失或不正确时抛出"""
 
@@ -79,6 +92,47 @@ class MailPoolConfig:
             raise ConfigurationError("缺少SMTP_HOST环境变量配置，请检查.env文件")
 
         self.smtp_port = self._get_port()
+        # 是否使用SSL连接(默认使用；本地测试服务器可设置为0)
+        self.smtp_use_ssl = os.getenv("SMTP_USE_SSL", "1").lower() not in ("0", "false", "no")
+        # 校验服务器证书使用的CA文件(可选，例如本地模拟服务器的自签名证书)
+        self.smtp_ssl_cafile = os.getenv("SMTP_SSL_CAFILE") or None
+        # 连接回收策略: 单个连接最多发送的邮件数、最长空闲秒数
+        self.max_messages_per_connection = self._get_int(
+            "SMTP_MAX_MESSAGES_PER_CONNECTION", 100
+        )
+        self.max_idle_seconds = self._get_int("SMTP_MAX_IDLE_SECONDS", 60)
+        # 熔断策略: 连续失败多少次后熔断、熔断后多少秒再探测
+        self.breaker_failures = self._get_int("SMTP_BREAKER_FAILURES", 3)
+        self.breaker_cooldown = self._get_int("SMTP_BREAKER_COOLDOWN", 60)
+        # 每个账户最多同时保持的连接数
+        self.connections_per_account = self._get_int("SMTP_CONNECTIONS_PER_ACCOUNT", 3)
+        # 持久化发件箱: SQLite文件路径和最大投递次数
+        self.outbox_path = os.getenv(
+            "MAIL_OUTBOX_PATH", os.path.join(project_root, "mail_outbox.db")
+        )
+        self.max_attempts = self._get_int("MAIL_MAX_ATTEMPTS", 5)
+        # 共享验证码存储: SQLite文件路径(默认与发件箱放在同一目录)和每个验证码允许的失败次数
+        self.verification_code_path = os.getenv(
+            "VERIFICATION_CODE_PATH",
+            os.path.join(os.path.dirname(self.outbox_path), "verification_codes.db"),
+        )
+        self.verification_max_attempts = self._get_int("VERIFICATION_MAX_ATTEMPTS", 5)
+        # 各发送通道的专属工作线程数
+        self.lane_workers = {
+            "interactive": self._get_int("MAIL_WORKERS_INTERACTIVE", 2),
+            "transactional": self._get_int("MAIL_WORKERS_TRANSACTIONAL", 1),
+            "bulk": self._get_int("MAIL_WORKERS_BULK", 1),
+        }
+        # 发送引擎: threads(阻塞smtplib + 工作线程) 或 asyncio(单线程事件循环)
+        self.mail_backend = os.getenv("MAIL_BACKEND", "threads").lower()
+        if self.mail_backend not in ("threads", "asyncio"):
+            raise ConfigurationError("MAIL_BACKEND必须是threads或asyncio")
+        # asyncio 引擎下各通道的最大并发发送数
+        self.async_concurrency = {
+            "interactive": self._get_int("MAIL_ASYNC_CONCURRENCY_INTERACTIVE", 20),
+            "transactional": self._get_int("MAIL_ASYNC_CONCURRENCY_TRANSACTIONAL", 20),
+            "bulk": self._get_int("MAIL_ASYNC_CONCURRENCY_BULK", 10),
+        }
         self.accounts = self._load_accounts()  # 加载所有配置的邮箱账户
 
         # 如果没有找到任何可用账户，记录错误
@@ -94,6 +148,21 @@ class MailPoolConfig:
         except ValueError:
             raise ConfigurationError("SMTP_PORT必须是一个有效的整数")
 
+    def _get_int(self, key: str, default: int) -> int:
+        """
+        读取整数类型的可选配置
+
+        参数:
+            key: 环境变量名
+            default: 未配置时的默认值
+        返回:
+            配置值
+        """
+        try:
+            return int(os.getenv(key, default))
+        except ValueError:
+            raise ConfigurationError(f"{key}必须是一个有效的整数")
+
     def _create_example_env(self, project_root):
         """
         创建示例.env文件，为用户提供配置模板
@@ -155,7 +224,18 @@ class MailPoolConfig:
                 logging.warning(f"{priority_key} 应该是整数，使用默认值 1")
                 priority = 1
 
-            accounts.append(EmailAccount(address=user, password=pwd, priority=priority))
+            limit_key = f"EMAIL_DAILY_LIMIT_{idx}"
+            try:
+                daily_limit = int(os.getenv(limit_key, 50))
+            except ValueError:
+                logging.warning(f"{limit_key} 应该是整数，使用默认值 50")
+                daily_limit = 50
+
+            accounts.append(
+                EmailAccount(
+                    address=user, password=pwd, priority=priority, daily_limit=daily_limit
+                )
+            )
             logging.info(f"已加载邮箱账户: {user} (优先级: {priority})")
             idx += 1  # 递增索引以读取下一个账户
 
@@ -164,25 +244,130 @@ class MailPoolConfig:
 
 
 # 连接层 ------------------------------------------------------
+@dataclass
+class PooledConnection:
+    """
+    连接池中的单个SMTP连接及其状态
+    """
+
+    smtp: smtplib.SMTP_SSL  # SMTP连接
+    authenticated: bool = False  # 是否已完成登录
+    message_count: int = 0  # 该连接已发送的邮件数
+    last_used: float = 0.0  # 最近一次使用的时间(time.monotonic)
+    broken: bool = False  # 使用过程中出错，归还时关闭而不放回连接池
+
+
+class TokenBucket:
+    """
+    令牌桶 - 限制单个账户在滚动24小时内的发送量
+    容量为账户的每日发送限制，令牌按 容量/24小时 的速率持续补充；
+    桶的状态保存在共享的 MailQuotaStore 中，所有工作进程从同一个配额中扣除，重启后也不会重新补满
+    """
+
+    def __init__(self, store: MailQuotaStore, address: str, capacity: int):
+        """
+        初始化令牌桶(账户首次使用时为满桶)
+
+        参数:
+            store: 共享配额存储
+            address: 邮箱账户地址
+            capacity: 桶容量，即窗口内最多发送的邮件数
+        """
+        self.capacity = capacity
+        self._store = store
+        self._address = address
+
+    def try_acquire(self, count: int = 1) -> bool:
+        """
+        尝试取出令牌
+
+        参数:
+            count: 需要的令牌数
+        返回:
+            令牌是否足够(足够时已扣除)
+        """
+        return self._store.try_acquire(self._address, self.capacity, count)
+
+    def refund(self, count: int = 1) -> None:
+        """
+        退还令牌
+
+        参数:
+            count: 退还的令牌数
+        """
+        self._store.refund(self._address, self.capacity, count)
+
+    @property
+    def available(self) -> float:
+        """当前可用的令牌数"""
+        return self._store.available(self._address, self.capacity)
+
+
+@dataclass
+class AccountPool:
+    """
+    单个账户的连接集合: 空闲连接栈 + 限制连接总数的信号量 + 发送令牌桶
+    """
+
+    idle: queue.LifoQueue  # 空闲连接，后进先出以优先复用最近用过的连接
+    slots: threading.BoundedSemaphore  # 同时借出的连接数上限
+    bucket: TokenBucket  # 滚动24小时发送配额(所有工作进程共享)
+    sent: int = 0  # 累计发送数量(统计用)
+    lock: threading.Lock = field(default_factory=threading.Lock)  # 保护统计计数
+
+
 class ConnectionPool:
     """
-    轻量级连接池 - 管理和复用SMTP连接,避免频繁创建和关闭连接
+    多连接池 - 每个账户最多保持 N 个SMTP连接，多个工作线程可以并行发送
+    记录每个连接的登录状态，只有新建或重置的连接才需要登录；
+    连接在发送一定数量的邮件或空闲过久后回收。
+    借出/归还只操作账户自己的队列和信号量，不经过全局锁
     """
 
-    def __init__(self):
-        """初始化连接池和使用计数器"""
-        self._pool = {}  # 存储 {account.address: SMTP_SSL实例} 的字典
-        self._usage_counter = {}  # 每个账户的使用计数,用于实现发送限制
-        self._lock = threading.RLock()  # 添加锁以保护连接池的线程安全
+    # 空闲超过该秒数的连接在复用前先用NOOP检查是否仍然有效
+    NOOP_AFTER_SECONDS = 10
+
+    def __init__(
+        self,
+        quota_path: str,
+        max_messages: int = 100,
+        max_idle: float = 60,
+        connections_per_account: int = 3,
+        checkout_timeout: float = 30,
+    ):
+        """
+        初始化连接池
+
+        参数:
+            quota_path: 共享发送配额的SQLite文件路径
+            max_messages: 单个连接最多发送的邮件数，达到后关闭重建
+            max_idle: 连接最长空闲秒数，超过后关闭重建
+            connections_per_account: 每个账户最多同时保持的连接数
+            checkout_timeout: 等待可用连接的最长秒数
+        """
+        self._accounts = {}  # 存储 {account.address: AccountPool} 的字典
+        self._quota = MailQuotaStore(quota_path)
+        self._max_messages = max_messages
+        self._max_idle = max_idle
+        self._connections_per_account = connections_per_account
+        self._checkout_timeout = checkout_timeout
 
     def _create_connection(self, config: MailPoolConfig) -> smtplib.SMTP_SSL:
         """
         创建新的SMTP连接
         参数:config - 包含SMTP服务器配置的对象
-        返回:已配置的SMTP_SSL连接实例
+        返回:已配置的SMTP_SSL连接实例(SMTP_USE_SSL=0 时为普通SMTP连接)
         """
         try:
             logging.info(f"尝试连接到SMTP服务器: {config.smtp_host}:{config.smtp_port}")
+            if not config.smtp_use_ssl:
+                return smtplib.SMTP(config.smtp_host, config.smtp_port)
+            if config.smtp_ssl_cafile:
+                return smtplib.SMTP_SSL(
+                    config.smtp_host,
+                    config.smtp_port,
+                    context=ssl.create_default_context(cafile=config.smtp_ssl_cafile),
+                )
             return smtplib.SMTP_SSL(
                 config.smtp_host, config.smtp_port
             )  # 创建SSL安全连接
@@ -190,96 +375,256 @@ class ConnectionPool:
             logging.error(f"连接SMTP服务器失败: {e}")
             raise
 
-    def get_connection(
-        self, account: EmailAccount, config: MailPoolConfig
-    ) -> smtplib.SMTP_SSL:
+    def _account_pool(self, account: EmailAccount) -> AccountPool:
+        """
+        获取账户的连接集合，首次使用时创建(dict.setdefault 是原子操作，无需加锁)
+        参数:account - 邮箱账户
+        返回:账户的连接集合
+        """
+        pool = self._accounts.get(account.address)
+        if pool is None:
+            pool = self._accounts.setdefault(
+                account.address,
+                AccountPool(
+                    idle=queue.LifoQueue(),
+                    slots=threading.BoundedSemaphore(self._connections_per_account),
+                    bucket=TokenBucket(self._quota, account.address, account.daily_limit),
+                ),
+            )
+        return pool
+
+    @staticmethod
+    def _close(entry: PooledConnection) -> None:
+        """关闭连接，忽略关闭过程中的异常"""
+        try:
+            entry.smtp.quit()
+        except Exception:
+            pass
+
+    def _is_reusable(self, address: str, entry: PooledConnection) -> bool:
         """
-        获取指定账户的可用连接,如果不存在则创建新连接
+        判断空闲连接是否可以继续使用
+        参数:
+            address - 邮箱地址
+            entry - 空闲连接
+        返回:连接是否有效且未达到回收条件
+        """
+        idle = time.monotonic() - entry.last_used
+
+        if entry.message_count >= self._max_messages:
+            logging.info(f"连接 ({address}) 已发送 {entry.message_count} 封邮件，回收重建")
+            return False
+        if idle > self._max_idle:
+            logging.info(f"连接 ({address}) 已空闲 {idle:.0f} 秒，回收重建")
+            return False
+
+        # 刚用过的连接直接复用，空闲一段时间后才检查连接状态
+        if idle > self.NOOP_AFTER_SECONDS:
+            try:
+                # 尝试执行一个简单的SMTP命令来验证连接状态
+                entry.smtp.noop()
+            except Exception as e:
+                logging.info(f"检测到无效连接 ({address}): {str(e)}，正在重新创建...")
+                return False
+        return True
+
+    def available_quota(self, account: EmailAccount) -> int:
+        """
+        账户在滚动24小时窗口内剩余的发送配额
+        参数:account - 邮箱账户
+        """
+        return int(self._account_pool(account).bucket.available)
+
+    def has_quota(self, account: EmailAccount) -> bool:
+        """
+        账户在滚动24小时窗口内是否还有发送配额
+        参数:account - 邮箱账户
+        """
+        return self._account_pool(account).bucket.available >= 1
+
+    def acquire_quota(self, account: EmailAccount) -> bool:
+        """
+        为一封邮件扣除账户的发送配额
+        参数:account - 邮箱账户
+        返回:是否扣除成功(配额用尽时返回False)
+        """
+        return self._account_pool(account).bucket.try_acquire()
+
+    def release_quota(self, account: EmailAccount) -> None:
+        """
+        退还一封邮件的发送配额(连接断开或被服务器暂时拒绝，邮件没有发出，稍后会重试)
+        参数:account - 邮箱账户
+        """
+        self._account_pool(account).bucket.refund()
+
+    @contextmanager
+    def checkout(self, account: EmailAccount, config: MailPoolConfig):
+        """
+        借出指定账户一个已登录的连接，with 块结束后自动归还
+        with 块内抛出异常或连接被标记为 broken 时关闭该连接而不放回
+
         参数:
             account - 要使用的邮箱账户
             config - SMTP服务器配置
         返回:
-            可用的SMTP连接
+            PooledConnection(通过 .smtp 使用SMTP连接)
         抛出:
-            DeliveryError - 当账户达到每日发送限制时
+            PoolExhaustedError - 当等待可用连接超时时
+            DeliveryError - 当无法创建连接时
+            smtplib.SMTPAuthenticationError - 当登录失败时
         """
-        with self._lock:
-            # 如果该账户没有活跃连接,创建新连接
-            if account.address not in self._pool:
-                self._pool[account.address] = self._create_connection(config)
-                self._usage_counter[account.address] = 0
+        pool = self._account_pool(account)
+        if not pool.slots.acquire(timeout=self._checkout_timeout):
+            raise PoolExhaustedError(f"账户 {account.address} 的连接全部被占用")
 
-            # 检查连接是否仍然有效
-            try:
-                # 尝试执行一个简单的SMTP命令来验证连接状态
-                self._pool[account.address].noop()
-            except Exception as e:
-                logging.info(
-                    f"检测到无效连接 ({account.address}): {str(e)}，正在重新创建..."
-                )
+        entry = None
+        reused = False
+        try:
+            # 优先复用空闲连接，丢弃达到回收条件或失效的连接
+            while entry is None:
                 try:
-                    # 尝试关闭旧连接
-                    try:
-                        self._pool[account.address].quit()
-                    except:
-                        pass
-                    # 创建新连接
-                    self._pool[account.address] = self._create_connection(config)
+                    candidate = pool.idle.get_nowait()
+                except queue.Empty:
+                    break
+                if self._is_reusable(account.address, candidate):
+                    entry = candidate
+                    reused = True
+                else:
+                    self._close(candidate)
+
+            # 没有可用的空闲连接,创建新连接
+            if entry is None:
+                try:
+                    entry = PooledConnection(
+                        smtp=self._create_connection(config),
+                        last_used=time.monotonic(),
+                    )
                 except Exception as conn_error:
-                    logging.error(f"重新创建连接失败: {str(conn_error)}")
+                    logging.error(f"创建连接失败: {str(conn_error)}")
                     raise DeliveryError(f"无法创建SMTP连接: {str(conn_error)}")
 
-            # 检查账户是否达到发送限制
-            if self._usage_counter[account.address] >= account.daily_limit:
-                raise DeliveryError(f"Account {account.address} reached daily limit")
-
-            # 返回该账户的活跃连接
-            return self._pool[account.address]
+            # 只有新建或重置的连接需要登录
+            if not entry.authenticated:
+                logging.info(f"正在登录邮箱账户 {account.address}...")
+                entry.smtp.login(account.address, account.password)
+                entry.authenticated = True
+
+            mail_metrics.record_checkout(account.address, reused)
+            yield entry
+        except BaseException:
+            # 连接状态未知，关闭后由下次借出重新连接并登录
+            if entry is not None:
+                entry.broken = True
+            raise
+        finally:
+            if entry is not None:
+                if entry.broken:
+                    self._close(entry)
+                else:
+                    entry.last_used = time.monotonic()
+                    pool.idle.put(entry)
+            pool.slots.release()
+
+    def drain(self, account: EmailAccount):
+        """
+        关闭账户的所有空闲连接(账户熔断时调用)，下次借出时重新连接并登录
+        参数:account - 邮箱账户
+        """
+        pool = self._account_pool(account)
+        while True:
+            try:
+                self._close(pool.idle.get_nowait())
+            except queue.Empty:
+                break
 
-    def increment_usage(self, account: EmailAccount):
+    def increment_usage(self, account: EmailAccount, entry: PooledConnection = None):
         """
         增加账户的使用计数,在每次成功发送邮件后调用
-        参数:account - 要增加使用计数的账户
+        参数:
+            account - 要增加使用计数的账户
+            entry - 发送所用的连接(可选)
         """
-        with self._lock:
-            self._usage_counter[account.address] = (
-                self._usage_counter.get(account.address, 0) + 1
-            )
+        pool = self._account_pool(account)
+        with pool.lock:
+            pool.sent += 1
+        mail_metrics.record_sent(account.address)
+        if entry is not None:
+            entry.message_count += 1
+            entry.last_used = time.monotonic()
 
     def close_all(self):
         """
-        关闭所有连接,在程序结束时调用以释放资源
+        关闭所有空闲连接,在程序结束时调用以释放资源
         忽略关闭过程中可能出现的异常
         """
-        with self._lock:
-            for address, conn in self._pool.items():
+        for address, pool in list(self._accounts.items()):
+            logging.info(f"正在关闭与 {address} 的连接")
+            while True:
                 try:
-                    logging.info(f"正在关闭与 {address} 的连接")
-                    conn.quit()  # 尝试正常关闭连接
-                except:
-                    pass  # 忽略关闭过程中的异常
-            self._pool.clear()  # 清空连接池
+                    self._close(pool.idle.get_nowait())  # 尝试正常关闭连接
+                except queue.Empty:
+                    break
+        self._accounts.clear()  # 清空连接池
 
 
 # 任务队列层 --------------------------------------------------
 class MailQueue:
     """
-    邮件任务队列 - 管理邮件发送任务并使用工作线程处理
+    邮件任务队列 - 将邮件写入持久化发件箱(MailOutbox)，并使用工作线程领取发送
+    放入队列只是一次SQLite插入，不会因队列已满而阻塞请求线程；
+    进程重启后未完成的邮件由租约机制重新领取，不会丢失
+
+    邮件分为三个发送通道，每个通道有专属的工作线程:
+        interactive   - 验证码、找回密码等用户正在等待的邮件
+        transactional - 普通事务邮件(默认)
+        bulk          - 摘要、群发等批量邮件
+    工作线程优先领取更高优先级通道的邮件，但不会领取更低优先级通道的邮件，
+    因此批量邮件再多也不会占用 interactive 通道的工作线程
     """
 
-    def __init__(self, worker_count=3, queue_size=100):
+    # 没有到期邮件时的轮询间隔(秒)，其他进程写入的邮件最迟在该间隔后被领取
+    POLL_INTERVAL = 1.0
+    # 清理已发送记录的间隔(秒)
+    PURGE_INTERVAL = 3600
+
+    def __init__(
+        self,
+        outbox: MailOutbox,
+        sender: Callable,
+        lane_workers: Dict[str, int] = None,
+    ):
         """
         初始化邮件队列和工作线程
 
         参数:
-            worker_count: 工作线程数量
-            queue_size: 队列最大容量
+            outbox: 持久化发件箱
+            sender: 实际发送邮件的函数 (to, subject, content, content_type) -> 结果字典
+            lane_workers: 各通道的工作线程数量 {lane: count}
         """
-        self._queue = queue.Queue(maxsize=queue_size)
+        self._outbox = outbox
+        self._sender = sender
         self._workers = []
         self._running = False
-        self._worker_count = worker_count
+        self._lane_workers = lane_workers or {
+            "interactive": 2,
+            "transactional": 1,
+            "bulk": 1,
+        }
         self._lock = threading.RLock()
+        # 各通道的处理指标 {lane: {"processed": 数量, "wait_total": 累计排队秒数, "wait_max": 最长排队秒数}}
+        self._lane_metrics = {
+            lane: {"processed": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for lane in MailOutbox.LANES
+        }
+        self._wakeup = threading.Event()  # 本进程写入新邮件时唤醒工作线程
+        self._callbacks = {}  # {outbox_id: callback}，回调只能在本进程内执行
+        self._callback_lock = threading.Lock()
+        self._owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._last_purge = 0.0
+        # 本进程正在发送的邮件 {outbox_id: 租约持有者}，定期续约
+        self._leases = {}
+        self._lease_lock = threading.Lock()
+        self._last_renew = 0.0
 
     def start(self):
         """启动工作线程"""
@@ -290,27 +635,37 @@ class MailQueue:
             self._running = True
             self._workers = []
 
-            # 创建并启动工作线程
-            for i in range(self._worker_count):
-                worker = threading.Thread(
-                    target=self._worker_loop, name=f"MailWorker-{i}", daemon=True
-                )
-                worker.start()
-                self._workers.append(worker)
+            # 为每个通道创建并启动专属工作线程
+            for lane in MailOutbox.LANES:
+                # 可领取的通道: 本通道及所有更高优先级的通道，按优先级排列
+                lanes = list(MailOutbox.LANES[: MailOutbox.LANES.index(lane) + 1])
+                for i in range(self._lane_workers.get(lane, 0)):
+                    worker = threading.Thread(
+                        target=self._worker_loop,
+                        args=(lanes,),
+                        name=f"MailWorker-{lane}-{i}",
+                        daemon=True,
+                    )
+                    worker.start()
+                    self._workers.append(worker)
+
+            # 续约线程: 工作线程都在发送长批次时，租约也不会过期
+            renewer = threading.Thread(
+                target=self._renew_loop, name="MailLeaseRenewer", daemon=True
+            )
+            renewer.start()
+            self._workers.append(renewer)
 
-            logging.info(f"邮件队列已启动，使用 {self._worker_count} 个工作线程")
+            logging.info(f"邮件队列已启动，使用 {len(self._workers)} 个工作线程 {self._lane_workers}")
 
     def stop(self):
-        """停止所有工作线程"""
+        """停止所有工作线程(未发送的邮件保留在发件箱中)"""
         with self._lock:
             if not self._running:
                 return
 
             self._running = False
-
-            # 为每个工作线程添加停止信号
-            for _ in self._workers:
-                self._queue.put(None)
+            self._wakeup.set()
 
             # 等待所有工作线程完成
             for worker in self._workers:
@@ -320,41 +675,70 @@ class MailQueue:
             self._workers = []
             logging.info("邮件队列已停止")
 
-    def put(self, task):
+    def put(self, task) -> int:
         """
-        将任务添加到队列
+        将任务写入发件箱
 
         参数:
             task: 包含任务信息的字典
+        返回:
+            发件箱记录ID
         """
         if not self._running:
             self.start()
 
-        self._queue.put(task)
+        recipients = [task["to"]] if isinstance(task["to"], str) else list(task["to"])
+        outbox_id = self._outbox.enqueue(
+            recipients,
+            task["subject"],
+            task["content"],
+            task["content_type"],
+            lane=task.get("lane", "transactional"),
+        )
+        if task.get("callback"):
+            with self._callback_lock:
+                self._callbacks[outbox_id] = task["callback"]
+
+        self._notify()
+        return outbox_id
+
+    def _notify(self):
+        """通知工作线程有新邮件写入"""
+        self._wakeup.set()
+
+    def _worker_loop(self, lanes: List[str]):
+        """
+        工作线程的主循环
 
-    def _worker_loop(self):
-        """工作线程的主循环"""
+        参数:
+            lanes: 该线程可领取的通道，按优先级排列
+        """
+        owner = f"{self._owner_prefix}:{threading.current_thread().name}"
         while self._running:
             try:
-                # 从队列获取任务
-                task = self._queue.get(block=True, timeout=1.0)
-
-                # 检查是否是停止信号
-                if task is None:
-                    self._queue.task_done()
-                    break
+                # 以租约方式领取一封到期的邮件
+                tasks = self._outbox.claim(owner, limit=1, lanes=lanes)
+                if not tasks:
+                    # 空闲时处理其他进程完成的回调，然后等待新邮件
+                    self._poll_callbacks()
+                    self._purge_if_due()
+                    self._wakeup.wait(self.POLL_INTERVAL)
+                    self._wakeup.clear()
+                    continue
 
+                task = tasks[0]
+                self._hold_lease(task)
                 try:
                     # 执行任务
                     self._execute_task(task)
                 except Exception as e:
                     logging.error(f"处理邮件任务时出错: {str(e)}", exc_info=True)
+                    self._outbox.retry_later(
+                        task["id"], task["owner"], task["attempts"], str(e)
+                    )
                 finally:
-                    self._queue.task_done()
+                    self._release_lease(task)
 
-            except queue.Empty:
-                # 队列为空，继续等待
-                continue
             except Exception as e:
                 logging.error(f"邮件工作线程出现错误: {str(e)}", exc_info=True)
                 # 短暂暂停以避免CPU占用过高
@@ -365,19 +749,161 @@ class MailQueue:
         执行邮件发送任务
 
         参数:
-            task: 包含任务信息的字典
+            task: 从发件箱领取的邮件
         """
-        # 解包任务信息
-        notifier = task["notifier"]
-        to = task["to"]
-        subject = task["subject"]
-        content = task["content"]
-        content_type = task["content_type"]
-        callback = task.get("callback")
+        self._record_wait(task["lane"], time.time() - task["created_at"])
 
         # 执行发送
-        result = notifier._send_sync(to, subject, content, content_type)
+        result = self._sender(
+            task["recipients"], task["subject"], task["content"], task["content_type"]
+        )
+        self._finish_task(task, result)
+
+    def _finish_task(self, task, result: Dict):
+        """
+        根据发送结果完成邮件、安排重试或进入死信，并执行回调
 
+        参数:
+            task: 从发件箱领取的邮件
+            result: 发送结果字典
+        """
+        recipients = task["recipients"]
+        # 所有账户都无法投递的收件人需要稍后重试；被拒收等明确的失败不再重试
+        handled = set(result["success"]) | set(result["failed"])
+        pending = [r for r in recipients if r not in handled]
+        # 合并之前各次投递的结果，重试、死信和完成时保存的都是这封邮件的完整结果
+        previous = task.get("result") or {}
+        result = {
+            "success": previous.get("success", []) + result["success"],
+            "failed": {**previous.get("failed", {}), **result["failed"]},
+        }
+        if pending:
+            error = "; ".join(str(v) for v in result["failed"].values()) or "没有可用的邮箱账户"
+            if self._outbox.retry_later(
+                task["id"],
+                task["owner"],
+                task["attempts"],
+                error,
+                recipients=pending,
+                result=result,
+            ):
+                return
+            for email in pending:
+                result["failed"].setdefault(email, error)
+        else:
+            if not self._outbox.complete(task["id"], task["owner"], result):
+                # 租约已被其他工作线程接管，回调由接管者完成后执行
+                return
+            mail_metrics.record_latency(task["lane"], time.time() - task["created_at"])
+
+        self._run_callback(task["id"], result)
+
+    def _hold_lease(self, task):
+        """记录本进程开始发送的邮件，由续约线程定期延长其租约"""
+        with self._lease_lock:
+            self._leases[task["id"]] = task["owner"]
+
+    def _release_lease(self, task):
+        """邮件处理结束后不再续约"""
+        with self._lease_lock:
+            self._leases.pop(task["id"], None)
+
+    def _renew_leases(self):
+        """每隔租约时长的三分之一，为本进程正在发送的邮件续约"""
+        now = time.time()
+        if now - self._last_renew < self._outbox.lease_seconds / 3:
+            return
+        self._last_renew = now
+        with self._lease_lock:
+            leases = dict(self._leases)
+        if leases:
+            renewed = self._outbox.renew(leases)
+            if renewed < len(leases):
+                logging.warning(f"{len(leases) - renewed} 封邮件的租约已被其他工作线程接管")
+
+    def _renew_loop(self):
+        """续约线程的主循环"""
+        while self._running:
+            time.sleep(self.POLL_INTERVAL)
+            try:
+                self._renew_leases()
+            except Exception as e:
+                logging.error(f"邮件租约续约失败: {str(e)}")
+
+    def get_status(self, outbox_id: int) -> Optional[Dict]:
+        """
+        查询邮件的发送状态
+
+        参数:
+            outbox_id: 发件箱记录ID
+        返回:
+            {"status", "result", "error"}，记录不存在(或已被清理)时返回None
+        """
+        return self._outbox.get_status(outbox_id)
+
+    def _record_wait(self, lane: str, wait: float):
+        """
+        记录邮件从写入到开始发送的排队时间
+
+        参数:
+            lane: 发送通道
+            wait: 排队秒数(包含重试等待)
+        """
+        with self._lock:
+            metrics = self._lane_metrics.setdefault(
+                lane, {"processed": 0, "wait_total": 0.0, "wait_max": 0.0}
+            )
+            metrics["processed"] += 1
+            metrics["wait_total"] += wait
+            metrics["wait_max"] = max(metrics["wait_max"], wait)
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        获取各通道的队列深度和处理指标
+
+        返回:
+            {lane: {"pending", "sending", "dead", "oldest_age", "workers", "processed", "avg_wait", "max_wait"}}
+            oldest_age 为最早一封待发送邮件已等待的秒数，没有待发送邮件时为0
+        """
+        depth = self._outbox.depth()
+        oldest = self._outbox.oldest_pending()
+        now = time.time()
+        stats = {}
+        with self._lock:
+            for lane in MailOutbox.LANES:
+                metrics = self._lane_metrics[lane]
+                processed = metrics["processed"]
+                stats[lane] = {
+                    **depth.get(lane, {}),
+                    "oldest_age": round(now - oldest[lane], 3) if lane in oldest else 0.0,
+                    "workers": self._lane_workers.get(lane, 0),
+                    "processed": processed,
+                    "avg_wait": round(metrics["wait_total"] / processed, 3)
+                    if processed
+                    else 0.0,
+                    "max_wait": round(metrics["wait_max"], 3),
+                }
+        return stats
+
+    def pending_recipients(self) -> int:
+        """
+        获取发件箱中尚未发送完的收件人总数(每个收件人占用一个配额令牌)
+
+        返回:
+            收件人数
+        """
+        return self._outbox.pending_recipients()
+
+    def _run_callback(self, outbox_id: int, result: Dict):
+        """
+        执行并移除邮件的回调函数(如果由本进程注册)
+
+        参数:
+            outbox_id: 发件箱记录ID
+            result: 发送结果字典
+        """
+        with self._callback_lock:
+            callback = self._callbacks.pop(outbox_id, None)
         # 如果提供了回调函数，调用它
         if callback:
             try:
@@ -385,6 +911,32 @@ class MailQueue:
             except Exception as e:
                 logging.error(f"执行回调函数时出错: {str(e)}", exc_info=True)
 
+    def _poll_callbacks(self):
+        """检查由其他进程发送完成的邮件，执行本进程注册的回调"""
+        with self._callback_lock:
+            outbox_ids = list(self._callbacks)
+        if not outbox_ids:
+            return
+
+        for outbox_id, final in self._outbox.get_final_results(outbox_ids).items():
+            result = final["result"] or {"success": [], "failed": {}}
+            if final["status"] == MailOutbox.DEAD and not result["failed"]:
+                result["failed"]["outbox"] = final["error"]
+            self._run_callback(outbox_id, result)
+
+    def _purge_if_due(self):
+        """定期清理已发送的发件箱记录"""
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        try:
+            purged = self._outbox.purge_sent()
+            if purged:
+                logging.info(f"已清理 {purged} 条已发送的发件箱记录")
+        except Exception as e:
+            logging.error(f"清理发件箱失败: {str(e)}")
+
 
 # 业务逻辑层 --------------------------------------------------
 class MailNotifier:
@@ -399,6 +951,9 @@ class MailNotifier:
     _logger = None
     _initialized = False
     _mail_queue = None
+    _breakers = None
+    _prober = None
+    _engine = None
 
     def __new__(cls):
         """实现单例模式"""
@@ -428,11 +983,58 @@ class MailNotifier:
                 extra={"account": "system"},
             )
 
-            MailNotifier._pool = ConnectionPool()
+            MailNotifier._pool = ConnectionPool(
+                quota_path=self.config.outbox_path,
+                max_messages=self.config.max_messages_per_connection,
+                max_idle=self.config.max_idle_seconds,
+                connections_per_account=self.config.connections_per_account,
+            )
 
-            # 初始化邮件队列
-            MailNotifier._mail_queue = MailQueue(worker_count=3)
+            # 每个账户一个熔断器，已熔断的账户由后台线程探测恢复
+            MailNotifier._breakers = {
+                account.address: CircuitBreaker(
+                    account.address,
+                    failure_threshold=self.config.breaker_failures,
+                    cooldown=self.config.breaker_cooldown,
+                )
+                for account in self.config.accounts
+            }
+            MailNotifier._prober = HealthProber(self.breakers, probe=self._probe_account)
+            MailNotifier._prober.start()
+
+            # 初始化持久化发件箱和邮件队列
+            outbox = MailOutbox(
+                self.config.outbox_path, max_attempts=self.config.max_attempts
+            )
+            if self.config.mail_backend == "asyncio":
+                # 只有选择 asyncio 引擎时才导入，避免循环导入
+                from .async_engine import AsyncConnectionPool, AsyncMailEngine, AsyncMailQueue
+
+                MailNotifier._engine = AsyncMailEngine(
+                    AsyncConnectionPool(
+                        self.config.smtp_host,
+                        self.config.smtp_port,
+                        use_ssl=self.config.smtp_use_ssl,
+                        ssl_cafile=self.config.smtp_ssl_cafile,
+                        max_messages=self.config.max_messages_per_connection,
+                        max_idle=self.config.max_idle_seconds,
+                        connections_per_account=self.config.connections_per_account,
+                    )
+                )
+                MailNotifier._mail_queue = AsyncMailQueue(
+                    outbox,
+                    sender=self._send_async,
+                    engine=self._engine,
+                    lane_workers=self.config.async_concurrency,
+                )
+            else:
+                MailNotifier._mail_queue = MailQueue(
+                    outbox, sender=self._send_sync, lane_workers=self.config.lane_workers
+                )
             MailNotifier._mail_queue.start()
+            self.logger.info(
+                f"邮件发送引擎: {self.config.mail_backend}", extra={"account": "system"}
+            )
 
             MailNotifier._initialized = True
 
@@ -464,6 +1066,11 @@ class MailNotifier:
         """获取连接池"""
         return MailNotifier._pool
 
+    @property
+    def breakers(self):
+        """获取各账户的熔断器 {邮箱地址: CircuitBreaker}"""
+        return MailNotifier._breakers
+
     @property
     def mail_queue(self):
         """获取邮件队列"""
@@ -496,9 +1103,10 @@ class MailNotifier:
         content: str,  # 邮件内容
         content_type: str = "plain",  # 内容类型,默认为纯文本
         callback: Callable[[Dict], Any] = None,  # 可选的回调函数
-    ) -> None:
+        lane: str = "transactional",  # 发送通道
+    ) -> int:
         """
-        将邮件发送任务添加到队列（非阻塞）
+        将邮件发送任务写入持久化发件箱（非阻塞）
 
         参数:
             to - 收件人地址(字符串)或地址列表
@@ -506,18 +1114,90 @@ class MailNotifier:
             content - 邮件内容
             content_type - 内容类型("plain"或"html")
             callback - 可选的回调函数，接收结果字典作为参数
+            lane - 发送通道("interactive"、"transactional"或"bulk")
+
+        返回:
+            发件箱记录ID
         """
         # 创建任务并添加到队列
         task = {
-            "notifier": self,
             "to": to,
             "subject": subject,
             "content": content,
             "content_type": content_type,
             "callback": callback,
+            "lane": lane,
         }
 
-        self.mail_queue.put(task)
+        return self.mail_queue.put(task)
+
+    def get_status(self, outbox_id: int) -> Optional[Dict]:
+        """
+        查询 send 返回的发件箱记录的发送状态（只读取一行，适合轮询）
+
+        参数:
+            outbox_id - send 返回的发件箱记录ID
+
+        返回:
+            {"status": "pending"/"sending"/"sent"/"dead", "result": 结果字典, "error": 失败原因}，
+            记录不存在时返回None
+        """
+        return self.mail_queue.get_status(outbox_id)
+
+    def stats(self) -> Dict:
+        """
+        获取邮件系统的运行指标
+
+        返回:
+            {
+                "backend": 发送引擎,
+                "pid": 进程ID(计数器只统计本进程),
+                "lanes": {lane: 队列深度、最早待发送邮件的等待秒数、排队时间和入队到发送完成的耗时直方图},
+                "accounts": {邮箱地址: 发送/失败/登录失败计数、连接复用率、剩余配额和熔断器状态},
+                "connections": 全部账户的连接复用汇总,
+                "templates": 邮件骨架缓存统计,
+            }
+        """
+        metrics = mail_metrics.snapshot()
+        lanes = self.mail_queue.stats()
+        for lane in lanes:
+            lanes[lane]["latency"] = metrics["latency"].get(lane) or LatencyHistogram().snapshot()
+
+        accounts = {}
+        for account in self.config.accounts:
+            counters = metrics["accounts"].get(account.address) or {
+                **dict.fromkeys(ACCOUNT_COUNTERS, 0),
+                "reuse_ratio": 0.0,
+            }
+            accounts[account.address] = {
+                **counters,
+                "quota_available": self.pool.available_quota(account),
+                "breaker": self.breakers[account.address].snapshot(),
+            }
+
+        return {
+            "backend": self.config.mail_backend,
+            "pid": os.getpid(),
+            "lanes": lanes,
+            "accounts": accounts,
+            "connections": metrics["connections"],
+            "templates": mail_templates.stats(),
+        }
+
+    def send_budget(self, reserve: int = 0) -> int:
+        """
+        计算现在还可以写入发件箱的批量邮件数: 所有账户的剩余配额减去发件箱中待发送的收件人数和保留配额
+        摘要、群发等批量任务按该值分批写入，不会用光验证码等邮件所需的配额；
+        一封群发分块有多个收件人，发送时每个收件人消耗一个令牌，因此按收件人而不是按邮件数扣除
+
+        参数:
+            reserve - 为其他邮件保留的配额
+        返回:
+            可写入的邮件数(不小于0)
+        """
+        available = sum(self.pool.available_quota(a) for a in self.config.accounts)
+        pending = self.mail_queue.pending_recipients()
+        return max(0, available - pending - reserve)
 
     def send_sync(
         self,
@@ -538,8 +1218,108 @@ class MailNotifier:
         返回:
             包含发送结果的字典
         """
+        if self._engine is not None:
+            return self._engine.run(self._send_async(to, subject, content, content_type))
         return self._send_sync(to, subject, content, content_type)
 
+    def _probe_account(self, address: str) -> None:
+        """
+        探测已熔断的账户: 丢弃旧连接后重新连接并登录，失败时抛出异常
+
+        参数:
+            address - 邮箱地址
+        """
+        account = next(a for a in self.config.accounts if a.address == address)
+        self.pool.drain(account)
+        with self.pool.checkout(account, self.config) as pooled:
+            pooled.smtp.noop()
+
+    def _on_account_failure(self, account: EmailAccount, started: float) -> None:
+        """
+        记录账户级失败，触发熔断时关闭该账户的空闲连接
+
+        参数:
+            account - 邮箱账户
+            started - 本次尝试开始的时间(time.monotonic)
+        """
+        mail_metrics.record_account_error(account.address)
+        if self.breakers[account.address].record_failure(time.monotonic() - started):
+            self.pool.drain(account)
+            if self._engine is not None:
+                self._engine.pool.drain(account)
+
+    @staticmethod
+    def _build_message(
+        account: EmailAccount,
+        email: str,
+        subject: str,
+        content: str,
+        content_type: str,
+        eight_bit: bool = True,
+    ) -> bytes:
+        """
+        为单个收件人生成邮件字节
+        同一 (内容, 主题, 发件账户) 的头部和正文只编码一次，之后每封邮件只替换收件人和模板参数
+
+        参数:
+            account - 发件账户
+            email - 收件人地址
+            subject - 邮件主题
+            content - 邮件内容(模板邮件为JSON格式的模板参数)
+            content_type - 内容类型("plain"、"html"或"template:<模板名称>")
+            eight_bit - 服务器是否支持8BITMIME
+        返回:
+            邮件字节
+        """
+        return mail_templates.build(
+            f"Notification System <{account.address}>",
+            email,
+            subject,
+            content,
+            content_type,
+            eight_bit=eight_bit,
+        )
+
+    def _recipient_error(
+        self, account: EmailAccount, email: str, error: Exception, result: Dict
+    ) -> bool:
+        """
+        处理发送给单个收件人时的错误
+        服务器返回5xx永久拒绝(收件人、发件人或DATA被拒，内容或策略问题换账户也不会成功)
+        或邮件生成失败等与服务器无关的错误记为该收件人失败；
+        4xx临时拒绝(通常是账户被限流)属于账户级错误，收件人保持未处理，由下一个账户或发件箱稍后重试
+
+        参数:
+            account - 邮箱账户
+            email - 收件人地址
+            error - 发送时抛出的异常
+            result - 发送结果字典(永久失败时写入 failed)
+        返回:
+            是否为账户级错误(调用方停止使用该账户并计入熔断)
+        """
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            temporary = any(code < 500 for code, _ in error.recipients.values())
+        elif isinstance(error, smtplib.SMTPResponseException):
+            # 发件人或DATA被拒: 4xx为临时拒绝(通常是账户被限流)，5xx为内容或策略的永久拒绝
+            temporary = error.smtp_code < 500
+        else:
+            temporary = False
+
+        if temporary:
+            self.logger.warning(
+                f"发送给 {email} 时被服务器暂时拒绝 ({str(error)})，剩余收件人改用其他账户",
+                extra={"account": account.address},
+            )
+            return True
+
+        result["failed"][email] = str(error)
+        mail_metrics.record_failed(account.address)
+        self.logger.warning(
+            f"发送给 {email} 失败 ({str(error)})",
+            extra={"account": account.address},
+        )
+        return False
+
     def _send_sync(self, to, subject, content, content_type):
         """
         同步发送邮件的核心逻辑
@@ -563,70 +1343,87 @@ class MailNotifier:
             )
             return result
         # 按优先级尝试不同账户
-        for account in self.config.accounts:
+        # 跳过已熔断的账户，同优先级的账户按健康评分排列
+        for account in order_accounts(self.config.accounts, self.breakers):
+            # 滚动24小时配额已用尽的账户直接跳过
+            if not self.pool.has_quota(account):
+                self.logger.warning(
+                    f"账户 {account.address} 已达到发送限制，跳过",
+                    extra={"account": account.address},
+                )
+                continue
+
+            started = time.monotonic()
+            sent_before = len(result["success"])
+            disconnected = False
+            throttled = False
             try:
-                # 获取SMTP连接并登录
+                # 借出已登录的SMTP连接(只有新建或重置的连接才会登录)
                 self.logger.info(
                     f"尝试使用账户 {account.address} 发送邮件",
                     extra={"account": account.address},
                 )
-                conn = self.pool.get_connection(account, self.config)
-
-                try:
+                with self.pool.checkout(account, self.config) as pooled:
+                    # 记录开始发送的日志
                     self.logger.info(
-                        f"正在登录邮箱账户 {account.address}...",
+                        f"准备发送邮件给 {len(recipients)} 位收件人",
                         extra={"account": account.address},
                     )
-                    conn.login(account.address, account.password)
-                except smtplib.SMTPAuthenticationError as auth_error:
-                    self.logger.error(
-                        f"邮箱账户认证失败: {str(auth_error)}",
-                        extra={"account": account.address},
-                    )
-                    result["failed"][
-                        "authentication"
-                    ] = f"账户 {account.address} 认证失败: {str(auth_error)}"
-                    continue
-
-                # 记录开始发送的日志
-                self.logger.info(
-                    f"准备发送邮件给 {len(recipients)} 位收件人",
-                    extra={"account": account.address},
-                )
 
-                # 发送给所有未成功的收件人
-                remaining = [r for r in recipients if r not in result["success"]]
-                for email in remaining:
-                    try:
-                        # 为每个收件人创建一个新的邮件对象
-                        msg = EmailMessage()
-                        msg.set_content(content, subtype=content_type)
-                        msg["Subject"] = subject
-                        msg["From"] = f"Notification System <{account.address}>"
-                        msg["To"] = email  # 设置收件人
-
-                        conn.send_message(msg)  # 发送邮件
-                        result["success"].append(email)  # 记录成功
-                        self.pool.increment_usage(account)  # 增加使用计数
-                        # 记录成功发送的日志
-                        self.logger.info(
-                            f"成功发送邮件给 {email}",
-                            extra={"account": account.address},
-                        )
-                    except smtplib.SMTPRecipientsRefused as e:
-                        # 记录收件人被拒绝的错误
-                        result["failed"][email] = str(e)
-                        self.logger.warning(
-                            f"发送给 {email} 失败 ({str(e)})",
-                            extra={"account": account.address},
-                        )
-                    except Exception as e:
-                        # 捕获并记录其他可能的发送错误
-                        result["failed"][email] = str(e)
-                        self.logger.warning(
-                            f"发送给 {email} 时出错: {str(e)}",
-                            extra={"account": account.address},
-                        )
+                    # 发送给所有未成功的收件人
+                    remaining = [r for r in recipients if r not in result["success"]]
+                    for email in remaining:
+                        # 每封邮件消耗一个令牌，用尽后剩余收件人由下一个账户发送
+                        if not self.pool.acquire_quota(account):
+                            self.logger.warning(
+                                f"账户 {account.address} 已达到发送限制",
+                                extra={"account": account.address},
+                            )
+                            break
+                        try:
+                            # 为每个收件人创建一个新的邮件对象
+                            eight_bit = pooled.smtp.has_extn("8bitmime")
+                            data = self._build_message(
+                                account, email, subject, content, content_type, eight_bit
+                            )
+                            pooled.smtp.sendmail(
+                                account.address,
+                                [email],
+                                data,
+                                mail_options=["BODY=8BITMIME"] if eight_bit else [],
+                            )  # 发送邮件
+                            result["success"].append(email)  # 记录成功
+                            self.pool.increment_usage(account, pooled)  # 增加使用计数
+                            # 记录成功发送的日志
+                            self.logger.info(
+                                f"成功发送邮件给 {email}",
+                                extra={"account": account.address},
+                            )
+                        except smtplib.SMTPServerDisconnected as e:
+                            # 连接已断开，归还时关闭该连接，剩余收件人由下一个账户重试
+                            pooled.broken = True
+                            disconnected = True
+                            self.pool.release_quota(account)  # 邮件没有发出，退还令牌
+                            self.logger.warning(
+                                f"发送给 {email} 时连接断开: {str(e)}",
+                                extra={"account": account.address},
+                            )
+                            break
+                        except Exception as e:
+                            # 5xx永久拒绝记为该收件人失败；4xx临时拒绝(限流等)换下一个账户
+                            if self._recipient_error(account, email, e, result):
+                                throttled = True
+                                self.pool.release_quota(account)  # 邮件没有发出，退还令牌
+                                break
+
+                # 更新账户健康状态: 有邮件发出算成功，连接断开或被服务器暂时拒绝算失败
+                sent = len(result["success"]) - sent_before
+                if disconnected or throttled:
+                    self._on_account_failure(account, started)
+                elif sent:
+                    self.breakers[account.address].record_success(
+                        (time.monotonic() - started) / sent
+                    )
 
                 # 如果所有收件人都已处理（无论成功或失败）,退出循环
                 if set(result["success"] + list(result["failed"].keys())) == set(
@@ -634,16 +1431,23 @@ class MailNotifier:
                 ):
                     break
 
-            except smtplib.SMTPAuthenticationError:
-                # 记录认证失败的错误
+            except PoolExhaustedError as e:
+                # 连接池繁忙不是账户故障，不计入熔断
+                self.logger.warning(str(e), extra={"account": account.address})
+            except smtplib.SMTPAuthenticationError as auth_error:
+                mail_metrics.record_auth_failure(account.address)
+                self._on_account_failure(account, started)
+                # 记录认证失败的错误，继续尝试下一个账户
                 self.logger.error(
-                    "认证失败",
+                    f"邮箱账户认证失败: {str(auth_error)}",
                     extra={"account": account.address},
-                    exc_info=True,  # 包含异常堆栈
                 )
-                # 继续尝试下一个账户
+                result["failed"][
+                    "authentication"
+                ] = f"账户 {account.address} 认证失败: {str(auth_error)}"
             except smtplib.SMTPException as e:
-                # 记录其他SMTP错误
+                self._on_account_failure(account, started)
+                # 记录其他SMTP错误(出错的连接已在归还时关闭)
                 self.logger.error(
                     f"SMTP错误: {str(e)}",
                     extra={"account": account.address},
@@ -651,6 +1455,7 @@ class MailNotifier:
                 )
                 # 继续尝试下一个账户
             except Exception as e:
+                self._on_account_failure(account, started)
                 # 捕获并记录所有其他可能的错误
                 self.logger.error(
                     f"发送邮件时出现未预期错误: {str(e)}",
@@ -667,6 +1472,113 @@ class MailNotifier:
 
         return result  # 返回发送结果
 
+    async def _send_async(self, to, subject, content, content_type):
+        """
+        异步发送邮件的核心逻辑(asyncio 引擎)，账户选择、配额和熔断与 _send_sync 相同，
+        等待SMTP响应时让出事件循环，多封邮件可以同时发送
+        参数:
+            to - 收件人地址或地址列表
+            subject - 邮件主题
+            content - 邮件内容
+            content_type - 内容类型
+        返回:
+            包含发送结果的字典
+        """
+        recipients = [to] if isinstance(to, str) else to
+        result = {"success": [], "failed": {}}
+        if not recipients:
+            return result
+        # 配额保存在共享的SQLite文件中，读写可能等待其他进程的写锁，放到线程池执行，不阻塞事件循环
+        loop = asyncio.get_running_loop()
+
+        # 跳过已熔断的账户，同优先级的账户按健康评分排列
+        for account in order_accounts(self.config.accounts, self.breakers):
+            if not await loop.run_in_executor(None, self.pool.has_quota, account):
+                self.logger.warning(
+                    f"账户 {account.address} 已达到发送限制，跳过",
+                    extra={"account": account.address},
+                )
+                continue
+
+            started = time.monotonic()
+            sent_before = len(result["success"])
+            disconnected = False
+            throttled = False
+            try:
+                async with self._engine.pool.checkout(account) as pooled:
+                    remaining = [r for r in recipients if r not in result["success"]]
+                    for email in remaining:
+                        # 每封邮件消耗一个令牌，用尽后剩余收件人由下一个账户发送
+                        if not await loop.run_in_executor(None, self.pool.acquire_quota, account):
+                            break
+                        try:
+                            eight_bit = "8BITMIME" in pooled.smtp.extensions
+                            data = self._build_message(
+                                account, email, subject, content, content_type, eight_bit
+                            )
+                            await pooled.smtp.sendmail(account.address, email, data, eight_bit)
+                            result["success"].append(email)
+                            self.pool.increment_usage(account, pooled)
+                        except smtplib.SMTPServerDisconnected as e:
+                            # 连接已断开，剩余收件人由下一个账户重试
+                            pooled.broken = True
+                            disconnected = True
+                            # 邮件没有发出，退还令牌
+                            await loop.run_in_executor(None, self.pool.release_quota, account)
+                            self.logger.warning(
+                                f"发送给 {email} 时连接断开: {str(e)}",
+                                extra={"account": account.address},
+                            )
+                            break
+                        except Exception as e:
+                            if self._recipient_error(account, email, e, result):
+                                throttled = True
+                                # 邮件没有发出，退还令牌
+                                await loop.run_in_executor(None, self.pool.release_quota, account)
+                                break
+
+                # 更新账户健康状态: 有邮件发出算成功，连接断开或被服务器暂时拒绝算失败
+                sent = len(result["success"]) - sent_before
+                if disconnected or throttled:
+                    self._on_account_failure(account, started)
+                elif sent:
+                    self.breakers[account.address].record_success(
+                        (time.monotonic() - started) / sent
+                    )
+
+                if set(result["success"] + list(result["failed"].keys())) == set(
+                    recipients
+                ):
+                    break
+
+            except PoolExhaustedError as e:
+                # 连接池繁忙不是账户故障，不计入熔断
+                self.logger.warning(str(e), extra={"account": account.address})
+            except smtplib.SMTPAuthenticationError as auth_error:
+                mail_metrics.record_auth_failure(account.address)
+                self._on_account_failure(account, started)
+                self.logger.error(
+                    f"邮箱账户认证失败: {str(auth_error)}",
+                    extra={"account": account.address},
+                )
+                result["failed"][
+                    "authentication"
+                ] = f"账户 {account.address} 认证失败: {str(auth_error)}"
+            except Exception as e:
+                self._on_account_failure(account, started)
+                self.logger.error(
+                    f"发送邮件时出错: {str(e)}",
+                    extra={"account": account.address},
+                )
+
+        if not result["success"] and len(self.config.accounts) > 0:
+            self.logger.error(
+                "所有邮箱账户都无法发送邮件，请检查配置和网络连接",
+                extra={"account": "system"},
+            )
+
+        return result
+
     @classmethod
     def close(cls):
         """关闭所有连接和工作线程,释放资源"""
@@ -677,6 +1589,15 @@ class MailNotifier:
             if cls._mail_queue:
                 cls._mail_queue.stop()
 
+            # 停止熔断探测线程
+            if cls._prober:
+                cls._prober.stop()
+
+            # 停止异步发送引擎
+            if cls._engine:
+                cls._engine.stop()
+                cls._engine = None
+
             # 关闭所有SMTP连接
             cls._pool.close_all()
             cls._initialized = False
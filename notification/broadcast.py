@@ -0,0 +1,390 @@
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, update, func, exists
+
+from database import db, User, Course, Material, EmailBroadcast, EmailBroadcastChunk
+from .base import MailNotifier
+
+logger = logging.getLogger(__name__)
+
+
+class EmailBroadcastSender:
+    """
+    管理员群发邮件 - 在后台线程中把群发分块写入发件箱，Web请求只创建一条群发记录
+
+    工作方式:
+    1. 目标用户按ID顺序每 chunk_size 个分为一块，每块作为一封多收件人邮件写入发件箱的 bulk 通道，
+       由 MailNotifier 在各账户的配额内逐个收件人发送
+    2. 每次写入的收件人数不超过所有账户的剩余配额减去待发送邮件和保留配额，配额不足时等待令牌桶补充；
+       配额(mail_quota 表)和发件箱都由所有工作进程共享，持有租约的进程看到的就是全局的剩余量
+    3. 分块和游标先提交到数据库再写入发件箱，进程重启后从游标继续，尚未写入发件箱的分块会重新写入
+    4. 多个工作进程通过群发记录上的租约保证同一时间只有一个进程处理同一个群发
+    5. 后台线程定期查询各分块在发件箱中的累计投递结果，同步到分块和群发记录的 sent/failed，管理页面据此显示进度
+    """
+
+    # 每次处理最多占用的秒数(租约时长为其两倍)
+    TICK_SECONDS = 60
+    # 有群发正在发送时的检查间隔(秒)
+    POLL_INTERVAL = 5
+    # 没有群发或配额不足时的检查间隔(秒)
+    IDLE_INTERVAL = 60
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """实现单例模式"""
+        if cls._instance is None:
+            cls._instance = super(EmailBroadcastSender, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """初始化群发任务"""
+        if self._initialized:
+            return
+
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()  # 本进程创建群发时唤醒后台线程
+        self._initialized = True
+
+    # 调度 ----------------------------------------------------------
+    def start(self, app) -> None:
+        """
+        启动后台群发线程
+
+        参数:
+            app: Flask应用对象
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._schedule_loop,
+                args=(app,),
+                name="EmailBroadcast",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _schedule_loop(self, app):
+        """群发线程的主循环"""
+        while True:
+            delay = self.IDLE_INTERVAL
+            try:
+                with app.app_context():
+                    try:
+                        delay = self.run_once(app)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                logger.error(f"群发邮件任务执行失败: {str(e)}", exc_info=True)
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    # 创建与取消 ----------------------------------------------------
+    def create(
+        self,
+        subject: str,
+        content: str,
+        creator_id: int,
+        segment: str = "all",
+        department_id: Optional[int] = None,
+        content_type: str = "plain",
+    ) -> EmailBroadcast:
+        """
+        创建群发(只写入一条记录，由后台线程发送)
+
+        参数:
+            subject: 邮件主题
+            content: 邮件正文
+            creator_id: 创建者ID
+            segment: 目标人群("all"、"admin"或"department")
+            department_id: 目标学院ID(segment 为 department 时必填)
+            content_type: 正文类型("plain"或"html")
+        返回:
+            创建的群发记录
+        抛出:
+            ValueError - 参数无效时
+        """
+        if segment not in EmailBroadcast.SEGMENTS:
+            raise ValueError(f"无效的目标人群: {segment}")
+        if segment == "department" and not department_id:
+            raise ValueError("按学院群发时必须选择学院")
+        if content_type not in ("plain", "html"):
+            raise ValueError(f"无效的正文类型: {content_type}")
+
+        broadcast = EmailBroadcast(
+            subject=subject.strip(),
+            content=content,
+            content_type=content_type,
+            segment=segment,
+            department_id=department_id if segment == "department" else None,
+            created_by=creator_id,
+        )
+        broadcast.total = db.session.execute(
+            select(func.count()).select_from(self._recipients(broadcast).subquery())
+        ).scalar()
+        try:
+            db.session.add(broadcast)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        self._wakeup.set()
+        return broadcast
+
+    def cancel(self, broadcast_id: int) -> bool:
+        """
+        取消群发，已写入发件箱的分块仍会投递
+
+        参数:
+            broadcast_id: 群发记录ID
+        返回:
+            是否取消成功(已完成的群发不能取消)
+        """
+        result = db.session.execute(
+            update(EmailBroadcast)
+            .where(
+                EmailBroadcast.id == broadcast_id,
+                EmailBroadcast.status.in_(("pending", "sending")),
+            )
+            .values(status="cancelled", finished_at=datetime.now())
+        )
+        db.session.commit()
+        return result.rowcount > 0
+
+    # 执行 ----------------------------------------------------------
+    def run_once(self, app) -> float:
+        """
+        领取一个未完成的群发，更新投递进度并在配额内继续写入分块
+
+        参数:
+            app: Flask应用对象(读取群发配置)
+        返回:
+            距下一次处理的秒数
+        """
+        broadcast = self._claim()
+        if broadcast is None:
+            return self.IDLE_INTERVAL
+
+        throttled = False
+        try:
+            self._refresh_chunks(broadcast)
+            self._enqueue_orphans(broadcast)
+            throttled = self._enqueue_chunks(
+                broadcast,
+                chunk_size=app.config.get("NOTIFICATION_BROADCAST_CHUNK_SIZE", 50),
+                reserve=app.config.get("NOTIFICATION_BROADCAST_QUOTA_RESERVE", 20),
+            )
+            self._finish_if_done(broadcast)
+        finally:
+            # 释放租约，下一次处理可以由任意进程领取
+            db.session.rollback()
+            db.session.execute(
+                update(EmailBroadcast)
+                .where(EmailBroadcast.id == broadcast.id)
+                .values(lease_until=0)
+            )
+            db.session.commit()
+        return self.IDLE_INTERVAL if throttled else self.POLL_INTERVAL
+
+    def _claim(self) -> Optional[EmailBroadcast]:
+        """
+        以租约方式领取最早创建的未完成群发
+
+        返回:
+            领取到的群发，没有可领取的群发时返回None
+        """
+        now = int(time.time())
+        candidates = db.session.execute(
+            select(EmailBroadcast.id)
+            .where(
+                EmailBroadcast.status.in_(("pending", "sending")),
+                EmailBroadcast.lease_until < now,
+            )
+            .order_by(EmailBroadcast.id)
+        ).scalars().all()
+        for broadcast_id in candidates:
+            result = db.session.execute(
+                update(EmailBroadcast)
+                .where(
+                    EmailBroadcast.id == broadcast_id,
+                    EmailBroadcast.status.in_(("pending", "sending")),
+                    EmailBroadcast.lease_until < now,
+                )
+                .values(lease_until=now + 2 * self.TICK_SECONDS, status="sending")
+            )
+            db.session.commit()
+            if result.rowcount:
+                return db.session.get(EmailBroadcast, broadcast_id)
+        return None
+
+    @staticmethod
+    def _recipients(broadcast: EmailBroadcast):
+        """
+        群发目标用户的查询(按用户ID排列)
+
+        参数:
+            broadcast: 群发记录
+        返回:
+            select(User.id, User.email)
+        """
+        stmt = select(User.id, User.email).where(User.is_email_verified.is_(True))
+        if broadcast.segment == "admin":
+            stmt = stmt.where(User.is_admin.is_(True))
+        elif broadcast.segment == "department":
+            stmt = stmt.where(
+                exists()
+                .where(Material.user_id == User.id)
+                .where(Material.course_id == Course.id)
+                .where(Course.department_id == broadcast.department_id)
+            )
+        return stmt.order_by(User.id)
+
+    def _enqueue_chunks(self, broadcast: EmailBroadcast, chunk_size: int, reserve: int) -> bool:
+        """
+        在配额内继续分块写入发件箱
+
+        参数:
+            broadcast: 群发记录
+            chunk_size: 每个分块的收件人数
+            reserve: 为验证码等邮件保留的配额
+        返回:
+            是否因配额不足而暂停
+        """
+        budget = MailNotifier().send_budget(reserve)
+        deadline = time.monotonic() + self.TICK_SECONDS
+        while time.monotonic() < deadline:
+            # 提交后重新读取状态，管理员可能已在其他请求中取消
+            if broadcast.status != "sending":
+                return False
+            limit = min(chunk_size, budget)
+            if limit <= 0:
+                return True
+            rows = db.session.execute(
+                self._recipients(broadcast).where(User.id > broadcast.cursor).limit(limit)
+            ).all()
+            if not rows:
+                return False
+
+            # 先提交分块和游标，再写入发件箱
+            chunk = EmailBroadcastChunk(
+                broadcast_id=broadcast.id,
+                first_user_id=broadcast.cursor,
+                last_user_id=rows[-1][0],
+                recipients=len(rows),
+            )
+            db.session.add(chunk)
+            broadcast.cursor = rows[-1][0]
+            broadcast.enqueued += len(rows)
+            db.session.commit()
+
+            self._enqueue(broadcast, chunk, [email for _, email in rows])
+            budget -= len(rows)
+        return False
+
+    def _enqueue_orphans(self, broadcast: EmailBroadcast) -> None:
+        """重新写入上次已记录、但在写入发件箱之前进程就退出的分块"""
+        # 没有找到收件人的分块已直接结束(status 不是 pending，outbox_id 仍为空)，不再重复处理
+        orphans = broadcast.chunks.filter(
+            EmailBroadcastChunk.status == "pending",
+            EmailBroadcastChunk.outbox_id.is_(None),
+        ).all()
+        for chunk in orphans:
+            logger.warning(f"群发 #{broadcast.id} 的分块 #{chunk.id} 未写入发件箱，重新写入")
+            self._enqueue(broadcast, chunk)
+
+    def _enqueue(
+        self, broadcast: EmailBroadcast, chunk: EmailBroadcastChunk, emails: List[str] = None
+    ) -> None:
+        """
+        把一个分块作为一封多收件人邮件写入发件箱
+
+        参数:
+            broadcast: 群发记录
+            chunk: 分块
+            emails: 收件人(可选，默认按分块的用户ID范围重新查询)
+        """
+        if emails is None:
+            emails = [
+                email
+                for _, email in db.session.execute(
+                    self._recipients(broadcast).where(
+                        User.id > chunk.first_user_id, User.id <= chunk.last_user_id
+                    )
+                )
+            ]
+        if not emails:
+            chunk.status = "sent"
+            chunk.failed = chunk.recipients
+            broadcast.failed += chunk.recipients
+        else:
+            chunk.outbox_id = MailNotifier().send(
+                to=emails,
+                subject=broadcast.subject,
+                content=broadcast.content,
+                content_type=broadcast.content_type,
+                lane="bulk",
+            )
+        db.session.commit()
+
+    def _refresh_chunks(self, broadcast: EmailBroadcast) -> None:
+        """
+        查询等待投递结果的分块，把投递进度计入群发记录
+        发件箱保存每封邮件各次投递累计的结果，投递过程中已成功的收件人数每次都同步到分块上，
+        发件箱记录之后被清理也不会丢失已知的结果
+        """
+        notifier = MailNotifier()
+        chunks = broadcast.chunks.filter(
+            EmailBroadcastChunk.status == "pending",
+            EmailBroadcastChunk.outbox_id.isnot(None),
+        ).all()
+        for chunk in chunks:
+            status = notifier.get_status(chunk.outbox_id)
+            if status is None:
+                # 发件箱记录已被清理，无法确认的收件人不能算作成功，计为失败
+                logger.warning(
+                    f"群发 #{broadcast.id} 的分块 #{chunk.id} 的发件箱记录已不存在，"
+                    f"{chunk.recipients - chunk.sent} 位收件人的投递结果未知，计为失败"
+                )
+                chunk.status = "lost"
+                sent, failed = chunk.sent, chunk.recipients - chunk.sent
+            else:
+                sent = min(chunk.recipients, len((status["result"] or {}).get("success", [])))
+                if status["status"] in ("sent", "dead"):
+                    # 投递结束: 没有成功的收件人都是失败
+                    chunk.status = status["status"]
+                    failed = chunk.recipients - sent
+                else:
+                    failed = chunk.failed
+            broadcast.sent += sent - chunk.sent
+            broadcast.failed += failed - chunk.failed
+            chunk.sent, chunk.failed = sent, failed
+        db.session.commit()
+
+    def _finish_if_done(self, broadcast: EmailBroadcast) -> None:
+        """所有目标用户都已分块且所有分块都有投递结果时，标记群发完成"""
+        if broadcast.status != "sending":
+            return
+        remaining = db.session.execute(
+            self._recipients(broadcast).where(User.id > broadcast.cursor).limit(1)
+        ).first()
+        unfinished = broadcast.chunks.filter(EmailBroadcastChunk.status == "pending").count()
+        if remaining is None and unfinished == 0:
+            broadcast.status = "done"
+            broadcast.finished_at = datetime.now()
+            db.session.commit()
+            logger.info(
+                f"群发 #{broadcast.id} 完成: 成功 {broadcast.sent}，失败 {broadcast.failed}"
+            )
+
+
+# 创建全局群发任务实例
+broadcast_sender = EmailBroadcastSender()
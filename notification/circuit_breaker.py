@@ -0,0 +1,193 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, List
+
+
+class CircuitBreaker:
+    """
+    单个邮箱账户的熔断器和健康评分
+
+    状态:
+        closed    - 正常使用
+        open      - 连续失败达到阈值，发送时直接跳过该账户
+        half_open - 冷却时间已过，由后台探测线程尝试连接和登录，成功后恢复为 closed
+    健康评分由最近的成功率和平均耗时(指数加权移动平均)计算，用于同优先级账户之间排序
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # 指数加权移动平均的平滑系数
+    EWMA_ALPHA = 0.2
+    # 耗时的参考值(秒)，平均耗时等于该值时评分减半
+    REFERENCE_LATENCY = 2.0
+
+    def __init__(self, address: str, failure_threshold: int = 3, cooldown: float = 60):
+        """
+        初始化熔断器
+
+        参数:
+            address: 邮箱地址
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断后等待多少秒再探测
+        """
+        self.address = address
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.success_rate = 1.0  # 成功率的加权平均
+        self.latency = 0.0  # 耗时的加权平均(秒)
+        self._lock = threading.Lock()
+
+    @property
+    def score(self) -> float:
+        """健康评分，范围 0~1，越大越健康"""
+        return self.success_rate / (1 + self.latency / self.REFERENCE_LATENCY)
+
+    def allow(self) -> bool:
+        """发送时是否可以使用该账户(只有 closed 状态可以)"""
+        return self.state == self.CLOSED
+
+    def due_for_probe(self) -> bool:
+        """
+        熔断冷却时间是否已过，需要探测(进入 half_open 状态)
+
+        返回:
+            是否应当由调用方执行一次探测
+        """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self, latency: float) -> None:
+        """
+        记录一次成功
+
+        参数:
+            latency: 本次操作耗时(秒)
+        """
+        with self._lock:
+            self._update(1.0, latency)
+            self.consecutive_failures = 0
+            if self.state != self.CLOSED:
+                logging.info(f"邮箱账户 {self.address} 已恢复，熔断关闭")
+            self.state = self.CLOSED
+
+    def record_failure(self, latency: float = 0.0) -> bool:
+        """
+        记录一次失败，连续失败达到阈值或探测失败时熔断
+
+        参数:
+            latency: 本次操作耗时(秒)
+        返回:
+            本次失败是否触发了熔断
+        """
+        with self._lock:
+            self._update(0.0, latency)
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED
+                and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                logging.warning(
+                    f"邮箱账户 {self.address} 连续失败 {self.consecutive_failures} 次，熔断 {self.cooldown} 秒"
+                )
+                return True
+            return False
+
+    def _update(self, success: float, latency: float) -> None:
+        """更新成功率和耗时的加权平均"""
+        self.success_rate += self.EWMA_ALPHA * (success - self.success_rate)
+        self.latency += self.EWMA_ALPHA * (latency - self.latency)
+
+    def snapshot(self) -> Dict:
+        """获取熔断器状态快照"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "success_rate": round(self.success_rate, 3),
+                "latency": round(self.latency, 3),
+                "score": round(self.score, 3),
+            }
+
+
+class HealthProber:
+    """
+    后台探测线程 - 定期检查已熔断的账户，冷却时间过后尝试连接和登录
+    发送路径从不为熔断的账户付出连接和认证失败的代价
+    """
+
+    def __init__(
+        self,
+        breakers: Dict[str, CircuitBreaker],
+        probe: Callable[[str], None],
+        interval: float = 5,
+    ):
+        """
+        初始化探测线程
+
+        参数:
+            breakers: {邮箱地址: 熔断器}
+            probe: 探测函数，接收邮箱地址，失败时抛出异常
+            interval: 检查间隔(秒)
+        """
+        self._breakers = breakers
+        self._probe = probe
+        self._interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """启动探测线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, name="MailHealthProber", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止探测线程"""
+        self._stop.set()
+
+    def _loop(self) -> None:
+        """探测线程的主循环"""
+        while not self._stop.wait(self._interval):
+            for address, breaker in list(self._breakers.items()):
+                if not breaker.due_for_probe():
+                    continue
+                started = time.monotonic()
+                try:
+                    self._probe(address)
+                except Exception as e:
+                    logging.info(f"探测邮箱账户 {address} 失败: {str(e)}")
+                    breaker.record_failure(time.monotonic() - started)
+                else:
+                    breaker.record_success(time.monotonic() - started)
+
+
+def order_accounts(accounts: List, breakers: Dict[str, CircuitBreaker]) -> List:
+    """
+    按 (优先级, 健康评分) 排列可用账户，跳过已熔断的账户；
+    所有账户都已熔断时退回按评分排列的全部账户
+
+    参数:
+        accounts: 按优先级排序的账户列表
+        breakers: {邮箱地址: 熔断器}
+    返回:
+        本次发送应依次尝试的账户列表
+    """
+    available = [a for a in accounts if breakers[a.address].allow()]
+    if not available:
+        return sorted(accounts, key=lambda a: -breakers[a.address].score)
+    return sorted(available, key=lambda a: (a.priority, -breakers[a.address].score))
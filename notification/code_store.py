@@ -0,0 +1,226 @@
+import os
+import hmac
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class VerificationCodeStore:
+    """
+    共享验证码存储 - 基于独立的SQLite文件，所有工作进程共享
+
+    工作方式:
+    1. 每个邮箱只保存最新的一个验证码，只存储加盐的SHA-256摘要，不保存明文
+    2. 验证在一个写事务中完成: 过期、匹配(可选地同时删除)、失败计数三种结果对所有进程一致，
+       同一个验证码不会被两个进程同时验证通过
+    3. 失败次数达到上限后验证码作废，防止穷举6位验证码
+    4. 过期清理使用哈希时间轮: 每条记录按过期时刻落入 wheel_size 个槽位之一，
+       写入时顺带推进时间轮，只删除经过的槽位中已过期的记录，不需要扫描全部验证码，也不需要清理线程
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 5,
+        tick_seconds: int = 60,
+        wheel_size: int = 64,
+    ):
+        """
+        初始化验证码存储
+
+        参数:
+            path: SQLite数据库文件路径
+            max_attempts: 每个验证码允许的最大失败次数
+            tick_seconds: 时间轮每个槽位对应的秒数
+            wheel_size: 时间轮的槽位数(有效期超过一圈的记录在之后的轮次删除)
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.tick_seconds = tick_seconds
+        self.wheel_size = wheel_size
+        self._local = threading.local()  # 每个线程独立的SQLite连接
+        self._tables_ready = False
+
+    # 连接 ----------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的SQLite连接(fork 之后的子进程重新连接)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")  # 读写互不阻塞
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+            if not self._tables_ready:
+                self._create_tables(conn)
+                self._tables_ready = True
+        return conn
+
+    def _create_tables(self, conn: sqlite3.Connection) -> None:
+        """创建验证码表和时间轮状态表"""
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS verification_code (
+                email TEXT PRIMARY KEY,
+                salt BLOB NOT NULL,
+                code_hash BLOB NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                expire_at REAL NOT NULL,
+                slot INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_verification_code_slot
+                ON verification_code (slot);
+            CREATE TABLE IF NOT EXISTS verification_code_wheel (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                last_tick INTEGER NOT NULL
+            );
+            """
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO verification_code_wheel (id, last_tick) VALUES (1, ?)",
+            (int(time.time() // self.tick_seconds) - 1,),
+        )
+
+    @staticmethod
+    def _digest(salt: bytes, email: str, code: str) -> bytes:
+        """计算验证码摘要(绑定邮箱，摘要不能挪用到其他邮箱)"""
+        return hashlib.sha256(salt + email.encode() + b"\0" + code.encode()).digest()
+
+    # 读写 ----------------------------------------------------------
+    def put(self, email: str, code: str, ttl: float) -> None:
+        """
+        保存验证码，覆盖该邮箱之前的验证码并清零失败次数
+
+        参数:
+            email: 用户邮箱
+            code: 验证码明文
+            ttl: 有效期(秒)
+        """
+        now = time.time()
+        expire_at = now + ttl
+        salt = os.urandom(16)
+        self._connect().execute(
+            """
+            INSERT OR REPLACE INTO verification_code
+                (email, salt, code_hash, attempts, expire_at, slot, created_at)
+            VALUES (?, ?, ?, 0, ?, ?, ?)
+            """,
+            (
+                email,
+                salt,
+                self._digest(salt, email, code),
+                expire_at,
+                int(expire_at // self.tick_seconds) % self.wheel_size,
+                now,
+            ),
+        )
+        self.advance(now)
+
+    def check(self, email: str, code: str, consume: bool = False) -> bool:
+        """
+        验证验证码，失败时增加失败次数，达到上限后作废
+
+        参数:
+            email: 用户邮箱
+            code: 用户提交的验证码
+            consume: 验证通过时是否同时删除验证码(防止重复使用)
+        返回:
+            验证是否通过
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT salt, code_hash, attempts, expire_at FROM verification_code WHERE email = ?",
+                (email,),
+            ).fetchone()
+            if row is None:
+                ok = False
+            elif time.time() > row["expire_at"]:
+                conn.execute("DELETE FROM verification_code WHERE email = ?", (email,))
+                ok = False
+            elif hmac.compare_digest(row["code_hash"], self._digest(row["salt"], email, code)):
+                if consume:
+                    conn.execute("DELETE FROM verification_code WHERE email = ?", (email,))
+                ok = True
+            else:
+                if row["attempts"] + 1 >= self.max_attempts:
+                    conn.execute("DELETE FROM verification_code WHERE email = ?", (email,))
+                    logger.warning(f"验证码失败次数过多，已作废: {email}")
+                else:
+                    conn.execute(
+                        "UPDATE verification_code SET attempts = attempts + 1 WHERE email = ?",
+                        (email,),
+                    )
+                ok = False
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ok
+
+    def delete(self, email: str) -> None:
+        """
+        删除邮箱的验证码
+
+        参数:
+            email: 用户邮箱
+        """
+        self._connect().execute("DELETE FROM verification_code WHERE email = ?", (email,))
+
+    # 时间轮 --------------------------------------------------------
+    def advance(self, now: Optional[float] = None) -> int:
+        """
+        推进时间轮，删除已经走过的槽位中过期的验证码
+        last_tick 是最后一个已清理的完整槽位，多个进程同时推进时，只有成功更新它的进程负责清理这段时间
+
+        参数:
+            now: 当前时间(可选，默认 time.time())
+        返回:
+            删除的验证码数
+        """
+        now = time.time() if now is None else now
+        tick = int(now // self.tick_seconds) - 1  # 只清理已经结束的槽位
+        conn = self._connect()
+        last_tick = conn.execute(
+            "SELECT last_tick FROM verification_code_wheel WHERE id = 1"
+        ).fetchone()[0]
+        if tick <= last_tick:
+            return 0
+        claimed = conn.execute(
+            "UPDATE verification_code_wheel SET last_tick = ? WHERE id = 1 AND last_tick = ?",
+            (tick, last_tick),
+        ).rowcount
+        if not claimed:
+            return 0
+
+        # 间隔超过一圈时每个槽位都要清理
+        first = max(last_tick + 1, tick - self.wheel_size + 1)
+        slots = [t % self.wheel_size for t in range(first, tick + 1)]
+        placeholders = ",".join("?" * len(slots))
+        removed = conn.execute(
+            f"DELETE FROM verification_code WHERE slot IN ({placeholders}) AND expire_at <= ?",
+            (*slots, now),
+        ).rowcount
+        if removed:
+            logger.debug(f"时间轮清理了 {removed} 个过期验证码")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取存储统计
+
+        返回:
+            {"codes": 保存的验证码数, "expired": 其中已过期但尚未清理的数量}
+        """
+        row = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(expire_at <= ?), 0) FROM verification_code",
+            (time.time(),),
+        ).fetchone()
+        return {"codes": row[0], "expired": row[1]}
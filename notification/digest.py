@@ -0,0 +1,548 @@
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update, func, exists
+from sqlalchemy.orm import aliased
+
+from database import (
+    db,
+    User,
+    Course,
+    Material,
+    Notification,
+    NotificationReceipt,
+    NotificationState,
+    EmailPreference,
+)
+from .base import MailNotifier
+from .mail_templates import MailTemplate, mail_templates, TEMPLATE_PREFIX
+from .retention import acquire_lease, load_metrics, record_metrics
+
+logger = logging.getLogger(__name__)
+
+# 每日摘要: 一封邮件列出收件人所有未读的关注上传
+FOLLOWER_DIGEST_TEMPLATE = MailTemplate(
+    "follower_digest",
+    subject="关注动态摘要 - PKUHUB",
+    body="""${username}，您好!
+
+您关注的用户最近上传了 ${count} 份新资料:
+
+${items}
+${more}
+登录 PKUHUB 查看详情。如需调整邮件通知方式，请在"编辑个人资料 - 邮件通知"中设置。
+
+本邮件由系统自动发送，请勿回复
+""",
+    content_type="plain",
+)
+mail_templates.register(FOLLOWER_DIGEST_TEMPLATE)
+
+# 立即通知: 每次上传一封邮件
+FOLLOWER_UPLOAD_TEMPLATE = MailTemplate(
+    "follower_upload",
+    subject="关注的用户上传了新资料 - PKUHUB",
+    body="""${username}，您好!
+
+${item}
+
+登录 PKUHUB 查看详情。如需调整邮件通知方式，请在"编辑个人资料 - 邮件通知"中设置。
+
+本邮件由系统自动发送，请勿回复
+""",
+    content_type="plain",
+)
+mail_templates.register(FOLLOWER_UPLOAD_TEMPLATE)
+
+
+class FollowerDigestJob:
+    """
+    关注上传邮件任务 - 按用户偏好把关注的用户上传资料的提醒发送到邮箱
+
+    工作方式:
+    1. 上传资料时扇出线程已为每位粉丝写入未读的关注者通知回执，这些回执就是待发送的事件
+    2. 偏好为 immediate 的粉丝在扇出时立即收到一封邮件，同样受剩余配额和保留配额限制，
+       超出配额的粉丝不推进 last_digest_id，留给下一次摘要合并发送
+    3. 偏好为 daily 的粉丝(以及有被推迟通知的 immediate 粉丝)由后台线程每个周期合并发送一封摘要，
+       只包含仍未读且未发送过的通知
+    4. 摘要按用户分批写入发件箱的 bulk 通道，每个周期的发送量不超过邮箱账户的剩余配额
+       (并为验证码等邮件保留一部分)，超出的用户留到稍后的周期
+    5. 每个用户的 last_digest_id 记录已发送到的通知ID，邮件数量随活跃用户数增长，而不是随 上传数x粉丝数 增长；
+       先提交推进后的 last_digest_id 再写入发件箱，进程在两步之间退出时最多漏发一次，不会重复发送
+    6. 运行指标写入 notification_state 表，所有工作进程共享
+    """
+
+    LEASE_KEY = "digest_lease"
+    METRICS_PREFIX = "digest"
+    # 后台线程检查是否到期的间隔(秒)
+    POLL_INTERVAL = 600
+    # 配额不足时，剩余用户在该秒数后重试
+    RETRY_SECONDS = 3600
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """实现单例模式"""
+        if cls._instance is None:
+            cls._instance = super(FollowerDigestJob, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """初始化摘要任务"""
+        if self._initialized:
+            return
+
+        self._thread = None
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    # 调度 ----------------------------------------------------------
+    def start(self, app) -> None:
+        """
+        启动后台摘要线程
+
+        参数:
+            app: Flask应用对象
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._schedule_loop,
+                args=(app,),
+                name="FollowerDigest",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _schedule_loop(self, app):
+        """摘要线程的主循环: 定期检查租约，到期的进程执行一次"""
+        interval = app.config.get("NOTIFICATION_DIGEST_INTERVAL", 86400)
+        # 启动后稍作等待，避免与应用初始化争用数据库
+        time.sleep(60)
+        while True:
+            try:
+                with app.app_context():
+                    try:
+                        if acquire_lease(self.LEASE_KEY, interval):
+                            run_metrics = self.run_once(app)
+                            if run_metrics["deferred"]:
+                                self._reschedule(self.RETRY_SECONDS)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                logger.error(f"关注摘要任务执行失败: {str(e)}", exc_info=True)
+            time.sleep(min(interval, self.POLL_INTERVAL))
+
+    def _reschedule(self, seconds: int) -> None:
+        """
+        把下一次执行提前到指定秒数之后
+
+        参数:
+            seconds: 距下一次执行的秒数
+        """
+        db.session.execute(
+            update(NotificationState)
+            .where(NotificationState.key == self.LEASE_KEY)
+            .values(value=int(time.time()) + seconds)
+        )
+        db.session.commit()
+
+    # 执行 ----------------------------------------------------------
+    def run_once(self, app) -> Dict:
+        """
+        为所有偏好为 daily(或 immediate 但有被推迟的通知)且有未发送通知的用户写入一封摘要邮件
+
+        参数:
+            app: Flask应用对象(读取摘要配置)
+        返回:
+            本次执行的指标 {"digests": 写入的摘要数, "deferred": 是否因配额不足留下了用户}
+        """
+        default_mode = app.config.get("NOTIFICATION_DIGEST_DEFAULT", "off")
+        batch_size = app.config.get("NOTIFICATION_DIGEST_BATCH_SIZE", 100)
+        max_items = app.config.get("NOTIFICATION_DIGEST_MAX_ITEMS", 20)
+        budget = MailNotifier().send_budget(
+            app.config.get("NOTIFICATION_DIGEST_QUOTA_RESERVE", 20)
+        )
+        started = time.monotonic()
+
+        digests = 0
+        deferred = False
+        cursor = 0  # 按用户ID分批
+        while True:
+            limit = min(batch_size, budget - digests)
+            if limit <= 0:
+                # 配额不足，检查是否还有等待摘要的用户
+                deferred = bool(self._digest_candidates(default_mode, cursor, 1))
+                break
+            candidates = self._digest_candidates(default_mode, cursor, limit)
+            if not candidates:
+                break
+            digests += self._send_digests(candidates, default_mode, max_items)
+            cursor = candidates[-1]["user_id"]
+
+        elapsed = time.monotonic() - started
+        run_metrics = {
+            "digests": digests,
+            "deferred": deferred,
+            "budget": budget,
+            "elapsed_seconds": round(elapsed, 3),
+        }
+        try:
+            record_metrics(
+                self.METRICS_PREFIX,
+                totals={"runs": 1, "digests_total": digests},
+                latest={
+                    "last_run_at": int(time.time()),
+                    "last_digests": digests,
+                    "last_deferred": int(deferred),
+                    "last_budget": budget,
+                    "last_elapsed_ms": int(elapsed * 1000),
+                },
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"记录关注摘要任务指标失败: {str(e)}")
+
+        logger.info(
+            f"关注摘要任务完成: 写入 {digests} 封摘要，"
+            f"{'配额不足，剩余用户稍后发送，' if deferred else ''}耗时 {elapsed:.2f}s"
+        )
+        return run_metrics
+
+    @staticmethod
+    def _mode_filter(mode: str, default_mode: str):
+        """邮件发送方式等于 mode 的条件(没有偏好记录的用户使用默认方式)"""
+        return func.coalesce(EmailPreference.follower_uploads, default_mode) == mode
+
+    @staticmethod
+    def _emailed_filter(default_mode: str):
+        """
+        需要通过摘要发送邮件的用户: 偏好为 daily 的用户，以及偏好为 immediate 的用户
+        (immediate 用户的 last_digest_id 在即时发送时已推进，只有因配额不足被推迟的通知会进入摘要)
+        """
+        return func.coalesce(EmailPreference.follower_uploads, default_mode).in_(
+            ("daily", "immediate")
+        )
+
+    def _digest_candidates(self, default_mode: str, after_user_id: int, limit: int) -> List[Dict]:
+        """
+        查询需要发送摘要的用户
+
+        参数:
+            default_mode: 默认发送方式
+            after_user_id: 只查询ID大于该值的用户
+            limit: 最多返回的用户数
+        返回:
+            [{"user_id", "username", "email", "count", "last_id"}]，按用户ID排列
+        """
+        rows = db.session.execute(
+            select(
+                User.id,
+                User.username,
+                User.email,
+                func.count(NotificationReceipt.id),
+                func.max(NotificationReceipt.notification_id),
+            )
+            .join(NotificationReceipt, NotificationReceipt.user_id == User.id)
+            .join(Notification, Notification.id == NotificationReceipt.notification_id)
+            .outerjoin(EmailPreference, EmailPreference.user_id == User.id)
+            .where(
+                User.id > after_user_id,
+                User.is_email_verified.is_(True),
+                self._emailed_filter(default_mode),
+                Notification.target_role == "followers",
+                NotificationReceipt.read.is_(False),
+                NotificationReceipt.notification_id
+                > func.coalesce(EmailPreference.last_digest_id, 0),
+            )
+            .group_by(User.id)
+            .order_by(User.id)
+            .limit(limit)
+        ).all()
+        return [
+            {
+                "user_id": user_id,
+                "username": username,
+                "email": email,
+                "count": count,
+                "last_id": last_id,
+            }
+            for user_id, username, email, count, last_id in rows
+        ]
+
+    @staticmethod
+    def _format_item(title: str, uploader: Optional[str], course: Optional[str], created_at) -> str:
+        """格式化摘要中的一条上传记录"""
+        line = f"- {uploader or '已注销用户'} 上传了《{title}》"
+        if course:
+            line += f"（{course}）"
+        return f"{line} {created_at.strftime('%m-%d %H:%M')}"
+
+    def _upload_items(self, notification_filter, max_items: int) -> Dict[int, List[str]]:
+        """
+        查询收件人的上传记录
+
+        参数:
+            notification_filter: 限定回执范围的查询条件
+            max_items: 每个用户最多返回的记录数
+        返回:
+            {用户ID: [格式化的上传记录]}，每个用户按时间倒序
+        """
+        uploader = User.__table__.alias("uploader")
+        rows = db.session.execute(
+            select(
+                NotificationReceipt.user_id,
+                func.coalesce(Material.title, Notification.title),
+                uploader.c.username,
+                Course.name,
+                Notification.created_at,
+            )
+            .join(Notification, Notification.id == NotificationReceipt.notification_id)
+            .outerjoin(Material, Material.id == Notification.material_id)
+            .outerjoin(Course, Course.id == Material.course_id)
+            .outerjoin(uploader, uploader.c.id == Notification.created_by)
+            .where(notification_filter)
+            .order_by(NotificationReceipt.user_id, Notification.id.desc())
+        ).all()
+
+        items: Dict[int, List[str]] = {}
+        for user_id, title, uploader_name, course, created_at in rows:
+            user_items = items.setdefault(user_id, [])
+            if len(user_items) < max_items:
+                user_items.append(self._format_item(title, uploader_name, course, created_at))
+        return items
+
+    def _send_digests(self, candidates: List[Dict], default_mode: str, max_items: int) -> int:
+        """
+        为一批用户写入摘要邮件并推进 last_digest_id
+
+        参数:
+            candidates: _digest_candidates 的结果
+            default_mode: 默认发送方式
+            max_items: 每封摘要最多列出的资料数
+        返回:
+            写入的摘要数
+        """
+        user_ids = [c["user_id"] for c in candidates]
+        preferences = {
+            p.user_id: p
+            for p in db.session.execute(
+                select(EmailPreference).where(EmailPreference.user_id.in_(user_ids))
+            ).scalars()
+        }
+        watermarks = {uid: getattr(preferences.get(uid), "last_digest_id", 0) for uid in user_ids}
+        items = self._upload_items(
+            (NotificationReceipt.user_id.in_(user_ids))
+            & (Notification.target_role == "followers")
+            & NotificationReceipt.read.is_(False)
+            & (
+                NotificationReceipt.notification_id
+                > func.coalesce(
+                    select(EmailPreference.last_digest_id)
+                    .where(EmailPreference.user_id == NotificationReceipt.user_id)
+                    .scalar_subquery(),
+                    0,
+                )
+            ),
+            max_items,
+        )
+
+        # 先在一个事务中推进所有收件人的 last_digest_id，再写入发件箱：
+        # 发件箱是独立的SQLite文件，无法与水位线同一事务提交，进程在两步之间退出时宁可漏发也不重复发送
+        messages = []
+        for candidate in candidates:
+            user_id = candidate["user_id"]
+            user_items = items.get(user_id)
+            if not user_items:
+                continue
+            more = candidate["count"] - len(user_items)
+            messages.append(
+                (
+                    candidate,
+                    json.dumps(
+                        {
+                            "username": candidate["username"],
+                            "count": candidate["count"],
+                            "items": "\r\n".join(user_items),
+                            "more": f"\r\n以及其他 {more} 份资料。\r\n" if more > 0 else "",
+                        },
+                        ensure_ascii=False,
+                    ),
+                )
+            )
+            preference = preferences.get(user_id)
+            if preference is None:
+                preference = EmailPreference(user_id=user_id)
+                db.session.add(preference)
+                preferences[user_id] = preference
+            preference.last_digest_id = max(watermarks[user_id], candidate["last_id"])
+        db.session.commit()
+
+        notifier = MailNotifier()
+        sent = 0
+        failed = []
+        for candidate, content in messages:
+            try:
+                notifier.send(
+                    to=candidate["email"],
+                    subject=FOLLOWER_DIGEST_TEMPLATE.subject,
+                    content=content,
+                    content_type=TEMPLATE_PREFIX + FOLLOWER_DIGEST_TEMPLATE.name,
+                    lane="bulk",
+                )
+                sent += 1
+            except Exception as e:
+                logger.error(f"写入用户 {candidate['user_id']} 的摘要邮件失败: {str(e)}")
+                failed.append(candidate)
+
+        if failed:
+            # 没能写入发件箱的用户恢复原来的水位线，下个周期重新发送
+            for candidate in failed:
+                db.session.execute(
+                    update(EmailPreference)
+                    .where(
+                        EmailPreference.user_id == candidate["user_id"],
+                        EmailPreference.last_digest_id
+                        == max(watermarks[candidate["user_id"]], candidate["last_id"]),
+                    )
+                    .values(last_digest_id=watermarks[candidate["user_id"]])
+                )
+            db.session.commit()
+        return sent
+
+    def send_immediate(self, notification: Notification) -> int:
+        """
+        为偏好为 immediate 的粉丝发送一封关注上传邮件(由扇出线程在创建关注者通知后调用)
+        发送量不超过邮箱账户的剩余配额减去保留配额，超出的粉丝和已有被推迟通知的粉丝不推进水位线，
+        这条通知留给下一次摘要合并发送
+
+        参数:
+            notification: 刚创建的关注者通知
+        返回:
+            写入发件箱的邮件数
+        """
+        from flask import current_app
+
+        default_mode = current_app.config.get("NOTIFICATION_DIGEST_DEFAULT", "off")
+        watermark = func.coalesce(EmailPreference.last_digest_id, 0)
+        # 已有被推迟(尚未通过摘要发送)的通知时，新的通知也并入摘要，避免水位线越过被推迟的通知
+        earlier = aliased(NotificationReceipt)
+        earlier_notification = aliased(Notification)
+        backlog = (
+            exists()
+            .where(
+                earlier.user_id == User.id,
+                earlier.read.is_(False),
+                earlier.notification_id > watermark,
+                earlier.notification_id < notification.id,
+                earlier_notification.id == earlier.notification_id,
+                earlier_notification.target_role == "followers",
+            )
+        )
+        recipients = db.session.execute(
+            select(User.id, User.username, User.email)
+            .join(NotificationReceipt, NotificationReceipt.user_id == User.id)
+            .outerjoin(EmailPreference, EmailPreference.user_id == User.id)
+            .where(
+                NotificationReceipt.notification_id == notification.id,
+                User.is_email_verified.is_(True),
+                self._mode_filter("immediate", default_mode),
+                watermark < notification.id,  # 摘要已经包含这条通知时不再单独发送
+                ~backlog,
+            )
+            .order_by(User.id)
+        ).all()
+        if not recipients:
+            return 0
+
+        budget = MailNotifier().send_budget(
+            current_app.config.get("NOTIFICATION_DIGEST_QUOTA_RESERVE", 20)
+        )
+        deferred = max(0, len(recipients) - budget)
+        recipients = recipients[:budget]
+        if deferred:
+            logger.warning(
+                f"邮箱配额不足，关注通知 #{notification.id} 的 {deferred} 位粉丝改由下一次摘要发送"
+            )
+        if not recipients:
+            record_metrics(self.METRICS_PREFIX, totals={"immediate_deferred": deferred})
+            db.session.commit()
+            return 0
+
+        material = db.session.get(Material, notification.material_id) if notification.material_id else None
+        item = self._format_item(
+            material.title if material else notification.title,
+            material.uploader.username if material else None,
+            material.course.name if material else None,
+            notification.created_at,
+        )
+
+        # 先推进水位线再写入发件箱: 已通过邮件发送的通知不再进入摘要(用户之后改为 daily 时不会重复收到)
+        user_ids = [user_id for user_id, _, _ in recipients]
+        preferences = {
+            p.user_id: p
+            for p in db.session.execute(
+                select(EmailPreference).where(EmailPreference.user_id.in_(user_ids))
+            ).scalars()
+        }
+        for user_id in user_ids:
+            preference = preferences.get(user_id)
+            if preference is None:
+                db.session.add(EmailPreference(user_id=user_id, last_digest_id=notification.id))
+            else:
+                preference.last_digest_id = max(preference.last_digest_id, notification.id)
+        record_metrics(
+            self.METRICS_PREFIX,
+            totals={"immediate_total": len(user_ids), "immediate_deferred": deferred},
+        )
+        db.session.commit()
+
+        notifier = MailNotifier()
+        for user_id, username, email in recipients:
+            notifier.send(
+                to=email,
+                subject=FOLLOWER_UPLOAD_TEMPLATE.subject,
+                content=json.dumps({"username": username, "item": item}, ensure_ascii=False),
+                content_type=TEMPLATE_PREFIX + FOLLOWER_UPLOAD_TEMPLATE.name,
+                lane="transactional",
+            )
+        return len(user_ids)
+
+    def stats(self) -> Dict:
+        """
+        获取摘要任务的运行指标(所有工作进程共享，需要在应用上下文中调用)
+
+        返回:
+            指标字典
+        """
+        metrics = load_metrics(self.METRICS_PREFIX)
+        last_run_at = metrics.get("last_run_at")
+        return {
+            "runs": metrics.get("runs", 0),  # 累计执行摘要的次数
+            "digests_total": metrics.get("digests_total", 0),  # 累计写入发件箱的摘要邮件数
+            "immediate_total": metrics.get("immediate_total", 0),  # 累计写入发件箱的立即通知邮件数
+            "immediate_deferred": metrics.get("immediate_deferred", 0),  # 因配额不足改由摘要发送的立即通知数
+            "last_run_at": datetime.fromtimestamp(last_run_at).strftime("%Y-%m-%d %H:%M:%S")
+            if last_run_at
+            else None,  # 最近一次执行时间
+            "last_run": {
+                "digests": metrics.get("last_digests", 0),
+                "deferred": bool(metrics.get("last_deferred", 0)),
+                "budget": metrics.get("last_budget", 0),
+                "elapsed_seconds": metrics.get("last_elapsed_ms", 0) / 1000,
+            }
+            if last_run_at
+            else {},  # 最近一次执行的明细
+        }
+
+
+# 创建全局摘要任务实例
+follower_digest = FollowerDigestJob()
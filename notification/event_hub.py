@@ -0,0 +1,265 @@
+import json
+import queue
+import logging
+import threading
+from typing import Optional, Tuple
+
+from sqlalchemy import select, func
+
+from database import db, Comment
+from .unread_counter import unread_counter
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    将事件编码为 Server-Sent Events 文本
+
+    参数:
+        event: 事件名
+        data: 事件数据(JSON序列化)
+    返回:
+        SSE 消息文本
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class Subscription:
+    """
+    单个SSE连接的订阅 - 持有一个有界事件队列
+    """
+
+    def __init__(self, user_id: int, is_admin: bool, material_id: Optional[int] = None):
+        """
+        初始化订阅
+
+        参数:
+            user_id: 用户ID
+            is_admin: 用户是否为管理员
+            material_id: 正在查看的资料ID(可选)，用于接收新评论事件
+        """
+        self.user_id = user_id
+        self.is_admin = bool(is_admin)
+        self.material_id = material_id
+        self._queue = queue.Queue(maxsize=100)
+
+    def put(self, event: str, data: dict) -> None:
+        """放入事件，客户端消费过慢导致队列已满时丢弃"""
+        try:
+            self._queue.put_nowait((event, data))
+        except queue.Full:
+            pass
+
+    def get(self, timeout: float) -> Optional[Tuple[str, dict]]:
+        """
+        取出下一个事件
+
+        参数:
+            timeout: 最长等待秒数
+        返回:
+            (事件名, 数据)，超时返回None
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    """
+    进程内发布/订阅中心 - 为SSE连接推送未读数变化和新评论
+
+    工作方式:
+    1. 每个SSE连接注册一个 Subscription，事件只在本进程内分发
+    2. 每个进程只有一个轮询线程，且只在有订阅者时查询数据库：
+       读取共享的未读令牌(unread_token)，变化时用一次批量主键查询找出受影响的在线用户，
+       只为这些用户重新统计未读数；按主键范围查询新增评论，推送给正在查看对应资料的连接
+    3. 本进程内产生变化后调用 wake() 立即轮询，其他进程的变化在一个轮询周期内送达
+    没有变化时每个轮询周期只有两次主键查询；标记已读和关注者通知只重新统计相关用户，
+    只有广播、删除和归档等影响全体用户的变更才会为每个在线用户重新统计一次
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """实现单例模式"""
+        if cls._instance is None:
+            cls._instance = super(EventHub, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, poll_interval: float = 2.0):
+        """
+        初始化事件中心
+
+        参数:
+            poll_interval: 检查共享状态的间隔(秒)
+        """
+        if self._initialized:
+            return
+
+        self._poll_interval = poll_interval
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._poller = None
+        self._app = None
+
+        # 轮询状态
+        self._last_token = None
+        self._last_comment_id = None
+        self._last_counts = {}  # {(user_id, is_admin): 已推送的未读数}
+        self._initialized = True
+
+    # 订阅管理 ------------------------------------------------------
+    def subscribe(
+        self,
+        app,
+        user_id: int,
+        is_admin: bool,
+        material_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Optional[Subscription]:
+        """
+        注册一个SSE连接
+
+        参数:
+            app: Flask应用对象(轮询线程需要应用上下文)
+            user_id: 用户ID
+            is_admin: 用户是否为管理员
+            material_id: 正在查看的资料ID(可选)
+            limit: 本进程同时保持的连接数上限(可选)
+        返回:
+            订阅对象，连接数已达上限时返回None
+        """
+        subscription = Subscription(user_id, is_admin, material_id)
+        with self._lock:
+            if limit is not None and len(self._subscriptions) >= limit:
+                return None
+            self._app = app
+            self._subscriptions.add(subscription)
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(
+                    target=self._poll_loop, name="EventHubPoller", daemon=True
+                )
+                self._poller.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """注销SSE连接"""
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            key = (subscription.user_id, subscription.is_admin)
+            if not any(
+                (s.user_id, s.is_admin) == key for s in self._subscriptions
+            ):
+                self._last_counts.pop(key, None)
+
+    def remember_count(self, user_id: int, is_admin: bool, count: int) -> None:
+        """记录已推送给该用户的未读数，避免重复推送"""
+        with self._lock:
+            self._last_counts[(user_id, bool(is_admin))] = count
+
+    # 发布 ----------------------------------------------------------
+    def publish(
+        self,
+        event: str,
+        data: dict,
+        user_id: Optional[int] = None,
+        material_id: Optional[int] = None,
+    ) -> None:
+        """
+        向本进程内匹配的订阅推送事件
+
+        参数:
+            event: 事件名
+            data: 事件数据
+            user_id: 仅推送给该用户(可选)
+            material_id: 仅推送给正在查看该资料的连接(可选)
+        """
+        with self._lock:
+            targets = [
+                s
+                for s in self._subscriptions
+                if (user_id is None or s.user_id == user_id)
+                and (material_id is None or s.material_id == material_id)
+            ]
+        for subscription in targets:
+            subscription.put(event, data)
+
+    def wake(self) -> None:
+        """本进程内数据发生变化后唤醒轮询线程立即检查"""
+        self._wake.set()
+
+    # 轮询 ----------------------------------------------------------
+    def _poll_loop(self):
+        """轮询线程的主循环"""
+        while True:
+            self._wake.wait(self._poll_interval)
+            self._wake.clear()
+
+            with self._lock:
+                if not self._subscriptions:
+                    continue
+                app = self._app
+
+            try:
+                with app.app_context():
+                    try:
+                        self._poll_once()
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                logger.error(f"事件中心轮询失败: {str(e)}", exc_info=True)
+
+    def _poll_once(self):
+        """检查一次共享状态并推送变化"""
+        from .app_notification import notification_manager
+
+        with self._lock:
+            users = {(s.user_id, s.is_admin) for s in self._subscriptions}
+            materials = {
+                s.material_id for s in self._subscriptions if s.material_id is not None
+            }
+
+        # 未读数：共享令牌变化时只重新统计受影响的在线用户
+        token = unread_counter.read_token()
+        if token != self._last_token:
+            if self._last_token is None:
+                changed_users = users
+            else:
+                changed_users = unread_counter.changed_users(users, self._last_token)
+            self._last_token = token
+            for user_id, is_admin in changed_users:
+                count = notification_manager.get_unread_count(user_id, is_admin)
+                with self._lock:
+                    changed = self._last_counts.get((user_id, is_admin)) != count
+                    self._last_counts[(user_id, is_admin)] = count
+                if changed:
+                    self.publish("unread", {"count": count}, user_id=user_id)
+
+        # 新评论：按主键范围只查询上次之后新增的评论
+        if self._last_comment_id is None:
+            self._last_comment_id = (
+                db.session.execute(select(func.max(Comment.id))).scalar() or 0
+            )
+            return
+
+        rows = db.session.execute(
+            select(Comment.material_id, func.max(Comment.id))
+            .where(Comment.id > self._last_comment_id)
+            .group_by(Comment.material_id)
+        ).all()
+        for material_id, last_comment_id in rows:
+            self._last_comment_id = max(self._last_comment_id, last_comment_id)
+            if material_id in materials:
+                self.publish(
+                    "comment",
+                    {"material_id": material_id, "last_comment_id": last_comment_id},
+                    material_id=material_id,
+                )
+
+
+# 创建全局事件中心实例
+event_hub = EventHub()
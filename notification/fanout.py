@@ -0,0 +1,259 @@
+import queue
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update
+
+from database import db, Material, FollowerFanoutTask
+
+logger = logging.getLogger(__name__)
+
+
+class FollowerFanoutQueue:
+    """
+    关注者通知扇出队列 - 在后台线程中为上传者的粉丝写入通知收件箱
+
+    上传请求把 (上传者ID, 资料ID) 写入 follower_fanout_task 表并放入进程内队列后就返回，
+    后台线程在应用上下文中创建通知，并用一条 INSERT ... SELECT
+    从 relationships 表为所有粉丝批量写入未读回执，任务记录在同一事务中删除
+
+    进程内队列只用于及时唤醒，任务以数据库记录为准：进程重启时队列中的任务不会丢失，
+    扇出线程空闲时补做超过 STALE_SECONDS 仍未完成的任务(包括其他进程遗留的)；
+    删除任务记录相当于认领，同一任务被多个线程同时处理时只有一个会创建通知。
+    执行出错的任务累加失败次数后留给补做，失败 MAX_ATTEMPTS 次后删除并记录错误，不会无限重试
+    """
+
+    # 空闲时检查遗留任务的间隔(秒)
+    RECOVERY_INTERVAL = 60
+    # 创建超过该时间仍未完成的任务视为遗留任务(秒)
+    STALE_SECONDS = 60
+    # 每次最多补做的任务数
+    RECOVERY_BATCH = 100
+    # 任务最多执行的次数，之后放弃
+    MAX_ATTEMPTS = 5
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """实现单例模式"""
+        if cls._instance is None:
+            cls._instance = super(FollowerFanoutQueue, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, queue_size: int = 1000):
+        """
+        初始化扇出队列
+
+        参数:
+            queue_size: 队列最大容量
+        """
+        if self._initialized:
+            return
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker = None
+        self._app = None
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def start(self, app=None):
+        """
+        启动后台工作线程
+
+        参数:
+            app: Flask应用对象(可选，传入后启动时即开始补做遗留任务)
+        """
+        with self._lock:
+            if app is not None:
+                self._app = app
+            if self._worker is not None and self._worker.is_alive():
+                return
+
+            self._worker = threading.Thread(
+                target=self._worker_loop, name="FollowerFanout", daemon=True
+            )
+            self._worker.start()
+            logger.info("关注者通知扇出线程已启动")
+
+    def submit(self, app, uploader_id: int, material_id: int) -> None:
+        """
+        提交一次上传的扇出任务(在请求的应用上下文中调用)，队列已满时在当前线程直接执行
+
+        参数:
+            app: Flask应用对象(后台线程需要应用上下文)
+            uploader_id: 上传者ID
+            material_id: 新资料ID
+        """
+        self.start(app)
+
+        # 先持久化任务，进程在扇出完成前退出时由其他进程补做
+        record = FollowerFanoutTask(uploader_id=uploader_id, material_id=material_id)
+        try:
+            db.session.add(record)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        task = (app, record.id)
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            logger.warning("关注者通知扇出队列已满，改为同步执行")
+            self._execute_task(task)
+
+    def join(self) -> None:
+        """等待队列中的任务全部完成"""
+        self._queue.join()
+
+    def _worker_loop(self):
+        """工作线程的主循环"""
+        while True:
+            try:
+                task = self._queue.get(timeout=self.RECOVERY_INTERVAL)
+            except queue.Empty:
+                try:
+                    self._recover()
+                except Exception as e:
+                    logger.error(f"补做关注者通知扇出任务失败: {str(e)}", exc_info=True)
+                continue
+            try:
+                self._execute_task(task)
+            except Exception as e:
+                logger.error(f"关注者通知扇出失败: {str(e)}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def _recover(self) -> int:
+        """
+        补做遗留的扇出任务
+
+        返回:
+            处理的任务数
+        """
+        app = self._app
+        if app is None:
+            return 0
+
+        with app.app_context():
+            try:
+                cutoff = datetime.now() - timedelta(seconds=self.STALE_SECONDS)
+                task_ids = db.session.execute(
+                    select(FollowerFanoutTask.id)
+                    .where(FollowerFanoutTask.created_at < cutoff)
+                    .order_by(FollowerFanoutTask.id)
+                    .limit(self.RECOVERY_BATCH)
+                ).scalars().all()
+            finally:
+                db.session.remove()
+
+        for task_id in task_ids:
+            self._execute_task((app, task_id))
+        if task_ids:
+            logger.info(f"已补做 {len(task_ids)} 个遗留的关注者通知扇出任务")
+        return len(task_ids)
+
+    def _execute_task(self, task):
+        """
+        执行扇出任务，出错时记录失败次数(不抛出异常)
+
+        参数:
+            task: (app, 任务ID)
+        """
+        app, task_id = task
+        with app.app_context():
+            try:
+                self._fanout(task_id)
+            except Exception as e:
+                db.session.rollback()
+                self._record_failure(task_id, e)
+            finally:
+                db.session.remove()
+
+    def _record_failure(self, task_id: int, error: Exception) -> None:
+        """
+        累加任务的失败次数，达到 MAX_ATTEMPTS 后删除任务
+
+        参数:
+            task_id: 任务ID
+            error: 执行时抛出的异常
+        """
+        try:
+            db.session.execute(
+                update(FollowerFanoutTask)
+                .where(FollowerFanoutTask.id == task_id)
+                .values(attempts=FollowerFanoutTask.attempts + 1)
+            )
+            abandoned = FollowerFanoutTask.query.filter(
+                FollowerFanoutTask.id == task_id,
+                FollowerFanoutTask.attempts >= self.MAX_ATTEMPTS,
+            ).delete()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"记录关注者通知扇出任务 #{task_id} 的失败次数出错: {str(e)}")
+            return
+
+        if abandoned:
+            logger.error(
+                f"关注者通知扇出任务 #{task_id} 失败 {self.MAX_ATTEMPTS} 次，已放弃: {str(error)}",
+                exc_info=error,
+            )
+        else:
+            logger.warning(f"关注者通知扇出任务 #{task_id} 执行失败，稍后重试: {str(error)}")
+
+    def _fanout(self, task_id: int) -> None:
+        """
+        认领任务并创建关注者通知(在应用上下文中调用)
+
+        参数:
+            task_id: 任务ID
+        """
+        from .app_notification import notification_manager
+        from .digest import follower_digest
+
+        record = db.session.get(FollowerFanoutTask, task_id)
+        if record is None:
+            return
+        uploader_id, material_id = record.uploader_id, record.material_id
+
+        # 删除任务记录即认领任务，与创建通知在同一事务中提交
+        claimed = FollowerFanoutTask.query.filter_by(id=task_id).delete()
+        if claimed == 0:
+            db.session.rollback()
+            return
+
+        material: Optional[Material] = db.session.get(Material, material_id)
+        if material is None:
+            # 资料已被删除，不再通知
+            db.session.commit()
+            return
+
+        uploader = material.uploader.username if material.uploader else "已注销用户"
+        course = material.course.name if material.course else "未知课程"
+        notification = notification_manager.create_follower_notification(
+            uploader_id=uploader_id,
+            title="关注的用户上传了新资料",
+            content=f"您关注的用户 {uploader} 上传了新资料《{material.title}》，点击查看详情。\n\n资料类型：{material.file_type}\n课程：{course}\n上传时间：{material.created_at.strftime('%Y-%m-%d %H:%M')}",
+            material_id=material.id,
+        )
+        if notification is None:
+            # 没有粉丝时创建通知的事务已回滚，单独删除任务记录
+            FollowerFanoutTask.query.filter_by(id=task_id).delete()
+            db.session.commit()
+            return
+
+        # 偏好为立即通知的粉丝同时收到邮件，其余粉丝由每日摘要合并发送；
+        # 通知和任务删除已经提交，邮件出错时不重做扇出
+        try:
+            follower_digest.send_immediate(notification)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"发送关注通知 #{notification.id} 的即时邮件失败: {str(e)}", exc_info=True)
+
+
+# 创建全局扇出队列实例
+follower_fanout = FollowerFanoutQueue()
@@ -0,0 +1,183 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional
+
+# 入队到发送完成耗时的直方图桶上界(秒)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+# 每个账户记录的计数器
+ACCOUNT_COUNTERS = (
+    "sent",  # 投递成功的邮件数
+    "failed",  # 被拒收或出错的邮件数
+    "auth_failures",  # 登录失败次数
+    "account_errors",  # 账户级失败次数(登录失败、连接断开、SMTP错误等，计入熔断)
+    "checkouts",  # 借出连接次数
+    "connections",  # 新建连接次数
+)
+
+
+class LatencyHistogram:
+    """
+    固定桶直方图 - 记录耗时分布，百分位数按桶上界估算
+    """
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        """
+        初始化直方图
+
+        参数:
+            buckets: 递增的桶上界(秒)，超过最后一个上界的值计入 +Inf 桶
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        记录一个耗时
+
+        参数:
+            value: 耗时(秒)
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        估算百分位数
+
+        参数:
+            pct: 百分位(0~100)
+        返回:
+            该百分位所在桶的上界(+Inf 桶返回最大值)，没有数据时返回None
+        """
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else round(self.max, 3)
+        return round(self.max, 3)
+
+    def snapshot(self) -> Dict:
+        """获取直方图快照，桶计数不累加"""
+        labels = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MailMetrics:
+    """
+    邮件发送指标 - 各通道的入队到发送完成耗时直方图、各账户的发送/失败/登录失败计数和连接复用情况
+    计数只统计本进程(每个 gunicorn worker 各自一份)，队列深度由 MailQueue 从共享的发件箱读取
+    """
+
+    def __init__(self):
+        """初始化指标"""
+        self._lock = threading.Lock()
+        self._latency: Dict[str, LatencyHistogram] = {}  # {lane: 直方图}
+        self._accounts: Dict[str, Dict[str, int]] = {}  # {邮箱地址: {计数器: 值}}
+
+    def _counters(self, address: str) -> Dict[str, int]:
+        """获取账户的计数器，首次使用时创建(调用方持有锁)"""
+        counters = self._accounts.get(address)
+        if counters is None:
+            counters = self._accounts[address] = dict.fromkeys(ACCOUNT_COUNTERS, 0)
+        return counters
+
+    def _incr(self, address: str, name: str, count: int = 1) -> None:
+        """增加账户的计数器"""
+        with self._lock:
+            self._counters(address)[name] += count
+
+    def record_latency(self, lane: str, seconds: float) -> None:
+        """
+        记录一封邮件从写入发件箱到发送完成的耗时
+
+        参数:
+            lane: 发送通道
+            seconds: 耗时(秒，包含重试等待)
+        """
+        with self._lock:
+            histogram = self._latency.get(lane)
+            if histogram is None:
+                histogram = self._latency[lane] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def record_sent(self, address: str) -> None:
+        """记录账户投递成功一封邮件"""
+        self._incr(address, "sent")
+
+    def record_failed(self, address: str) -> None:
+        """记录账户发送的一封邮件被拒收或出错"""
+        self._incr(address, "failed")
+
+    def record_auth_failure(self, address: str) -> None:
+        """记录账户登录失败"""
+        self._incr(address, "auth_failures")
+
+    def record_account_error(self, address: str) -> None:
+        """记录一次账户级失败"""
+        self._incr(address, "account_errors")
+
+    def record_checkout(self, address: str, reused: bool) -> None:
+        """
+        记录一次借出连接
+
+        参数:
+            address: 邮箱地址
+            reused: 是否复用了空闲连接(否则为新建连接)
+        """
+        with self._lock:
+            counters = self._counters(address)
+            counters["checkouts"] += 1
+            if not reused:
+                counters["connections"] += 1
+
+    @staticmethod
+    def _reuse_ratio(counters: Dict[str, int]) -> float:
+        """连接复用率: 复用空闲连接的借出次数 / 总借出次数"""
+        if not counters["checkouts"]:
+            return 0.0
+        return round(1 - counters["connections"] / counters["checkouts"], 3)
+
+    def snapshot(self) -> Dict:
+        """
+        获取指标快照
+
+        返回:
+            {"latency": {lane: 直方图}, "accounts": {邮箱地址: 计数器}, "connections": 连接复用汇总}
+        """
+        with self._lock:
+            accounts = {
+                address: {**counters, "reuse_ratio": self._reuse_ratio(counters)}
+                for address, counters in self._accounts.items()
+            }
+            latency = {lane: h.snapshot() for lane, h in self._latency.items()}
+
+        totals = dict.fromkeys(("checkouts", "connections"), 0)
+        for counters in accounts.values():
+            for name in totals:
+                totals[name] += counters[name]
+        return {
+            "latency": latency,
+            "accounts": accounts,
+            "connections": {**totals, "reuse_ratio": self._reuse_ratio(totals)},
+        }
+
+
+# 创建全局指标实例
+mail_metrics = MailMetrics()
@@ -0,0 +1,288 @@
+import re
+import json
+import html
+import threading
+from collections import OrderedDict
+from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
+from string import Template
+from typing import Dict, List, Optional, Tuple
+
+# 内容类型以该前缀开头时，邮件内容是模板参数(JSON)，例如 "template:verification_code"
+TEMPLATE_PREFIX = "template:"
+
+# 编译时代替占位符的标记，编码后在正文字节中按它切分
+_MARKER = "@@PKUHUB:{}@@"
+_MARKER_RE = re.compile(rb"@@PKUHUB:(\w+)@@")
+
+# SMTP 规定每行不超过998字节，超过时不能使用8bit传输
+_MAX_LINE_BYTES = 998
+
+
+class CompiledMessage:
+    """
+    预编译的邮件骨架 - 头部(主题、发件人、MIME头)已编码为字节，
+    正文按占位符切分为字节片段，发送时只需拼接收件人和参数
+    """
+
+    def __init__(self, head: bytes, parts: List[bytes], fields: List[str], escape: bool):
+        """
+        初始化邮件骨架
+
+        参数:
+            head: 已编码的头部(不含 To 和结尾空行)
+            parts: 正文片段，长度比 fields 多1
+            fields: 片段之间依次插入的参数名
+            escape: 参数是否需要HTML转义
+        """
+        self.head = head
+        self.parts = parts
+        self.fields = fields
+        self.escape = escape
+
+    def render(self, to: str, params: Optional[Dict] = None) -> bytes:
+        """
+        生成发给单个收件人的完整邮件
+
+        参数:
+            to: 收件人地址(ASCII)
+            params: 模板参数
+        返回:
+            可直接交给SMTP DATA的邮件字节
+        """
+        chunks = [self.head, b"To: ", to.encode("ascii"), b"\r\n\r\n", self.parts[0]]
+        for field, part in zip(self.fields, self.parts[1:]):
+            value = str((params or {}).get(field, ""))
+            if self.escape:
+                value = html.escape(value)
+            chunks.append(value.encode("utf-8"))
+            chunks.append(part)
+        return b"".join(chunks)
+
+
+class MailTemplate:
+    """
+    邮件模板 - 正文使用 string.Template 的 ${name} 占位符
+    """
+
+    def __init__(self, name: str, subject: str, body: str, content_type: str = "html"):
+        """
+        初始化模板
+
+        参数:
+            name: 模板名称
+            subject: 默认邮件主题
+            body: 正文模板
+            content_type: 正文类型("plain"或"html")
+        """
+        self.name = name
+        self.subject = subject
+        self.body = body
+        self.content_type = content_type
+        self._template = Template(body)
+
+    def render(self, params: Optional[Dict] = None) -> str:
+        """
+        渲染正文字符串(不支持8bit传输时的回退路径)
+
+        参数:
+            params: 模板参数
+        返回:
+            正文字符串
+        """
+        params = params or {}
+        if self.content_type == "html":
+            params = {k: html.escape(str(v)) for k, v in params.items()}
+        return self._template.safe_substitute(params)
+
+    def compile(self, subject: str, from_header: str) -> Optional[CompiledMessage]:
+        """
+        编译邮件骨架
+
+        参数:
+            subject: 邮件主题
+            from_header: 发件人头部
+        返回:
+            CompiledMessage，正文有超长行无法使用8bit传输时返回None
+        """
+        skeleton = self._template.safe_substitute(
+            {field: _MARKER.format(field) for field in self._fields()}
+        )
+        return compile_message(subject, from_header, skeleton, self.content_type)
+
+    def _fields(self) -> List[str]:
+        """模板中出现的所有参数名"""
+        return [
+            match.group("named") or match.group("braced")
+            for match in self._template.pattern.finditer(self.body)
+            if match.group("named") or match.group("braced")
+        ]
+
+
+def compile_message(
+    subject: str, from_header: str, body: str, content_type: str, placeholders: bool = True
+) -> Optional[CompiledMessage]:
+    """
+    把主题、发件人和正文编码为邮件骨架
+
+    参数:
+        subject: 邮件主题
+        from_header: 发件人头部
+        body: 正文
+        content_type: 正文类型
+        placeholders: 正文中是否包含需要按占位标记切分的参数
+    返回:
+        CompiledMessage，正文有超长行时返回None
+    """
+    encoded = body.encode("utf-8")
+    if any(len(line) > _MAX_LINE_BYTES for line in encoded.splitlines()):
+        return None
+
+    msg = EmailMessage()
+    msg.set_content(body, subtype=content_type, cte="8bit")
+    msg["Subject"] = subject
+    msg["From"] = from_header
+    head, _, payload = msg.as_bytes(policy=SMTP_POLICY).partition(b"\r\n\r\n")
+
+    # 切分结果交替为 正文片段, 参数名, 正文片段, ...
+    pieces = _MARKER_RE.split(payload) if placeholders else [payload]
+    return CompiledMessage(
+        head=head + b"\r\n",
+        parts=pieces[0::2],
+        fields=[field.decode("ascii") for field in pieces[1::2]],
+        escape=content_type == "html",
+    )
+
+
+class MailTemplateCache:
+    """
+    邮件模板注册表和骨架缓存 - 按 (模板或正文, 主题, 发件人) 缓存编译好的邮件骨架，
+    同一内容发给大量收件人时每封邮件只拼接收件人，不再重复编码头部和正文
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """
+        初始化缓存
+
+        参数:
+            max_entries: 最多缓存的骨架数量(最近最少使用的先淘汰)
+        """
+        self._templates: Dict[str, MailTemplate] = {}
+        self._compiled: "OrderedDict[Tuple, Optional[CompiledMessage]]" = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0  # 缓存命中次数
+        self.misses = 0  # 缓存未命中次数
+
+    def register(self, template: MailTemplate) -> None:
+        """
+        注册模板(同名模板会被替换，对应的缓存失效)
+
+        参数:
+            template: 邮件模板
+        """
+        with self._lock:
+            self._templates[template.name] = template
+            for key in [k for k in self._compiled if k[0] == template.name]:
+                del self._compiled[key]
+
+    def get(self, name: str) -> MailTemplate:
+        """
+        获取已注册的模板
+
+        参数:
+            name: 模板名称
+        返回:
+            邮件模板
+        抛出:
+            KeyError - 模板未注册时
+        """
+        return self._templates[name]
+
+    def _compiled_for(self, key: Tuple, compile_func) -> Optional[CompiledMessage]:
+        """从缓存获取骨架，未命中时编译并放入缓存"""
+        with self._lock:
+            if key in self._compiled:
+                self._compiled.move_to_end(key)
+                self.hits += 1
+                return self._compiled[key]
+            self.misses += 1
+
+        compiled = compile_func()
+        with self._lock:
+            self._compiled[key] = compiled
+            if len(self._compiled) > self._max_entries:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def build(
+        self,
+        from_header: str,
+        to: str,
+        subject: str,
+        content: str,
+        content_type: str,
+        eight_bit: bool = True,
+    ) -> bytes:
+        """
+        生成发给单个收件人的完整邮件字节
+
+        参数:
+            from_header: 发件人头部
+            to: 收件人地址
+            subject: 邮件主题(为空时使用模板的默认主题)
+            content: 邮件正文；模板邮件为JSON格式的模板参数
+            content_type: "plain"、"html" 或 "template:<模板名称>"
+            eight_bit: 服务器是否支持8BITMIME
+        返回:
+            邮件字节
+        """
+        template = None
+        params = None
+        if content_type.startswith(TEMPLATE_PREFIX):
+            template = self.get(content_type[len(TEMPLATE_PREFIX):])
+            params = json.loads(content) if content else {}
+            subject = subject or template.subject
+
+        if eight_bit and to.isascii():
+            if template is not None:
+                key = (template.name, subject, from_header)
+                compiled = self._compiled_for(
+                    key, lambda: template.compile(subject, from_header)
+                )
+            else:
+                key = (None, content, content_type, subject, from_header)
+                compiled = self._compiled_for(
+                    key,
+                    lambda: compile_message(
+                        subject, from_header, content, content_type, placeholders=False
+                    ),
+                )
+            if compiled is not None:
+                return compiled.render(to, params)
+
+        # 回退: 逐封构建 EmailMessage；服务器不支持8bit时使用base64传输编码
+        msg = EmailMessage()
+        cte = None if eight_bit else "base64"
+        if template is not None:
+            msg.set_content(template.render(params), subtype=template.content_type, cte=cte)
+        else:
+            msg.set_content(content, subtype=content_type, cte=cte)
+        msg["Subject"] = subject
+        msg["From"] = from_header
+        msg["To"] = to
+        return msg.as_bytes(policy=SMTP_POLICY)
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存统计"""
+        with self._lock:
+            return {
+                "templates": len(self._templates),
+                "compiled": len(self._compiled),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# 创建全局模板缓存实例
+mail_templates = MailTemplateCache()
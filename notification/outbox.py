@@ -0,0 +1,469 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MailOutbox:
+    """
+    持久化邮件发件箱 - 基于独立的SQLite文件，所有工作进程共享
+
+    工作方式:
+    1. MailNotifier.send 只向 mail_outbox 表追加一行就返回，不会阻塞请求线程
+    2. 工作线程以租约方式领取到期的邮件(status=sending, lease_owner, lease_expires_at)，
+       发送期间定期续约；进程崩溃或重启后租约过期，邮件会被其他工作线程重新领取。
+       完成、重试和死信都只在租约仍属于自己时生效，租约已被他人接管的结果不会覆盖对方
+    3. 投递失败按指数退避加随机抖动重试，超过最大次数后标记为 dead(死信)
+    4. 每封邮件属于一个发送通道(lane)，工作线程按通道优先级领取
+    """
+
+    # 发送通道，按优先级从高到低排列
+    LANES = ("interactive", "transactional", "bulk")
+
+    # 邮件状态
+    PENDING = "pending"  # 等待发送
+    SENDING = "sending"  # 已被工作线程领取
+    SENT = "sent"  # 发送完成(可能有部分收件人被拒收)
+    DEAD = "dead"  # 超过最大重试次数
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 5,
+        base_delay: float = 5,
+        max_delay: float = 3600,
+        lease_seconds: float = 120,
+    ):
+        """
+        初始化发件箱，必要时创建数据表
+
+        参数:
+            path: SQLite数据库文件路径
+            max_attempts: 最大投递次数，超过后进入死信
+            base_delay: 第一次重试前的等待秒数
+            max_delay: 重试等待的上限秒数
+            lease_seconds: 领取后的租约时长，超时未完成的邮件会被重新领取
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()  # 每个线程独立的SQLite连接
+        self._create_tables()
+
+    # 连接 ----------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的SQLite连接(fork 之后的子进程重新连接)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")  # 读写互不阻塞
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _create_tables(self) -> None:
+        """创建发件箱表和索引"""
+        conn = self._connect()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS mail_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipients TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                content TEXT NOT NULL,
+                content_type TEXT NOT NULL DEFAULT 'plain',
+                lane TEXT NOT NULL DEFAULT 'transactional',
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                last_error TEXT,
+                result TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        # 旧版发件箱没有 lane 列，补充后旧邮件归入 transactional 通道
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(mail_outbox)")]
+        if "lane" not in columns:
+            conn.execute(
+                "ALTER TABLE mail_outbox ADD COLUMN lane TEXT NOT NULL DEFAULT 'transactional'"
+            )
+        conn.executescript(
+            """
+            DROP INDEX IF EXISTS ix_mail_outbox_due;
+            CREATE INDEX IF NOT EXISTS ix_mail_outbox_lane_due
+                ON mail_outbox (status, lane, next_attempt_at);
+            """
+        )
+
+    # 写入 ----------------------------------------------------------
+    def enqueue(
+        self,
+        recipients: List[str],
+        subject: str,
+        content: str,
+        content_type: str = "plain",
+        lane: str = "transactional",
+    ) -> int:
+        """
+        追加一封待发送邮件
+
+        参数:
+            recipients: 收件人列表
+            subject: 邮件主题
+            content: 邮件内容
+            content_type: 内容类型
+            lane: 发送通道(interactive、transactional 或 bulk)
+        返回:
+            发件箱记录ID
+        """
+        if lane not in self.LANES:
+            raise ValueError(f"未知的发送通道: {lane}")
+
+        now = time.time()
+        cursor = self._connect().execute(
+            """
+            INSERT INTO mail_outbox
+                (recipients, subject, content, content_type, lane, status,
+                 next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                json.dumps(recipients),
+                subject,
+                content,
+                content_type,
+                lane,
+                self.PENDING,
+                now,
+                now,
+                now,
+            ),
+        )
+        return cursor.lastrowid
+
+    # 领取 ----------------------------------------------------------
+    def claim(
+        self, owner: str, limit: int = 1, lanes: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """
+        以租约方式领取到期的邮件(包括租约已过期的邮件)
+
+        参数:
+            owner: 领取者标识
+            limit: 最多领取的数量
+            lanes: 按优先级排列的可领取通道(可选，默认所有通道)
+        返回:
+            领取到的邮件列表(owner 为租约持有者，完成、重试和续约时需要传回)
+        """
+        now = time.time()
+        conn = self._connect()
+        # IMMEDIATE 事务保证多个进程不会领取到同一行
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = []
+            # 按通道优先级依次查找，高优先级通道有到期邮件时先领取
+            for lane in lanes or self.LANES:
+                rows = conn.execute(
+                    """
+                    SELECT * FROM mail_outbox
+                    WHERE lane = ?
+                      AND ((status = ? AND next_attempt_at <= ?)
+                        OR (status = ? AND lease_expires_at <= ?))
+                    ORDER BY next_attempt_at
+                    LIMIT ?
+                    """,
+                    (lane, self.PENDING, now, self.SENDING, now, limit),
+                ).fetchall()
+                if rows:
+                    break
+            if rows:
+                conn.executemany(
+                    """
+                    UPDATE mail_outbox
+                    SET status = ?, lease_owner = ?, lease_expires_at = ?,
+                        attempts = attempts + 1, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    [
+                        (self.SENDING, owner, now + self.lease_seconds, now, row["id"])
+                        for row in rows
+                    ],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return [
+            {
+                "id": row["id"],
+                "recipients": json.loads(row["recipients"]),
+                "subject": row["subject"],
+                "content": row["content"],
+                "content_type": row["content_type"],
+                "lane": row["lane"],
+                "attempts": row["attempts"] + 1,
+                "created_at": row["created_at"],
+                "owner": owner,
+                # 之前各次投递累计的结果(部分收件人已成功时不为空)
+                "result": json.loads(row["result"]) if row["result"] else None,
+            }
+            for row in rows
+        ]
+
+    def renew(self, leases: Dict[int, str]) -> int:
+        """
+        延长仍在发送中的邮件的租约(发送时间可能超过租约时长的批量邮件需要定期调用)
+
+        参数:
+            leases: {outbox_id: 租约持有者}
+        返回:
+            续约成功的邮件数(租约已过期并被他人接管的邮件不会续约)
+        """
+        if not leases:
+            return 0
+        now = time.time()
+        cursor = self._connect().executemany(
+            """
+            UPDATE mail_outbox SET lease_expires_at = ?, updated_at = ?
+            WHERE id = ? AND status = ? AND lease_owner = ?
+            """,
+            [
+                (now + self.lease_seconds, now, outbox_id, self.SENDING, owner)
+                for outbox_id, owner in leases.items()
+            ],
+        )
+        return cursor.rowcount
+
+    # 完成 ----------------------------------------------------------
+    def complete(self, outbox_id: int, owner: str, result: Dict) -> bool:
+        """
+        标记邮件发送完成
+
+        参数:
+            outbox_id: 发件箱记录ID
+            owner: 领取时的租约持有者
+            result: 发送结果字典
+        返回:
+            是否生效(租约已过期并被他人接管时返回False，结果以接管者为准)
+        """
+        now = time.time()
+        cursor = self._connect().execute(
+            """
+            UPDATE mail_outbox
+            SET status = ?, result = ?, lease_owner = NULL, lease_expires_at = NULL,
+                updated_at = ?
+            WHERE id = ? AND status = ? AND lease_owner = ?
+            """,
+            (
+                self.SENT,
+                json.dumps(result, ensure_ascii=False),
+                now,
+                outbox_id,
+                self.SENDING,
+                owner,
+            ),
+        )
+        if cursor.rowcount == 0:
+            logger.warning(f"邮件 #{outbox_id} 的租约已被其他工作线程接管，忽略本次发送结果")
+            return False
+        return True
+
+    def retry_later(
+        self,
+        outbox_id: int,
+        owner: str,
+        attempts: int,
+        error: str,
+        recipients: Optional[List[str]] = None,
+        result: Optional[Dict] = None,
+    ) -> bool:
+        """
+        投递失败后按指数退避安排重试，超过最大次数则进入死信
+        收件人、状态和租约在一条 UPDATE 中修改，且只在租约仍属于 owner 时生效
+
+        参数:
+            outbox_id: 发件箱记录ID
+            owner: 领取时的租约持有者
+            attempts: 已投递的次数
+            error: 失败原因
+            recipients: 仍需投递的收件人(可选，部分成功时缩小收件人列表)
+            result: 目前为止各次投递累计的发送结果(可选，每次都保存，群发等据此统计部分成功)
+        返回:
+            邮件是否仍会被处理: 已安排重试，或租约已被他人接管时返回True；已进入死信时返回False
+        """
+        now = time.time()
+        dead = attempts >= self.max_attempts
+        if dead:
+            next_attempt_at = now
+            if result is not None and recipients:
+                # 进入死信时仍未投递的收件人记为失败，保存的是完整结果
+                result = {**result, "failed": {**dict.fromkeys(recipients, error), **result["failed"]}}
+        else:
+            # 指数退避，乘以 [0.5, 1.5) 的随机抖动避免重试同时到达
+            delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+            delay *= random.uniform(0.5, 1.5)
+            next_attempt_at = now + delay
+
+        cursor = self._connect().execute(
+            """
+            UPDATE mail_outbox
+            SET status = ?, next_attempt_at = ?, recipients = COALESCE(?, recipients),
+                result = COALESCE(?, result), last_error = ?, lease_owner = NULL,
+                lease_expires_at = NULL, updated_at = ?
+            WHERE id = ? AND status = ? AND lease_owner = ?
+            """,
+            (
+                self.DEAD if dead else self.PENDING,
+                next_attempt_at,
+                json.dumps(recipients) if recipients is not None else None,
+                json.dumps(result, ensure_ascii=False) if result else None,
+                error,
+                now,
+                outbox_id,
+                self.SENDING,
+                owner,
+            ),
+        )
+        if cursor.rowcount == 0:
+            logger.warning(f"邮件 #{outbox_id} 的租约已被其他工作线程接管，忽略本次失败: {error}")
+            return True
+
+        if dead:
+            logger.error(f"邮件 #{outbox_id} 投递 {attempts} 次仍失败，已进入死信: {error}")
+            return False
+        logger.warning(
+            f"邮件 #{outbox_id} 第 {attempts} 次投递失败，{next_attempt_at - now:.0f} 秒后重试: {error}"
+        )
+        return True
+
+    # 查询 ----------------------------------------------------------
+    def get_final_results(self, outbox_ids: List[int]) -> Dict[int, Dict]:
+        """
+        查询已结束(已发送或死信)的邮件结果
+
+        参数:
+            outbox_ids: 发件箱记录ID列表
+        返回:
+            {outbox_id: {"status": 状态, "result": 结果字典}}
+        """
+        if not outbox_ids:
+            return {}
+        placeholders = ",".join("?" * len(outbox_ids))
+        rows = self._connect().execute(
+            f"""
+            SELECT id, status, result, last_error FROM mail_outbox
+            WHERE id IN ({placeholders}) AND status IN (?, ?)
+            """,
+            (*outbox_ids, self.SENT, self.DEAD),
+        ).fetchall()
+        return {
+            row["id"]: {
+                "status": row["status"],
+                "result": json.loads(row["result"]) if row["result"] else None,
+                "error": row["last_error"],
+            }
+            for row in rows
+        }
+
+    def get_status(self, outbox_id: int) -> Optional[Dict]:
+        """
+        查询单封邮件的当前状态(用于状态轮询，只读取一行)
+
+        参数:
+            outbox_id: 发件箱记录ID
+        返回:
+            {"status": 状态, "result": 结果字典, "error": 最近一次失败原因}，记录不存在时返回None
+        """
+        row = self._connect().execute(
+            "SELECT status, result, last_error FROM mail_outbox WHERE id = ?",
+            (outbox_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "status": row["status"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["last_error"],
+        }
+
+    def depth(self) -> Dict[str, Dict[str, int]]:
+        """
+        统计各通道的邮件数量
+
+        返回:
+            {lane: {"pending": 等待发送数, "sending": 发送中数, "dead": 死信数}}
+        """
+        depth = {lane: {self.PENDING: 0, self.SENDING: 0, self.DEAD: 0} for lane in self.LANES}
+        rows = self._connect().execute(
+            """
+            SELECT lane, status, COUNT(*) AS count FROM mail_outbox
+            WHERE status IN (?, ?, ?)
+            GROUP BY lane, status
+            """,
+            (self.PENDING, self.SENDING, self.DEAD),
+        ).fetchall()
+        for row in rows:
+            depth.setdefault(row["lane"], {})[row["status"]] = row["count"]
+        return depth
+
+    def pending_recipients(self) -> int:
+        """
+        统计等待发送和发送中的邮件的收件人总数(群发分块等多收件人邮件按收件人计)
+
+        返回:
+            收件人数
+        """
+        row = self._connect().execute(
+            """
+            SELECT COALESCE(SUM(json_array_length(recipients)), 0) FROM mail_outbox
+            WHERE status IN (?, ?)
+            """,
+            (self.PENDING, self.SENDING),
+        ).fetchone()
+        return row[0]
+
+    def oldest_pending(self) -> Dict[str, float]:
+        """
+        查询各通道最早一封待发送邮件的写入时间
+
+        返回:
+            {lane: created_at}，没有待发送邮件的通道不出现在结果中
+        """
+        rows = self._connect().execute(
+            """
+            SELECT lane, MIN(created_at) AS oldest FROM mail_outbox
+            WHERE status IN (?, ?)
+            GROUP BY lane
+            """,
+            (self.PENDING, self.SENDING),
+        ).fetchall()
+        return {row["lane"]: row["oldest"] for row in rows}
+
+    def purge_sent(self, older_than: float = 7 * 86400) -> int:
+        """
+        删除早于指定时间的已发送记录，保持发件箱较小(死信保留以便排查)
+
+        参数:
+            older_than: 保留的秒数
+        返回:
+            删除的记录数
+        """
+        cursor = self._connect().execute(
+            "DELETE FROM mail_outbox WHERE status = ? AND updated_at < ?",
+            (self.SENT, time.time() - older_than),
+        )
+        return cursor.rowcount
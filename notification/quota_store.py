@@ -0,0 +1,124 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class MailQuotaStore:
+    """
+    共享发送配额 - 基于SQLite文件(默认与发件箱同一个文件)，所有工作进程共享
+
+    工作方式:
+    1. 每个邮箱账户一行令牌桶记录: 剩余令牌数和上次扣减的时间(墙上时钟)
+    2. 令牌按 容量/窗口 的速率持续补充，补充和扣减在一条 UPDATE 中完成，
+       多个进程同时扣减时由SQLite的写锁串行化，所有进程从同一个配额中扣除
+    3. 状态保存在文件中，进程重启不会把配额重新补满
+    """
+
+    def __init__(self, path: str, window: float = 86400):
+        """
+        初始化配额存储
+
+        参数:
+            path: SQLite数据库文件路径
+            window: 补满整个桶所需的秒数(滚动窗口长度)
+        """
+        self.path = path
+        self.window = window
+        self._local = threading.local()  # 每个线程独立的SQLite连接
+        self._tables_ready = False
+
+    # 连接 ----------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的SQLite连接(fork 之后的子进程重新连接)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")  # 读写互不阻塞
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+            if not self._tables_ready:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS mail_quota (
+                        address TEXT PRIMARY KEY,
+                        tokens REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                    """
+                )
+                self._tables_ready = True
+        return conn
+
+    # 读写 ----------------------------------------------------------
+    def try_acquire(self, address: str, capacity: int, count: int = 1) -> bool:
+        """
+        原子地补充并扣除账户的令牌
+
+        参数:
+            address: 邮箱账户地址
+            capacity: 桶容量，即窗口内最多发送的邮件数
+            count: 需要的令牌数
+        返回:
+            令牌是否足够(足够时已扣除)
+        """
+        conn = self._connect()
+        params = {
+            "address": address,
+            "capacity": capacity,
+            "rate": capacity / self.window,
+            "now": time.time(),
+            "count": count,
+        }
+        sql = """
+            UPDATE mail_quota
+            SET tokens = MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) - :count,
+                updated_at = :now
+            WHERE address = :address
+              AND MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) >= :count
+        """
+        if conn.execute(sql, params).rowcount > 0:
+            return True
+
+        # 账户首次使用时创建满桶记录后再扣一次
+        created = conn.execute(
+            "INSERT OR IGNORE INTO mail_quota (address, tokens, updated_at) VALUES (?, ?, ?)",
+            (address, float(capacity), params["now"]),
+        ).rowcount
+        return created > 0 and conn.execute(sql, params).rowcount > 0
+
+    def refund(self, address: str, capacity: int, count: int = 1) -> None:
+        """
+        退还已扣除但没有用于发出邮件的令牌(不超过桶容量)
+
+        参数:
+            address: 邮箱账户地址
+            capacity: 桶容量
+            count: 退还的令牌数
+        """
+        self._connect().execute(
+            "UPDATE mail_quota SET tokens = MIN(?, tokens + ?) WHERE address = ?",
+            (float(capacity), count, address),
+        )
+
+    def available(self, address: str, capacity: int) -> float:
+        """
+        账户当前可用的令牌数
+
+        参数:
+            address: 邮箱账户地址
+            capacity: 桶容量
+        返回:
+            可用令牌数(账户没有记录时为满桶)
+        """
+        row = self._connect().execute(
+            """
+            SELECT MIN(?, tokens + MAX(0, ? - updated_at) * ?)
+            FROM mail_quota WHERE address = ?
+            """,
+            (capacity, time.time(), capacity / self.window, address),
+        ).fetchone()
+        return float(capacity) if row is None else row[0]
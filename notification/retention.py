@@ -0,0 +1,342 @@
+import os
+import gzip
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from database import db, Notification, NotificationReceipt, NotificationState
+from .unread_counter import unread_counter
+from .event_hub import event_hub
+
+logger = logging.getLogger(__name__)
+
+
+def acquire_lease(key: str, duration: int) -> bool:
+    """
+    获取跨进程租约，租约未过期时其他进程不会执行
+
+    参数:
+        key: 租约在 notification_state 表中的键名
+        duration: 租约时长(秒)
+    返回:
+        是否获得租约
+    """
+    now = int(time.time())
+    try:
+        result = db.session.execute(
+            update(NotificationState)
+            .where(
+                NotificationState.key == key,
+                NotificationState.value <= now,
+            )
+            .values(value=now + duration)
+        )
+        if result.rowcount == 0:
+            if db.session.get(NotificationState, key) is not None:
+                db.session.rollback()
+                return False
+            db.session.add(NotificationState(key=key, value=now + duration))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        # 其他进程同时创建了租约记录
+        db.session.rollback()
+        return False
+
+
+def record_metrics(
+    prefix: str, totals: Dict[str, int] = None, latest: Dict[str, int] = None
+) -> None:
+    """
+    在当前事务中把任务指标写入 notification_state 表(键名为 "前缀:指标名")，
+    由调用方提交；所有工作进程共享，进程重启后仍然保留
+
+    参数:
+        prefix: 指标键名前缀(通常为任务名)
+        totals: 需要累加的计数
+        latest: 需要覆盖的最近一次的值
+    """
+    for values, accumulate in ((totals or {}, True), (latest or {}, False)):
+        rows = [{"key": f"{prefix}:{name}", "value": int(value)} for name, value in values.items()]
+        if not rows:
+            continue
+        stmt = sqlite_insert(NotificationState)
+        new_value = NotificationState.value + stmt.excluded.value if accumulate else stmt.excluded.value
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[NotificationState.key], set_={"value": new_value}
+            ),
+            rows,
+        )
+
+
+def load_metrics(prefix: str) -> Dict[str, int]:
+    """
+    读取 record_metrics 写入的指标
+
+    参数:
+        prefix: 指标键名前缀
+    返回:
+        {指标名: 值}
+    """
+    rows = db.session.execute(
+        select(NotificationState.key, NotificationState.value).where(
+            NotificationState.key.startswith(f"{prefix}:")
+        )
+    ).all()
+    return {key[len(prefix) + 1 :]: value for key, value in rows}
+
+
+class NotificationRetentionJob:
+    """
+    通知保留任务 - 定期将过期通知归档到压缩文件并从数据库删除
+
+    工作方式:
+    1. 每种 target_role 有各自的保留天数(config.yaml 的 notification.retention_days)
+    2. 过期通知连同回执按批写入 gzip 压缩的 JSON Lines 归档文件，再从数据库删除
+    3. 删除后压缩广播已读回执为水位线，保持热数据集较小
+    4. 多个工作进程通过 notification_state 表中的租约保证同一周期只有一个进程执行，
+       运行指标也写入该表，任一进程都能读到
+    """
+
+    LEASE_KEY = "retention_lease"
+    METRICS_PREFIX = "retention"
+    BATCH_SIZE = 500
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """实现单例模式"""
+        if cls._instance is None:
+            cls._instance = super(NotificationRetentionJob, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """初始化保留任务"""
+        if self._initialized:
+            return
+
+        self._thread = None
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    # 调度 ----------------------------------------------------------
+    def start(self, app) -> None:
+        """
+        启动后台维护线程
+
+        参数:
+            app: Flask应用对象
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._schedule_loop,
+                args=(app,),
+                name="NotificationRetention",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _schedule_loop(self, app):
+        """维护线程的主循环: 每个周期尝试获取租约并执行一次"""
+        interval = app.config.get("NOTIFICATION_MAINTENANCE_INTERVAL", 86400)
+        # 启动后稍作等待，避免与应用初始化争用数据库
+        time.sleep(60)
+        while True:
+            try:
+                with app.app_context():
+                    try:
+                        if self._acquire_lease(interval):
+                            self.run_once(app)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                logger.error(f"通知保留任务执行失败: {str(e)}", exc_info=True)
+            time.sleep(interval)
+
+    def _acquire_lease(self, duration: int) -> bool:
+        """获取本任务的跨进程租约"""
+        return acquire_lease(self.LEASE_KEY, duration)
+
+    # 执行 ----------------------------------------------------------
+    def run_once(self, app) -> Dict:
+        """
+        执行一次归档和压缩
+
+        参数:
+            app: Flask应用对象(读取保留配置)
+        返回:
+            本次执行的指标 {target_role: {"archived": n, "receipts": m}}
+        """
+        from .app_notification import notification_manager
+
+        retention = app.config.get("NOTIFICATION_RETENTION_DAYS", {})
+        archive_folder = app.config.get("NOTIFICATION_ARCHIVE_FOLDER")
+        started = time.monotonic()
+
+        os.makedirs(archive_folder, exist_ok=True)
+        archive_path = os.path.join(
+            archive_folder,
+            f"notifications-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz",
+        )
+
+        run_metrics = {}
+        with gzip.open(archive_path, "at", encoding="utf-8") as archive:
+            for target_role, days in retention.items():
+                if not days or days <= 0:
+                    continue
+                cutoff = datetime.now() - timedelta(days=days)
+                run_metrics[target_role] = self._archive_role(
+                    archive, target_role, cutoff
+                )
+
+        archived = sum(m["archived"] for m in run_metrics.values())
+        receipts = sum(m["receipts"] for m in run_metrics.values())
+        if archived == 0:
+            os.remove(archive_path)
+        else:
+            # 删除的广播可能仍是部分用户的未读通知，压缩水位线并让计数缓存失效
+            notification_manager.compact_read_receipts()
+            unread_counter.invalidate()
+            event_hub.wake()
+
+        elapsed = time.monotonic() - started
+        latest = {
+            "last_run_at": int(time.time()),
+            "last_archived": archived,
+            "last_receipts": receipts,
+            "last_elapsed_ms": int(elapsed * 1000),
+        }
+        for target_role, metrics in run_metrics.items():
+            latest[f"last_archived.{target_role}"] = metrics["archived"]
+            latest[f"last_receipts.{target_role}"] = metrics["receipts"]
+        try:
+            record_metrics(
+                self.METRICS_PREFIX,
+                totals={"runs": 1, "archived_total": archived, "receipts_total": receipts},
+                latest=latest,
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"记录通知保留任务指标失败: {str(e)}")
+
+        logger.info(
+            f"通知保留任务完成: 归档 {archived} 条通知，删除 {receipts} 条回执，耗时 {elapsed:.2f}s"
+        )
+        return run_metrics
+
+    def _archive_role(self, archive, target_role: str, cutoff: datetime) -> Dict:
+        """
+        分批归档并删除某个角色的过期通知
+
+        参数:
+            archive: 已打开的归档文件
+            target_role: 目标角色
+            cutoff: 早于该时间的通知过期
+        返回:
+            {"archived": 归档通知数, "receipts": 删除回执数}
+        """
+        archived = 0
+        receipts_deleted = 0
+
+        while True:
+            notifications: List[Notification] = db.session.execute(
+                select(Notification)
+                .where(
+                    Notification.target_role == target_role,
+                    Notification.created_at < cutoff,
+                )
+                .order_by(Notification.id)
+                .limit(self.BATCH_SIZE)
+            ).scalars().all()
+            if not notifications:
+                break
+
+            ids = [n.id for n in notifications]
+            receipts_by_id = {}
+            for receipt in db.session.execute(
+                select(NotificationReceipt).where(
+                    NotificationReceipt.notification_id.in_(ids)
+                )
+            ).scalars():
+                receipts_by_id.setdefault(receipt.notification_id, []).append(
+                    {
+                        "user_id": receipt.user_id,
+                        "read": receipt.read,
+                        "read_at": receipt.read_at.strftime("%Y-%m-%d %H:%M:%S")
+                        if receipt.read_at
+                        else None,
+                    }
+                )
+
+            # 先写归档，再删除数据库记录
+            for notification in notifications:
+                record = notification.to_dict()
+                record.pop("is_read", None)
+                record["receipts"] = receipts_by_id.get(notification.id, [])
+                archive.write(json.dumps(record, ensure_ascii=False) + "\n")
+            archive.flush()
+
+            try:
+                result = db.session.execute(
+                    delete(NotificationReceipt).where(
+                        NotificationReceipt.notification_id.in_(ids)
+                    )
+                )
+                receipts_deleted += result.rowcount
+                db.session.execute(delete(Notification).where(Notification.id.in_(ids)))
+                unread_counter.bump_token()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            archived += len(ids)
+
+        return {"archived": archived, "receipts": receipts_deleted}
+
+    def stats(self) -> Dict:
+        """
+        获取保留任务的运行指标(所有工作进程共享，需要在应用上下文中调用)
+
+        返回:
+            指标字典
+        """
+        metrics = load_metrics(self.METRICS_PREFIX)
+        last_run_at = metrics.get("last_run_at")
+        roles = {}
+        for name, value in metrics.items():
+            if "." in name:
+                field, target_role = name.split(".", 1)
+                roles.setdefault(target_role, {})[field[len("last_"):]] = value
+        return {
+            "runs": metrics.get("runs", 0),  # 累计执行次数
+            "archived_total": metrics.get("archived_total", 0),  # 累计归档的通知数
+            "receipts_total": metrics.get("receipts_total", 0),  # 累计删除的回执数
+            "last_run_at": datetime.fromtimestamp(last_run_at).strftime("%Y-%m-%d %H:%M:%S")
+            if last_run_at
+            else None,  # 最近一次执行时间
+            "last_run": {
+                "archived": metrics.get("last_archived", 0),
+                "receipts": metrics.get("last_receipts", 0),
+                "roles": roles,
+                "elapsed_seconds": metrics.get("last_elapsed_ms", 0) / 1000,
+            }
+            if last_run_at
+            else {},  # 最近一次执行的明细
+        }
+
+
+# 创建全局保留任务实例
+retention_job = NotificationRetentionJob()
@@ -0,0 +1,280 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import String, cast, literal, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.sql import Select
+
+from database import db, NotificationState
+
+logger = logging.getLogger(__name__)
+
+
+class UnreadCounterCache:
+    """
+    未读通知计数缓存 - 在进程内维护每个用户的未读数量
+
+    工作方式:
+    1. 计数按 (user_id, is_admin) 缓存在有界的LRU字典中，导航栏渲染时直接命中
+    2. 所有工作进程共享 notification_state 表中的 unread_token 令牌，
+       任何通知变化都会在同一事务内递增该令牌
+    3. 本进程创建通知或标记已读时增量更新自己的缓存；
+       发现令牌被其他进程改动时清空缓存，之后按需重新统计
+    4. 递增令牌的同时把新令牌记到受影响的范围上(单个用户、全体或管理员)，
+       changed_users() 据此找出某个令牌之后未读数可能变化的用户
+    """
+
+    TOKEN_KEY = "unread_token"
+    # 影响全体用户/管理员的变更(广播、删除、归档等)最后一次对应的令牌
+    ROLE_KEYS = {"all": "unread_token:all", "admin": "unread_token:admin"}
+    # 影响单个用户的变更(关注者通知、标记已读)最后一次对应的令牌
+    USER_KEY_PREFIX = "unread_token:u"
+    # changed_users() 每次查询的键数上限(SQLite参数个数有限)
+    KEY_BATCH = 500
+
+    def __init__(self, max_entries: int = 4096):
+        """
+        初始化计数缓存
+
+        参数:
+            max_entries: 最多缓存的用户数量
+        """
+        self._entries = OrderedDict()  # {(user_id, is_admin): count}
+        self._token = None  # 当前缓存内容对应的共享令牌
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    # 共享令牌 ------------------------------------------------------
+    def read_token(self) -> int:
+        """读取共享失效令牌(主键查询)"""
+        value = db.session.execute(
+            select(NotificationState.value).where(
+                NotificationState.key == self.TOKEN_KEY
+            )
+        ).scalar()
+        return value or 0
+
+    def ensure_token(self) -> None:
+        """确保共享令牌记录存在(应用启动时调用)"""
+        if db.session.get(NotificationState, self.TOKEN_KEY) is None:
+            db.session.add(NotificationState(key=self.TOKEN_KEY, value=0))
+            db.session.commit()
+
+    def bump_token(self, user_ids=None, target_role: str = "all") -> int:
+        """
+        在当前事务中递增共享令牌，必须在提交通知变更之前调用，
+        保证其他进程看到新数据时也一定能看到新令牌
+
+        参数:
+            user_ids: 受影响的用户，ID列表或只查询用户ID一列的 Select；
+                      为None时表示影响 target_role 对应的全部用户
+            target_role: user_ids 为None时受影响的角色('all' 或 'admin')
+        返回:
+            递增后的令牌值
+        """
+        result = db.session.execute(
+            update(NotificationState)
+            .where(NotificationState.key == self.TOKEN_KEY)
+            .values(value=NotificationState.value + 1)
+        )
+        if result.rowcount == 0:
+            db.session.add(NotificationState(key=self.TOKEN_KEY, value=1))
+            db.session.flush()
+        token = self.read_token()
+
+        if user_ids is None:
+            key = self.ROLE_KEYS.get(target_role, self.ROLE_KEYS["all"])
+            self._upsert(select(literal(key), literal(token)).where(literal(True)))
+        elif isinstance(user_ids, Select):
+            # 受影响的用户由子查询给出(如上传者的所有粉丝)，数据不经过Python
+            ids = user_ids.subquery()
+            column = list(ids.c)[0]
+            self._upsert(
+                select(
+                    literal(self.USER_KEY_PREFIX) + cast(column, String),
+                    literal(token),
+                ).where(column.isnot(None))
+            )
+        else:
+            rows = [
+                {"key": self.user_key(user_id), "value": token}
+                for user_id in set(user_ids)
+            ]
+            if rows:
+                stmt = sqlite_insert(NotificationState)
+                db.session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[NotificationState.key],
+                        set_={"value": stmt.excluded.value},
+                    ),
+                    rows,
+                )
+        return token
+
+    def _upsert(self, rows: Select) -> None:
+        """
+        把查询结果 (键, 令牌) 写入共享状态表，键已存在时更新令牌
+
+        参数:
+            rows: 查询 (key, value) 两列的 Select(需带WHERE子句，避免SQLite把ON CONFLICT解析为连接条件)
+        """
+        stmt = sqlite_insert(NotificationState).from_select(["key", "value"], rows)
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[NotificationState.key],
+                set_={"value": stmt.excluded.value},
+            )
+        )
+
+    @classmethod
+    def user_key(cls, user_id: int) -> str:
+        """单个用户的变更令牌键名"""
+        return f"{cls.USER_KEY_PREFIX}{user_id}"
+
+    def changed_users(
+        self, users: Set[Tuple[int, bool]], since: int
+    ) -> Set[Tuple[int, bool]]:
+        """
+        找出令牌 since 之后未读数可能变化的用户(按主键批量查询，与用户总数无关)
+
+        参数:
+            users: {(user_id, is_admin)}
+            since: 上次检查时的共享令牌
+        返回:
+            users 中需要重新统计未读数的用户
+        """
+        if not users:
+            return set()
+
+        keys = list(self.ROLE_KEYS.values()) + sorted(
+            {self.user_key(user_id) for user_id, _ in users}
+        )
+        tokens = {}
+        for start in range(0, len(keys), self.KEY_BATCH):
+            batch = keys[start : start + self.KEY_BATCH]
+            tokens.update(
+                db.session.execute(
+                    select(NotificationState.key, NotificationState.value).where(
+                        NotificationState.key.in_(batch)
+                    )
+                ).all()
+            )
+
+        all_changed = tokens.get(self.ROLE_KEYS["all"], 0) > since
+        admin_changed = tokens.get(self.ROLE_KEYS["admin"], 0) > since
+        return {
+            (user_id, is_admin)
+            for user_id, is_admin in users
+            if all_changed
+            or (is_admin and admin_changed)
+            or tokens.get(self.user_key(user_id), 0) > since
+        }
+
+    # 读取 ----------------------------------------------------------
+    def get(self, user_id: int, is_admin: bool, loader: Callable[[], int]) -> int:
+        """
+        获取用户的未读数量，未命中时调用 loader 从数据库统计
+
+        参数:
+            user_id: 用户ID
+            is_admin: 用户是否为管理员
+            loader: 从数据库统计未读数量的函数
+        返回:
+            未读通知数量
+        """
+        key = (user_id, bool(is_admin))
+        token = self.read_token()
+
+        with self._lock:
+            if token != self._token:
+                # 其他进程修改过通知，缓存整体失效
+                self._entries.clear()
+                self._token = token
+            elif key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        count = loader()
+
+        # 统计期间令牌未变化，结果才与令牌一致，可以放入缓存
+        if self.read_token() == token:
+            with self._lock:
+                if self._token == token:
+                    self._entries[key] = count
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self._max_entries:
+                        self._entries.popitem(last=False)
+        return count
+
+    # 增量维护 ------------------------------------------------------
+    def _apply(self, new_token: int, change: Callable[[], None]) -> None:
+        """
+        在令牌连续的情况下应用本进程的增量修改，否则清空缓存
+
+        参数:
+            new_token: 本次变更递增后的令牌
+            change: 修改缓存条目的函数(在锁内执行)
+        """
+        with self._lock:
+            if self._token is not None and new_token == self._token + 1:
+                change()
+                self._token = new_token
+            else:
+                self._entries.clear()
+                self._token = None
+
+    def on_created(
+        self,
+        new_token: int,
+        target_role: str,
+        recipient_ids: Optional[Iterable[int]] = None,
+    ) -> None:
+        """
+        新通知创建后增加受众的未读计数
+
+        参数:
+            new_token: 创建通知时递增后的令牌
+            target_role: 通知的目标角色
+            recipient_ids: 关注者通知的接收人ID
+        """
+        recipients = set(recipient_ids or [])
+
+        def change():
+            for (user_id, is_admin) in self._entries:
+                if (
+                    target_role == "all"
+                    or (target_role == "admin" and is_admin)
+                    or (target_role == "followers" and user_id in recipients)
+                ):
+                    self._entries[(user_id, is_admin)] += 1
+
+        self._apply(new_token, change)
+
+    def on_read(self, new_token: int, user_id: int, count: int = 1) -> None:
+        """
+        用户标记已读后减少其未读计数
+
+        参数:
+            new_token: 标记已读时递增后的令牌
+            user_id: 用户ID
+            count: 本次标记已读的通知数量
+        """
+
+        def change():
+            for key in ((user_id, False), (user_id, True)):
+                if key in self._entries:
+                    self._entries[key] = max(0, self._entries[key] - count)
+
+        self._apply(new_token, change)
+
+    def invalidate(self) -> None:
+        """清空本进程的缓存(无法增量维护的变更之后调用)"""
+        with self._lock:
+            self._entries.clear()
+            self._token = None
+
+
+# 创建全局未读计数缓存实例
+unread_counter = UnreadCounterCache()
@@ -1,6 +1,10 @@
 from notification import MailNotifier
+from .base import MailPoolConfig
+from .outbox import MailOutbox
+from .code_store import VerificationCodeStore
+from .mail_templates import MailTemplate, mail_templates, TEMPLATE_PREFIX
+import json
 import logging
-import time
 import random
 from typing import List, Tuple, Dict, Union, Callable
 from threading import Lock, Event
@@ -8,7 +12,8 @@ from threading import Lock, Event
 
 class VerificationCodeManager:
     """
-    验证码管理器 - 存储和管理验证码，提供自动清理过期验证码功能
+    验证码管理器 - 通过所有工作进程共享的 VerificationCodeStore 存储和验证验证码
+    签发验证码的进程和验证的进程可以不同，过期验证码由存储的时间轮在写入时顺带清理
     """
 
     _instance = None
@@ -27,55 +32,47 @@ class VerificationCodeManager:
         if self._initialized:
             return
 
-        # 验证码存储格式: {email: (code, expire_time)}
-        self._codes = {}
+        self._store = None  # 首次使用时按邮件配置打开
         self._expire_minutes = 15  # 默认过期时间15分钟
-        self._cleanup_interval = 60  # 清理间隔(秒)
         self._initialized = True
 
-        # 启动自动清理任务
-        self._start_cleanup_task()
+    @property
+    def store(self) -> VerificationCodeStore:
+        """获取共享验证码存储"""
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    config = MailPoolConfig()
+                    self._store = VerificationCodeStore(
+                        config.verification_code_path,
+                        max_attempts=config.verification_max_attempts,
+                    )
+        return self._store
 
     def add_code(self, email: str, code: str) -> None:
         """
-        添加或更新验证码
+        添加或更新验证码(同时清零失败次数)
 
         参数:
             email: 用户邮箱
             code: 验证码
         """
-        expire_time = time.time() + (self._expire_minutes * 60)
-        with self._lock:
-            self._codes[email] = (code, expire_time)
-        logging.debug(
-            f"已保存验证码 {code} 到 {email}，过期时间 {self._expire_minutes} 分钟"
-        )
+        self.store.put(email, code, self._expire_minutes * 60)
+        logging.debug(f"已保存 {email} 的验证码，过期时间 {self._expire_minutes} 分钟")
 
-    def verify_code(self, email: str, code: str) -> bool:
+    def verify_code(self, email: str, code: str, consume: bool = False) -> bool:
         """
-        验证用户提交的验证码是否正确且未过期
+        验证用户提交的验证码是否正确且未过期，失败次数过多时验证码作废
 
         参数:
             email: 用户邮箱
             code: 用户提交的验证码
+            consume: 验证通过时是否同时删除验证码
 
         返回:
             验证是否通过
         """
-        with self._lock:
-            if email not in self._codes:
-                return False
-
-            stored_code, expire_time = self._codes[email]
-
-            # 检查是否过期
-            if time.time() > expire_time:
-                # 自动清除过期验证码
-                del self._codes[email]
-                return False
-
-            # 检查验证码是否匹配
-            return stored_code == code
+        return self.store.check(email, code, consume=consume)
 
     def remove_code(self, email: str) -> None:
         """
@@ -84,61 +81,11 @@ class VerificationCodeManager:
         参数:
             email: 用户邮箱
         """
-        with self._lock:
-            if email in self._codes:
-                del self._codes[email]
-
-    def _cleanup_expired(self) -> None:
-        """清理所有过期的验证码"""
-        now = time.time()
-        expired_emails = []
-
-        with self._lock:
-            # 找出所有过期的邮箱
-            for email, (_, expire_time) in self._codes.items():
-                if now > expire_time:
-                    expired_emails.append(email)
-
-            # 删除过期的验证码
-            for email in expired_emails:
-                del self._codes[email]
-
-        if expired_emails:
-            logging.debug(f"自动清理了 {len(expired_emails)} 个过期验证码")
-
-    def _start_cleanup_task(self) -> None:
-        """启动定期清理任务"""
-        import threading
-
-        def cleanup_loop():
-            consecutive_errors = 0
-            max_consecutive_errors = 3
-
-            while True:
-                try:
-                    self._cleanup_expired()
-                    consecutive_errors = 0  # 成功执行后重置错误计数
-
-                except Exception as e:
-                    consecutive_errors += 1
-                    logging.error(
-                        f"清理验证码时出错 (第{consecutive_errors}次): {str(e)}"
-                    )
-
-                    # 如果连续多次出错，添加更长的暂停时间让系统恢复
-                    if consecutive_errors >= max_consecutive_errors:
-                        logging.critical(
-                            f"验证码清理任务连续{max_consecutive_errors}次失败，暂停较长时间..."
-                        )
-                        time.sleep(self._cleanup_interval * 5)  # 暂停更长时间
-                        consecutive_errors = 0  # 重置错误计数
-
-                time.sleep(self._cleanup_interval)
+        self.store.delete(email)
 
-        # 使用守护线程，这样主程序退出时，清理线程也会退出
-        cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
-        cleanup_thread.start()
-        logging.info("验证码自动清理任务已启动")
+    def stats(self) -> Dict[str, int]:
+        """获取共享存储中的验证码数量"""
+        return self.store.stats()
 
     @property
     def expire_minutes(self) -> int:
@@ -164,6 +111,91 @@ def code_generator():
     return "".join([random.choice("0123456789") for _ in range(6)])
 
 
+# 验证码邮件模板: 头部和正文只编码一次，每封邮件只替换收件人、验证码和有效期
+VERIFICATION_TEMPLATE = MailTemplate(
+    "verification_code",
+    subject="验证码 - PKUHUB",
+    body="""
+        <div style="font-family:Arial,sans-serif; max-width:600px; margin:0 auto; padding:20px; border:1px solid #ddd; border-radius:5px;">
+            <h2 style="color:#900023; text-align:center;">PKUHUB</h2>
+            <p>您好!</p>
+            <p>您的验证码是: <strong style="font-size:24px; color:#900023;">${code}</strong></p>
+            <p>验证码将在${expire_minutes}分钟内有效。如果您没有请求此验证码，请忽略此邮件。</p>
+            <p style="font-size:12px; color:#666; margin-top:30px;">本邮件由系统自动发送，请勿回复</p>
+        </div>
+        """,
+    content_type="html",
+)
+mail_templates.register(VERIFICATION_TEMPLATE)
+
+
+def _code_params(code: str) -> str:
+    """
+    生成验证码邮件的模板参数
+
+    参数:
+        code: 验证码
+
+    返回:
+        JSON格式的模板参数(作为邮件内容写入发件箱)
+    """
+    return json.dumps({"code": code, "expire_minutes": code_manager.expire_minutes})
+
+
+def request_verification_code(email: str, subject: str = "验证码 - PKUHUB") -> int:
+    """
+    生成验证码并写入发件箱后立即返回，不等待SMTP发送完成
+
+    参数:
+        email: 接收验证码的邮箱
+        subject: 邮件标题
+
+    返回:
+        发送凭证(发件箱记录ID)，可通过 get_verification_status 查询发送状态
+    """
+    code = code_generator()
+    code_manager.add_code(email, code)
+
+    def on_complete(result):
+        # 发送失败时移除验证码，用户可以立即重新请求
+        if email not in result.get("success", []):
+            error = result.get("failed", {}).get(email, "未知错误")
+            logging.warning(f"邮件发送失败，邮箱: {email}, 错误: {error}")
+            code_manager.remove_code(email)
+
+    return MailNotifier().send(
+        to=email,
+        subject=subject,
+        content=_code_params(code),
+        content_type=TEMPLATE_PREFIX + VERIFICATION_TEMPLATE.name,
+        callback=on_complete,
+        lane="interactive",  # 用户正在等待验证码，使用最高优先级通道
+    )
+
+
+def get_verification_status(ticket: int, email: str) -> str:
+    """
+    查询验证码邮件的发送状态
+
+    参数:
+        ticket: request_verification_code 返回的发送凭证
+        email: 接收验证码的邮箱
+
+    返回:
+        "pending"(排队或发送中)、"sent"(已发送)、"failed"(发送失败) 或 "unknown"(凭证不存在)
+    """
+    status = MailNotifier().get_status(ticket)
+    if status is None:
+        return "unknown"
+    if status["status"] in (MailOutbox.PENDING, MailOutbox.SENDING):
+        return "pending"
+    if status["status"] == MailOutbox.SENT and email in (status["result"] or {}).get(
+        "success", []
+    ):
+        return "sent"
+    return "failed"
+
+
 def send_verification_codes(
     email_list: List[str], subject: str = "验证码 - PKUHUB", timeout: int = 60
 ) -> List[Tuple[bool, str, str]]:
@@ -219,16 +251,8 @@ def send_verification_codes(
         # 添加验证码到管理器
         code_manager.add_code(email, code)
 
-        # 创建HTML内容
-        content = f"""
-        <div style="font-family:Arial,sans-serif; max-width:600px; margin:0 auto; padding:20px; border:1px solid #ddd; border-radius:5px;">
-            <h2 style="color:#900023; text-align:center;">PKUHUB</h2>
-            <p>您好!</p>
-            <p>您的验证码是: <strong style="font-size:24px; color:#900023;">{code}</strong></p>
-            <p>验证码将在{code_manager.expire_minutes}分钟内有效。如果您没有请求此验证码，请忽略此邮件。</p>
-            <p style="font-size:12px; color:#666; margin-top:30px;">本邮件由系统自动发送，请勿回复</p>
-        </div>
-        """
+        # 模板参数，HTML由预编译的模板生成
+        content = _code_params(code)
 
         # 创建特定邮件的回调函数
         def make_callback(email_addr, verification_code):
@@ -242,8 +266,9 @@ def send_verification_codes(
             to=email,
             subject=subject,
             content=content,
-            content_type="html",
+            content_type=TEMPLATE_PREFIX + VERIFICATION_TEMPLATE.name,
             callback=make_callback(email, code),
+            lane="interactive",  # 用户正在等待验证码，使用最高优先级通道
         )
 
     # 等待所有任务完成或超时
@@ -283,8 +308,5 @@ def verify_code(email: str, submitted_code: str) -> bool:
     返回:
         验证是否通过
     """
-    result = code_manager.verify_code(email, submitted_code)
-    if result:
-        # 验证成功后删除验证码，防止重复使用
-        code_manager.remove_code(email)
-    return result
+    # 验证成功的同时删除验证码，防止重复使用(并发提交时只有一个请求通过)
+    return code_manager.verify_code(email, submitted_code, consume=True)
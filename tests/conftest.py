@@ -0,0 +1,246 @@
+"""
+测试公共夹具 - 使用临时目录中的SQLite数据库创建应用，每个测试开始前清空所有表
+
+邮件相关的环境变量在导入应用之前指向本机的无效端口，测试不会读取 .env 中的真实账户，
+也不会连接真实的邮件服务商
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+TMP = tempfile.mkdtemp(prefix="pkuhub-tests-")
+
+# 必须在导入 notification 之前设置；load_dotenv 不会覆盖已存在的环境变量
+os.environ.update(
+    {
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": "1",
+        "SMTP_USE_SSL": "0",
+        "EMAIL_USER_1": "tests@example.com",
+        "EMAIL_PWD_1": "password",
+        # 空值让账户扫描在此停止，不会读取 .env 中的其他账户
+        "EMAIL_USER_2": "",
+        "MAIL_OUTBOX_PATH": os.path.join(TMP, "outbox.db"),
+    }
+)
+
+from config.config import Config  # noqa: E402
+
+
+class TestConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(TMP, "test.db")
+    UPLOAD_FOLDER = os.path.join(TMP, "uploads")
+    AVATAR_FOLDER = os.path.join(TMP, "avatars")
+    RATE_LIMIT_STORAGE = os.path.join(TMP, "rate_limit.db")
+    WTF_CSRF_ENABLED = False
+    TESTING = True
+
+
+@pytest.fixture(scope="session")
+def app():
+    """整个测试会话共用一个应用(数据库实例只能绑定一次)"""
+    from __init__ import create_app
+
+    return create_app(TestConfig)
+
+
+def clear_database():
+    """清空所有表(包括应用启动时导入的课程和通知)"""
+    from database import db
+    from notification import unread_counter
+
+    db.session.rollback()
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
+    # 共享令牌随表一起清空，按应用启动时的方式重新建立，并丢弃进程内的计数缓存
+    unread_counter.ensure_token()
+    unread_counter.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def app_context(app):
+    """每个测试在空数据库和新的应用上下文中运行"""
+    from database import db
+
+    with app.app_context():
+        clear_database()
+        yield
+        db.session.rollback()
+        db.session.remove()
+
+
+@pytest.fixture
+def make_user():
+    """创建用户的工厂函数"""
+    from database import db, User
+
+    def factory(name, is_admin=False, **kwargs):
+        user = User(
+            username=name,
+            email=f"{name.lower()}@example.com",
+            password_hash="x",
+            is_admin=is_admin,
+            **kwargs,
+        )
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return factory
+
+
+@pytest.fixture
+def make_course():
+    """创建课程(及其所属学院)的工厂函数"""
+    from database import db, Course, Department
+
+    def factory(name="高等数学", code=None, department="数学科学学院", **kwargs):
+        dept = Department.query.filter_by(name=department).first()
+        if dept is None:
+            dept = Department(name=department)
+            db.session.add(dept)
+            db.session.flush()
+        course = Course(
+            name=name,
+            code=code or f"C{Course.query.count() + 1:04d}",
+            credits=3,
+            type="专业必修",
+            hours=48,
+            department_id=dept.id,
+            **kwargs,
+        )
+        db.session.add(course)
+        db.session.commit()
+        return course
+
+    return factory
+
+
+@pytest.fixture
+def make_material(make_course):
+    """创建资料的工厂函数，未指定课程时使用同一门默认课程"""
+    from database import db, Material
+
+    default_course = []
+
+    def factory(user, title="期末试卷", course=None, **kwargs):
+        if course is None:
+            if not default_course:
+                default_course.append(make_course())
+            course = default_course[0]
+        material = Material(
+            title=title,
+            file_path="uploads/test.pdf",
+            file_type=kwargs.pop("file_type", "试卷"),
+            course_id=course.id,
+            user_id=user.id,
+            **kwargs,
+        )
+        db.session.add(material)
+        db.session.commit()
+        return material
+
+    return factory
+
+
+@pytest.fixture
+def client(app):
+    """测试客户端"""
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """让测试客户端以指定用户的身份登录"""
+
+    def do_login(user):
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user.id)
+            session["_fresh"] = True
+        return client
+
+    return do_login
+
+
+class StubSMTP:
+    """代替 smtplib 连接的桩对象，不建立网络连接，收发记录在 StubSMTPServer 中"""
+
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+
+    def has_extn(self, name):
+        return name.lower() == "8bitmime"
+
+    def login(self, user, password):
+        self.server.logins.append(user)
+        return (235, b"OK")
+
+    def sendmail(self, from_addr, to_addrs, msg, mail_options=()):
+        for to in to_addrs:
+            errors = self.server.errors.get(to)
+            if errors:
+                raise errors.pop(0)
+            self.server.received.append((from_addr, to, msg))
+        return {}
+
+    def noop(self):
+        return (250, b"OK")
+
+    def quit(self):
+        self.closed = True
+
+
+class StubSMTPServer:
+    """
+    桩SMTP服务器 - 记录建立的连接、登录和收到的邮件；
+    errors 为 {收件人: [异常, ...]}，发送给该收件人时依次抛出
+    """
+
+    def __init__(self):
+        self.connections = 0
+        self.logins = []
+        self.received = []  # [(发件人, 收件人, 邮件)]
+        self.errors = {}
+
+    def connect(self):
+        self.connections += 1
+        return StubSMTP(self)
+
+
+@pytest.fixture
+def smtp_stub(monkeypatch):
+    """让连接池连接到桩SMTP服务器"""
+    from notification.base import ConnectionPool
+
+    server = StubSMTPServer()
+    monkeypatch.setattr(ConnectionPool, "_create_connection", lambda pool, config: server.connect())
+    return server
+
+
+@pytest.fixture
+def mail_notifier(tmp_path, monkeypatch):
+    """
+    按给定的环境变量重新初始化邮件通知器，测试结束后关闭
+
+    用法: notifier = mail_notifier(SMTP_MAX_MESSAGES_PER_CONNECTION=2)
+    """
+    from notification import MailNotifier
+
+    def factory(**env):
+        MailNotifier.close()
+        monkeypatch.setenv("MAIL_OUTBOX_PATH", str(tmp_path / "outbox.db"))
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        return MailNotifier()
+
+    yield factory
+    MailNotifier.close()
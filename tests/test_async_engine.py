@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import smtplib
+import threading
+
+import pytest
+
+from notification.async_engine import AsyncSMTPConnection
+
+
+class ScriptedSMTPServer:
+    """
+    在后台线程中运行的最小SMTP服务器，记录收到的命令和邮件，
+    rejections 按 (命令, 参数) 指定拒绝时返回的响应行
+    """
+
+    def __init__(self):
+        self.commands = []
+        self.logins = []
+        self.messages = []  # [(发件人, 收件人, 邮件字节)]
+        self.rejections = {}
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait(5)
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0)
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_forever()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    async def _handle(self, reader, writer):
+        def reply(line):
+            writer.write(line.encode() + b"\r\n")
+
+        reply("220 scripted")
+        sender = recipient = None
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            verb, _, arg = line.decode().strip().partition(" ")
+            verb = verb.upper()
+            self.commands.append(verb)
+            rejection = self.rejections.get((verb, arg))
+            if rejection:
+                reply(rejection)
+            elif verb == "EHLO":
+                reply("250-scripted")
+                reply("250 AUTH PLAIN")
+            elif verb == "AUTH":
+                self.logins.append(base64.b64decode(arg.split()[1]).split(b"\0")[1].decode())
+                reply("235 OK")
+            elif verb == "MAIL":
+                sender = arg.split("<")[1].split(">")[0]
+                reply("250 OK")
+            elif verb == "RCPT":
+                recipient = arg.split("<")[1].split(">")[0]
+                reply("250 OK")
+            elif verb == "DATA":
+                reply("354 go ahead")
+                lines = []
+                while True:
+                    data = await reader.readline()
+                    if data == b".\r\n":
+                        break
+                    lines.append(data[1:] if data.startswith(b"..") else data)
+                self.messages.append((sender, recipient, b"".join(lines)))
+                reply("250 queued")
+            elif verb == "QUIT":
+                reply("221 bye")
+                break
+            else:
+                reply("250 OK")
+            await writer.drain()
+        writer.close()
+
+
+@pytest.fixture
+def scripted_server():
+    server = ScriptedSMTPServer()
+    yield server
+    server.stop()
+
+
+def run_session(server, *steps):
+    """连接脚本服务器、登录并依次执行 steps(接收连接的协程函数)"""
+
+    async def session():
+        smtp = AsyncSMTPConnection("127.0.0.1", server.port, use_ssl=False, timeout=5)
+        await smtp.connect()
+        await smtp.login("tests@example.com", "password")
+        try:
+            for step in steps:
+                await step(smtp)
+        finally:
+            await smtp.quit()
+
+    asyncio.run(session())
+
+
+def test_sends_mail_with_dot_stuffing(scripted_server):
+    data = b"Subject: hi\r\n\r\n.leading dot\r\nbody\r\n"
+
+    run_session(
+        scripted_server,
+        lambda smtp: smtp.sendmail("tests@example.com", "user@example.com", data),
+    )
+
+    assert scripted_server.logins == ["tests@example.com"]
+    assert scripted_server.messages == [("tests@example.com", "user@example.com", data)]
+
+
+def test_rejections_raise_smtplib_exceptions(scripted_server):
+    scripted_server.rejections[("RCPT", "TO:<unknown@example.com>")] = "550 no such user"
+    scripted_server.rejections[("MAIL", "FROM:<blocked@example.com>")] = "451 try later"
+    errors = []
+
+    async def expect(smtp, sender, to, exception):
+        try:
+            await smtp.sendmail(sender, to, b"body\r\n")
+        except exception as e:
+            errors.append(e)
+
+    run_session(
+        scripted_server,
+        lambda smtp: expect(smtp, "tests@example.com", "unknown@example.com", smtplib.SMTPRecipientsRefused),
+        lambda smtp: expect(smtp, "blocked@example.com", "user@example.com", smtplib.SMTPSenderRefused),
+        # 拒绝后连接已 RSET，仍然可以继续发送
+        lambda smtp: smtp.sendmail("tests@example.com", "user@example.com", b"body\r\n"),
+    )
+
+    assert errors[0].recipients == {"unknown@example.com": (550, "no such user")}
+    assert errors[1].smtp_code == 451
+    assert scripted_server.commands.count("RSET") == 2
+    assert [to for _, to, _ in scripted_server.messages] == ["user@example.com"]
+
+
+def test_asyncio_backend_delivers_queued_mail(scripted_server, mail_notifier):
+    notifier = mail_notifier(
+        MAIL_BACKEND="asyncio", SMTP_HOST="127.0.0.1", SMTP_PORT=str(scripted_server.port)
+    )
+    done = threading.Event()
+    results = []
+
+    def callback(result):
+        results.append(result)
+        done.set()
+
+    notifier.send(to=["a@example.com", "b@example.com"], subject="主题", content="内容", callback=callback)
+
+    assert done.wait(10)
+    assert results == [{"success": ["a@example.com", "b@example.com"], "failed": {}}]
+    assert sorted(to for _, to, _ in scripted_server.messages) == ["a@example.com", "b@example.com"]
+    # 同一账户的会话被复用，只登录一次
+    assert scripted_server.logins == ["tests@example.com"]
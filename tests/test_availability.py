@@ -0,0 +1,63 @@
+from sqlalchemy import insert
+
+from database import db, User
+from database.action import update_user
+from database.availability import BloomFilter, UserAvailabilityFilter, availability_filter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    members = [f"user{i}@pku.edu.cn" for i in range(1000)]
+    for item in members:
+        bloom.add(item)
+
+    assert all(item in bloom for item in members)
+    false_positives = sum(f"other{i}@pku.edu.cn" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_exists_matches_the_database(make_user):
+    users = [make_user(f"Student{i}") for i in range(20)]
+    availability = UserAvailabilityFilter()
+
+    assert all(availability.exists("username", u.username) for u in users)
+    assert all(availability.exists("email", u.email) for u in users)
+    assert not any(availability.exists("username", f"Nobody{i}") for i in range(200))
+
+    stats = availability.stats()
+    assert stats["probes"] == 240 and stats["elements"] == 40
+    # 绝大多数不存在的值不需要查询数据库
+    assert stats["filtered"] >= 190 and stats["queries"] == 40 + stats["false_positives"]
+
+
+def test_users_created_or_renamed_in_this_process_are_seen_immediately(make_user):
+    availability_filter.rebuild()
+    user = make_user("Alice")
+
+    assert availability_filter.exists("username", "Alice")
+
+    update_user(user.id, username="Alicia")
+    assert availability_filter.exists("username", "Alicia")
+    assert not availability_filter.exists("username", "Alice")
+
+
+def test_users_registered_by_other_processes_are_synced(make_user, monkeypatch):
+    availability = UserAvailabilityFilter()
+    availability.rebuild()
+    # 绕过ORM事件写入，模拟其他工作进程注册的用户
+    db.session.execute(insert(User).values(username="Remote", email="remote@example.com", password_hash="x"))
+    db.session.commit()
+
+    assert not availability.exists("username", "Remote")
+    monkeypatch.setattr(UserAvailabilityFilter, "SYNC_INTERVAL", 0)
+    assert availability.exists("username", "Remote")
+
+
+def test_availability_endpoints(client):
+    db.session.add(User(username="Taken", email="taken@pku.edu.cn", password_hash="x"))
+    db.session.commit()
+
+    assert client.post("/check_username", json={"username": "Taken"}).get_json()["available"] is False
+    assert client.post("/check_username", json={"username": "Free"}).get_json()["available"] is True
+    assert client.post("/check_email", json={"email": "taken@pku.edu.cn"}).get_json()["available"] is False
+    assert client.post("/check_email", json={"email": "free@pku.edu.cn"}).get_json()["available"] is True
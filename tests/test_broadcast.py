@@ -0,0 +1,137 @@
+import pytest
+
+from database import db, EmailBroadcast, EmailBroadcastChunk
+from database.action import delete_user
+from notification import MailNotifier
+from notification.broadcast import broadcast_sender
+
+
+class FakeOutbox:
+    """代替发件箱: 记录写入的分块，测试直接修改投递状态"""
+
+    def __init__(self):
+        self.mails = {}  # {outbox_id: send 的参数}
+        self.status = {}  # {outbox_id: get_status 的返回值}
+        self.budget = 100
+
+    def send(self, **kw):
+        outbox_id = len(self.mails) + 1
+        self.mails[outbox_id] = kw
+        self.status[outbox_id] = {"status": "pending", "result": None, "error": None}
+        return outbox_id
+
+    def deliver(self, outbox_id, success, status="sent"):
+        self.status[outbox_id] = {"status": status, "result": {"success": success, "failed": {}}}
+
+
+@pytest.fixture
+def outbox(app, monkeypatch):
+    fake = FakeOutbox()
+    monkeypatch.setattr(MailNotifier, "send", lambda self, **kw: fake.send(**kw))
+    monkeypatch.setattr(MailNotifier, "send_budget", lambda self, reserve=0: fake.budget)
+    monkeypatch.setattr(MailNotifier, "get_status", lambda self, outbox_id: fake.status.get(outbox_id))
+    monkeypatch.setitem(app.config, "NOTIFICATION_BROADCAST_CHUNK_SIZE", 2)
+    return fake
+
+
+@pytest.fixture
+def audience(make_user):
+    """五位邮箱已验证的用户(第一位是管理员)和一位未验证的用户"""
+    admin = make_user("Admin", is_admin=True, is_email_verified=True)
+    users = [admin] + [make_user(f"User{i}", is_email_verified=True) for i in range(4)]
+    make_user("Unverified")
+    return users
+
+
+def test_create_counts_verified_recipients(audience):
+    admin = audience[0]
+
+    assert broadcast_sender.create("通知", "内容", admin.id).total == 5
+    assert broadcast_sender.create("通知", "内容", admin.id, segment="admin").total == 1
+    with pytest.raises(ValueError):
+        broadcast_sender.create("通知", "内容", admin.id, segment="everyone")
+    with pytest.raises(ValueError):
+        broadcast_sender.create("通知", "内容", admin.id, segment="department")
+
+
+def test_recipients_are_chunked_into_bulk_mail(app, outbox, audience):
+    broadcast = broadcast_sender.create("通知", "内容", audience[0].id)
+
+    assert broadcast_sender.run_once(app) == broadcast_sender.POLL_INTERVAL
+
+    assert [len(mail["to"]) for mail in outbox.mails.values()] == [2, 2, 1]
+    assert {mail["lane"] for mail in outbox.mails.values()} == {"bulk"}
+    assert sorted(sum((mail["to"] for mail in outbox.mails.values()), [])) == sorted(
+        user.email for user in audience
+    )
+    db.session.refresh(broadcast)
+    assert broadcast.enqueued == 5 and broadcast.status == "sending"
+
+
+def test_chunks_stop_at_the_send_budget(app, outbox, audience):
+    broadcast = broadcast_sender.create("通知", "内容", audience[0].id)
+    outbox.budget = 3
+
+    assert broadcast_sender.run_once(app) == broadcast_sender.IDLE_INTERVAL
+    assert [len(mail["to"]) for mail in outbox.mails.values()] == [2, 1]
+
+    # 配额恢复后从游标继续
+    outbox.budget = 100
+    broadcast_sender.run_once(app)
+    assert [len(mail["to"]) for mail in outbox.mails.values()] == [2, 1, 2]
+    db.session.refresh(broadcast)
+    assert broadcast.enqueued == 5
+
+
+def test_progress_keeps_cumulative_results(app, outbox, audience):
+    broadcast = broadcast_sender.create("通知", "内容", audience[0].id)
+    broadcast_sender.run_once(app)
+    first, second, third = outbox.mails
+
+    # 第一块部分成功后仍在重试，第二块全部成功，第三块的发件箱记录已被清理
+    outbox.deliver(first, outbox.mails[first]["to"][:1], status="pending")
+    outbox.deliver(second, outbox.mails[second]["to"])
+    del outbox.status[third]
+    broadcast_sender.run_once(app)
+    db.session.refresh(broadcast)
+    assert (broadcast.sent, broadcast.failed, broadcast.status) == (3, 1, "sending")
+    statuses = {c.outbox_id: c.status for c in EmailBroadcastChunk.query}
+    assert statuses == {first: "pending", second: "sent", third: "lost"}
+
+    outbox.deliver(first, outbox.mails[first]["to"][:1], status="dead")
+    broadcast_sender.run_once(app)
+    db.session.refresh(broadcast)
+    assert (broadcast.sent, broadcast.failed, broadcast.status) == (3, 2, "done")
+
+
+def test_cancelled_broadcast_is_not_sent(app, outbox, audience):
+    broadcast = broadcast_sender.create("通知", "内容", audience[0].id)
+
+    assert broadcast_sender.cancel(broadcast.id) is True
+    assert broadcast_sender.run_once(app) == broadcast_sender.IDLE_INTERVAL
+    assert outbox.mails == {}
+    assert broadcast_sender.cancel(broadcast.id) is False
+
+
+def test_deleting_the_creator_keeps_the_broadcast(audience):
+    admin = audience[0]
+    broadcast_id = broadcast_sender.create("通知", "内容", admin.id).id
+
+    delete_user(admin.id)
+
+    assert db.session.get(EmailBroadcast, broadcast_id).created_by is None
+
+
+def test_send_budget_counts_pending_recipients(smtp_stub, mail_notifier):
+    notifier = mail_notifier(
+        EMAIL_DAILY_LIMIT_1="10",
+        MAIL_WORKERS_INTERACTIVE="0",
+        MAIL_WORKERS_TRANSACTIONAL="0",
+        MAIL_WORKERS_BULK="0",
+    )
+    assert notifier.send_budget() == 10
+
+    notifier.send(to=["a@example.com", "b@example.com", "c@example.com"], subject="通知", content="内容", lane="bulk")
+
+    assert notifier.send_budget() == 7
+    assert notifier.send_budget(reserve=5) == 2
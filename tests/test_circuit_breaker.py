@@ -0,0 +1,101 @@
+import smtplib
+
+from notification.base import EmailAccount
+from notification.circuit_breaker import CircuitBreaker, order_accounts
+
+PRIMARY, BACKUP = "tests@example.com", "backup@example.com"
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers_after_probe():
+    breaker = CircuitBreaker(PRIMARY, failure_threshold=2, cooldown=0)
+
+    assert breaker.record_failure() is False and breaker.allow()
+    assert breaker.record_failure() is True
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    # 冷却结束进入 half_open，探测失败立即重新熔断
+    assert breaker.due_for_probe() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN and not breaker.allow()
+    assert breaker.record_failure() is True
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.due_for_probe() is True
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.consecutive_failures == 0
+
+
+def test_success_resets_the_failure_streak():
+    breaker = CircuitBreaker(PRIMARY, failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success(0.1)
+
+    assert breaker.record_failure() is False
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_is_not_probed_before_cooldown():
+    breaker = CircuitBreaker(PRIMARY, failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+
+    assert breaker.due_for_probe() is False
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_accounts_are_ordered_by_priority_then_health():
+    fast, slow, fallback = (
+        EmailAccount("fast@example.com", "x"),
+        EmailAccount("slow@example.com", "x"),
+        EmailAccount("fallback@example.com", "x", priority=2),
+    )
+    breakers = {a.address: CircuitBreaker(a.address, failure_threshold=1) for a in (fast, slow, fallback)}
+    breakers[slow.address].record_success(10.0)
+
+    assert order_accounts([slow, fast, fallback], breakers) == [fast, slow, fallback]
+
+    breakers[fast.address].record_failure()
+    assert order_accounts([slow, fast, fallback], breakers) == [slow, fallback]
+
+    # 全部熔断时仍按评分尝试所有账户
+    breakers[slow.address].record_failure()
+    breakers[fallback.address].record_failure()
+    ordered = order_accounts([slow, fast, fallback], breakers)
+    assert {a.address for a in ordered} == {fast.address, slow.address, fallback.address}
+
+
+def two_account_notifier(mail_notifier):
+    return mail_notifier(EMAIL_USER_2=BACKUP, EMAIL_PWD_2="password", EMAIL_USER_3="")
+
+
+def test_temporary_rejection_fails_over_to_the_next_account(smtp_stub, mail_notifier):
+    notifier = two_account_notifier(mail_notifier)
+    smtp_stub.errors["user@example.com"] = [
+        smtplib.SMTPSenderRefused(451, b"rate limited", PRIMARY)
+    ]
+
+    result = notifier.send_sync("user@example.com", "主题", "内容")
+
+    assert result == {"success": ["user@example.com"], "failed": {}}
+    assert smtp_stub.logins == [PRIMARY, BACKUP]
+    assert notifier.breakers[PRIMARY].consecutive_failures == 1
+
+
+def test_permanent_rejections_fail_the_recipient_without_tripping_the_breaker(smtp_stub, mail_notifier):
+    notifier = two_account_notifier(mail_notifier)
+    smtp_stub.errors.update(
+        {
+            "unknown@example.com": [
+                smtplib.SMTPRecipientsRefused({"unknown@example.com": (550, b"no such user")})
+            ],
+            "spam@example.com": [smtplib.SMTPDataError(554, b"content rejected")],
+            "policy@example.com": [smtplib.SMTPSenderRefused(553, b"not allowed", PRIMARY)],
+        }
+    )
+
+    result = notifier.send_sync(
+        ["unknown@example.com", "spam@example.com", "policy@example.com", "ok@example.com"], "主题", "内容"
+    )
+
+    assert result["success"] == ["ok@example.com"]
+    assert set(result["failed"]) == {"unknown@example.com", "spam@example.com", "policy@example.com"}
+    assert smtp_stub.logins == [PRIMARY]
+    assert notifier.breakers[PRIMARY].consecutive_failures == 0
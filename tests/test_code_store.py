@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from notification.code_store import VerificationCodeStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "codes.db")
+
+
+def test_code_is_shared_and_consumed_once(path):
+    issuer, verifier = VerificationCodeStore(path), VerificationCodeStore(path)
+    issuer.put("a@pku.edu.cn", "123456", ttl=60)
+
+    assert verifier.check("a@pku.edu.cn", "123456") is True
+    assert verifier.check("a@pku.edu.cn", "123456", consume=True) is True
+    assert issuer.check("a@pku.edu.cn", "123456") is False
+
+
+def test_only_a_salted_digest_is_stored(path):
+    VerificationCodeStore(path).put("a@pku.edu.cn", "123456", ttl=60)
+
+    row = sqlite3.connect(path).execute("SELECT salt, code_hash FROM verification_code").fetchone()
+    assert b"123456" not in row[0] + row[1]
+
+
+def test_code_is_voided_after_too_many_failures(path):
+    store = VerificationCodeStore(path, max_attempts=3)
+    store.put("a@pku.edu.cn", "123456", ttl=60)
+
+    assert store.check("a@pku.edu.cn", "000000") is False
+    assert store.check("a@pku.edu.cn", "111111") is False
+    assert store.check("a@pku.edu.cn", "123456") is True
+    assert store.check("a@pku.edu.cn", "222222") is False
+    # 第三次失败后验证码作废，正确的验证码也不再通过
+    assert store.check("a@pku.edu.cn", "123456") is False
+
+    # 重新发送验证码清零失败次数
+    store.put("a@pku.edu.cn", "654321", ttl=60)
+    assert store.check("a@pku.edu.cn", "000000") is False
+    assert store.check("a@pku.edu.cn", "654321") is True
+
+
+def test_expired_code_is_rejected(path):
+    store = VerificationCodeStore(path)
+    store.put("a@pku.edu.cn", "123456", ttl=-1)
+
+    assert store.check("a@pku.edu.cn", "123456") is False
+    assert store.stats() == {"codes": 0, "expired": 0}
+
+
+def test_timing_wheel_removes_only_expired_codes(path):
+    store = VerificationCodeStore(path, tick_seconds=1, wheel_size=8)
+    store.put("short@pku.edu.cn", "111111", ttl=5)
+    store.put("long@pku.edu.cn", "222222", ttl=600)
+    now = time.time()
+
+    assert store.advance(now) == 0
+    assert store.advance(now + 10) == 1
+    assert store.stats() == {"codes": 1, "expired": 0}
+    # 有效期超过一圈的记录不会被提前删除
+    assert store.advance(now + 100) == 0
+    assert store.check("long@pku.edu.cn", "222222") is True
+
+
+def test_concurrent_consume_succeeds_once(path):
+    VerificationCodeStore(path).put("a@pku.edu.cn", "123456", ttl=60)
+    results = []
+
+    def worker():
+        results.append(VerificationCodeStore(path).check("a@pku.edu.cn", "123456", consume=True))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
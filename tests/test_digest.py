@@ -0,0 +1,155 @@
+import json
+
+import pytest
+
+from database import db, EmailPreference
+from database.action import delete_user
+from database.models import Relationship
+from notification import MailNotifier, follower_fanout, notification_manager
+from notification.digest import follower_digest
+
+
+class SentMail(list):
+    """写入发件箱的邮件参数列表"""
+
+    budget = None
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    """记录写入发件箱的邮件，budget["value"] 控制剩余配额"""
+    sent = SentMail()
+    budget = {"value": 100}
+    monkeypatch.setattr(MailNotifier, "send", lambda self, **kw: sent.append(kw) or len(sent))
+    monkeypatch.setattr(MailNotifier, "send_budget", lambda self, reserve=0: budget["value"])
+    sent.budget = budget
+    return sent
+
+
+@pytest.fixture
+def fans(make_user):
+    """一位上传者和三位邮箱已验证的粉丝"""
+    uploader = make_user("Up")
+    fans = [make_user(f"Fan{i}", is_email_verified=True) for i in range(3)]
+    for fan in fans:
+        db.session.add(Relationship(follower_id=fan.id, followed_id=uploader.id))
+    db.session.commit()
+    return uploader, fans
+
+
+def set_mode(user, mode):
+    db.session.merge(EmailPreference(user_id=user.id, follower_uploads=mode))
+    db.session.commit()
+
+
+def upload(uploader, title):
+    return notification_manager.create_follower_notification(uploader.id, title, f"上传了 {title}")
+
+
+def recipients(sent):
+    return sorted(mail["to"] for mail in sent)
+
+
+def test_follower_emails_are_off_by_default(app, outbox, fans):
+    uploader, _ = fans
+
+    assert follower_digest.send_immediate(upload(uploader, "期中试卷")) == 0
+    assert follower_digest.run_once(app)["digests"] == 0
+    assert outbox == []
+
+
+def test_immediate_preference_sends_one_mail_per_upload(app, outbox, fans):
+    uploader, (fan, other, _) = fans
+    set_mode(fan, "immediate")
+    set_mode(other, "daily")
+
+    notification = upload(uploader, "期中试卷")
+    assert follower_digest.send_immediate(notification) == 1
+
+    [mail] = outbox
+    assert mail["to"] == fan.email and mail["lane"] == "transactional"
+    assert "期中试卷" in json.loads(mail["content"])["item"]
+    assert db.session.get(EmailPreference, fan.id).last_digest_id == notification.id
+
+    # 已经即时发送的通知不会再进入摘要
+    outbox.clear()
+    follower_digest.run_once(app)
+    assert recipients(outbox) == [other.email]
+
+
+def test_daily_digest_merges_uploads_once(app, outbox, fans):
+    uploader, (fan, _, _) = fans
+    set_mode(fan, "daily")
+    upload(uploader, "期中试卷")
+    upload(uploader, "期末试卷")
+
+    assert follower_digest.run_once(app)["digests"] == 1
+    [mail] = outbox
+    params = json.loads(mail["content"])
+    assert mail["lane"] == "bulk" and params["count"] == 2
+    assert "期中试卷" in params["items"] and "期末试卷" in params["items"]
+
+    assert follower_digest.run_once(app)["digests"] == 0
+    assert follower_digest.stats()["digests_total"] == 1
+
+
+def test_read_notifications_are_left_out_of_the_digest(app, outbox, fans):
+    uploader, (fan, _, _) = fans
+    set_mode(fan, "daily")
+    notification = upload(uploader, "期中试卷")
+    notification_manager.mark_as_read(notification.id, fan.id, False)
+
+    assert follower_digest.run_once(app)["digests"] == 0
+
+
+def test_immediate_mail_over_budget_is_deferred_to_the_digest(app, outbox, fans):
+    uploader, fans = fans
+    for fan in fans:
+        set_mode(fan, "immediate")
+    outbox.budget["value"] = 1
+
+    assert follower_digest.send_immediate(upload(uploader, "期中试卷")) == 1
+    assert recipients(outbox) == [fans[0].email]
+    assert follower_digest.stats()["immediate_deferred"] == 2
+
+    # 被推迟的粉丝不会再单独收到后续上传，而是由摘要合并发送
+    outbox.clear()
+    outbox.budget["value"] = 100
+    assert follower_digest.send_immediate(upload(uploader, "期末试卷")) == 1
+    assert recipients(outbox) == [fans[0].email]
+
+    outbox.clear()
+    follower_digest.run_once(app)
+    assert recipients(outbox) == sorted(fan.email for fan in fans[1:])
+    assert all(json.loads(mail["content"])["count"] == 2 for mail in outbox)
+
+
+def test_digest_stops_at_the_budget(app, outbox, fans):
+    uploader, fans = fans
+    for fan in fans:
+        set_mode(fan, "daily")
+    upload(uploader, "期中试卷")
+    outbox.budget["value"] = 2
+
+    result = follower_digest.run_once(app)
+
+    assert result["digests"] == 2 and result["deferred"] is True
+
+
+def test_fanout_sends_immediate_mail(app, outbox, fans, make_material):
+    uploader, (fan, _, _) = fans
+    set_mode(fan, "immediate")
+
+    follower_fanout.submit(app, uploader.id, make_material(uploader, "线性代数笔记").id)
+    follower_fanout.join()
+
+    assert recipients(outbox) == [fan.email]
+
+
+def test_deleting_a_user_removes_the_preference(outbox, fans):
+    _, (fan, _, _) = fans
+    set_mode(fan, "daily")
+
+    delete_user(fan.id)
+
+    assert db.session.get(EmailPreference, fan.id) is None
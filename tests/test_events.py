@@ -0,0 +1,61 @@
+import blueprints.events
+from notification import event_hub, format_sse, notification_manager, unread_counter
+
+
+def test_format_sse():
+    assert format_sse("unread", {"count": 3}) == 'event: unread\ndata: {"count": 3}\n\n'
+
+
+def test_subscriber_receives_unread_count_changes(app, make_user):
+    author, user = make_user("Author"), make_user("User")
+    subscription = event_hub.subscribe(app, user.id, False)
+    try:
+        notification_manager.create_notification("标题", "内容", author.id)
+        event = subscription.get(timeout=5)
+        while event is not None and event[1]["count"] != 1:
+            event = subscription.get(timeout=5)
+        assert event == ("unread", {"count": 1})
+    finally:
+        event_hub.unsubscribe(subscription)
+
+
+def test_changed_users_only_reports_affected_users(make_user):
+    author, fan, other = make_user("Author"), make_user("Fan"), make_user("Other")
+    online = {(fan.id, False), (other.id, False)}
+
+    since = unread_counter.read_token()
+    notification_manager.create_notification(
+        "关注", "内容", author.id, target_role="followers", recipient_ids=[fan.id]
+    )
+    assert unread_counter.changed_users(online, since) == {(fan.id, False)}
+
+    since = unread_counter.read_token()
+    notification_manager.create_notification("管理员", "内容", author.id, target_role="admin")
+    assert unread_counter.changed_users(online | {(author.id, True)}, since) == {(author.id, True)}
+
+    since = unread_counter.read_token()
+    notification_manager.create_notification("全体", "内容", author.id)
+    assert unread_counter.changed_users(online, since) == online
+
+
+def test_stream_starts_with_the_unread_count(login, make_user):
+    client = login(make_user("User"))
+
+    response = client.get("/events")
+    try:
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+        chunks = iter(response.response)
+        assert next(chunks).startswith(b"retry:")
+        assert next(chunks) == format_sse("unread", {"count": 0}).encode()
+    finally:
+        response.close()
+
+
+def test_stream_limit_returns_503(login, make_user, monkeypatch):
+    client = login(make_user("User"))
+    monkeypatch.setattr(blueprints.events, "MAX_STREAMS", 0)
+
+    response = client.get("/events")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(blueprints.events.STREAM_LIFETIME)
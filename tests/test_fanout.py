@@ -0,0 +1,75 @@
+from unittest import mock
+
+from database import db, FollowerFanoutTask, Notification, NotificationReceipt
+from database.action import delete_user
+from database.models import Relationship
+from notification import follower_fanout, notification_manager
+
+
+def follow(follower, followed):
+    db.session.add(Relationship(follower_id=follower.id, followed_id=followed.id))
+    db.session.commit()
+
+
+def test_upload_fans_out_to_every_follower(app, make_user, make_material):
+    uploader, fans = make_user("Up"), [make_user(f"Fan{i}") for i in range(3)]
+    stranger = make_user("Stranger")
+    for fan in fans:
+        follow(fan, uploader)
+    material = make_material(uploader, "线性代数笔记")
+
+    follower_fanout.submit(app, uploader.id, material.id)
+    follower_fanout.join()
+    db.session.expire_all()
+
+    [notification] = Notification.query.filter_by(target_role="followers").all()
+    assert notification.material_id == material.id
+    assert "线性代数笔记" in notification.content
+    assert {r.user_id for r in NotificationReceipt.query} == {fan.id for fan in fans}
+    assert notification_manager.get_unread_count(fans[0].id, False) == 1
+    assert notification_manager.get_unread_count(stranger.id, False) == 0
+    assert FollowerFanoutTask.query.count() == 0
+
+
+def test_upload_without_followers_only_removes_the_task(app, make_user, make_material):
+    uploader = make_user("Up")
+    material = make_material(uploader)
+
+    follower_fanout.submit(app, uploader.id, material.id)
+    follower_fanout.join()
+
+    assert Notification.query.count() == 0
+    assert FollowerFanoutTask.query.count() == 0
+
+
+def test_failing_task_is_dropped_after_max_attempts(app, make_user, make_material):
+    uploader, fan = make_user("Up"), make_user("Fan")
+    follow(fan, uploader)
+    material = make_material(uploader)
+    task = FollowerFanoutTask(uploader_id=uploader.id, material_id=material.id)
+    db.session.add(task)
+    db.session.commit()
+    task_id = task.id
+
+    with mock.patch.object(
+        notification_manager, "create_follower_notification", side_effect=RuntimeError("boom")
+    ):
+        for attempt in range(1, follower_fanout.MAX_ATTEMPTS):
+            follower_fanout._execute_task((app, task_id))
+            db.session.expire_all()
+            assert db.session.get(FollowerFanoutTask, task_id).attempts == attempt
+        follower_fanout._execute_task((app, task_id))
+
+    db.session.expire_all()
+    assert db.session.get(FollowerFanoutTask, task_id) is None
+    assert Notification.query.count() == 0
+
+
+def test_delete_user_drops_pending_fanout_tasks(make_user, make_material):
+    uploader = make_user("Up")
+    material = make_material(uploader)
+    db.session.add(FollowerFanoutTask(uploader_id=uploader.id, material_id=material.id))
+    db.session.commit()
+
+    assert delete_user(uploader.id) is True
+    assert FollowerFanoutTask.query.count() == 0
@@ -0,0 +1,55 @@
+import logging
+import os
+from argparse import Namespace
+
+import pytest
+
+from benchmarks.mail_bench import MailBenchmark, account_address, percentile
+from notification import MailNotifier
+
+
+@pytest.fixture
+def bench_args():
+    """MailBenchmark 的参数(与命令行默认值相同，但规模更小)，测试结束后恢复环境变量"""
+    saved = dict(os.environ)
+    MailNotifier.close()
+
+    def make(**overrides):
+        args = dict(
+            mode="send", backend="threads", messages=20, concurrency=4, lane="transactional",
+            accounts=2, connections=2, latency=0.0, ssl=False, fail_accounts=[],
+            recover_after=None, rate_limit=None, rate_window=60, timeout=30,
+        )
+        args.update(overrides)
+        return Namespace(**args)
+
+    yield make
+    MailNotifier.close()
+    os.environ.clear()
+    os.environ.update(saved)
+    logging.disable(logging.NOTSET)
+
+
+@pytest.mark.parametrize("backend", ["threads", "asyncio"])
+def test_queued_sends_are_all_delivered(bench_args, backend):
+    report = MailBenchmark(bench_args(backend=backend)).run()
+
+    assert report["completed"] is True
+    assert report["delivered"] == 20 and report["failed"] == 0
+    # 会话被复用，连接数不超过 账户数 x 每账户连接数
+    assert report["smtp_connections"] <= 4
+    assert report["connection_reuse_ratio"] > 0.5
+
+
+def test_verification_codes_fail_over_from_a_rejected_account(bench_args):
+    report = MailBenchmark(bench_args(mode="verification", messages=5, fail_accounts=[1])).run()
+
+    assert report["delivered"] == 5
+    assert report["delivered_by_account"] == {account_address(2): 5}
+    assert report["auth_rejections"] >= 1
+
+
+def test_percentile_uses_nearest_rank():
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile([3, 1, 2, 4], 99) == 4
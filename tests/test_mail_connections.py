@@ -0,0 +1,37 @@
+import smtplib
+
+ACCOUNT = "tests@example.com"
+
+
+def test_authenticated_session_is_reused(smtp_stub, mail_notifier):
+    notifier = mail_notifier()
+
+    for i in range(3):
+        result = notifier.send_sync(f"user{i}@example.com", "主题", "内容")
+        assert result["success"] == [f"user{i}@example.com"]
+
+    assert smtp_stub.connections == 1
+    assert smtp_stub.logins == [ACCOUNT]
+    assert [to for _, to, _ in smtp_stub.received] == [f"user{i}@example.com" for i in range(3)]
+
+
+def test_connection_is_recycled_after_max_messages(smtp_stub, mail_notifier):
+    notifier = mail_notifier(SMTP_MAX_MESSAGES_PER_CONNECTION=2)
+
+    for i in range(5):
+        assert notifier.send_sync(f"user{i}@example.com", "主题", "内容")["success"]
+
+    assert smtp_stub.connections == 3
+    assert smtp_stub.logins == [ACCOUNT] * 3
+
+
+def test_disconnected_session_is_replaced_and_logged_in_again(smtp_stub, mail_notifier):
+    notifier = mail_notifier()
+    notifier.send_sync("first@example.com", "主题", "内容")
+    smtp_stub.errors["second@example.com"] = [smtplib.SMTPServerDisconnected("断开")]
+
+    assert notifier.send_sync("second@example.com", "主题", "内容")["success"] == []
+    assert notifier.send_sync("second@example.com", "主题", "内容")["success"] == ["second@example.com"]
+
+    assert smtp_stub.connections == 2
+    assert smtp_stub.logins == [ACCOUNT] * 2
@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from notification.outbox import MailOutbox
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return MailOutbox(str(tmp_path / "outbox.db"))
+
+
+def test_higher_priority_lanes_are_claimed_first(outbox):
+    bulk = outbox.enqueue(["a@example.com"], "摘要", "内容", lane="bulk")
+    transactional = outbox.enqueue(["b@example.com"], "通知", "内容")
+    interactive = outbox.enqueue(["c@example.com"], "验证码", "内容", lane="interactive")
+
+    claimed = []
+    for _ in range(3):
+        [task] = outbox.claim("worker", lanes=list(MailOutbox.LANES))
+        claimed.append(task["id"])
+    assert claimed == [interactive, transactional, bulk]
+
+
+def test_workers_never_claim_lower_priority_lanes(outbox):
+    outbox.enqueue(["a@example.com"], "摘要", "内容", lane="bulk")
+
+    assert outbox.claim("interactive-worker", lanes=["interactive"]) == []
+    assert outbox.claim("transactional-worker", lanes=["interactive", "transactional"]) == []
+    assert len(outbox.claim("bulk-worker", lanes=list(MailOutbox.LANES))) == 1
+
+
+def test_unknown_lane_is_rejected(outbox):
+    with pytest.raises(ValueError):
+        outbox.enqueue(["a@example.com"], "主题", "内容", lane="urgent")
+
+
+def test_interactive_mail_is_not_stuck_behind_bulk_mail(smtp_stub, mail_notifier):
+    # 没有批量通道的工作线程: 批量邮件一直排队，验证码仍由 interactive 工作线程发送
+    notifier = mail_notifier(MAIL_WORKERS_BULK=0, MAIL_WORKERS_TRANSACTIONAL=0)
+    bulk_ids = [
+        notifier.send(to=f"user{i}@example.com", subject="摘要", content="内容", lane="bulk")
+        for i in range(20)
+    ]
+    done = threading.Event()
+    notifier.send(
+        to="waiting@example.com", subject="验证码", content="123456",
+        callback=lambda result: done.set(), lane="interactive",
+    )
+
+    assert done.wait(10)
+    assert [to for _, to, _ in smtp_stub.received] == ["waiting@example.com"]
+    assert {notifier.get_status(i)["status"] for i in bulk_ids} == {MailOutbox.PENDING}
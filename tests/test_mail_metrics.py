@@ -0,0 +1,61 @@
+from notification.mail_metrics import LatencyHistogram, MailMetrics, mail_metrics
+
+
+def test_histogram_percentiles_use_bucket_upper_bounds():
+    histogram = LatencyHistogram(buckets=(1, 5, 10))
+    for value in (0.5, 0.8, 3, 4, 7, 42):
+        histogram.observe(value)
+
+    assert histogram.percentile(50) == 5
+    assert histogram.percentile(80) == 10
+    # 超过最后一个桶上界时返回记录到的最大值
+    assert histogram.percentile(99) == 42
+
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 2, "5": 2, "10": 1, "+Inf": 1}
+    assert snapshot["count"] == 6 and snapshot["max"] == 42
+
+
+def test_empty_histogram_has_no_percentiles():
+    assert LatencyHistogram().snapshot()["p99"] is None
+
+
+def test_account_counters_and_connection_reuse():
+    metrics = MailMetrics()
+    metrics.record_checkout("a@example.com", reused=False)
+    for _ in range(3):
+        metrics.record_checkout("a@example.com", reused=True)
+    metrics.record_checkout("b@example.com", reused=False)
+    metrics.record_sent("a@example.com")
+    metrics.record_failed("b@example.com")
+    metrics.record_latency("interactive", 0.2)
+
+    snapshot = metrics.snapshot()
+
+    assert snapshot["accounts"]["a@example.com"]["reuse_ratio"] == 0.75
+    assert snapshot["accounts"]["b@example.com"]["failed"] == 1
+    assert snapshot["connections"] == {"checkouts": 5, "connections": 2, "reuse_ratio": 0.6}
+    assert snapshot["latency"]["interactive"]["count"] == 1
+
+
+def test_sends_are_counted_per_account(smtp_stub, mail_notifier):
+    notifier = mail_notifier()
+    before = mail_metrics.snapshot()["accounts"].get("tests@example.com", {}).get("sent", 0)
+
+    notifier.send_sync(["a@example.com", "b@example.com"], "主题", "内容")
+
+    assert mail_metrics.snapshot()["accounts"]["tests@example.com"]["sent"] == before + 2
+
+
+def test_stats_endpoint_requires_admin(make_user, login):
+    assert login(make_user("student")).get("/admin/mail/stats").status_code == 403
+
+
+def test_admin_stats_endpoint(make_user, login, smtp_stub, mail_notifier):
+    mail_notifier()
+
+    stats = login(make_user("admin", is_admin=True)).get("/admin/mail/stats").get_json()
+    assert stats["backend"] == "threads"
+    assert set(stats["lanes"]) == {"interactive", "transactional", "bulk"}
+    assert "latency" in stats["lanes"]["interactive"]
+    assert stats["accounts"]["tests@example.com"]["breaker"]["state"] == "closed"
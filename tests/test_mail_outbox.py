@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from notification.outbox import MailOutbox
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return MailOutbox(str(tmp_path / "outbox.db"), max_attempts=3, base_delay=60, lease_seconds=60)
+
+
+def test_claimed_mail_is_not_claimed_twice(outbox):
+    outbox_id = outbox.enqueue(["a@example.com"], "主题", "内容")
+
+    [task] = outbox.claim("worker-a")
+    assert task["id"] == outbox_id and task["owner"] == "worker-a" and task["attempts"] == 1
+    assert outbox.claim("worker-b") == []
+
+    assert outbox.complete(outbox_id, "worker-a", {"success": ["a@example.com"], "failed": {}})
+    assert outbox.get_status(outbox_id)["status"] == MailOutbox.SENT
+
+
+def test_orphaned_lease_is_reclaimed_and_fenced(tmp_path):
+    outbox = MailOutbox(str(tmp_path / "outbox.db"), lease_seconds=0.05)
+    outbox_id = outbox.enqueue(["a@example.com"], "主题", "内容")
+    outbox.claim("crashed-worker")
+
+    time.sleep(0.1)
+    [task] = outbox.claim("worker-b")
+    assert task["id"] == outbox_id and task["attempts"] == 2
+
+    # 原持有者的续约、完成和重试都不再生效
+    assert outbox.renew({outbox_id: "crashed-worker"}) == 0
+    assert outbox.complete(outbox_id, "crashed-worker", {"success": [], "failed": {}}) is False
+    assert outbox.retry_later(outbox_id, "crashed-worker", 1, "超时") is True
+    assert outbox.get_status(outbox_id)["status"] == MailOutbox.SENDING
+
+    assert outbox.complete(outbox_id, "worker-b", {"success": ["a@example.com"], "failed": {}})
+    assert outbox.get_status(outbox_id)["result"]["success"] == ["a@example.com"]
+
+
+def test_retry_backs_off_and_keeps_cumulative_results(outbox):
+    outbox_id = outbox.enqueue(["a@example.com", "b@example.com"], "主题", "内容")
+    [task] = outbox.claim("worker")
+    partial = {"success": ["a@example.com"], "failed": {}}
+
+    assert outbox.retry_later(outbox_id, "worker", task["attempts"], "421", ["b@example.com"], partial)
+    # 退避期间不会被领取
+    assert outbox.claim("worker") == []
+    status = outbox.get_status(outbox_id)
+    assert status["status"] == MailOutbox.PENDING and status["result"] == partial
+
+
+def test_mail_goes_dead_after_max_attempts(tmp_path):
+    outbox = MailOutbox(str(tmp_path / "outbox.db"), max_attempts=2, base_delay=0)
+    outbox_id = outbox.enqueue(["a@example.com", "b@example.com"], "主题", "内容")
+    partial = {"success": ["a@example.com"], "failed": {}}
+
+    [task] = outbox.claim("worker")
+    outbox.retry_later(outbox_id, "worker", task["attempts"], "421", ["b@example.com"], partial)
+    [task] = outbox.claim("worker")
+    assert task["recipients"] == ["b@example.com"] and task["result"] == partial
+    assert outbox.retry_later(outbox_id, "worker", task["attempts"], "421", ["b@example.com"], partial) is False
+
+    final = outbox.get_final_results([outbox_id])[outbox_id]
+    assert final["status"] == MailOutbox.DEAD
+    assert final["result"] == {"success": ["a@example.com"], "failed": {"b@example.com": "421"}}
+
+
+def test_queued_mail_is_delivered_from_the_outbox(smtp_stub, mail_notifier):
+    notifier = mail_notifier()
+    done = threading.Event()
+    results = []
+
+    def callback(result):
+        results.append(result)
+        done.set()
+
+    outbox_id = notifier.send(to="user@example.com", subject="主题", content="内容", callback=callback)
+
+    assert done.wait(10)
+    assert results == [{"success": ["user@example.com"], "failed": {}}]
+    assert notifier.get_status(outbox_id)["status"] == MailOutbox.SENT
+    assert [to for _, to, _ in smtp_stub.received] == ["user@example.com"]
@@ -0,0 +1,90 @@
+import smtplib
+import threading
+import time
+
+import pytest
+
+from notification.base import ConnectionPool, EmailAccount, PoolExhaustedError
+from notification.quota_store import MailQuotaStore
+
+ACCOUNT = "tests@example.com"
+
+
+def test_quota_is_shared_by_every_store_on_the_same_file(tmp_path):
+    path = str(tmp_path / "quota.db")
+    worker_a, worker_b = MailQuotaStore(path), MailQuotaStore(path)
+
+    assert worker_a.try_acquire(ACCOUNT, 3) is True
+    assert worker_b.try_acquire(ACCOUNT, 3, count=2) is True
+    assert worker_a.try_acquire(ACCOUNT, 3) is False
+    assert worker_b.available(ACCOUNT, 3) == pytest.approx(0, abs=0.01)
+
+
+def test_tokens_refill_over_the_window(tmp_path):
+    store = MailQuotaStore(str(tmp_path / "quota.db"), window=0.2)
+    assert store.try_acquire(ACCOUNT, 2, count=2) is True
+    assert store.try_acquire(ACCOUNT, 2) is False
+
+    time.sleep(0.25)
+    assert store.available(ACCOUNT, 2) == 2
+    assert store.try_acquire(ACCOUNT, 2, count=2) is True
+
+
+def test_refund_never_exceeds_capacity(tmp_path):
+    store = MailQuotaStore(str(tmp_path / "quota.db"))
+    store.try_acquire(ACCOUNT, 5)
+    store.refund(ACCOUNT, 5, count=3)
+
+    assert store.available(ACCOUNT, 5) == pytest.approx(5, abs=0.01)
+
+
+def test_pool_limits_concurrent_connections_per_account(tmp_path, smtp_stub):
+    pool = ConnectionPool(str(tmp_path / "quota.db"), connections_per_account=2, checkout_timeout=0.1)
+    account = EmailAccount(ACCOUNT, "password")
+    release = threading.Event()
+    holding = threading.Barrier(3)
+
+    def hold():
+        with pool.checkout(account, None):
+            holding.wait()
+            release.wait(5)
+
+    threads = [threading.Thread(target=hold) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    holding.wait()
+    try:
+        with pytest.raises(PoolExhaustedError):
+            with pool.checkout(account, None):
+                pass
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    # 归还后的两个连接都可以复用
+    with pool.checkout(account, None):
+        pass
+    assert smtp_stub.connections == 2
+
+
+def test_daily_limit_stops_sending(smtp_stub, mail_notifier):
+    notifier = mail_notifier(EMAIL_DAILY_LIMIT_1=2)
+
+    result = notifier.send_sync([f"user{i}@example.com" for i in range(3)], "主题", "内容")
+
+    # 配额用尽后剩余的收件人保持未处理，由发件箱稍后重试
+    assert result["success"] == ["user0@example.com", "user1@example.com"]
+    assert notifier.pool.has_quota(notifier.config.accounts[0]) is False
+
+
+def test_temporary_rejection_refunds_the_token(tmp_path, smtp_stub, mail_notifier):
+    notifier = mail_notifier(EMAIL_DAILY_LIMIT_1=10)
+    smtp_stub.errors["user@example.com"] = [
+        smtplib.SMTPRecipientsRefused({"user@example.com": (451, b"try again later")})
+    ]
+
+    assert notifier.send_sync("user@example.com", "主题", "内容")["success"] == []
+    # 发送配额与发件箱保存在同一个文件中
+    store = MailQuotaStore(str(tmp_path / "outbox.db"))
+    assert store.available(ACCOUNT, 10) == pytest.approx(10, abs=0.01)
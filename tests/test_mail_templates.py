@@ -0,0 +1,73 @@
+import json
+from email import message_from_bytes
+from email.policy import default
+
+import pytest
+
+from notification.mail_templates import TEMPLATE_PREFIX, MailTemplate, MailTemplateCache
+
+FROM = "PKUHUB <tests@example.com>"
+
+
+@pytest.fixture
+def cache():
+    cache = MailTemplateCache()
+    cache.register(MailTemplate("greeting", "问候 - PKUHUB", "<p>你好 ${name}，验证码 ${code}</p>"))
+    return cache
+
+
+def parse(data):
+    return message_from_bytes(data, policy=default)
+
+
+def build(cache, to, params, **kw):
+    return cache.build(FROM, to, "", json.dumps(params), TEMPLATE_PREFIX + "greeting", **kw)
+
+
+def test_compiled_template_renders_headers_and_escaped_params(cache):
+    msg = parse(build(cache, "a@example.com", {"name": "<张三>", "code": "123456"}))
+
+    assert msg["Subject"] == "问候 - PKUHUB"
+    assert msg["To"] == "a@example.com"
+    assert msg.get_content_type() == "text/html"
+    assert msg.get_content().strip() == "<p>你好 &lt;张三&gt;，验证码 123456</p>"
+
+
+def test_skeleton_is_compiled_once_per_subject_and_sender(cache):
+    first = parse(build(cache, "a@example.com", {"name": "甲", "code": "1"}))
+    second = parse(build(cache, "b@example.com", {"name": "乙", "code": "2"}))
+
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+    assert (first["To"], second["To"]) == ("a@example.com", "b@example.com")
+    assert "乙" in second.get_content() and "甲" not in second.get_content()
+
+
+def test_base64_fallback_matches_the_compiled_message(cache):
+    params = {"name": "丙", "code": "654321"}
+    compiled = parse(build(cache, "a@example.com", params))
+    fallback = parse(build(cache, "a@example.com", params, eight_bit=False))
+
+    assert fallback["Content-Transfer-Encoding"] == "base64"
+    assert fallback.get_content().strip() == compiled.get_content().strip()
+    assert fallback["Subject"] == compiled["Subject"]
+
+
+def test_plain_content_and_overlong_lines(cache):
+    plain = parse(cache.build(FROM, "a@example.com", "主题", "正文", "plain"))
+    assert plain.get_content_type() == "text/plain" and plain.get_content().strip() == "正文"
+
+    # 超过998字节的行不能使用8bit骨架，回退为逐封构建
+    long_body = "长" * 400
+    msg = parse(cache.build(FROM, "a@example.com", "主题", long_body, "plain"))
+    assert msg.get_content().strip() == long_body
+
+
+def test_registering_a_template_invalidates_its_skeletons(cache):
+    build(cache, "a@example.com", {"name": "甲", "code": "1"})
+    cache.register(MailTemplate("greeting", "新主题", "<p>${name}</p>"))
+
+    msg = parse(build(cache, "a@example.com", {"name": "甲"}))
+
+    assert msg["Subject"] == "新主题"
+    assert msg.get_content().strip() == "<p>甲</p>"
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,43 @@
+from notification import notification_manager
+
+
+def test_feed_pages_with_a_keyset_cursor(login, make_user):
+    author, user = make_user("Author"), make_user("User")
+    ids = [notification_manager.create_notification(f"通知{i}", "内容", author.id).id for i in range(5)]
+    client = login(user)
+
+    first = client.get("/api/notifications?limit=2").get_json()
+    assert [n["id"] for n in first["notifications"]] == [ids[4], ids[3]]
+    assert first["next_cursor"] == ids[3]
+
+    second = client.get(f"/api/notifications?limit=2&before={first['next_cursor']}").get_json()
+    assert [n["id"] for n in second["notifications"]] == [ids[2], ids[1]]
+
+    last = client.get(f"/api/notifications?limit=2&before={second['next_cursor']}").get_json()
+    assert [n["id"] for n in last["notifications"]] == [ids[0]]
+    assert last["next_cursor"] is None
+
+
+def test_cursor_is_stable_when_new_notifications_arrive(make_user):
+    author, user = make_user("Author"), make_user("User")
+    ids = [notification_manager.create_notification(f"通知{i}", "内容", author.id).id for i in range(3)]
+
+    page = notification_manager.get_notification_page(user.id, False, limit=2)
+    notification_manager.create_notification("新通知", "内容", author.id)
+    rest = notification_manager.get_notification_page(user.id, False, before=page["next_cursor"], limit=2)
+
+    assert [n["id"] for n in rest["notifications"]] == [ids[0]]
+
+
+def test_page_size_is_clamped(login, make_user):
+    author, user = make_user("Author"), make_user("User")
+    for i in range(3):
+        notification_manager.create_notification(f"通知{i}", "内容", author.id)
+    client = login(user)
+
+    page = client.get("/api/notifications?limit=0").get_json()
+    assert len(page["notifications"]) == 1 and page["next_cursor"] is not None
+
+
+def test_feed_requires_login(client):
+    assert client.get("/api/notifications").status_code == 302
@@ -0,0 +1,90 @@
+import json
+
+from database import db, Notification, NotificationReceipt, User
+from database.action import delete_user
+from notification import notification_manager
+
+
+def test_broadcast_read_state_is_per_user(make_user):
+    alice, bob = make_user("Alice"), make_user("Bob")
+    n = notification_manager.create_notification("标题", "内容", alice.id)
+
+    assert notification_manager.get_unread_count(bob.id, False) == 1
+    assert notification_manager.mark_as_read(n.id, bob.id, False) is True
+    # 重复标记不再改变状态
+    assert notification_manager.mark_as_read(n.id, bob.id, False) is False
+
+    assert notification_manager.get_unread_count(bob.id, False) == 0
+    assert notification_manager.get_unread_count(alice.id, False) == 1
+    [item] = notification_manager.get_user_notifications(bob.id, False)
+    assert item["id"] == n.id and item["is_read"] is True
+
+
+def test_admin_notifications_are_hidden_from_users(make_user):
+    admin, user = make_user("Admin", is_admin=True), make_user("User")
+    n = notification_manager.create_notification("仅管理员", "内容", admin.id, target_role="admin")
+
+    assert notification_manager.get_user_notifications(user.id, False) == []
+    assert notification_manager.mark_as_read(n.id, user.id, False) is False
+    assert [item["id"] for item in notification_manager.get_user_notifications(admin.id, True)] == [n.id]
+
+
+def test_follower_notifications_reach_only_recipients(make_user):
+    uploader, fan, other = make_user("Up"), make_user("Fan"), make_user("Other")
+    n = notification_manager.create_notification(
+        "新资料", "内容", uploader.id, target_role="followers", recipient_ids=[fan.id]
+    )
+
+    assert notification_manager.get_unread_count(fan.id, False) == 1
+    assert notification_manager.get_unread_count(other.id, False) == 0
+    assert notification_manager.mark_as_read(n.id, other.id, False) is False
+    assert notification_manager.mark_as_read(n.id, fan.id, False) is True
+    assert notification_manager.get_unread_count(fan.id, False) == 0
+
+
+def test_recipient_deletes_only_their_read_receipt(make_user):
+    uploader, fan, other = make_user("Up"), make_user("Fan"), make_user("Other")
+    n = notification_manager.create_notification(
+        "新资料", "内容", uploader.id, target_role="followers", recipient_ids=[fan.id, other.id]
+    )
+    # 未读的关注者通知不能删除
+    assert notification_manager.delete_notification(n.id, fan.id) is False
+    notification_manager.mark_as_read(n.id, fan.id, False)
+    assert notification_manager.delete_notification(n.id, fan.id) is True
+
+    assert notification_manager.get_user_notifications(fan.id, False) == []
+    assert len(notification_manager.get_user_notifications(other.id, False)) == 1
+
+
+def test_import_legacy_notifications(tmp_path, make_user):
+    alice, bob = make_user("Alice"), make_user("Bob")
+    legacy = [
+        {"title": "旧通知", "content": "内容", "target_role": "all",
+         "created_at": "2024-01-01 10:00:00", "created_by": alice.id, "read_by": [bob.id]},
+        {"title": "关注", "content": "内容", "target_role": "followers",
+         "created_at": "2024-01-02 10:00:00", "created_by": alice.id, "for_users": [bob.id]},
+    ]
+    (tmp_path / "notifications.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    assert notification_manager.import_legacy_notifications(str(tmp_path)) == 2
+    # 表中已有通知时不再重复导入
+    assert notification_manager.import_legacy_notifications(str(tmp_path)) == 0
+
+    items = notification_manager.get_user_notifications(bob.id, False)
+    assert [(item["title"], item["is_read"]) for item in items] == [("关注", False), ("旧通知", True)]
+
+
+def test_delete_user_cleans_up_notification_rows(make_user):
+    alice, bob = make_user("Alice"), make_user("Bob")
+    n = notification_manager.create_notification(
+        "新资料", "内容", alice.id, target_role="followers", recipient_ids=[bob.id]
+    )
+    alice_id, bob_id, notification_id = alice.id, bob.id, n.id
+
+    assert delete_user(bob_id) is True
+    assert NotificationReceipt.query.filter_by(user_id=bob_id).count() == 0
+
+    assert delete_user(alice_id) is True
+    db.session.expire_all()
+    assert db.session.get(Notification, notification_id).created_by is None
+    assert User.query.count() == 0
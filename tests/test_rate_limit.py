@@ -0,0 +1,76 @@
+import pytest
+
+from utils.rate_limit import SlidingWindowLimiter, get_limiter
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return SlidingWindowLimiter(str(tmp_path / "rate_limit.db"))
+
+
+def test_requests_over_the_limit_are_rejected(limiter):
+    key = [("login:ip:1.2.3.4:10", 3, 10)]
+
+    assert [limiter.hit(key, now=t) for t in (0, 1, 2)] == [0, 0, 0]
+    assert limiter.hit(key, now=3) > 0
+
+
+def test_window_slides_instead_of_resetting(limiter):
+    key = [("login:ip:1.2.3.4:10", 3, 10)]
+    for t in (0, 1, 2):
+        limiter.hit(key, now=t)
+
+    # 第一个请求的分桶只剩一半在窗口内，估算请求数仍然达到上限
+    assert limiter.hit(key, now=10.5) > 0
+    assert limiter.hit(key, now=11) == 0
+    assert limiter.hit(key, now=11.5) > 0
+
+
+def test_retry_after_points_to_when_a_request_is_allowed(limiter):
+    key = [("login:ip:1.2.3.4:10", 2, 10)]
+    limiter.hit(key, now=0)
+    limiter.hit(key, now=5)
+
+    retry_after = limiter.hit(key, now=6)
+
+    assert limiter.hit(key, now=6 + retry_after) == 0
+
+
+def test_rejected_request_is_not_counted_for_any_rule(limiter):
+    ip, email = ("code:ip:1.2.3.4:600", 10, 600), ("code:email:a@pku.edu.cn:60", 1, 60)
+    limiter.hit([ip, email], now=0)
+
+    for t in range(1, 20):
+        assert limiter.hit([ip, email], now=t) > 0
+    # 被拒绝的请求没有消耗 IP 规则的次数
+    assert all(limiter.hit([ip], now=30) == 0 for _ in range(9))
+    assert limiter.hit([ip], now=30) > 0
+
+
+def test_counts_are_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "rate_limit.db")
+    key = [("login:ip:1.2.3.4:60", 1, 60)]
+
+    assert SlidingWindowLimiter(path).hit(key, now=0) == 0
+    assert SlidingWindowLimiter(path).hit(key, now=1) > 0
+
+
+def test_endpoint_returns_429_with_retry_after(client, smtp_stub, mail_notifier):
+    mail_notifier()
+    get_limiter().reset()
+
+    assert client.post("/send_verification_code", json={"email": "a@pku.edu.cn"}).status_code == 202
+    response = client.post("/send_verification_code", json={"email": "A@pku.edu.cn "})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.get_json()["success"] is False
+    # 其他邮箱不受影响
+    assert client.post("/send_verification_code", json={"email": "b@pku.edu.cn"}).status_code == 202
+
+
+def test_get_requests_are_not_limited(client, app, monkeypatch):
+    get_limiter().reset()
+    monkeypatch.setattr(SlidingWindowLimiter, "hit", lambda *args, **kw: pytest.fail("GET 请求不应计数"))
+
+    assert client.get("/login").status_code == 200
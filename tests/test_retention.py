@@ -0,0 +1,72 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import db, Notification
+from notification import notification_manager, retention_job
+from notification.retention import acquire_lease
+
+
+@pytest.fixture
+def archive_folder(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "NOTIFICATION_ARCHIVE_FOLDER", str(tmp_path))
+    monkeypatch.setitem(app.config, "NOTIFICATION_RETENTION_DAYS", {"all": 30, "followers": 7})
+    return tmp_path
+
+
+def backdate(notification, days):
+    notification.created_at = datetime.now() - timedelta(days=days)
+    db.session.commit()
+
+
+def test_expired_notifications_are_archived_and_deleted(app, archive_folder, make_user):
+    author, fan = make_user("Author"), make_user("Fan")
+    old = notification_manager.create_notification("旧广播", "内容", author.id)
+    kept = notification_manager.create_notification("新广播", "内容", author.id)
+    follower = notification_manager.create_notification(
+        "关注", "内容", author.id, target_role="followers", recipient_ids=[fan.id]
+    )
+    backdate(old, 40)
+    backdate(follower, 10)
+    old_id, kept_id, follower_id = old.id, kept.id, follower.id
+    assert notification_manager.get_unread_count(fan.id, False) == 3
+
+    metrics = retention_job.run_once(app)
+
+    assert metrics == {
+        "all": {"archived": 1, "receipts": 0},
+        "followers": {"archived": 1, "receipts": 1},
+    }
+    assert [n.id for n in Notification.query] == [kept_id]
+    assert notification_manager.get_unread_count(fan.id, False) == 1
+
+    [archive] = archive_folder.iterdir()
+    with gzip.open(archive, "rt", encoding="utf-8") as f:
+        records = {record["id"]: record for record in map(json.loads, f)}
+    assert set(records) == {old_id, follower_id}
+    assert records[follower_id]["receipts"] == [{"user_id": fan.id, "read": False, "read_at": None}]
+
+    stats = retention_job.stats()
+    assert stats["runs"] == 1 and stats["archived_total"] == 2
+    assert stats["last_run"]["roles"]["followers"] == {"archived": 1, "receipts": 1}
+
+
+def test_run_without_expired_notifications_leaves_no_archive(app, archive_folder, make_user):
+    notification_manager.create_notification("新广播", "内容", make_user("Author").id)
+
+    metrics = retention_job.run_once(app)
+
+    assert sum(m["archived"] for m in metrics.values()) == 0
+    assert list(archive_folder.iterdir()) == []
+    assert Notification.query.count() == 1
+
+
+def test_lease_is_held_until_it_expires():
+    assert acquire_lease("test_lease", 60) is True
+    assert acquire_lease("test_lease", 60) is False
+    assert acquire_lease("other_lease", 60) is True
+    # 时长为负的租约立即过期
+    assert acquire_lease("expired_lease", -1) is True
+    assert acquire_lease("expired_lease", 60) is True
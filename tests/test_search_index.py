@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import select, text
+
+from database import db, Department
+from database.action import (
+    delete_material,
+    update_comment,
+    update_course,
+    update_material,
+    update_user,
+)
+from database.search_index import search_index
+
+
+@pytest.fixture(autouse=True)
+def empty_index():
+    """清空表时不会触发ORM事件，索引行需要单独清空"""
+    db.session.execute(text("DELETE FROM material_fts"))
+    db.session.commit()
+
+
+def search(query):
+    fts = search_index.match(query)
+    return db.session.execute(select(fts.c.material_id).order_by(fts.c.rank)).scalars().all()
+
+
+def test_new_materials_are_indexed_and_ranked(make_user, make_material):
+    user = make_user("Up")
+    in_title = make_material(user, "线性代数期末试卷")
+    in_description = make_material(user, "期中试卷", description="覆盖线性代数前五章")
+    make_material(user, "数学分析笔记")
+
+    assert search("线性代数") == [in_title.id, in_description.id]
+    # 课程名称同样被索引
+    assert len(search("高等数学")) == 3
+
+
+def test_updated_and_deleted_materials_leave_the_index(make_user, make_material):
+    material = make_material(make_user("Up"), "线性代数期末试卷")
+
+    assert update_material(material.id, title="概率统计期末试卷") is material
+    assert search("线性代数") == []
+    assert search("概率统计") == [material.id]
+
+    assert delete_material(material.id)
+    assert search("概率统计") == []
+
+
+def test_course_and_department_renames_are_reindexed(make_user, make_course, make_material):
+    course = make_course("高等代数")
+    material = make_material(make_user("Up"), "期末试卷", course=course)
+
+    update_course(course.id, name="抽象代数学")
+    assert search("抽象代数学") == [material.id]
+    assert search("高等代数") == []
+
+    department = db.session.get(Department, course.department_id)
+    department.name = "应用数学学院"
+    db.session.commit()
+    assert search("应用数学学院") == [material.id]
+
+
+def test_versioned_course_update_reindexes_in_the_same_transaction(make_user, make_course, make_material):
+    course = make_course("高等代数")
+    material = make_material(make_user("Up"), "期末试卷", course=course)
+
+    updated = update_course(course.id, name="抽象代数学", version=course.version)
+    assert updated is course and updated.name == "抽象代数学"
+    assert search("抽象代数学") == [material.id]
+
+    # 版本冲突时课程和索引都不变
+    assert update_course(course.id, name="近世代数学", version=0) is None
+    assert search("近世代数学") == [] and search("抽象代数学") == [material.id]
+
+
+def test_update_functions_return_the_object_or_none(make_user, make_material):
+    from database import Comment
+
+    user = make_user("Up")
+    material = make_material(user)
+    comment = Comment(content="好资料", user_id=user.id, material_id=material.id)
+    db.session.add(comment)
+    db.session.commit()
+
+    assert update_user(user.id, bio="你好") is user
+    assert update_user(user.id, bio="再见", version=user.version) is user
+    assert update_user(user.id, bio="冲突", version=-1) is None
+    assert update_user(987654, bio="不存在") is None
+    assert update_material(material.id, title="新标题") is material
+    assert update_material(987654, title="不存在") is None
+    assert update_comment(comment.id, content="很好的资料") is comment
+    assert update_comment(987654, content="不存在") is None
+    assert update_course(987654, name="不存在") is None
+
+
+def test_search_page_highlights_matches(make_user, make_material, login):
+    user = make_user("Up")
+    make_material(user, "线性代数期末试卷", description="覆盖线性代数前五章")
+
+    response = login(user).get("/search?q=线性代数")
+
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert "线性代数期末试卷" in page and "<mark>线性代数</mark>" in page
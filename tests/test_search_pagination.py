@@ -0,0 +1,114 @@
+import re
+
+import pytest
+from sqlalchemy import event, insert, text
+
+from blueprints.search import EXACT_COUNT_LIMIT, count_results
+from database import db
+from database.models import Material, MaterialStats
+from database.search_index import search_index
+
+
+@pytest.fixture
+def bulk_materials(make_user, make_course):
+    """批量写入资料并重建全文索引(批量插入不触发ORM事件)"""
+    db.session.execute(text("DELETE FROM material_fts"))
+    db.session.commit()
+    user, course = make_user("Up"), make_course()
+
+    def add(title, count, downloads=0):
+        rows = [
+            {"title": title, "description": "", "file_path": "uploads/test.pdf", "file_type": "试卷",
+             "course_id": course.id, "user_id": user.id}
+            for _ in range(count)
+        ]
+        db.session.execute(insert(Material), rows)
+        db.session.commit()
+
+    return add
+
+
+def matching(query):
+    fts = search_index.match(query)
+    return db.session.query(Material).join(fts, fts.c.material_id == Material.id)
+
+
+def reindex():
+    search_index.rebuild(db.session.connection())
+    db.session.commit()
+
+
+def test_small_result_sets_are_counted_exactly(bulk_materials):
+    bulk_materials("线性代数期末试卷", 30)
+    bulk_materials("数学分析期末试卷", 30)
+    reindex()
+
+    assert count_results(matching("线性代数")) == (30, True)
+
+
+def test_clustered_matches_are_estimated_within_their_own_id_range(bulk_materials):
+    # 匹配的资料集中在中间一段ID，前后各有大量不匹配的资料
+    bulk_materials("数学分析期末试卷", 3000)
+    bulk_materials("线性代数期末试卷", 1500)
+    bulk_materials("数学分析期末试卷", 3000)
+    reindex()
+
+    total, exact = count_results(matching("线性代数"))
+
+    assert exact is False
+    assert EXACT_COUNT_LIMIT < total
+    assert abs(total - 1500) <= 150
+
+
+def test_two_clusters_are_estimated_within_bound(bulk_materials):
+    bulk_materials("线性代数期末试卷", 800)
+    bulk_materials("数学分析期末试卷", 1000)
+    bulk_materials("线性代数期末试卷", 800)
+    reindex()
+
+    total, exact = count_results(matching("线性代数"))
+
+    assert exact is False
+    # 两段之间的空隙会让估算偏低，但不会低于已读取的ID数，也不会按整张资料表的ID范围放大
+    assert EXACT_COUNT_LIMIT < total and abs(total - 1600) <= 400
+
+
+def test_pages_are_limited_and_clamped(bulk_materials, make_user, login):
+    bulk_materials("线性代数期末试卷", 45)
+    reindex()
+    client = login(make_user("Reader"))
+
+    page = client.get("/search?q=线性代数&per_page=20&page=2").get_data(as_text=True)
+    assert "找到 45 个匹配结果" in page and "第 2 页 / 共 3 页" in page
+
+    # 超出范围的页码调整为最后一页
+    page = client.get("/search?q=线性代数&per_page=20&page=99").get_data(as_text=True)
+    assert "第 3 页 / 共 3 页" in page
+
+
+def test_download_sort_joins_stats_once(bulk_materials, make_user, login):
+    bulk_materials("线性代数期末试卷", 30)
+    reindex()
+    db.session.execute(
+        insert(MaterialStats),
+        [{"material_id": m.id, "download_count": m.id} for m in Material.query],
+    )
+    db.session.commit()
+    client = login(make_user("Reader"))
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/search?q=线性代数&sort=downloads&per_page=10")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    stats_queries = [s for s in statements if "material_stats" in s]
+    # 只有分页查询读取统计表，且只连接一次；没有逐条懒加载统计
+    [page_query] = stats_queries
+    assert len(re.findall(r"JOIN material_stats", page_query)) == 1
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import select, text
+
+from database import db
+from database.search_index import search_index
+from database.tokenizer import highlight, normalize, query_expression, tokenize
+
+
+def test_cjk_runs_are_split_into_bigrams():
+    assert tokenize("数据结构") == "数据 据结 结构 构"
+    assert tokenize("C语言程序设计 CS202") == "c 语言 言程 程序 序设 设计 计 cs 202"
+    assert tokenize("") == "" and tokenize(None) == ""
+
+
+def test_width_case_and_script_are_normalized():
+    assert normalize("ＣＳ２０２") == "cs202"
+    assert tokenize("數據結構") == tokenize("数据结构")
+    assert tokenize("ＣＳ２０２，线代") == tokenize("cs202 线代")
+
+
+def test_query_expression():
+    assert query_expression("数据结构") == '"数据 据结 结构"'
+    # 末尾的单字和字母/数字使用前缀匹配
+    assert query_expression("数") == '"数" *'
+    assert query_expression("cs") == '"cs" *'
+    assert query_expression("线代 期末") == '"线代" AND "期末"'
+    assert query_expression("！？") is None
+
+
+def test_query_keeps_cjk_and_following_latin_adjacent():
+    assert query_expression("数据结构2024") == '"数据 据结 结构 构 2024" *'
+    assert query_expression("C语言") == '"c 语言"'
+
+
+def test_highlight_marks_normalized_matches_and_escapes():
+    assert highlight("<b>數據結構</b>期末", "数据结构") == "&lt;b&gt;<mark>數據結構</mark>&lt;/b&gt;期末"
+    assert highlight("课程代码ＣＳ２０２", "cs202") == "课程代码<mark>ＣＳ２０２</mark>"
+    assert highlight("没有匹配", "线代") is None
+
+    snippet = highlight("前" * 100 + "线代" + "后" * 100, "线代", width=20)
+    assert snippet.startswith("…") and snippet.endswith("…") and "<mark>线代</mark>" in snippet
+
+
+@pytest.fixture
+def indexed(make_user, make_material):
+    db.session.execute(text("DELETE FROM material_fts"))
+    db.session.commit()
+    user = make_user("Up")
+    return {
+        title: make_material(user, title).id
+        for title in ("数据结构2024期末", "数据结构 期末 2024", "C语言程序设计", "線性代數筆記")
+    }
+
+
+def search(query):
+    fts = search_index.match(query)
+    return set(db.session.execute(select(fts.c.material_id)).scalars())
+
+
+def test_short_traditional_and_mixed_queries(indexed):
+    assert search("线") == {indexed["線性代數筆記"]}
+    assert search("代数") == {indexed["線性代數筆記"]}
+    assert search("線性代數") == search("线性代数") == {indexed["線性代數筆記"]}
+    assert search("c语言") == {indexed["C语言程序设计"]}
+    assert search("ｃ语言程序") == {indexed["C语言程序设计"]}
+    assert search("数据结构2024") == {indexed["数据结构2024期末"]}
+    assert search("数据结构 2024") == {indexed["数据结构2024期末"], indexed["数据结构 期末 2024"]}
@@ -0,0 +1,54 @@
+from database import db, NotificationState
+from notification import notification_manager, unread_counter
+
+
+def fail():
+    raise AssertionError("不应重新统计未读数")
+
+
+def test_cached_count_is_served_without_recounting(make_user):
+    user = make_user("User")
+    notification_manager.create_notification("标题", "内容", user.id)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return notification_manager.count_unread(user.id, False)
+
+    assert unread_counter.get(user.id, False, loader) == 1
+    assert unread_counter.get(user.id, False, loader) == 1
+    assert len(calls) == 1
+
+
+def test_local_changes_update_the_cache_incrementally(make_user):
+    author, user = make_user("Author"), make_user("User")
+    assert notification_manager.get_unread_count(user.id, False) == 0
+
+    n = notification_manager.create_notification("标题", "内容", author.id)
+    assert unread_counter.get(user.id, False, fail) == 1
+
+    notification_manager.create_notification("管理员", "内容", author.id, target_role="admin")
+    assert unread_counter.get(user.id, False, fail) == 1
+
+    notification_manager.mark_as_read(n.id, user.id, False)
+    assert unread_counter.get(user.id, False, fail) == 0
+
+
+def test_token_change_from_another_worker_drops_the_cache(make_user):
+    user = make_user("User")
+    assert notification_manager.get_unread_count(user.id, False) == 0
+
+    # 模拟其他进程修改通知: 只递增共享令牌，不经过本进程的缓存
+    state = db.session.get(NotificationState, unread_counter.TOKEN_KEY)
+    state.value += 1
+    db.session.commit()
+
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return 7
+
+    assert unread_counter.get(user.id, False, loader) == 7
+    assert unread_counter.get(user.id, False, loader) == 7
+    assert calls == [1]
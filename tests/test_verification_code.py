@@ -0,0 +1,79 @@
+import smtplib
+import time
+
+import pytest
+
+import notification
+from notification import verification_code
+
+
+def wait_for_status(ticket, email, timeout=10):
+    """轮询发送状态直到不再是 pending"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = notification.get_verification_status(ticket, email)
+        if status != "pending":
+            return status
+        time.sleep(0.05)
+    return "pending"
+
+
+@pytest.fixture
+def fixed_code(monkeypatch):
+    monkeypatch.setattr(verification_code, "code_generator", lambda: "123456")
+    return "123456"
+
+
+def test_code_is_queued_and_verified_once(smtp_stub, mail_notifier, fixed_code):
+    mail_notifier()
+    email = "queued@pku.edu.cn"
+
+    ticket = notification.request_verification_code(email)
+
+    assert wait_for_status(ticket, email) == "sent"
+    assert [to for _, to, _ in smtp_stub.received] == [email]
+    assert notification.verify_code(email, "000000") is False
+    assert notification.verify_code(email, fixed_code) is True
+    # 验证通过后验证码被消费
+    assert notification.verify_code(email, fixed_code) is False
+
+
+def test_failed_delivery_discards_the_code(smtp_stub, mail_notifier, fixed_code):
+    mail_notifier()
+    email = "bounced@pku.edu.cn"
+    smtp_stub.errors[email] = [smtplib.SMTPRecipientsRefused({email: (550, b"no such user")})]
+
+    ticket = notification.request_verification_code(email)
+
+    assert wait_for_status(ticket, email) == "failed"
+    assert notification.verify_code(email, fixed_code) is False
+
+
+def test_unknown_ticket():
+    assert notification.get_verification_status(987654, "nobody@pku.edu.cn") == "unknown"
+
+
+def test_endpoint_returns_a_ticket_and_reports_status(client, smtp_stub, mail_notifier, fixed_code):
+    mail_notifier()
+    email = "endpoint@pku.edu.cn"
+
+    response = client.post("/send_verification_code", json={"email": email})
+
+    assert response.status_code == 202
+    ticket = response.get_json()["ticket"]
+    assert wait_for_status(ticket, email) == "sent"
+    assert client.get(f"/verification_status/{ticket}").get_json() == {"status": "sent"}
+
+
+def test_status_is_only_visible_to_the_requesting_session(client, app, smtp_stub, mail_notifier):
+    mail_notifier()
+    response = client.post("/send_verification_code", json={"email": "other@pku.edu.cn"})
+    ticket = response.get_json()["ticket"]
+
+    assert app.test_client().get(f"/verification_status/{ticket}").status_code == 404
+
+
+def test_non_pku_email_is_rejected(client):
+    response = client.post("/send_verification_code", json={"email": "user@example.com"})
+
+    assert response.get_json()["success"] is False
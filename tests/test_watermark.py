@@ -0,0 +1,73 @@
+from database import NotificationReceipt
+from notification import notification_manager
+
+
+def broadcasts(author, count, target_role="all"):
+    return [
+        notification_manager.create_notification(f"通知{i}", "内容", author.id, target_role=target_role).id
+        for i in range(count)
+    ]
+
+
+def receipts(user):
+    return NotificationReceipt.query.filter_by(user_id=user.id).count()
+
+
+def test_reading_in_order_only_moves_the_watermark(make_user):
+    author, user = make_user("Author"), make_user("User")
+    first, second, third = broadcasts(author, 3)
+
+    notification_manager.mark_as_read(first, user.id, False)
+    notification_manager.mark_as_read(second, user.id, False)
+
+    assert notification_manager.get_watermark(user.id) == second
+    assert receipts(user) == 0
+    assert notification_manager.get_unread_count(user.id, False) == 1
+
+
+def test_out_of_order_reads_keep_exception_receipts_until_the_gap_closes(make_user):
+    author, user = make_user("Author"), make_user("User")
+    first, second, third = broadcasts(author, 3)
+
+    notification_manager.mark_as_read(third, user.id, False)
+    notification_manager.mark_as_read(second, user.id, False)
+    assert notification_manager.get_watermark(user.id) == 0
+    assert receipts(user) == 2
+    assert notification_manager.get_unread_count(user.id, False) == 1
+
+    notification_manager.mark_as_read(first, user.id, False)
+    assert notification_manager.get_watermark(user.id) == third
+    assert receipts(user) == 0
+    assert notification_manager.get_unread_count(user.id, False) == 0
+    # 水位线以下的通知不能再次标记
+    assert notification_manager.mark_as_read(second, user.id, False) is False
+
+
+def test_admin_only_broadcasts_do_not_block_a_users_watermark(make_user):
+    author, user = make_user("Author", is_admin=True), make_user("User")
+    [first] = broadcasts(author, 1)
+    broadcasts(author, 1, target_role="admin")
+    [last] = broadcasts(author, 1)
+
+    notification_manager.mark_as_read(first, user.id, False)
+    notification_manager.mark_as_read(last, user.id, False)
+
+    assert notification_manager.get_watermark(user.id) == last
+    assert receipts(user) == 0
+
+
+def test_mark_all_as_read_collapses_receipts_into_the_watermark(make_user):
+    author, user = make_user("Author"), make_user("User")
+    ids = broadcasts(author, 4)
+    follower = notification_manager.create_notification(
+        "关注", "内容", author.id, target_role="followers", recipient_ids=[user.id]
+    )
+    notification_manager.mark_as_read(ids[2], user.id, False)
+
+    assert notification_manager.mark_all_as_read(user.id, False) == 4
+    assert notification_manager.get_watermark(user.id) == ids[-1]
+    assert notification_manager.get_unread_count(user.id, False) == 0
+    # 只剩关注者通知的回执(已读)
+    [receipt] = NotificationReceipt.query.filter_by(user_id=user.id).all()
+    assert receipt.notification_id == follower.id and receipt.read
+    assert notification_manager.mark_all_as_read(user.id, False) == 0
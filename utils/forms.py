@@ -68,6 +68,21 @@ class UpdateProfileForm(FlaskForm):
     submit = SubmitField("更新资料")  # 提交按钮
 
 
+class EmailPreferenceForm(FlaskForm):
+    """邮件通知偏好表单"""
+
+    follower_uploads = SelectField(
+        "关注的用户上传资料时",
+        choices=[
+            ("immediate", "立即发送邮件"),
+            ("daily", "每日摘要"),
+            ("off", "不发送邮件"),
+        ],
+        validators=[DataRequired()],
+    )
+    submit = SubmitField("保存设置")  # 提交按钮
+
+
 class ChangePasswordForm(FlaskForm):
     current_password = PasswordField(
         "当前密码", validators=[DataRequired()]
@@ -0,0 +1,251 @@
+import os
+import math
+import time
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, jsonify, render_template, request
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    限流规则 - 每个 scope 取值在 window 秒内最多 limit 次请求
+    """
+
+    scope: str  # 计数维度: "ip" 或 "email"
+    limit: int  # 窗口内允许的请求数
+    window: int  # 窗口长度(秒)
+
+
+class SlidingWindowLimiter:
+    """
+    滑动窗口限流器 - 计数保存在独立的SQLite文件中，所有工作进程共享
+
+    工作方式:
+    1. 每个键的窗口分成 BUCKETS 个分桶计数，请求数估算为窗口内各分桶计数之和，最早的分桶按仍在窗口内的比例计入，
+       每个键最多保存 BUCKETS + 1 行记录，不保存每次请求的时间，误差不超过一个分桶的时长
+    2. 一次请求的所有规则在同一个写事务中检查并计数: 任一规则超限时整个请求被拒绝，被拒绝的请求不计数
+    3. 过期计数由各进程每分钟顺带删除一次
+    """
+
+    # 每个窗口的分桶数
+    BUCKETS = 10
+    # 清理过期计数的间隔(秒)
+    CLEANUP_INTERVAL = 60
+
+    def __init__(self, path: str):
+        """
+        初始化限流器
+
+        参数:
+            path: SQLite数据库文件路径
+        """
+        self.path = path
+        self._local = threading.local()  # 每个线程独立的SQLite连接
+        self._tables_ready = False
+        self._last_cleanup = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的SQLite连接(fork 之后的子进程重新连接)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")  # 读写互不阻塞
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+            if not self._tables_ready:
+                conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS rate_limit_counter (
+                        key TEXT NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        count INTEGER NOT NULL,
+                        expires_at REAL NOT NULL,
+                        PRIMARY KEY (key, bucket)
+                    ) WITHOUT ROWID;
+                    CREATE INDEX IF NOT EXISTS ix_rate_limit_counter_expires
+                        ON rate_limit_counter (expires_at);
+                    """
+                )
+                self._tables_ready = True
+        return conn
+
+    def _check(
+        self, conn: sqlite3.Connection, key: str, limit: int, window: int, now: float
+    ) -> float:
+        """
+        估算一个键在滑动窗口内的请求数
+
+        参数:
+            conn: SQLite连接(调用方已开启事务)
+            key: 计数键
+            limit: 窗口内允许的请求数
+            window: 窗口长度(秒)
+            now: 当前时间
+        返回:
+            0 表示未超限；否则为估算请求数降到 limit - 1 以下需要等待的秒数
+        """
+        size = window / self.BUCKETS
+        current = int(now // size)
+        oldest = current - self.BUCKETS
+        rows = conn.execute(
+            """
+            SELECT bucket, count FROM rate_limit_counter
+            WHERE key = ? AND bucket >= ? ORDER BY bucket
+            """,
+            (key, oldest),
+        ).fetchall()
+        # 最早的分桶只有一部分仍在滑动窗口内，按比例计入
+        overlap = 1 - (now - current * size) / size
+        estimate = sum(count * (overlap if bucket == oldest else 1) for bucket, count in rows)
+        excess = estimate + 1 - limit
+        if excess <= 0:
+            return 0.0
+
+        # 从最早的分桶开始，等到滑出窗口的计数足够多
+        for bucket, count in rows:
+            excess -= count * (overlap if bucket == oldest else 1)
+            if excess <= 0:
+                return (bucket + self.BUCKETS + 1) * size - now
+        return window
+
+    def hit(self, keys: List[Tuple[str, int, int]], now: Optional[float] = None) -> float:
+        """
+        检查并记录一次请求
+
+        参数:
+            keys: [(计数键, 上限, 窗口秒数)]
+            now: 当前时间(可选，默认 time.time())
+        返回:
+            0 表示允许；大于 0 表示被拒绝，值为建议的重试等待秒数
+        """
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            retry_after = max(
+                [self._check(conn, key, limit, window, now) for key, limit, window in keys],
+                default=0.0,
+            )
+            if not retry_after:
+                for key, _, window in keys:
+                    size = window / self.BUCKETS
+                    conn.execute(
+                        """
+                        INSERT INTO rate_limit_counter (key, bucket, count, expires_at)
+                        VALUES (?, ?, 1, ?)
+                        ON CONFLICT (key, bucket) DO UPDATE SET count = count + 1
+                        """,
+                        (key, int(now // size), now + window + size),
+                    )
+
+            if now - self._last_cleanup > self.CLEANUP_INTERVAL:
+                self._last_cleanup = now
+                conn.execute("DELETE FROM rate_limit_counter WHERE expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return max(retry_after, 1.0) if retry_after else 0.0
+
+    def reset(self) -> None:
+        """清空所有计数"""
+        self._connect().execute("DELETE FROM rate_limit_counter")
+
+
+# 按存储路径缓存的限流器
+_limiters: Dict[str, SlidingWindowLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter() -> SlidingWindowLimiter:
+    """获取当前应用配置的限流器"""
+    path = current_app.config["RATE_LIMIT_STORAGE"]
+    limiter = _limiters.get(path)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.setdefault(path, SlidingWindowLimiter(path))
+    return limiter
+
+
+def _scope_value(scope: str) -> Optional[str]:
+    """
+    获取当前请求在某个计数维度上的取值
+
+    参数:
+        scope: "ip" 或 "email"
+    返回:
+        取值，请求中没有该维度时返回None(该规则不生效)
+    """
+    if scope == "ip":
+        # 部署在反向代理之后时由 ProxyFix 按 rate_limit.proxy_hops 还原为客户端地址
+        return request.remote_addr or "unknown"
+    if scope == "email":
+        data = request.get_json(silent=True) if request.is_json else request.form
+        email = (data or {}).get("email")
+        return email.strip().lower() if isinstance(email, str) and email.strip() else None
+    raise ValueError(f"未知的限流维度: {scope}")
+
+
+def rate_limit(name: str, *limits: RateLimit, methods: Tuple[str, ...] = ("POST",)):
+    """
+    限流装饰器 - 超过任一规则时返回 429 和 Retry-After，不再执行视图函数
+
+    参数:
+        name: 限流名称，同名的路由共享计数
+        limits: 限流规则
+        methods: 需要限流的请求方法(默认只限制POST，表单页面的GET不计数)
+
+    使用示例:
+        @auth_bp.route("/send_verification_code", methods=["POST"])
+        @rate_limit("send_code", RateLimit("ip", 10, 600), RateLimit("email", 1, 60))
+        def send_verification_code(): ...
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method not in methods or not current_app.config.get(
+                "RATE_LIMIT_ENABLED", True
+            ):
+                return f(*args, **kwargs)
+
+            keys = []
+            for rule in limits:
+                value = _scope_value(rule.scope)
+                if value is not None:
+                    keys.append(
+                        (f"{name}:{rule.scope}:{value}:{rule.window}", rule.limit, rule.window)
+                    )
+            try:
+                retry_after = get_limiter().hit(keys) if keys else 0
+            except sqlite3.Error as e:
+                # 限流存储不可用时放行，不影响正常用户
+                logger.error(f"限流检查失败: {str(e)}")
+                retry_after = 0
+            if not retry_after:
+                return f(*args, **kwargs)
+
+            seconds = math.ceil(retry_after)
+            logger.info(f"请求被限流: {name} {request.remote_addr} {seconds}秒")
+            message = f"请求过于频繁，请在{seconds}秒后重试"
+            if request.is_json:
+                response = jsonify({"success": False, "available": False, "message": message})
+            else:
+                response = current_app.make_response(
+                    render_template("error.html", error_code=429, error_message=message)
+                )
+            response.status_code = 429
+            response.headers["Retry-After"] = str(seconds)
+            return response
+
+        return decorated_function
+
+    return decorator